@@ -3,4 +3,24 @@ from app import create_app
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    from app.config.migrations import Migrations
+    from app.services.partitions import PartitionManager
+    from app.services.sessions import session_timer
+    from app.services.write_behind import write_behind
+    from app.services.model_registry import model_registry
+    from app.services.recommender import recommender
+    from app.services.plays import play_counter
+    from app.services.media_cache import media_cache
+    from app.services.moderation import moderation
+    from app.services.notifications import notifier
+    Migrations.check()
+    PartitionManager.maintain(expire=False)
+    session_timer.start()
+    write_behind.recover()
+    model_registry.start()
+    recommender.start()
+    play_counter.start()
+    media_cache.start_prefetch()
+    moderation.start()
+    notifier.start()
+    app.run(debug=True)
@@ -3,15 +3,21 @@ from pprint import pp
 from flask import Flask
 from .routes.auth import auth_bp
 from .routes.protected import protected_bp
+from .config.tracing import Tracing
+from .config.db import DBConnection
+from .config.compression import Compression
+from .services.model_loader import prediction_model
+from .cli import register_commands
 from flask_cors import CORS
 
 def create_app():
-    UPLOAD_FOLDER = 'uploads/music' 
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER)
-
     app = Flask(__name__)
-    CORS(app, supports_credentials=True)
+    CORS(app, supports_credentials=True, expose_headers=['X-Trace-Id'])
+    Tracing.init_app(app)
+    DBConnection.init_app(app)
+    Compression.init_app(app)
+    prediction_model.init_app(app)
+    register_commands(app)
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(protected_bp, url_prefix='/api/protected')
@@ -39,4 +45,19 @@ def create_app():
 
     from app.routes.chat import chat_bp
     app.register_blueprint(chat_bp, url_prefix='/api')
+
+    from app.routes.images import images_bp
+    app.register_blueprint(images_bp, url_prefix='/api')
+
+    from app.routes.moderation import moderation_bp
+    app.register_blueprint(moderation_bp, url_prefix='/api')
+
+    from app.routes.notifications import notifications_bp
+    app.register_blueprint(notifications_bp, url_prefix='/api')
+
+    from app.routes.health import health_bp
+    app.register_blueprint(health_bp, url_prefix='/api')
+
+    from app.routes.debug import debug_bp
+    app.register_blueprint(debug_bp, url_prefix='/api')
     return app
\ No newline at end of file
@@ -0,0 +1,56 @@
+# app/asgi/__init__.py
+"""
+Async serving mode.
+
+The I/O-heavy routes (chat history, the SSE stream, media serving and
+buy-messages) are served natively on the event loop with an asyncpg pool.
+Everything else falls through to the unchanged Flask app, which runs on a
+bounded thread pool.
+
+Needs starlette, a2wsgi, asyncpg, httpx and uvicorn; start it with
+gunicorn.conf.py (SERVER_MODE=async).
+"""
+import os
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Mount, Route
+from app import create_app
+from app.asgi import chat, media
+from app.asgi.push import hub
+from app.config.async_db import AsyncDBConnection
+
+WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 16))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await AsyncDBConnection.init_pool()
+    try:
+        yield
+    finally:
+        await hub.close()
+        await chat.close_gateway_client()
+        await AsyncDBConnection.close_pool()
+
+
+def create_asgi_app(flask_app=None):
+    flask_app = flask_app or create_app()
+
+    routes = [
+        Route('/api/messages', chat.get_my_messages, methods=['GET']),
+        Route('/api/messages/stream', chat.stream_messages, methods=['GET']),
+        Route('/api/messages/{user_id:int}', chat.get_messages_with_user, methods=['GET']),
+        Route('/api/buy-messages', chat.buy_messages, methods=['POST']),
+        Route('/api/music/serve/{music_id:int}', media.serve_music_file, methods=['GET', 'HEAD']),
+        Route('/api/exercises/serve/{exercise_id:int}', media.serve_video, methods=['GET', 'HEAD']),
+        Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ]
+    middleware = [
+        # Same policy as flask_cors in create_app, so native routes behave identically
+        Middleware(CORSMiddleware, allow_origin_regex='.*', allow_credentials=True,
+                   allow_methods=['*'], allow_headers=['*'], expose_headers=['X-Trace-Id']),
+    ]
+    return Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
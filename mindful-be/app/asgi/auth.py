@@ -0,0 +1,25 @@
+# app/asgi/auth.py
+from functools import wraps
+from starlette.responses import JSONResponse
+from app.config.JWTConfig import JWTConfig
+
+
+def token_required(handler):
+    """Async counterpart of JWTConfig.token_required for native ASGI routes"""
+    @wraps(handler)
+    async def decorated(request):
+        token = request.cookies.get(JWTConfig.COOKIE_NAME)
+
+        if not token:
+            return JSONResponse({'error': 'Authorization token missing'}, status_code=401)
+
+        payload = JWTConfig.verify_token(token)
+        if not payload:
+            return JSONResponse({'error': 'Invalid or expired token'}, status_code=401)
+
+        current_user = {
+            'user_id': payload['user_id'],
+            'email': payload['email']
+        }
+        return await handler(request, current_user=current_user)
+    return decorated
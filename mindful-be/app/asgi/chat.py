@@ -0,0 +1,175 @@
+# app/asgi/chat.py
+import asyncio
+import json
+import httpx
+from starlette.responses import JSONResponse, StreamingResponse
+from app.asgi.auth import token_required
+from app.asgi.idempotency import idempotent
+from app.asgi.push import hub
+from app.asgi.rate_limit import limit
+from app.config.async_db import AsyncDBConnection
+from app.config.db import ReplicaConfig
+from app.config.push import Push
+from app.routes.chat import EXPERT_ID, message_row_to_dict, build_khalti_request, stream_channels
+from app.services.partitions import PartitionConfig, history_since
+
+HISTORY_SQL = """
+    SELECT id, sender_id, receiver_id, content, timestamp
+    FROM messages
+    WHERE LEAST(sender_id, receiver_id) = LEAST($1::int, $2::int)
+      AND GREATEST(sender_id, receiver_id) = GREATEST($1::int, $2::int)
+      AND timestamp >= $3
+    ORDER BY timestamp ASC
+"""
+
+_gateway = None
+
+
+def gateway_client():
+    """Shared HTTP client so gateway calls reuse pooled keep-alive connections"""
+    global _gateway
+    if _gateway is None:
+        _gateway = httpx.AsyncClient(timeout=httpx.Timeout(15.0, connect=5.0))
+    return _gateway
+
+
+async def close_gateway_client():
+    global _gateway
+    if _gateway is not None:
+        await _gateway.aclose()
+        _gateway = None
+
+
+# GET /api/messages - chat history between the current user and the expert
+@token_required
+async def get_my_messages(request, current_user):
+    user_id = current_user['user_id']
+    try:
+        since = history_since(request.query_params.get('days'), PartitionConfig.MESSAGES_HISTORY_DAYS)
+    except ValueError as e:
+        return JSONResponse({"message": str(e)}, status_code=400)
+
+    try:
+        sticky = ReplicaConfig.STICKY_COOKIE in request.cookies
+        async with AsyncDBConnection.get_connection(readonly=True, sticky=sticky) as conn:
+            rows = await conn.fetch(HISTORY_SQL, user_id, EXPERT_ID, since)
+        messages = []
+        for row in rows:
+            message = message_row_to_dict(row)
+            message['sender_type'] = 'user' if row['sender_id'] == user_id else 'expert'
+            messages.append(message)
+        return JSONResponse(messages)
+    except Exception as e:
+        print(f"GET /messages (async) error: {e}")
+        return JSONResponse({"message": "Failed to fetch messages"}, status_code=500)
+
+
+# GET /api/messages/{user_id} - expert view of a user's chat history
+@token_required
+async def get_messages_with_user(request, current_user):
+    if str(current_user['user_id']) != str(EXPERT_ID):
+        return JSONResponse({"message": "Unauthorized"}, status_code=403)
+    try:
+        user_id = int(request.path_params['user_id'])
+    except ValueError:
+        return JSONResponse({"message": "Invalid user id"}, status_code=400)
+    try:
+        since = history_since(request.query_params.get('days'), PartitionConfig.MESSAGES_HISTORY_DAYS)
+    except ValueError as e:
+        return JSONResponse({"message": str(e)}, status_code=400)
+
+    try:
+        sticky = ReplicaConfig.STICKY_COOKIE in request.cookies
+        async with AsyncDBConnection.get_connection(readonly=True, sticky=sticky) as conn:
+            rows = await conn.fetch(HISTORY_SQL, user_id, EXPERT_ID, since)
+        messages = []
+        for row in rows:
+            message = message_row_to_dict(row)
+            message['sender_type'] = 'expert' if row['sender_id'] == EXPERT_ID else 'user'
+            messages.append(message)
+        return JSONResponse(messages)
+    except Exception as e:
+        print(f"GET /messages/<user_id> (async) error: {e}")
+        return JSONResponse({"message": "Failed to fetch messages"}, status_code=500)
+
+
+# GET /api/messages/stream - server-sent events for the current user
+@token_required
+async def stream_messages(request, current_user):
+    channels = stream_channels(current_user['user_id'])
+    queue = await hub.subscribe(channels)
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=Push.HEARTBEAT_SECONDS)
+                    yield Push.format_sse(message.get('event', 'message'), message.get('data'))
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            await hub.unsubscribe(channels, queue)
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# POST /api/buy-messages - create a purchase and initiate the Khalti payment
+@token_required
+@idempotent
+@limit('buy-messages')
+async def buy_messages(request, current_user):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not data or not data.get('chat_credits') or not data.get('amount'):
+        return JSONResponse({"message": "chat_credits and amount are required"}, status_code=400)
+
+    try:
+        chat_credits = int(data['chat_credits'])
+        amount = int(data['amount'])  # Amount in paisa
+    except (TypeError, ValueError):
+        return JSONResponse({"message": "Invalid chat_credits or amount (minimum NPR 10)"}, status_code=400)
+    user_id = current_user['user_id']
+
+    if chat_credits <= 0 or amount < 1000:  # Khalti minimum is NPR 10 (1000 paisa)
+        return JSONResponse({"message": "Invalid chat_credits or amount (minimum NPR 10)"}, status_code=400)
+
+    try:
+        # Short transaction: the gateway call below must not hold a pooled connection
+        async with AsyncDBConnection.transaction() as conn:
+            user = await conn.fetchrow("SELECT name, email FROM users WHERE id = $1", user_id)
+            if not user:
+                return JSONResponse({"message": "User not found"}, status_code=404)
+            purchase_id = await conn.fetchval("""
+                INSERT INTO purchases (user_id, amount, chat_credits, status)
+                VALUES ($1, $2, $3, 'pending')
+                RETURNING id
+            """, user_id, amount, chat_credits)
+
+        url, headers, payload = build_khalti_request(
+            purchase_id, chat_credits, amount, user['name'], user['email'], current_user.get('phone')
+        )
+        response = await gateway_client().post(url, headers=headers, content=payload)
+        try:
+            response_data = response.json()
+        except json.JSONDecodeError:
+            response_data = {}
+
+        async with AsyncDBConnection.get_connection() as conn:
+            if response.status_code != 200 or 'pidx' not in response_data:
+                await conn.execute("UPDATE purchases SET status = 'failed' WHERE id = $1", purchase_id)
+                return JSONResponse({"message": "Failed to initiate payment",
+                                     "error": response_data.get('error_key', 'Unknown error')}, status_code=500)
+            await conn.execute("UPDATE purchases SET pidx = $1 WHERE id = $2", response_data['pidx'], purchase_id)
+
+        return JSONResponse({
+            "message": "Payment initiated",
+            "payment_url": response_data['payment_url'],
+            "pidx": response_data['pidx']
+        })
+    except Exception as e:
+        print(f"POST /buy-messages (async) error: {e}")
+        return JSONResponse({"message": "Failed to initiate payment"}, status_code=500)
@@ -0,0 +1,110 @@
+# app/asgi/idempotency.py
+"""Async counterpart of Idempotency.idempotent (app/config/idempotency.py) for native ASGI routes"""
+import time
+from functools import wraps
+from starlette.responses import JSONResponse, Response
+from app.config.async_db import AsyncDBConnection
+from app.config.idempotency import (
+    HEADER, REPLAYED_HEADER, INVALID_KEY, KEY_REUSED, IN_PROGRESS, IdempotencyConfig,
+    valid_key, request_hash, storable, pack, unpack,
+)
+
+CLAIM_SQL = """
+    INSERT INTO idempotency_keys AS k (user_id, key, request_hash, locked_until, expires_at)
+    VALUES ($1, $2, $3, statement_timestamp() + $4 * INTERVAL '1 second',
+            statement_timestamp() + $5 * INTERVAL '1 second')
+    ON CONFLICT (user_id, key) DO UPDATE SET
+        request_hash = EXCLUDED.request_hash, status_code = NULL, headers = NULL, body = NULL,
+        locked_until = EXCLUDED.locked_until, expires_at = EXCLUDED.expires_at
+    WHERE k.expires_at < statement_timestamp()
+       OR (k.status_code IS NULL AND k.locked_until < statement_timestamp()
+           AND k.request_hash = EXCLUDED.request_hash)
+    RETURNING TRUE
+"""
+
+LOOKUP_SQL = """
+    SELECT request_hash, status_code, headers, body FROM idempotency_keys
+    WHERE user_id = $1 AND key = $2 AND expires_at >= statement_timestamp()
+"""
+
+COMPLETE_SQL = """
+    UPDATE idempotency_keys SET status_code = $4, headers = $5::JSONB, body = $6
+    WHERE user_id = $1 AND key = $2 AND request_hash = $3 AND status_code IS NULL
+"""
+
+RELEASE_SQL = """
+    DELETE FROM idempotency_keys
+    WHERE user_id = $1 AND key = $2 AND request_hash = $3 AND status_code IS NULL
+"""
+
+_pruned_at = time.monotonic()
+
+
+async def _claim(user_id, key, digest):
+    global _pruned_at
+    async with AsyncDBConnection.get_connection() as conn:
+        if await conn.fetchval(CLAIM_SQL, user_id, key, digest,
+                               IdempotencyConfig.LOCK_SECONDS, IdempotencyConfig.TTL_SECONDS):
+            if time.monotonic() - _pruned_at > IdempotencyConfig.PRUNE_SECONDS:
+                _pruned_at = time.monotonic()
+                await conn.execute("DELETE FROM idempotency_keys WHERE expires_at < statement_timestamp()")
+            return True
+        return await conn.fetchrow(LOOKUP_SQL, user_id, key)
+
+
+async def _finish(user_id, key, digest, response):
+    async with AsyncDBConnection.get_connection() as conn:
+        if response is not None and storable(response.status_code):
+            stored = pack(response.status_code, response.headers.items(), bytes(response.body))
+            await conn.execute(COMPLETE_SQL, user_id, key, digest,
+                               stored['status'], stored['headers'], stored['body'])
+        else:
+            await conn.execute(RELEASE_SQL, user_id, key, digest)
+
+
+def _error(contract_error):
+    status, message, retry_after = contract_error
+    headers = {'Retry-After': str(retry_after)} if retry_after else None
+    return JSONResponse({"message": message}, status_code=status, headers=headers)
+
+
+def idempotent(handler):
+    """Honour an Idempotency-Key header (place under token_required)"""
+    @wraps(handler)
+    async def decorated(request, current_user):
+        key = request.headers.get(HEADER)
+        if not IdempotencyConfig.ENABLED or key is None:
+            return await handler(request, current_user=current_user)
+        if not valid_key(key):
+            return _error(INVALID_KEY)
+        user_id = current_user['user_id']
+        # Starlette caches the body, so the handler can still read it
+        digest = request_hash(request.method, request.url.path, await request.body())
+        try:
+            claimed = await _claim(user_id, key, digest)
+        except Exception as e:
+            print(f"Idempotency claim error: {e}")
+            return await handler(request, current_user=current_user)
+
+        if claimed is not True:
+            if claimed is not None and bytes(claimed['request_hash']) != digest:
+                return _error(KEY_REUSED)
+            if claimed is None or claimed['status_code'] is None:
+                return _error(IN_PROGRESS)
+            status, headers, body = unpack(claimed)
+            replay = Response(body, status_code=status)
+            for name, value in headers:
+                replay.headers.append(name, value)
+            replay.headers[REPLAYED_HEADER] = 'true'
+            return replay
+
+        response = None
+        try:
+            response = await handler(request, current_user=current_user)
+            return response
+        finally:
+            try:
+                await _finish(user_id, key, digest, response)
+            except Exception as e:
+                print(f"Idempotency store error: {e}")
+    return decorated
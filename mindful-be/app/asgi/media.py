@@ -0,0 +1,121 @@
+# app/asgi/media.py
+import os
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from werkzeug.http import http_date, parse_date, parse_etags, parse_range_header, quote_etag
+from app.config.async_db import AsyncDBConnection
+from app.services.media_cache import media_cache, _chunks
+from app.services.plays import play_counter, counts_as_play
+from app.services.storage import storage, key_of, LocalStorage, StorageConfig, StorageError
+
+
+async def _lookup(query, media_id):
+    async with AsyncDBConnection.get_connection() as conn:
+        return await conn.fetchval(query, media_id)
+
+
+def _send(stored):
+    """
+    Local files are sent from disk; anything else redirects to the backend's
+    direct URL, so no object is proxied through the event loop
+    """
+    backend = storage.backend
+    if not isinstance(backend, LocalStorage) or StorageConfig.DIRECT_DOWNLOADS:
+        url = storage.url(stored)
+        if url:
+            response = RedirectResponse(url, status_code=302)
+            # Cache the redirect for less time than the signature lives
+            response.headers['Cache-Control'] = f"private, max-age={max(0, StorageConfig.PRESIGN_SECONDS - 60)}"
+            return response
+    if not isinstance(backend, LocalStorage):
+        return JSONResponse({"message": "File not found"}, status_code=404)
+    try:
+        full_path = backend.path(key_of(stored))
+    except StorageError:
+        return JSONResponse({"message": "File not found"}, status_code=404)
+    if not os.path.isfile(full_path):
+        return JSONResponse({"message": "File not found"}, status_code=404)
+    return FileResponse(full_path)
+
+
+def _not_modified(request, entry):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return parse_etags(if_none_match).contains(entry.etag)
+    since = parse_date(request.headers.get('If-Modified-Since'))
+    return since is not None and int(entry.mtime) <= since.timestamp()
+
+
+def _send_cached(request, entry):
+    """
+    Async counterpart of media_cache.send: the entry's bytes with its ETag,
+    answering If-None-Match/If-Modified-Since with 304 and Range with 206
+    """
+    headers = {
+        'ETag': quote_etag(entry.etag),
+        'Last-Modified': http_date(entry.mtime),
+        'Cache-Control': 'no-cache',  # as send_file: revalidate with the ETag
+        'Accept-Ranges': 'bytes',
+    }
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+
+    status, start, end = 200, 0, entry.size
+    byte_range = parse_range_header(request.headers.get('Range'))
+    if_range = request.headers.get('If-Range')
+    if byte_range is not None and (if_range is None or if_range.strip() == quote_etag(entry.etag)):
+        window = byte_range.range_for_length(entry.size)
+        if window is None:
+            return Response(status_code=416, headers=dict(headers, **{'Content-Range': f"bytes */{entry.size}"}))
+        status, (start, end) = 206, window
+        headers['Content-Range'] = f"bytes {start}-{end - 1}/{entry.size}"
+    headers['Content-Length'] = str(end - start)
+    if request.method == 'HEAD':
+        return Response(status_code=status, headers=headers, media_type=entry.mimetype)
+
+    async def body():
+        for chunk in _chunks(entry.data, start, end):
+            yield chunk
+    media_cache.served(end - start)
+    return StreamingResponse(body(), status_code=status, headers=headers, media_type=entry.mimetype)
+
+
+async def _serve(request, kind, item_id, query):
+    """A cache hit skips the row lookup and the file system entirely"""
+    entry = media_cache.get(kind, item_id)
+    if entry is None:
+        stored = await _lookup(query, item_id)
+        if not stored:
+            return None
+        # Reads the file (or maps it), so off the event loop
+        entry = await run_in_threadpool(media_cache.load, kind, item_id, stored)
+    response = _send_cached(request, entry) if entry else _send(stored)
+    if counts_as_play(request, response.status_code):
+        play_counter.record(kind, item_id)
+    return response
+
+
+# GET /api/music/serve/{music_id}
+async def serve_music_file(request):
+    music_id = request.path_params['music_id']
+    try:
+        response = await _serve(request, 'music', music_id, "SELECT file_path FROM music WHERE id = $1")
+    except Exception as e:
+        print(f"GET /api/music/serve/{music_id} (async) error: {e}")
+        return JSONResponse({"message": "Failed to serve music"}, status_code=500)
+    if response is None:
+        return JSONResponse({"message": "Music not found"}, status_code=404)
+    return response
+
+
+# GET /api/exercises/serve/{exercise_id}
+async def serve_video(request):
+    exercise_id = request.path_params['exercise_id']
+    try:
+        response = await _serve(request, 'exercise', exercise_id, "SELECT video_path FROM exercise WHERE id = $1")
+    except Exception as e:
+        print(f"GET /api/exercises/serve/{exercise_id} (async) error: {e}")
+        return JSONResponse({"message": "Failed to serve video"}, status_code=500)
+    if response is None:
+        return JSONResponse({"message": "Exercise not found"}, status_code=404)
+    return response
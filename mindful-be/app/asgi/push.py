@@ -0,0 +1,68 @@
+# app/asgi/push.py
+import asyncio
+import json
+from app.config.async_db import AsyncDBConnection
+
+
+class PushHub:
+    """
+    Fans NOTIFY events out to server-sent event subscribers.
+    One dedicated LISTEN connection per worker serves every open stream,
+    instead of one connection per client as in the sync mode.
+    """
+
+    QUEUE_SIZE = 100
+
+    def __init__(self):
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._subscribers = {}  # channel -> set of asyncio.Queue
+
+    async def _connection(self):
+        if self._conn is None or self._conn.is_closed():
+            self._conn = await AsyncDBConnection.connect_dedicated()
+            for channel in self._subscribers:
+                await self._conn.add_listener(channel, self._dispatch)
+        return self._conn
+
+    def _dispatch(self, connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        for queue in list(self._subscribers.get(channel, ())):
+            if queue.full():
+                queue.get_nowait()  # drop the oldest event for slow consumers
+            queue.put_nowait(message)
+
+    async def subscribe(self, channels):
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        async with self._lock:
+            conn = await self._connection()
+            for channel in channels:
+                if channel not in self._subscribers:
+                    self._subscribers[channel] = set()
+                    await conn.add_listener(channel, self._dispatch)
+                self._subscribers[channel].add(queue)
+        return queue
+
+    async def unsubscribe(self, channels, queue):
+        async with self._lock:
+            for channel in channels:
+                listeners = self._subscribers.get(channel)
+                if listeners is None:
+                    continue
+                listeners.discard(queue)
+                if not listeners:
+                    del self._subscribers[channel]
+                    if self._conn is not None and not self._conn.is_closed():
+                        await self._conn.remove_listener(channel, self._dispatch)
+
+    async def close(self):
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+        self._subscribers.clear()
+
+
+hub = PushHub()
@@ -0,0 +1,49 @@
+# app/asgi/rate_limit.py
+"""Async counterpart of RateLimit.limit (app/config/rate_limit.py) for native ASGI routes"""
+from functools import wraps
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from app.config.rate_limit import RateLimit, MemoryBuckets
+
+
+def client_key(request, current_user=None):
+    """Same keys as RateLimit.client_key, from a Starlette request"""
+    if current_user:
+        return f"user:{current_user['user_id']}"
+    forwarded = request.headers.get('X-Forwarded-For')
+    if RateLimit.TRUST_FORWARDED and forwarded:
+        return f"ip:{forwarded.split(',')[0].strip()}"
+    return f"ip:{request.client.host if request.client else None}"
+
+
+async def _check(key, cost):
+    # The postgres backend blocks on the database, so it runs off the event loop (as does a gate wait)
+    if isinstance(RateLimit.buckets, MemoryBuckets):
+        return RateLimit.check(key, cost)
+    return await run_in_threadpool(RateLimit.check, key, cost)
+
+
+def limit(name, cost=1):
+    """Spend the route's cost from the client's bucket, then pass the admission gate (place under token_required)"""
+    cost = RateLimit.route_cost(name, cost)
+
+    def decorator(handler):
+        @wraps(handler)
+        async def decorated(request, current_user=None):
+            if RateLimit.ENABLED:
+                retry_after = await _check(client_key(request, current_user), cost)
+                if retry_after is not None:
+                    return JSONResponse({'message': 'Too many requests', 'retry_after': retry_after},
+                                        status_code=429, headers={'Retry-After': str(retry_after)})
+
+            if RateLimit.ADMISSION_MAX_INFLIGHT <= 0:
+                return await handler(request, current_user=current_user)
+            if not await run_in_threadpool(RateLimit.gate.acquire):
+                return JSONResponse({'message': 'Server is busy, try again shortly'}, status_code=503,
+                                    headers={'Retry-After': str(RateLimit.ADMISSION_RETRY_AFTER)})
+            try:
+                return await handler(request, current_user=current_user)
+            finally:
+                RateLimit.gate.release()
+        return decorated
+    return decorator
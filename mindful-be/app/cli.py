@@ -0,0 +1,376 @@
+# app/cli.py
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import click
+from flask.cli import AppGroup
+
+BE_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def register_commands(app):
+    """Attach management commands to `flask --app app ...`"""
+    app.cli.add_command(bulk_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(partitions_cli)
+    app.cli.add_command(chat_requests_cli)
+    app.cli.add_command(write_behind_cli)
+    app.cli.add_command(models_cli)
+    app.cli.add_command(storage_cli)
+    app.cli.add_command(moderation_cli)
+
+    @app.cli.command('profile-imports')
+    @click.option('--top', default=20, show_default=True, help='number of modules to list')
+    @click.option('--sort', type=click.Choice(['cumulative', 'self']), default='cumulative', show_default=True)
+    @click.option('--with-model', is_flag=True, help='also load the prediction model eagerly')
+    def profile_imports(top, sort, with_model):
+        """Report the slowest imports while the app starts."""
+        env = dict(os.environ, MODEL_LOAD='eager' if with_model else 'lazy')
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+            cwd=BE_ROOT, env=env, capture_output=True, text=True
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            click.echo(result.stderr, err=True)
+            raise SystemExit(result.returncode)
+
+        modules = []
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                self_us, cumulative_us, _, name = match.groups()
+                modules.append((name, int(self_us), int(cumulative_us)))
+
+        key = 2 if sort == 'cumulative' else 1
+        modules.sort(key=lambda m: m[key], reverse=True)
+        total_self_ms = sum(m[1] for m in modules) / 1000
+
+        click.echo(f"Startup: {wall_ms:.0f} ms wall, {total_self_ms:.0f} ms in {len(modules)} imports")
+        click.echo(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for name, self_us, cumulative_us in modules[:top]:
+            click.echo(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+
+db_cli = AppGroup('db', help='Versioned schema migrations (mindful-be/migrations).')
+
+
+@db_cli.command('upgrade')
+@click.option('--target', type=int, default=None, help='stop at this version (default: latest)')
+def db_upgrade(target):
+    """Apply pending migrations."""
+    from app.config.migrations import Migrations
+    applied = Migrations.upgrade(target, log=click.echo)
+    click.echo(f"{len(applied)} migration(s) applied")
+
+
+@db_cli.command('downgrade')
+@click.argument('target', type=int)
+def db_downgrade(target):
+    """Revert migrations newer than TARGET (0 reverts everything)."""
+    from app.config.migrations import Migrations
+    reverted = Migrations.downgrade(target, log=click.echo)
+    click.echo(f"{len(reverted)} migration(s) reverted")
+
+
+@db_cli.command('status')
+def db_status():
+    """List migrations and whether they are applied."""
+    from app.config.migrations import Migrations
+    for row in Migrations.status():
+        state = 'applied' if row['applied'] else 'pending'
+        if not row['checksum_ok']:
+            state = 'MODIFIED'
+        click.echo(f"{row['version']:04d}  {state:<8} {row['name']}")
+
+
+@db_cli.command('check')
+def db_check():
+    """Exit non-zero if the schema has drifted from the migration files."""
+    from app.config.migrations import Migrations
+    problems = Migrations.drift()
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise SystemExit(1)
+    click.echo("Schema is up to date")
+
+
+partitions_cli = AppGroup('partitions', help='Monthly partitions of messages and moods.')
+
+
+@partitions_cli.command('maintain')
+def partitions_maintain():
+    """Create upcoming partitions, roll up and detach expired ones (run daily from cron)."""
+    from app.services.partitions import PartitionManager
+    report = PartitionManager.maintain(log=click.echo)
+    if report is not None:
+        click.echo(json.dumps(report))
+
+
+@partitions_cli.command('list')
+def partitions_list():
+    """Show the attached partitions and their row estimates."""
+    from app.config.db import DBConnection
+    from app.services.partitions import PartitionManager
+    with DBConnection.get_cursor() as cursor:
+        for table in PartitionManager.TABLES:
+            for month, name in PartitionManager.partitions(table):
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", (name,))
+                click.echo(f"{table:<9} {month:%Y-%m}  {name:<20} ~{max(cursor.fetchone()[0], 0)} rows")
+
+
+chat_requests_cli = AppGroup('chat-requests', help='Chat session request queue.')
+
+
+@chat_requests_cli.command('expire')
+@click.option('--batch-size', default=500, show_default=True)
+def chat_requests_expire(batch_size):
+    """Expire unpaid claims past their deadline (the API also does this lazily)."""
+    from app.services.chat_queue import ChatQueue
+    total = 0
+    while rows := ChatQueue.expire_due(batch_size):
+        total += len(rows)
+    click.echo(f"{total} request(s) expired")
+
+
+write_behind_cli = AppGroup('write-behind', help='Buffered mood/comment/upvote inserts and their spill segments.')
+
+
+@write_behind_cli.command('recover')
+def write_behind_recover():
+    """Write spill segments left behind by stopped or crashed workers."""
+    from app.services.write_behind import write_behind
+    click.echo(f"{write_behind.recover(log=click.echo)} row(s) replayed")
+
+
+@write_behind_cli.command('status')
+def write_behind_status():
+    """Show enabled endpoints and spill segments waiting on disk."""
+    import glob
+    from app.services.write_behind import WriteBehindConfig
+    segments = sorted(glob.glob(os.path.join(WriteBehindConfig.DIR, '*.jsonl')))
+    click.echo(f"endpoints: {', '.join(sorted(WriteBehindConfig.ENDPOINTS)) or '(none)'}")
+    click.echo(f"spill dir: {WriteBehindConfig.DIR}")
+    for path in segments:
+        with open(path, encoding='utf-8') as fh:
+            click.echo(f"  {os.path.basename(path)}  {sum(1 for _ in fh)} row(s)")
+    click.echo(f"{len(segments)} segment(s) pending")
+
+
+models_cli = AppGroup('models', help='Prediction model registry (MODEL_REGISTRY_DIR).')
+
+
+@models_cli.command('list')
+def models_list():
+    """List registered model versions and the CURRENT/SHADOW pointers."""
+    from app.services.model_registry import ModelRegistry
+    current = ModelRegistry.read_pointer('CURRENT')
+    for entry in ModelRegistry.versions():
+        marker = '*' if entry['version'] == current else ' '
+        click.echo(f"{marker} {entry['version']:<32} {entry['format']:<7} {entry['size_bytes'] / 1e6:>8.2f} MB")
+    click.echo(f"shadow: {ModelRegistry.read_pointer('SHADOW') or '(off)'}")
+
+
+@models_cli.command('promote')
+@click.argument('version')
+def models_promote(version):
+    """Check VERSION loads, then make it CURRENT; workers swap within MODEL_REGISTRY_POLL_SECONDS."""
+    from app.services.model_registry import model_registry
+    model_registry.promote(version)
+    click.echo(f"{version} is now CURRENT (labels: {', '.join(model_registry.active.labels)})")
+
+
+@models_cli.command('shadow')
+@click.argument('version', required=False)
+@click.option('--sample', default=0.1, show_default=True, help='fraction of /predict traffic to shadow')
+def models_shadow(version, sample):
+    """Shadow VERSION on a sample of traffic; without VERSION, stop shadowing."""
+    from app.services.model_registry import model_registry
+    try:
+        model_registry.set_shadow(version, sample)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"shadow: {f'{version} on {sample:.0%} of traffic' if version else 'off'}")
+
+
+storage_cli = AppGroup('storage', help='Media storage (STORAGE_BACKEND): usage, orphan collection and download URLs.')
+
+
+@storage_cli.command('usage')
+def storage_usage():
+    """Files and bytes per media prefix, measured now, against STORAGE_BUDGET_BYTES."""
+    from app.services.storage import storage, StorageConfig, LocalStorage
+    usage = storage.usage(refresh=True)
+    for prefix, entry in usage.items():
+        if prefix != 'total_bytes':
+            click.echo(f"{prefix:<12} {entry['files']:>8} file(s) {entry['bytes'] / 1e6:>12.1f} MB")
+    budget = f"{StorageConfig.BUDGET_BYTES / 1e6:.1f} MB" if StorageConfig.BUDGET_BYTES else 'none'
+    click.echo(f"total        {usage['total_bytes'] / 1e6:>27.1f} MB (budget: {budget}, backend: {storage.backend.name})")
+    if isinstance(storage.backend, LocalStorage):
+        click.echo(f"disk free    {storage.backend.free_bytes() / 1e6:>27.1f} MB")
+
+
+@storage_cli.command('gc')
+@click.option('--dry-run', is_flag=True, help='only list what would be deleted')
+@click.option('--grace', type=int, default=None, help='skip files younger than this many seconds (default: STORAGE_GC_GRACE_SECONDS)')
+def storage_gc(dry_run, grace):
+    """Delete media and images that no music/exercise row refers to."""
+    from app.services.storage import storage
+    _report(storage.collect_garbage(dry_run=dry_run, grace_seconds=grace, log=click.echo))
+
+
+@storage_cli.command('url')
+@click.argument('key')
+@click.option('--expires', type=int, default=None, help='seconds the URL stays valid (default: STORAGE_PRESIGN_SECONDS)')
+def storage_url(key, expires):
+    """Print a direct download URL for KEY (a storage key or file_path)."""
+    from app.services.storage import storage
+    url = storage.url(key, expires)
+    if not url:
+        raise click.ClickException('this backend has no direct URLs (set STORAGE_LOCAL_PUBLIC_URL and STORAGE_LOCAL_SECURE_LINK_SECRET)')
+    click.echo(url)
+
+
+moderation_cli = AppGroup('moderation', help='Screening of posts and comments and the expert review queue.')
+
+
+@moderation_cli.command('screen')
+def moderation_screen():
+    """Screen every unscreened post and comment now (the model is loaded first)."""
+    from app.services.model_loader import prediction_model
+    from app.services.moderation import moderation, ModerationConfig
+    prediction_model.get()
+    while moderation.screen() >= ModerationConfig.BATCH:
+        pass
+    status = moderation.status()
+    click.echo(f"{status['screened']} item(s) screened, {status['flagged']} flagged, {status['alerts']} crisis alert(s)")
+
+
+def _holdout_texts(texts_file, holdout):
+    """Texts to check an export against: one per line from TEXTS_FILE, plus recent chat messages"""
+    texts = []
+    if texts_file:
+        with open(texts_file, encoding='utf-8') as fh:
+            texts = [line.strip() for line in fh if line.strip()]
+    if holdout:
+        from app.config.db import DBConnection
+        try:
+            with DBConnection.get_cursor(readonly=True) as cursor:
+                cursor.execute("SELECT content FROM messages WHERE content <> '' ORDER BY timestamp DESC LIMIT %s",
+                               (holdout,))
+                texts += [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            click.echo(f"Could not read held-out messages: {e}", err=True)
+    if not texts:
+        raise click.ClickException('No held-out texts to verify against (use --texts FILE)')
+    return texts
+
+
+def _verify_report(report):
+    click.echo(f"{report['texts']} text(s): {report['label_mismatches']} label mismatch(es), "
+               f"{report['ties']} tie(s), max score difference {report['max_score_diff']:.2e}")
+    for text in report['mismatch_examples']:
+        click.echo(f"  mismatch: {text!r}", err=True)
+    if not report['ok']:
+        raise SystemExit(1)
+
+
+@models_cli.command('export')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.argument('dest', type=click.Path())
+@click.option('--texts', 'texts_file', type=click.Path(exists=True, dir_okay=False), help='held-out texts, one per line')
+@click.option('--holdout', default=2000, show_default=True, help='recent chat messages to verify against (0 = none)')
+@click.option('--float64', is_flag=True, help='keep weights in float64 (default float32)')
+def models_export(source, dest, texts_file, holdout, float64):
+    """Export the joblib pipeline SOURCE as a numpy bundle DEST (e.g. MODEL_REGISTRY_DIR/v3.bundle)."""
+    import joblib
+    import numpy as np
+    from app.services import compact_model
+    if not dest.endswith('.bundle'):
+        raise click.BadParameter('must end in .bundle', param_hint='DEST')
+    texts = _holdout_texts(texts_file, holdout)
+    report = compact_model.export(joblib.load(source), dest, texts, np.float64 if float64 else np.float32)
+    _verify_report(report)
+    click.echo(f"Wrote {dest}")
+
+
+@models_cli.command('verify')
+@click.argument('bundle', type=click.Path(exists=True, file_okay=False))
+@click.option('--against', required=True, type=click.Path(exists=True, dir_okay=False), help='the joblib pipeline it was exported from')
+@click.option('--texts', 'texts_file', type=click.Path(exists=True, dir_okay=False), help='held-out texts, one per line')
+@click.option('--holdout', default=2000, show_default=True, help='recent chat messages to verify against (0 = none)')
+def models_verify(bundle, against, texts_file, holdout):
+    """Check BUNDLE predicts the same labels and scores as the original pipeline."""
+    import joblib
+    from app.services.compact_model import CompactModel, verify
+    _verify_report(verify(joblib.load(against), CompactModel(bundle), _holdout_texts(texts_file, holdout)))
+
+
+bulk_cli = AppGroup('bulk', help='Bulk import and export of catalogs and community data.')
+
+
+@bulk_cli.command('import-music')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--manifest', required=True, type=click.Path(exists=True, dir_okay=False),
+              help='CSV/JSONL with file, music_name, author, category, tags')
+@click.option('--workers', type=int, default=None, help='file processing processes (default: CPU count)')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--keep-duplicates', is_flag=True, help='import files whose content was already seen in this run')
+def import_music(directory, manifest, workers, batch_size, keep_duplicates):
+    """Import music tracks from DIRECTORY described by a manifest."""
+    from app.services.bulk import import_media
+    _report(import_media('music', directory, manifest, workers, batch_size, not keep_duplicates, log=click.echo))
+
+
+@bulk_cli.command('import-exercises')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--manifest', required=True, type=click.Path(exists=True, dir_okay=False),
+              help='CSV/JSONL with file, title, category, duration, description, steps')
+@click.option('--workers', type=int, default=None, help='file processing processes (default: CPU count)')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--keep-duplicates', is_flag=True, help='import files whose content was already seen in this run')
+def import_exercises(directory, manifest, workers, batch_size, keep_duplicates):
+    """Import exercise videos from DIRECTORY described by a manifest."""
+    from app.services.bulk import import_media
+    _report(import_media('exercise', directory, manifest, workers, batch_size, not keep_duplicates, log=click.echo))
+
+
+@bulk_cli.command('import-posts')
+@click.argument('manifest', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=10000, show_default=True)
+def import_posts(manifest, batch_size):
+    """Import posts (title, content, category, author_id, timestamp) from a CSV/JSONL manifest."""
+    from app.services.bulk import import_posts as run_import
+    _report(run_import(manifest, batch_size, log=click.echo))
+
+
+@bulk_cli.command('export')
+@click.argument('table')
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'parquet']), default='jsonl', show_default=True)
+@click.option('--out', required=True, type=click.Path(dir_okay=False, writable=True))
+@click.option('--batch-size', default=10000, show_default=True)
+def export(table, fmt, out, batch_size):
+    """Export TABLE to JSONL or Parquet for analytics."""
+    from app.services.bulk import export_table, EXPORT_COLUMNS
+    if table not in EXPORT_COLUMNS:
+        raise click.BadParameter(f"choose one of: {', '.join(EXPORT_COLUMNS)}", param_hint='TABLE')
+    try:
+        _report(export_table(table, out, fmt, batch_size, log=click.echo))
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+
+def _report(summary):
+    errors = summary.pop('errors', [])
+    for error in errors[:20]:
+        click.echo(f"  {error}", err=True)
+    if len(errors) > 20:
+        click.echo(f"  ... and {len(errors) - 20} more", err=True)
+    click.echo(json.dumps(summary))
@@ -4,6 +4,7 @@ import datetime
 from dotenv import load_dotenv
 from functools import wraps
 from flask import request, jsonify
+from app.config.tracing import Tracing
 
 load_dotenv()
 
@@ -47,7 +48,8 @@ class JWTConfig:
             if not token:
                 return jsonify({'error': 'Authorization token missing'}), 401
             
-            payload = JWTConfig.verify_token(token)
+            with Tracing.phase('auth'):
+                payload = JWTConfig.verify_token(token)
             if not payload:
                 return jsonify({'error': 'Invalid or expired token'}), 401
             
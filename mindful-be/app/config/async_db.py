@@ -0,0 +1,102 @@
+# app/config/async_db.py
+import asyncio
+import os
+import asyncpg
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from app.config.db import DBConnection, ReplicaConfig, replicas
+
+load_dotenv()
+
+
+class AsyncDBConnection:
+    """asyncpg connection pool used by the async serving mode"""
+
+    MIN_SIZE = int(os.getenv('DB_POOL_MIN', 2))
+    MAX_SIZE = int(os.getenv('DB_POOL_MAX', 20))
+    COMMAND_TIMEOUT = float(os.getenv('DB_COMMAND_TIMEOUT', 30))
+
+    _pool = None
+    _replica_pools = {}
+
+    @staticmethod
+    def get_connection_params(params=None):
+        """Translate the psycopg2 parameters into asyncpg keyword arguments"""
+        params = params or DBConnection.get_connection_params()
+        translated = {
+            'database': params['dbname'],
+            'user': params['user'],
+            'password': params['password'],
+            'host': params['host'],
+        }
+        if params.get('port'):
+            translated['port'] = int(params['port'])
+        return translated
+
+    @staticmethod
+    async def init_pool():
+        """Create the pool once per worker process"""
+        if AsyncDBConnection._pool is None:
+            AsyncDBConnection._pool = await asyncpg.create_pool(
+                min_size=AsyncDBConnection.MIN_SIZE,
+                max_size=AsyncDBConnection.MAX_SIZE,
+                command_timeout=AsyncDBConnection.COMMAND_TIMEOUT,
+                **AsyncDBConnection.get_connection_params()
+            )
+        return AsyncDBConnection._pool
+
+    @staticmethod
+    async def replica_pool(replica):
+        """Pool for one replica, created on first use"""
+        pool = AsyncDBConnection._replica_pools.get(replica['dsn'])
+        if pool is None:
+            pool = AsyncDBConnection._replica_pools[replica['dsn']] = await asyncpg.create_pool(
+                min_size=1,
+                max_size=AsyncDBConnection.MAX_SIZE,
+                command_timeout=AsyncDBConnection.COMMAND_TIMEOUT,
+                timeout=ReplicaConfig.CONNECT_TIMEOUT,
+                **AsyncDBConnection.get_connection_params(replicas.params(replica))
+            )
+        return pool
+
+    @staticmethod
+    async def close_pool():
+        if AsyncDBConnection._pool is not None:
+            await AsyncDBConnection._pool.close()
+            AsyncDBConnection._pool = None
+        while AsyncDBConnection._replica_pools:
+            _, pool = AsyncDBConnection._replica_pools.popitem()
+            await pool.close()
+
+    @staticmethod
+    @asynccontextmanager
+    async def get_connection(readonly=False, sticky=False):
+        """
+        Borrow a pooled connection. Read-only borrowers may get a replica
+        (see ReplicaConfig) unless `sticky` pins them to the primary.
+        """
+        pool = None
+        if readonly and not sticky and replicas.replicas:
+            # The first pick in a process probes the replicas; keep that off the event loop
+            replica = replicas.pick() if replicas.checked_at else await asyncio.to_thread(replicas.pick)
+            if replica is not None:
+                try:
+                    pool = await AsyncDBConnection.replica_pool(replica)
+                except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+                    replicas.mark_failed(replica, e)
+        pool = pool or await AsyncDBConnection.init_pool()
+        async with pool.acquire() as conn:
+            yield conn
+
+    @staticmethod
+    @asynccontextmanager
+    async def transaction():
+        """Borrow a pooled connection inside a transaction, committed on success"""
+        async with AsyncDBConnection.get_connection() as conn:
+            async with conn.transaction():
+                yield conn
+
+    @staticmethod
+    async def connect_dedicated():
+        """Open a connection outside the pool, for long-lived LISTEN sessions"""
+        return await asyncpg.connect(**AsyncDBConnection.get_connection_params())
@@ -0,0 +1,178 @@
+# app/config/compression.py
+"""
+Response compression (after_request).
+
+Negotiates br, zstd or gzip from Accept-Encoding (brotli and zstd only when
+the `brotli` / `zstandard` packages are installed; gzip always is). Only
+text-like media types between COMPRESSION_MIN_BYTES and COMPRESSION_MAX_BYTES
+are compressed, so audio/video from uploads/ and event streams pass through
+untouched.
+
+Cacheable responses (GET/HEAD that already carry an ETag, such as files
+from send_from_directory, or come from COMPRESSION_CACHE_ENDPOINTS, which
+get a content-hash ETag) are compressed once per (ETag, encoding) at a
+higher level and served from an in-process LRU afterwards. Every variant
+has its own ETag ("<etag>-<encoding>") and answers If-None-Match with 304;
+a body that does not shrink is sent as identity under its own ETag and
+is not cached.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from flask import request
+from dotenv import load_dotenv
+from app.config.tracing import Tracing
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+load_dotenv()
+
+# (on-the-fly level, level for cached variants)
+LEVELS = {'br': (4, 9), 'zstd': (3, 12), 'gzip': (6, 9)}
+
+COMPRESSORS = {'gzip': lambda data, level: gzip.compress(data, compresslevel=level, mtime=0)}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda data, level: brotli.compress(data, quality=level)
+if zstandard is not None:
+    COMPRESSORS['zstd'] = lambda data, level: zstandard.ZstdCompressor(level=level).compress(data)
+
+
+class Compression:
+    """Negotiated response compression with a per-ETag variant cache"""
+
+    # Configuration
+    ENABLED = os.getenv('COMPRESSION_ENABLED', '1') == '1'
+    MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+    # Larger bodies (big files) are sent as they are rather than compressed in the request
+    MAX_BYTES = int(os.getenv('COMPRESSION_MAX_BYTES', 8_000_000))
+    # Server preference order, among what the client accepts with equal quality
+    ENCODINGS = [e for e in os.getenv('COMPRESSION_ENCODINGS', 'br,zstd,gzip').split(',') if e in COMPRESSORS]
+    CACHE_BYTES = int(os.getenv('COMPRESSION_CACHE_BYTES', 32_000_000))
+    CACHE_ENDPOINTS = {e.strip() for e in os.getenv(
+        'COMPRESSION_CACHE_ENDPOINTS',
+        'music.get_music,exercise.get_exercises,posts.get_posts,comments.get_comments'
+    ).split(',') if e.strip()}
+    COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml',
+                          'image/svg+xml')
+
+    _cache = OrderedDict()
+    _cache_bytes = 0
+    _lock = threading.Lock()
+    _stats = {'compressed': 0, 'cache_hits': 0, 'not_modified': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    @staticmethod
+    def init_app(app):
+        """Install the hook; register after the other after_request hooks so tracing times it"""
+        if Compression.ENABLED and Compression.ENCODINGS:
+            app.after_request(Compression._compress)
+
+    @staticmethod
+    def compressible(mimetype):
+        if not mimetype or mimetype == 'text/event-stream':
+            return False
+        return mimetype.startswith(Compression.COMPRESSIBLE_TYPES) or mimetype.endswith(('+json', '+xml'))
+
+    @staticmethod
+    def _compress(response):
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers
+                or (response.is_streamed and not response.direct_passthrough)
+                or not Compression.compressible(response.mimetype)):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        length = response.content_length
+        if length is None and not response.direct_passthrough:
+            length = len(response.get_data())
+        if length is None or not Compression.MIN_BYTES <= length <= Compression.MAX_BYTES:
+            return response
+
+        encoding = request.accept_encodings.best_match(Compression.ENCODINGS)
+        etag, weak = response.get_etag()
+        cacheable = (request.method in ('GET', 'HEAD') and not response.cache_control.no_store
+                     and (etag is not None or request.endpoint in Compression.CACHE_ENDPOINTS))
+        if not cacheable:
+            if encoding:
+                Compression._encode(response, encoding, Compression._body(response), LEVELS[encoding][0])
+            return response
+
+        if etag is None:
+            etag = hashlib.blake2b(Compression._body(response), digest_size=16).hexdigest()
+        body = b''
+        if encoding:
+            key = (etag, encoding)
+            with Compression._lock:
+                body = Compression._cache.get(key)
+                if body is not None:
+                    Compression._cache.move_to_end(key)
+                    Compression._stats['cache_hits'] += 1
+            if body is None:
+                body = Compression._encode(response, encoding, Compression._body(response), LEVELS[encoding][1])
+                if body:
+                    Compression._store(key, body)
+            else:
+                Compression._set_body(response, encoding, body)
+
+        # A body that did not shrink is sent as identity under the plain ETag
+        response.set_etag(f"{etag}-{encoding}" if body else etag, weak=weak)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            Compression._stats['not_modified'] += 1
+        return response
+
+    @staticmethod
+    def _body(response):
+        """The identity body; file responses are read (and their file closed) here"""
+        if response.direct_passthrough:
+            response.direct_passthrough = False
+        return response.get_data()
+
+    @staticmethod
+    def _encode(response, encoding, data, level):
+        """Compress `data` into the response; returns the encoded body, or b'' if it did not shrink"""
+        with Tracing.phase('serialize', operation=f"compress:{encoding}"):
+            body = COMPRESSORS[encoding](data, level)
+        if len(body) >= len(data):
+            return b''
+        Compression._stats['compressed'] += 1
+        Compression._stats['bytes_in'] += len(data)
+        Compression._stats['bytes_out'] += len(body)
+        Compression._set_body(response, encoding, body)
+        return body
+
+    @staticmethod
+    def _set_body(response, encoding, body):
+        if response.direct_passthrough and hasattr(response.response, 'close'):
+            response.response.close()  # cached variant: the file was never read
+        response.direct_passthrough = False
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        # Byte ranges would address the encoded representation, which send_file cannot serve
+        response.headers.pop('Accept-Ranges', None)
+
+    @staticmethod
+    def _store(key, body):
+        if len(body) > Compression.CACHE_BYTES:
+            return
+        with Compression._lock:
+            if key in Compression._cache:
+                return
+            Compression._cache[key] = body
+            Compression._cache_bytes += len(body)
+            while Compression._cache_bytes > Compression.CACHE_BYTES:
+                _, evicted = Compression._cache.popitem(last=False)
+                Compression._cache_bytes -= len(evicted)
+
+    @staticmethod
+    def status():
+        with Compression._lock:
+            return dict(Compression._stats, encodings=Compression.ENCODINGS,
+                        cached_variants=len(Compression._cache), cache_bytes=Compression._cache_bytes)
@@ -1,14 +1,184 @@
 # app/config/db.py
+import itertools
+import threading
+import time
 import psycopg2
 from psycopg2 import extras # Still needed for RealDictCursor in other modules
 import os
 from dotenv import load_dotenv # Import load_dotenv
 from contextlib import contextmanager
+from flask import g, request, has_request_context
+from app.config.tracing import Tracing
 
 load_dotenv() # Load environment variables from .env file
 
+
+class TracedCursor(psycopg2.extensions.cursor):
+    """Cursor that attributes query time to the request's 'db' phase"""
+
+    def execute(self, query, vars=None):
+        with Tracing.phase('db'):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        with Tracing.phase('db'):
+            return super().executemany(query, vars_list)
+
+
+class TracedRealDictCursor(extras.RealDictCursor):
+    """RealDictCursor variant of TracedCursor"""
+
+    def execute(self, query, vars=None):
+        with Tracing.phase('db'):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        with Tracing.phase('db'):
+            return super().executemany(query, vars_list)
+
+
+class ReplicaConfig:
+    """Read-replica routing configuration"""
+
+    # Comma-separated libpq DSNs or URIs; unset keys fall back to the primary's DB_* values.
+    # A single instance can stand in for a replica, e.g. DB_REPLICA_DSNS="host=localhost"
+    DSNS = [dsn.strip() for dsn in os.getenv('DB_REPLICA_DSNS', '').split(',') if dsn.strip()]
+    MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', 5))
+    CHECK_SECONDS = float(os.getenv('DB_REPLICA_CHECK_SECONDS', 2))
+    CONNECT_TIMEOUT = int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', 2))
+    # After a write, the client's reads stay on the primary this long (read-your-writes)
+    STICKY_SECONDS = int(os.getenv('DB_STICKY_PRIMARY_SECONDS', 5))
+    STICKY_COOKIE = 'db_primary'
+
+
+# Replay lag in seconds; 0 on a primary (an aliased replica) or a standby that has replayed all it received
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class ReplicaRouter:
+    """
+    Round-robin over replicas that are reachable and within MAX_LAG_SECONDS.
+    A background thread re-measures lag every CHECK_SECONDS so picking a
+    replica never waits on a probe; with no healthy replica, reads use the primary.
+    """
+
+    def __init__(self, dsns):
+        self.replicas = [{'dsn': dsn, 'params': None, 'healthy': False, 'lag': None, 'error': None}
+                         for dsn in dsns]
+        self.checked_at = None
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def params(self, replica):
+        if replica['params'] is None:
+            replica['params'] = dict(DBConnection.get_connection_params(),
+                                     **psycopg2.extensions.parse_dsn(replica['dsn']))
+        return replica['params']
+
+    def check(self):
+        """Measure every replica's lag and update its health"""
+        for replica in self.replicas:
+            try:
+                conn = psycopg2.connect(connect_timeout=ReplicaConfig.CONNECT_TIMEOUT, **self.params(replica))
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(LAG_SQL)
+                        lag = float(cursor.fetchone()[0])
+                finally:
+                    conn.close()
+                replica.update(lag=lag, error=None, healthy=lag <= ReplicaConfig.MAX_LAG_SECONDS)
+            except psycopg2.Error as e:
+                replica.update(lag=None, error=str(e).strip(), healthy=False)
+        self.checked_at = time.time()
+
+    def mark_failed(self, replica, error):
+        """Take a replica out of rotation until the next check sees it healthy"""
+        print(f"Replica {replica['params'].get('host')} unavailable, reading from primary: {error}")
+        replica.update(healthy=False, error=str(error).strip())
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            if self.checked_at is None:
+                self.check()  # the first read of a process waits for one probe
+            self._thread = threading.Thread(target=self._run, name='replica-monitor', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(ReplicaConfig.CHECK_SECONDS)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Replica check error: {e}")
+
+    def pick(self):
+        """The next healthy replica, or None to use the primary"""
+        if not self.replicas:
+            return None
+        self._start()
+        healthy = [replica for replica in self.replicas if replica['healthy']]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def status(self):
+        return {
+            'replicas': [{'host': self.params(r).get('host'), 'port': self.params(r).get('port'),
+                          'healthy': r['healthy'], 'lag_seconds': r['lag'], 'error': r['error']}
+                         for r in self.replicas],
+            'checked_at': self.checked_at,
+            'max_lag_seconds': ReplicaConfig.MAX_LAG_SECONDS,
+        }
+
+
+replicas = ReplicaRouter(ReplicaConfig.DSNS)
+
+
 class DBConnection:
     """Database connection handler class"""
+
+    @staticmethod
+    def init_app(app):
+        """Send the sticky-primary cookie on responses to requests that wrote"""
+        app.after_request(DBConnection._stick_to_primary)
+
+    @staticmethod
+    def mark_write():
+        """Record that this request changed data, so its client reads from the primary for a while"""
+        if has_request_context():
+            g._db_wrote = True
+
+    @staticmethod
+    def reads_from_primary():
+        """True while read-your-writes requires the primary for this request"""
+        if not has_request_context():
+            return False
+        return g.get('_db_wrote', False) or ReplicaConfig.STICKY_COOKIE in request.cookies
+
+    @staticmethod
+    def _stick_to_primary(response):
+        if g.get('_db_wrote') and ReplicaConfig.DSNS:
+            response.set_cookie(ReplicaConfig.STICKY_COOKIE, '1', max_age=ReplicaConfig.STICKY_SECONDS,
+                                httponly=True, samesite='Lax', path='/')
+        return response
+
+    @staticmethod
+    def route_read():
+        """Replica to serve a read-only cursor, or None for the primary"""
+        if DBConnection.reads_from_primary():
+            return None
+        return replicas.pick()
     
     @staticmethod
     def get_connection_params():
@@ -22,11 +192,25 @@ class DBConnection:
 
     @staticmethod
     @contextmanager
-    def get_connection():
-        """Get a database connection with context management"""
+    def get_connection(readonly=False):
+        """
+        Get a database connection with context management.
+        If readonly=True, it may come from a replica and refuses writes.
+        """
         conn = None
         try:
-            conn = psycopg2.connect(**DBConnection.get_connection_params())
+            with Tracing.phase('db', operation='connect'):
+                replica = DBConnection.route_read() if readonly else None
+                if replica is not None:
+                    try:
+                        conn = psycopg2.connect(cursor_factory=TracedCursor,
+                                                connect_timeout=ReplicaConfig.CONNECT_TIMEOUT,
+                                                **replicas.params(replica))
+                    except psycopg2.OperationalError as e:
+                        replicas.mark_failed(replica, e)
+                if conn is None:
+                    conn = psycopg2.connect(cursor_factory=TracedCursor, **DBConnection.get_connection_params())
+                conn.readonly = readonly
             yield conn
         except psycopg2.Error as e:
             print(f"Database connection failed: {e}")
@@ -37,20 +221,24 @@ class DBConnection:
 
     @staticmethod
     @contextmanager
-    def get_cursor(dictionary=False): # Added 'dictionary' parameter back for flexibility
+    def get_cursor(dictionary=False, readonly=False): # Added 'dictionary' parameter back for flexibility
         """
         Get a database cursor with context management.
         If dictionary=True, returns a RealDictCursor.
+        If readonly=True, the query may be served by a replica (see ReplicaConfig).
         """
-        with DBConnection.get_connection() as conn:
+        with DBConnection.get_connection(readonly) as conn:
             cursor = None
             try:
                 if dictionary:
-                    cursor = conn.cursor(cursor_factory=extras.RealDictCursor)
+                    cursor = conn.cursor(cursor_factory=TracedRealDictCursor)
                 else:
                     cursor = conn.cursor()
                 yield cursor
-                conn.commit() # Commit changes if no exceptions
+                with Tracing.phase('db', operation='commit'):
+                    conn.commit() # Commit changes if no exceptions
+                if not readonly and has_request_context() and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+                    DBConnection.mark_write()
             except Exception as e:
                 conn.rollback() # Rollback on any exception
                 print(f"Database operation failed: {e}")
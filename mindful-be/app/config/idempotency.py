@@ -0,0 +1,200 @@
+# app/config/idempotency.py
+"""
+Idempotency-Key support for write endpoints that clients retry.
+
+    @posts_bp.route('/posts', methods=['POST'])
+    @JWTConfig.token_required
+    @Idempotency.idempotent
+    def create_post(current_user): ...
+
+A request carrying an Idempotency-Key header claims (user, key) in the
+idempotency_keys table with one INSERT ... ON CONFLICT, together with a
+SHA-256 of its method, path and body. The winner runs the handler and
+stores its status, headers and zlib-compressed body for
+IDEMPOTENCY_TTL_SECONDS. A retry with the same key gets that response
+replayed (Idempotent-Replayed: true) without the handler running again.
+
+- The same key with a different request: 422.
+- The same key while the first request is still running, e.g. a
+  concurrent retry: 409 with Retry-After. The primary key serializes
+  concurrent claims, so exactly one request runs the handler.
+- A claim left unfinished for IDEMPOTENCY_LOCK_SECONDS (its worker died)
+  can be taken over by the next retry.
+
+Server errors, 409 and 429 are not stored: the claim is released so a
+retry runs the handler again. Requests without the header behave as
+before, and so do requests while the table cannot be reached.
+"""
+import hashlib
+import json
+import os
+import time
+import zlib
+from functools import wraps
+from flask import request, jsonify, make_response, Response
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Statuses a retry should be allowed to re-run
+RETRYABLE = {409, 429}
+# Headers that describe the original exchange rather than the result
+SKIPPED_HEADERS = {'content-length', 'set-cookie', 'date', 'server'}
+
+CLAIM_SQL = """
+    INSERT INTO idempotency_keys AS k (user_id, key, request_hash, locked_until, expires_at)
+    VALUES (%(user_id)s, %(key)s, %(hash)s,
+            statement_timestamp() + %(lock)s * INTERVAL '1 second',
+            statement_timestamp() + %(ttl)s * INTERVAL '1 second')
+    ON CONFLICT (user_id, key) DO UPDATE SET
+        request_hash = EXCLUDED.request_hash, status_code = NULL, headers = NULL, body = NULL,
+        locked_until = EXCLUDED.locked_until, expires_at = EXCLUDED.expires_at
+    WHERE k.expires_at < statement_timestamp()
+       OR (k.status_code IS NULL AND k.locked_until < statement_timestamp()
+           AND k.request_hash = EXCLUDED.request_hash)
+    RETURNING TRUE
+"""
+
+LOOKUP_SQL = """
+    SELECT request_hash, status_code, headers, body FROM idempotency_keys
+    WHERE user_id = %(user_id)s AND key = %(key)s AND expires_at >= statement_timestamp()
+"""
+
+COMPLETE_SQL = """
+    UPDATE idempotency_keys SET status_code = %(status)s, headers = %(headers)s, body = %(body)s
+    WHERE user_id = %(user_id)s AND key = %(key)s AND request_hash = %(hash)s AND status_code IS NULL
+"""
+
+RELEASE_SQL = """
+    DELETE FROM idempotency_keys
+    WHERE user_id = %(user_id)s AND key = %(key)s AND request_hash = %(hash)s AND status_code IS NULL
+"""
+
+
+class IdempotencyConfig:
+    """Idempotency key configuration"""
+
+    ENABLED = os.getenv('IDEMPOTENCY_ENABLED', '1') == '1'
+    TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+    # How long a claim is held for a running request before a retry may take it over
+    LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 60))
+    PRUNE_SECONDS = 600
+
+
+def valid_key(key):
+    return 0 < len(key) <= MAX_KEY_LENGTH and key.isprintable()
+
+
+def request_hash(method, path, body):
+    return hashlib.sha256(b'\n'.join([method.encode(), path.encode(), body or b''])).digest()
+
+
+def storable(status):
+    return status < 500 and status not in RETRYABLE
+
+
+def pack(status, headers, body):
+    """Row values for a response: kept headers as JSON, the body compressed"""
+    kept = [[name, value] for name, value in headers if name.lower() not in SKIPPED_HEADERS]
+    return {'status': status, 'headers': json.dumps(kept), 'body': zlib.compress(body)}
+
+
+def unpack(row):
+    """(status, [(name, value), ...], body) of a stored response"""
+    headers = row['headers'] if isinstance(row['headers'], list) else json.loads(row['headers'] or '[]')
+    return row['status_code'], [tuple(h) for h in headers], zlib.decompress(bytes(row['body']))
+
+
+# Error responses of the contract: (status, message, retry after)
+INVALID_KEY = (400, f'{HEADER} must be 1-{MAX_KEY_LENGTH} printable characters', None)
+KEY_REUSED = (422, f'{HEADER} was already used for a different request', None)
+IN_PROGRESS = (409, f'A request with this {HEADER} is still in progress', 1)
+
+
+class Idempotency:
+    """Idempotency-Key claims and stored responses in the idempotency_keys table"""
+
+    _pruned_at = time.monotonic()
+
+    @staticmethod
+    def claim(params):
+        """True if this request owns the key, else the stored row (None if it vanished meanwhile)"""
+        from app.config.db import DBConnection
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute(CLAIM_SQL, params)
+            if cursor.fetchone():
+                Idempotency._prune(cursor)
+                return True
+            cursor.execute(LOOKUP_SQL, params)
+            return cursor.fetchone()
+
+    @staticmethod
+    def _prune(cursor):
+        if time.monotonic() - Idempotency._pruned_at > IdempotencyConfig.PRUNE_SECONDS:
+            Idempotency._pruned_at = time.monotonic()
+            cursor.execute("DELETE FROM idempotency_keys WHERE expires_at < statement_timestamp()")
+
+    @staticmethod
+    def finish(params, response):
+        """Store the response for replay, or release the key so a retry runs again"""
+        from app.config.db import DBConnection
+        with DBConnection.get_cursor() as cursor:
+            if response is not None and storable(response.status_code):
+                cursor.execute(COMPLETE_SQL, dict(params, **pack(response.status_code, response.headers.items(),
+                                                                 response.get_data())))
+            else:
+                cursor.execute(RELEASE_SQL, params)
+
+    @staticmethod
+    def error(contract_error):
+        status, message, retry_after = contract_error
+        response = jsonify({"message": message})
+        if retry_after:
+            response.headers['Retry-After'] = str(retry_after)
+        return response, status
+
+    @staticmethod
+    def idempotent(f):
+        """Decorator: honour an Idempotency-Key header (place under token_required)"""
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not IdempotencyConfig.ENABLED or key is None:
+                return f(*args, **kwargs)
+            if not valid_key(key):
+                return Idempotency.error(INVALID_KEY)
+            params = {
+                'user_id': kwargs['current_user']['user_id'], 'key': key,
+                'hash': request_hash(request.method, request.path, request.get_data(cache=True)),
+                'lock': IdempotencyConfig.LOCK_SECONDS, 'ttl': IdempotencyConfig.TTL_SECONDS,
+            }
+            try:
+                claimed = Idempotency.claim(params)
+            except Exception as e:
+                # Without the store the request is served unprotected, as before
+                print(f"Idempotency claim error: {e}")
+                return f(*args, **kwargs)
+
+            if claimed is not True:
+                if claimed is not None and bytes(claimed['request_hash']) != params['hash']:
+                    return Idempotency.error(KEY_REUSED)
+                if claimed is None or claimed['status_code'] is None:
+                    return Idempotency.error(IN_PROGRESS)
+                status, headers, body = unpack(claimed)
+                replay = Response(body, status=status, headers=headers)
+                replay.headers[REPLAYED_HEADER] = 'true'
+                return replay
+
+            response = None
+            try:
+                response = make_response(f(*args, **kwargs))
+                return response
+            finally:
+                try:
+                    Idempotency.finish(params, response)
+                except Exception as e:
+                    print(f"Idempotency store error: {e}")
+        return decorated
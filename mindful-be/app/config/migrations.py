@@ -0,0 +1,196 @@
+# app/config/migrations.py
+import hashlib
+import os
+import re
+from dotenv import load_dotenv
+from app.config.db import DBConnection
+
+load_dotenv()
+
+MIGRATIONS_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..', 'migrations'))
+FILENAME = re.compile(r'^(\d{4})_([a-z0-9_]+)\.(up|down)\.sql$')
+NO_TRANSACTION = '-- migrate: no-transaction'
+
+
+class SchemaDriftError(RuntimeError):
+    """Raised when the database schema does not match the migration files"""
+
+
+class Migration:
+    def __init__(self, version, name, up_path, down_path):
+        self.version = version
+        self.name = name
+        self.up_path = up_path
+        self.down_path = down_path
+
+    @property
+    def up_sql(self):
+        with open(self.up_path, encoding='utf-8') as fh:
+            return fh.read()
+
+    @property
+    def down_sql(self):
+        if not self.down_path:
+            return None
+        with open(self.down_path, encoding='utf-8') as fh:
+            return fh.read()
+
+    @property
+    def checksum(self):
+        return hashlib.sha256(self.up_sql.encode('utf-8')).hexdigest()
+
+
+class Migrations:
+    """
+    Versioned forward/backward SQL migrations in mindful-be/migrations.
+
+    Files are named NNNN_name.up.sql / NNNN_name.down.sql. Each migration runs
+    in its own transaction, unless its first line is '-- migrate: no-transaction'
+    (needed for CREATE INDEX CONCURRENTLY); those run statement by statement.
+    """
+
+    # strict: refuse to start on drift, warn: log and continue, off: skip
+    SCHEMA_CHECK = os.getenv('SCHEMA_CHECK', 'strict')
+
+    @staticmethod
+    def available(directory=MIGRATIONS_DIR):
+        found = {}
+        for filename in sorted(os.listdir(directory)):
+            match = FILENAME.match(filename)
+            if not match:
+                continue
+            version, name, direction = int(match.group(1)), match.group(2), match.group(3)
+            migration = found.setdefault(version, Migration(version, name, None, None))
+            setattr(migration, f'{direction}_path', os.path.join(directory, filename))
+        for migration in found.values():
+            if not migration.up_path:
+                raise SchemaDriftError(f"migration {migration.version:04d} has no .up.sql file")
+        return [found[v] for v in sorted(found)]
+
+    @staticmethod
+    def ensure_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    @staticmethod
+    def applied():
+        """Return {version: (name, checksum)} for applied migrations"""
+        with DBConnection.get_cursor() as cursor:
+            Migrations.ensure_table(cursor)
+            cursor.execute("SELECT version, name, checksum FROM schema_migrations ORDER BY version")
+            return {version: (name, checksum) for version, name, checksum in cursor.fetchall()}
+
+    @staticmethod
+    def _split_statements(sql):
+        """Split a script on lines ending with ';' (no procedural bodies in these files)"""
+        statements, current = [], []
+        for line in sql.splitlines():
+            if not current and (not line.strip() or line.strip().startswith('--')):
+                continue
+            current.append(line)
+            if line.rstrip().endswith(';'):
+                statements.append('\n'.join(current))
+                current = []
+        if current:
+            statements.append('\n'.join(current))
+        return statements
+
+    @staticmethod
+    def _run(sql, bookkeeping, params):
+        """Run a migration script plus its schema_migrations bookkeeping statement"""
+        if sql.lstrip().startswith(NO_TRANSACTION):
+            with DBConnection.get_connection() as conn:
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    for statement in Migrations._split_statements(sql):
+                        cursor.execute(statement)
+                    cursor.execute(bookkeeping, params)
+        else:
+            with DBConnection.get_cursor() as cursor:
+                cursor.execute(sql)
+                cursor.execute(bookkeeping, params)
+
+    @staticmethod
+    def upgrade(target=None, log=print):
+        """Apply pending migrations up to `target` (default: latest)"""
+        applied = Migrations.applied()
+        done = []
+        for migration in Migrations.available():
+            if target is not None and migration.version > target:
+                break
+            if migration.version in applied:
+                continue
+            log(f"Applying {migration.version:04d}_{migration.name}")
+            Migrations._run(
+                migration.up_sql,
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum)
+            )
+            done.append(migration.version)
+        return done
+
+    @staticmethod
+    def downgrade(target, log=print):
+        """Revert applied migrations newer than `target` (0 reverts everything)"""
+        applied = Migrations.applied()
+        done = []
+        for migration in reversed(Migrations.available()):
+            if migration.version <= target or migration.version not in applied:
+                continue
+            if migration.down_sql is None:
+                raise SchemaDriftError(f"migration {migration.version:04d} cannot be reverted (no .down.sql)")
+            log(f"Reverting {migration.version:04d}_{migration.name}")
+            Migrations._run(migration.down_sql, "DELETE FROM schema_migrations WHERE version = %s",
+                            (migration.version,))
+            done.append(migration.version)
+        return done
+
+    @staticmethod
+    def status():
+        applied = Migrations.applied()
+        rows = []
+        for migration in Migrations.available():
+            entry = applied.get(migration.version)
+            rows.append({
+                'version': migration.version,
+                'name': migration.name,
+                'applied': entry is not None,
+                'checksum_ok': entry is None or entry[1] == migration.checksum,
+            })
+        return rows
+
+    @staticmethod
+    def drift():
+        """Return a list of human-readable drift problems (empty when in sync)"""
+        available = {m.version: m for m in Migrations.available()}
+        applied = Migrations.applied()
+        problems = []
+        for version, migration in available.items():
+            if version not in applied:
+                problems.append(f"{version:04d}_{migration.name} is not applied")
+            elif applied[version][1] != migration.checksum:
+                problems.append(f"{version:04d}_{migration.name} was modified after it was applied")
+        for version, (name, _) in applied.items():
+            if version not in available:
+                problems.append(f"{version:04d}_{name} is applied but missing from {MIGRATIONS_DIR}")
+        return problems
+
+    @staticmethod
+    def check():
+        """Startup check; raises SchemaDriftError in strict mode"""
+        if Migrations.SCHEMA_CHECK == 'off':
+            return
+        problems = Migrations.drift()
+        if not problems:
+            return
+        message = "Schema drift detected: " + "; ".join(problems) + \
+                  " (run `flask --app app db upgrade`)"
+        if Migrations.SCHEMA_CHECK == 'strict':
+            raise SchemaDriftError(message)
+        print(message)
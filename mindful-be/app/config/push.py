@@ -0,0 +1,91 @@
+# app/config/push.py
+import json
+import select
+import time
+import psycopg2
+from psycopg2 import extensions
+from app.config.db import DBConnection
+
+
+class Push:
+    """
+    Push notifications over PostgreSQL LISTEN/NOTIFY.
+    Producers publish inside their own transaction, so events are only
+    delivered once the write commits. Subscribers receive them as
+    server-sent events, in both the sync and the async serving mode.
+    """
+
+    MAX_PAYLOAD = 7900  # pg_notify payloads are limited to 8000 bytes
+    HEARTBEAT_SECONDS = 15
+    EXPERTS_CHANNEL = "experts"  # broadcast to every connected expert
+
+    @staticmethod
+    def user_channel(user_id):
+        return f"user_{int(user_id)}"
+
+    @staticmethod
+    def encode(event, data):
+        """Serialize an event, dropping large fields if it would exceed the NOTIFY limit"""
+        payload = json.dumps({"event": event, "data": data}, default=str)
+        if len(payload.encode('utf-8')) > Push.MAX_PAYLOAD and isinstance(data, dict):
+            slim = {k: v for k, v in data.items() if not isinstance(v, str) or len(v) < 256}
+            slim['truncated'] = True
+            payload = json.dumps({"event": event, "data": slim}, default=str)
+        return payload
+
+    @staticmethod
+    def publish(cursor, channel, event, data):
+        """Queue an event on a channel; delivered when the cursor's transaction commits"""
+        cursor.execute("SELECT pg_notify(%s, %s)", (channel, Push.encode(event, data)))
+
+    @staticmethod
+    def publish_many(cursor, events):
+        """Queue many (channel, event, data) tuples with a single statement"""
+        if not events:
+            return
+        channels = [channel for channel, _, _ in events]
+        payloads = [Push.encode(event, data) for _, event, data in events]
+        cursor.execute("SELECT pg_notify(c, p) FROM unnest(%s::text[], %s::text[]) AS t(c, p)", (channels, payloads))
+
+    @staticmethod
+    def format_sse(event, data, event_id=None):
+        lines = []
+        if event_id is not None:
+            lines.append(f"id: {event_id}")
+        lines.append(f"event: {event}")
+        lines.append(f"data: {json.dumps(data, default=str)}")
+        return "\n".join(lines) + "\n\n"
+
+    @staticmethod
+    def listen(channels, heartbeat=None):
+        """
+        Blocking generator of SSE frames for the given channels.
+        Holds one connection (and one worker thread) for the lifetime of the stream,
+        use the async serving mode when many clients stay connected.
+        """
+        heartbeat = heartbeat or Push.HEARTBEAT_SECONDS
+        conn = psycopg2.connect(**DBConnection.get_connection_params())
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        try:
+            with conn.cursor() as cursor:
+                for channel in channels:
+                    cursor.execute(f"LISTEN {extensions.quote_ident(channel, cursor)}")
+            yield ": connected\n\n"
+            last_sent = time.monotonic()
+            while True:
+                ready, _, _ = select.select([conn], [], [], heartbeat)
+                if ready:
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            message = json.loads(notify.payload)
+                        except ValueError:
+                            continue
+                        yield Push.format_sse(message.get('event', 'message'), message.get('data'))
+                        last_sent = time.monotonic()
+                if time.monotonic() - last_sent >= heartbeat:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            conn.close()
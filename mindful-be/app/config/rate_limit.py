@@ -0,0 +1,246 @@
+# app/config/rate_limit.py
+"""
+Rate limiting and admission control for expensive routes.
+
+    @prediction_bp.route('/predict', methods=['POST'])
+    @JWTConfig.token_required
+    @RateLimit.limit('predict')
+    def predict_mental_health(current_user): ...
+
+Under token_required the bucket is keyed by user id; on routes without
+auth by client IP. Every client has one token bucket of
+RATE_LIMIT_CAPACITY tokens refilled at RATE_LIMIT_REFILL_PER_SECOND, and
+each limited route spends its cost from RATE_LIMIT_COSTS, so heavy routes
+drain it faster. An empty bucket answers 429 with Retry-After.
+
+Buckets live in process memory (so limits apply per worker) or, with
+RATE_LIMIT_BACKEND=postgres, in the UNLOGGED rate_limit_buckets table that
+every worker and host shares: one statement per limited request, and
+requests are let through if the database cannot be reached.
+
+Separately, a per-process concurrency gate admits at most
+ADMISSION_MAX_INFLIGHT limited requests at once. Up to ADMISSION_MAX_QUEUE
+more wait ADMISSION_QUEUE_TIMEOUT seconds for a slot; anything beyond that
+gets 503 with Retry-After instead of piling up in the worker pool.
+"""
+import math
+import os
+import threading
+import time
+from functools import wraps
+from flask import request, jsonify
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _costs(spec):
+    costs = {}
+    for item in spec.split(','):
+        name, _, cost = item.partition('=')
+        if name.strip():
+            costs[name.strip()] = float(cost)
+    return costs
+
+
+TAKE_SQL = """
+    INSERT INTO rate_limit_buckets AS b (key, tokens, updated_at)
+    VALUES (%(key)s, %(capacity)s - %(cost)s, statement_timestamp())
+    ON CONFLICT (key) DO UPDATE
+    SET tokens = LEAST(%(capacity)s, b.tokens + EXTRACT(EPOCH FROM statement_timestamp() - b.updated_at) * %(rate)s)
+                 - %(cost)s,
+        updated_at = statement_timestamp()
+    WHERE LEAST(%(capacity)s, b.tokens + EXTRACT(EPOCH FROM statement_timestamp() - b.updated_at) * %(rate)s)
+          >= %(cost)s
+    RETURNING tokens
+"""
+
+PEEK_SQL = """
+    SELECT LEAST(%(capacity)s, tokens + EXTRACT(EPOCH FROM statement_timestamp() - updated_at) * %(rate)s)
+    FROM rate_limit_buckets WHERE key = %(key)s
+"""
+
+
+class MemoryBuckets:
+    """Token buckets in this process"""
+
+    MAX_KEYS = 50_000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, cost, capacity, rate):
+        """(allowed, tokens left after the attempt)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.MAX_KEYS:
+                self._prune(now, capacity, rate)
+        return allowed, tokens
+
+    def _prune(self, now, capacity, rate):
+        # A bucket that has refilled completely is the same as no bucket
+        full = [k for k, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * rate >= capacity]
+        for key in full:
+            del self._buckets[key]
+
+
+class PostgresBuckets:
+    """Token buckets shared through the rate_limit_buckets table"""
+
+    PRUNE_SECONDS = 600
+
+    def __init__(self):
+        self._pruned_at = time.monotonic()
+
+    def take(self, key, cost, capacity, rate):
+        from app.config.db import DBConnection
+        params = {'key': key, 'cost': cost, 'capacity': capacity, 'rate': rate}
+        with DBConnection.get_cursor() as cursor:
+            cursor.execute(TAKE_SQL, params)
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(PEEK_SQL, params)
+                peek = cursor.fetchone()
+            if time.monotonic() - self._pruned_at > self.PRUNE_SECONDS:
+                self._pruned_at = time.monotonic()
+                # Rows idle long enough to have refilled are full buckets; dropping them changes nothing
+                cursor.execute("""
+                    DELETE FROM rate_limit_buckets
+                    WHERE updated_at < statement_timestamp() - %s * INTERVAL '1 second'
+                """, (capacity / rate,))
+        if row is not None:
+            return True, row[0]
+        return False, peek[0] if peek else 0.0
+
+
+class ConcurrencyGate:
+    """Bounded in-flight requests with a bounded, time-limited wait for a slot"""
+
+    def __init__(self, max_inflight, max_queue, timeout):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.inflight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Take a slot; False if the queue is full or no slot freed up in time"""
+        with self._cond:
+            if self.inflight < self.max_inflight:
+                self.inflight += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self.inflight < self.max_inflight, self.timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                self.rejected += 1
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+
+    def status(self):
+        return {'inflight': self.inflight, 'waiting': self.waiting, 'rejected': self.rejected,
+                'max_inflight': self.max_inflight, 'max_queue': self.max_queue}
+
+
+class RateLimit:
+    """Token-bucket rate limiting and the admission gate for expensive routes"""
+
+    # Configuration
+    ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+    BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')  # memory | postgres
+    CAPACITY = float(os.getenv('RATE_LIMIT_CAPACITY', 60))
+    REFILL_PER_SECOND = float(os.getenv('RATE_LIMIT_REFILL_PER_SECOND', 1))
+    # Tokens each limited route spends; routes not listed spend the cost given to limit()
+    COSTS = _costs(os.getenv('RATE_LIMIT_COSTS', 'predict=5,buy-messages=10,upload=20,image-render=2'))
+    # Use the first X-Forwarded-For address as the client IP (only behind a proxy that sets it)
+    TRUST_FORWARDED = os.getenv('RATE_LIMIT_TRUST_FORWARDED', '0') == '1'
+
+    ADMISSION_MAX_INFLIGHT = int(os.getenv('ADMISSION_MAX_INFLIGHT', 16))  # 0 = no gate
+    ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 32))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 2))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 2))
+
+    buckets = PostgresBuckets() if BACKEND == 'postgres' else MemoryBuckets()
+    gate = ConcurrencyGate(ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT)
+
+    @staticmethod
+    def client_key(current_user=None):
+        """Bucket key: the user id under token_required, else the client IP (see app/asgi/rate_limit.py)"""
+        if current_user:
+            return f"user:{current_user['user_id']}"
+        if RateLimit.TRUST_FORWARDED and request.access_route:
+            return f"ip:{request.access_route[0]}"
+        return f"ip:{request.remote_addr}"
+
+    @staticmethod
+    def check(key, cost):
+        """None if the request may proceed, else the seconds to wait"""
+        try:
+            allowed, tokens = RateLimit.buckets.take(key, cost, RateLimit.CAPACITY, RateLimit.REFILL_PER_SECOND)
+        except Exception as e:
+            print(f"Rate limit backend error: {e}")
+            return None  # fail open
+        if allowed:
+            return None
+        return max(1, math.ceil((cost - tokens) / RateLimit.REFILL_PER_SECOND))
+
+    @staticmethod
+    def route_cost(name, cost=1):
+        """Tokens a limited route spends: its RATE_LIMIT_COSTS entry, else `cost`"""
+        cost = RateLimit.COSTS.get(name, cost)
+        if cost > RateLimit.CAPACITY:
+            raise ValueError(f"Rate limit cost of {name} ({cost}) exceeds RATE_LIMIT_CAPACITY")
+        return cost
+
+    @staticmethod
+    def limit(name, cost=1):
+        """Decorator: spend the route's cost from the client's bucket, then pass the admission gate"""
+        cost = RateLimit.route_cost(name, cost)
+
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                if RateLimit.ENABLED:
+                    retry_after = RateLimit.check(RateLimit.client_key(kwargs.get('current_user')), cost)
+                    if retry_after is not None:
+                        response = jsonify({'message': 'Too many requests', 'retry_after': retry_after})
+                        response.headers['Retry-After'] = str(retry_after)
+                        return response, 429
+
+                if RateLimit.ADMISSION_MAX_INFLIGHT <= 0:
+                    return f(*args, **kwargs)
+                if not RateLimit.gate.acquire():
+                    response = jsonify({'message': 'Server is busy, try again shortly'})
+                    response.headers['Retry-After'] = str(RateLimit.ADMISSION_RETRY_AFTER)
+                    return response, 503
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    RateLimit.gate.release()
+            return decorated
+        return decorator
+
+    @staticmethod
+    def status():
+        return {'enabled': RateLimit.ENABLED, 'backend': RateLimit.BACKEND, 'admission': RateLimit.gate.status()}
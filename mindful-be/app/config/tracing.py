@@ -0,0 +1,254 @@
+# app/config/tracing.py
+import os
+import json
+import time
+import queue
+import secrets
+import threading
+from collections import deque
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Tracing:
+    """Per-request latency tracing with phase breakdown and span export"""
+
+    # Configuration
+    ENABLED = os.getenv('TRACE_ENABLED', '1') == '1'
+    SPAN_FILE = os.getenv('TRACE_SPAN_FILE', '')  # JSONL of OTLP/JSON payloads, empty = off
+    OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', '')  # e.g. http://localhost:4318/v1/traces
+    BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', 500))
+    DEBUG_ENDPOINTS = os.getenv('TRACE_DEBUG_ENDPOINTS', '0') == '1'
+    SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'mindful-be')
+    MAX_SPANS_PER_REQUEST = 200
+
+    PHASES = ('auth', 'db', 'inference', 'serialize', 'file_io')
+
+    _recent = deque(maxlen=BUFFER_SIZE)
+    _recent_lock = threading.Lock()
+    _export_queue = queue.Queue(maxsize=10000)
+    _exporter = None
+
+    @staticmethod
+    def init_app(app):
+        """Install request hooks and the timing JSON provider on the app"""
+        if not Tracing.ENABLED:
+            return
+        app.json_provider_class = TracedJSONProvider
+        app.json = TracedJSONProvider(app)
+        app.before_request(Tracing._start_request)
+        app.after_request(Tracing._finish_request)
+        if Tracing.SPAN_FILE or Tracing.OTLP_ENDPOINT:
+            Tracing._start_exporter()
+
+    @staticmethod
+    def _start_request():
+        trace_id, parent_span_id = Tracing._parse_traceparent(request.headers.get('traceparent'))
+        g._trace = {
+            'trace_id': trace_id or secrets.token_hex(16),
+            'parent_span_id': parent_span_id,
+            'span_id': secrets.token_hex(8),
+            'start_ns': time.time_ns(),
+            'start': time.perf_counter(),
+            'phases': {},
+            'depth': {},
+            'stack': [],
+            'spans': [],
+        }
+
+    @staticmethod
+    def _finish_request(response):
+        trace = g.pop('_trace', None)
+        if trace is None:
+            return response
+
+        duration_ms = (time.perf_counter() - trace['start']) * 1000
+        phases = {name: round(ms, 3) for name, ms in trace['phases'].items()}
+        phases['app'] = round(max(duration_ms - sum(trace['phases'].values()), 0.0), 3)
+
+        summary = {
+            'trace_id': trace['trace_id'],
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 3),
+            'phases': phases,
+            'timestamp': trace['start_ns'] // 1_000_000,
+        }
+        with Tracing._recent_lock:
+            Tracing._recent.append(summary)
+
+        if Tracing._exporter is not None:
+            try:
+                Tracing._export_queue.put_nowait((trace, summary))
+            except queue.Full:
+                pass  # Never block a request on span export
+
+        response.headers['X-Trace-Id'] = trace['trace_id']
+        response.headers['traceparent'] = f"00-{trace['trace_id']}-{trace['span_id']}-01"
+        return response
+
+    @staticmethod
+    @contextmanager
+    def phase(name, **attributes):
+        """
+        Time a block of work and attribute it to a request phase.
+        Phases record exclusive time: while a nested block runs, the block
+        around it is paused, so no time is counted twice and the phases never
+        add up to more than the request. Nested blocks of the same phase get
+        one span. Outside of a traced request this is a no-op.
+        """
+        trace = g.get('_trace') if has_request_context() else None
+        if trace is None:
+            yield
+            return
+
+        depth = trace['depth']
+        depth[name] = depth.get(name, 0) + 1
+        frame = {'nested_ms': 0.0}
+        trace['stack'].append(frame)
+        start_ns = time.time_ns()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            trace['stack'].pop()
+            if trace['stack']:
+                trace['stack'][-1]['nested_ms'] += elapsed_ms
+            trace['phases'][name] = trace['phases'].get(name, 0.0) + elapsed_ms - frame['nested_ms']
+            depth[name] -= 1
+            if depth[name] == 0 and len(trace['spans']) < Tracing.MAX_SPANS_PER_REQUEST:
+                trace['spans'].append({
+                    'name': name,
+                    'span_id': secrets.token_hex(8),
+                    'start_ns': start_ns,
+                    'end_ns': start_ns + int(elapsed_ms * 1_000_000),
+                    'attributes': attributes,
+                })
+
+    @staticmethod
+    def current_trace_id():
+        """Return the trace id of the active request, if any"""
+        if not has_request_context():
+            return None
+        trace = g.get('_trace')
+        return trace['trace_id'] if trace else None
+
+    @staticmethod
+    def slowest(limit=20, path_prefix=None):
+        """Return the slowest requests currently held in the ring buffer"""
+        with Tracing._recent_lock:
+            entries = list(Tracing._recent)
+        if path_prefix:
+            entries = [e for e in entries if e['path'].startswith(path_prefix)]
+        entries.sort(key=lambda e: e['duration_ms'], reverse=True)
+        return entries[:limit], len(entries)
+
+    @staticmethod
+    def _parse_traceparent(header):
+        """Parse a W3C traceparent header into (trace_id, parent_span_id)"""
+        if not header:
+            return None, None
+        parts = header.strip().split('-')
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None, None
+        try:
+            int(parts[1], 16)
+            int(parts[2], 16)
+        except ValueError:
+            return None, None
+        return parts[1], parts[2]
+
+    # ─────────────────────────────────────
+    # Span export (OTLP/JSON)
+    # ─────────────────────────────────────
+    @staticmethod
+    def _start_exporter():
+        if Tracing._exporter is not None:
+            return
+        Tracing._exporter = threading.Thread(target=Tracing._export_loop, name='trace-exporter', daemon=True)
+        Tracing._exporter.start()
+
+    @staticmethod
+    def _export_loop():
+        while True:
+            batch = [Tracing._export_queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(Tracing._export_queue.get_nowait())
+                except queue.Empty:
+                    break
+            payload = Tracing.to_otlp(batch)
+            try:
+                if Tracing.SPAN_FILE:
+                    with open(Tracing.SPAN_FILE, 'a', encoding='utf-8') as fh:
+                        fh.write(json.dumps(payload, separators=(',', ':')) + '\n')
+                if Tracing.OTLP_ENDPOINT:
+                    import requests
+                    requests.post(Tracing.OTLP_ENDPOINT, json=payload, timeout=5)
+            except Exception as e:
+                print(f"Trace export failed: {e}")
+
+    @staticmethod
+    def to_otlp(batch):
+        """Convert (trace, summary) pairs to an OTLP/JSON ExportTraceServiceRequest"""
+        def attr(key, value):
+            if isinstance(value, bool):
+                return {'key': key, 'value': {'boolValue': value}}
+            if isinstance(value, int):
+                return {'key': key, 'value': {'intValue': str(value)}}
+            if isinstance(value, float):
+                return {'key': key, 'value': {'doubleValue': value}}
+            return {'key': key, 'value': {'stringValue': str(value)}}
+
+        spans = []
+        for trace, summary in batch:
+            end_ns = trace['start_ns'] + int(summary['duration_ms'] * 1_000_000)
+            root = {
+                'traceId': trace['trace_id'],
+                'spanId': trace['span_id'],
+                'name': f"{summary['method']} {summary['endpoint'] or summary['path']}",
+                'kind': 2,  # SPAN_KIND_SERVER
+                'startTimeUnixNano': str(trace['start_ns']),
+                'endTimeUnixNano': str(end_ns),
+                'attributes': [
+                    attr('http.method', summary['method']),
+                    attr('http.target', summary['path']),
+                    attr('http.status_code', summary['status']),
+                ] + [attr(f'phase.{name}_ms', float(ms)) for name, ms in summary['phases'].items()],
+            }
+            if trace['parent_span_id']:
+                root['parentSpanId'] = trace['parent_span_id']
+            spans.append(root)
+            for span in trace['spans']:
+                spans.append({
+                    'traceId': trace['trace_id'],
+                    'spanId': span['span_id'],
+                    'parentSpanId': trace['span_id'],
+                    'name': span['name'],
+                    'kind': 1,  # SPAN_KIND_INTERNAL
+                    'startTimeUnixNano': str(span['start_ns']),
+                    'endTimeUnixNano': str(span['end_ns']),
+                    'attributes': [attr(k, v) for k, v in span['attributes'].items()],
+                })
+
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [attr('service.name', Tracing.SERVICE_NAME)]},
+                'scopeSpans': [{'scope': {'name': 'app.config.tracing'}, 'spans': spans}],
+            }]
+        }
+
+
+class TracedJSONProvider(DefaultJSONProvider):
+    """JSON provider that attributes response serialization to the 'serialize' phase"""
+
+    def dumps(self, obj, **kwargs):
+        with Tracing.phase('serialize'):
+            return super().dumps(obj, **kwargs)
@@ -1,12 +1,47 @@
-from flask import Blueprint, jsonify, request, redirect
+from flask import Blueprint, jsonify, request, redirect, Response, stream_with_context
 from app.config.db import DBConnection
 from app.config.JWTConfig import JWTConfig
+from app.config.rate_limit import RateLimit
+from app.config.idempotency import Idempotency
+from app.config.push import Push
+from app.services.partitions import PartitionConfig, history_since
+from app.services.notifications import notifier
 from datetime import datetime
 import requests
 import json
+import os
 
 chat_bp = Blueprint('chat', __name__)
 
+EXPERT_ID = 8
+# Accounts that can work the chat request queue; EXPERT_ID answers the chat itself
+EXPERT_IDS = {int(i) for i in os.getenv('EXPERT_IDS', str(EXPERT_ID)).split(',') if i.strip()}
+
+def is_expert(user_id):
+    return int(user_id) in EXPERT_IDS
+
+def stream_channels(user_id):
+    """Push channels a user's event stream subscribes to"""
+    channels = [Push.user_channel(user_id)]
+    if is_expert(user_id):
+        channels.append(Push.EXPERTS_CHANNEL)
+    return channels
+
+# Messages between two users in either direction since a given time; matches
+# idx_messages_conversation, and the timestamp bound prunes old monthly partitions
+CONVERSATION_SQL = """
+    SELECT id, sender_id, receiver_id, content, timestamp
+    FROM messages
+    WHERE LEAST(sender_id, receiver_id) = LEAST(%s, %s)
+      AND GREATEST(sender_id, receiver_id) = GREATEST(%s, %s)
+      AND timestamp >= %s
+    ORDER BY timestamp ASC
+"""
+
+KHALTI_INITIATE_URL = os.getenv('KHALTI_INITIATE_URL', 'https://dev.khalti.com/api/v2/epayment/initiate/')
+KHALTI_SECRET_KEY = os.getenv('KHALTI_SECRET_KEY', 'e030ba49d9194a86924ca3949324be02')
+KHALTI_RETURN_URL = os.getenv('KHALTI_RETURN_URL', 'http://localhost:5000/api/messages/purchase/complete')
+
 def message_row_to_dict(row):
     return {
         "id": row["id"],
@@ -16,6 +51,26 @@ def message_row_to_dict(row):
         "timestamp": row["timestamp"].isoformat() if row["timestamp"] else None,
     }
 
+def build_khalti_request(purchase_id, chat_credits, amount, user_name, user_email, phone):
+    """Return (url, headers, body) for a Khalti payment initiation"""
+    payload = json.dumps({
+        "return_url": KHALTI_RETURN_URL,
+        "website_url": "https://example.com",
+        "amount": str(amount),
+        "purchase_order_id": f"chat_purchase_{purchase_id}",
+        "purchase_order_name": f"{chat_credits} Chat Credits",
+        "customer_info": {
+            "name": user_name or "Anonymous",
+            "email": user_email or "user@example.com",
+            "phone": phone or '9800000001'
+        }
+    })
+    headers = {
+        'Authorization': f'key {KHALTI_SECRET_KEY}',
+        'Content-Type': 'application/json'
+    }
+    return KHALTI_INITIATE_URL, headers, payload
+
 # GET chat count for current user
 @chat_bp.route('/chat-count', methods=['GET'])
 @JWTConfig.token_required
@@ -37,6 +92,7 @@ def get_chat_count(current_user):
 # POST send message (requires chat_count > 0)
 @chat_bp.route('/messages', methods=['POST'])
 @JWTConfig.token_required
+@Idempotency.idempotent
 def send_message(current_user):
     data = request.get_json()
     if not data:
@@ -50,15 +106,18 @@ def send_message(current_user):
 
     try:
         with DBConnection.get_cursor(dictionary=True) as cursor:
-            # Check chat count
-            cursor.execute(
-                "SELECT chat_count FROM users WHERE id = %s",
-                (sender_id,)
-            )
+            # Check chat count; messages inside a running paid session are metered per session instead
+            cursor.execute("""
+                SELECT u.chat_count, EXISTS (
+                    SELECT 1 FROM chat_session_requests s
+                    WHERE s.user_id = u.id AND s.status = 'active' AND s.ends_at > NOW()
+                ) AS in_session
+                FROM users u WHERE u.id = %s
+            """, (sender_id,))
             user_row = cursor.fetchone()
             if user_row is None:
                 return jsonify({"message": "User not found"}), 404
-            if user_row['chat_count'] <= 0:
+            if user_row['chat_count'] <= 0 and not user_row['in_session']:
                 return jsonify({"message": "You have no chats remaining"}), 403
 
             # Send message to expert (id = 8)
@@ -70,12 +129,16 @@ def send_message(current_user):
             message_row = cursor.fetchone()
 
             # Decrement chat count
-            cursor.execute(
-                "UPDATE users SET chat_count = chat_count - 1 WHERE id = %s",
-                (sender_id,)
-            )
+            if not user_row['in_session']:
+                cursor.execute(
+                    "UPDATE users SET chat_count = chat_count - 1 WHERE id = %s",
+                    (sender_id,)
+                )
 
-            return jsonify({"message": "Message sent", "data": message_row_to_dict(message_row)}), 201
+            message = message_row_to_dict(message_row)
+            Push.publish(cursor, Push.user_channel(EXPERT_ID), 'message', {**message, 'sender_type': 'user'})
+
+            return jsonify({"message": "Message sent", "data": message}), 201
 
     except Exception as e:
         print(f"POST /messages error: {e}")
@@ -90,14 +153,13 @@ def get_messages_with_user(current_user, user_id):
         return jsonify({"message": "Unauthorized"}), 403
 
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
-            cursor.execute("""
-                SELECT id, sender_id, receiver_id, content, timestamp
-                FROM messages
-                WHERE (sender_id = %s AND receiver_id = 8)
-                   OR (sender_id = 8 AND receiver_id = %s)
-                ORDER BY timestamp ASC
-            """, (user_id, user_id))
+        since = history_since(request.args.get('days'), PartitionConfig.MESSAGES_HISTORY_DAYS)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
+            cursor.execute(CONVERSATION_SQL, (user_id, EXPERT_ID, user_id, EXPERT_ID, since))
             rows = cursor.fetchall()
             messages = []
             for row in rows:
@@ -116,14 +178,13 @@ def get_my_messages(current_user):
     expert_id = 8
 
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
-            cursor.execute("""
-                SELECT id, sender_id, receiver_id, content, timestamp
-                FROM messages
-                WHERE (sender_id = %s AND receiver_id = %s)
-                   OR (sender_id = %s AND receiver_id = %s)
-                ORDER BY timestamp ASC
-            """, (user_id, expert_id, expert_id, user_id))
+        since = history_since(request.args.get('days'), PartitionConfig.MESSAGES_HISTORY_DAYS)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
+            cursor.execute(CONVERSATION_SQL, (user_id, expert_id, user_id, expert_id, since))
             rows = cursor.fetchall()
 
             messages = []
@@ -137,6 +198,17 @@ def get_my_messages(current_user):
         print(f"GET /messages error: {e}")
         return jsonify({"message": "Failed to fetch messages"}), 500
 
+# GET server-sent event stream of new messages for the current user
+@chat_bp.route('/messages/stream', methods=['GET'])
+@JWTConfig.token_required
+def stream_messages(current_user):
+    stream = Push.listen(stream_channels(current_user['user_id']))
+    return Response(
+        stream_with_context(stream),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @chat_bp.route('/expert/messages/<int:user_id>', methods=['POST'])
 @JWTConfig.token_required
 def expert_send_message(current_user, user_id):
@@ -160,10 +232,14 @@ def expert_send_message(current_user, user_id):
             """, (8, user_id, content, datetime.utcnow()))
             message_row = cursor.fetchone()
 
-            return jsonify({
-                "message": "Message sent",
-                "data": message_row_to_dict(message_row)
-            }), 201
+            message = message_row_to_dict(message_row)
+            Push.publish(cursor, Push.user_channel(user_id), 'message', {**message, 'sender_type': 'expert'})
+
+        notifier.emit('message', EXPERT_ID, EXPERT_ID, recipient_id=user_id)
+        return jsonify({
+            "message": "Message sent",
+            "data": message
+        }), 201
     except Exception as e:
         print(f"POST /expert/messages/<user_id> error: {e}")
         return jsonify({"message": "Failed to send message"}), 500
@@ -176,7 +252,7 @@ def get_accepted_users(current_user):
         return jsonify({"message": "Unauthorized"}), 403
 
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
             # Get distinct user IDs with their latest message timestamp
             cursor.execute("""
                 SELECT 
@@ -219,6 +295,8 @@ def get_accepted_users(current_user):
 
 @chat_bp.route('/buy-messages', methods=['POST'])
 @JWTConfig.token_required
+@Idempotency.idempotent
+@RateLimit.limit('buy-messages')
 def buy_messages(current_user):
     try:
         data = request.get_json()
@@ -256,23 +334,11 @@ def buy_messages(current_user):
             print(f"POST /buy-messages: Inserted purchase record with id: {purchase_id}")
 
             # Initiate Khalti payment
-            url = "https://dev.khalti.com/api/v2/epayment/initiate/"
-            payload = json.dumps({
-                "return_url": "http://localhost:5000/api/messages/purchase/complete",
-                "website_url": "https://example.com",
-                "amount": str(amount),
-                "purchase_order_id": f"chat_purchase_{purchase_id}",
-                "purchase_order_name": f"{chat_credits} Chat Credits",
-                "customer_info": {
-                    "name": user[0] or "Anonymous",  # Index 0 for name
-                    "email": user[1] or "user@example.com",  # Index 1 for email
-                    "phone": current_user.get('phone', '9800000001')
-                }
-            })
-            headers = {
-                'Authorization': 'key e030ba49d9194a86924ca3949324be02',
-                'Content-Type': 'application/json'
-            }
+            url, headers, payload = build_khalti_request(
+                purchase_id, chat_credits, amount,
+                user[0], user[1],  # Index 0 for name, 1 for email
+                current_user.get('phone')
+            )
             print(f"POST /buy-messages: Sending Khalti request with payload: {payload}")
             response = requests.post(url, headers=headers, data=payload)
             response_data = response.json()
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
-from app.config.db import DBConnection
-from datetime import datetime
+from app.config.JWTConfig import JWTConfig
+from app.routes.chat import is_expert
+from app.services.chat_queue import ChatQueue, ClaimConflict, STATUSES
+from app.services.sessions import ChatSessions, session_timer
 
 chat_requests_bp = Blueprint('chat_requests', __name__)
 
@@ -8,65 +10,93 @@ def row_to_dict(row):
     return {
         "id": row["id"],
         "user_id": row["user_id"],
-        "user_name": row.get("user_name"),  # optional join on user table for name if implemented
+        "user_name": row.get("user_name"),
         "session_duration": row["session_duration"],
         "requested_at": row["requested_at"].isoformat() if row["requested_at"] else None,
         "status": row["status"],
         "paid": row["paid"],
         "updated_at": row["updated_at"].isoformat() if row["updated_at"] else None,
+        "claimed_by": row.get("claimed_by"),
+        "claimed_at": row["claimed_at"].isoformat() if row.get("claimed_at") else None,
+        "expires_at": row["expires_at"].isoformat() if row.get("expires_at") else None,
+        "started_at": row["started_at"].isoformat() if row.get("started_at") else None,
+        "ends_at": row["ends_at"].isoformat() if row.get("ends_at") else None,
+        "ended_at": row["ended_at"].isoformat() if row.get("ended_at") else None,
     }
 
 # POST /chat-requests - user creates a new chat session request
 @chat_requests_bp.route('/chat-requests', methods=['POST'])
-def create_chat_request():
+@JWTConfig.token_required
+def create_chat_request(current_user):
     data = request.get_json()
     if not data:
         return jsonify({"message": "Missing JSON body"}), 400
 
     session_duration = data.get("session_duration")
-    user_id = data.get("user_id")  # now expecting user_id passed in request body
-    if not session_duration or not user_id:
-        return jsonify({"message": "Session duration and user_id are required"}), 400
+    if session_duration is None or session_duration == "":
+        return jsonify({"message": "Session duration is required"}), 400
+    # Whole minutes, as a number or a numeric string; 0, -5, 2.5 and true are rejected
+    if isinstance(session_duration, str) and session_duration.strip().isdigit():
+        session_duration = int(session_duration)
+    if isinstance(session_duration, bool) or not isinstance(session_duration, int) or session_duration <= 0:
+        return jsonify({"message": "Session duration must be a positive whole number of minutes"}), 400
 
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
-            cursor.execute(
-                """
-                INSERT INTO chat_session_requests (user_id, session_duration, status, paid, requested_at)
-                VALUES (%s, %s, 'pending', FALSE, NOW())
-                RETURNING id, user_id, session_duration, requested_at, status, paid, updated_at
-                """,
-                (user_id, session_duration)
-            )
-            row = cursor.fetchone()
-            return jsonify({"message": "Request created", "data": row_to_dict(row)}), 201
+        row = ChatQueue.create(current_user['user_id'], session_duration)
+        return jsonify({"message": "Request created", "data": row_to_dict(row)}), 201
     except Exception as e:
         print(f"POST /chat-requests error: {e}")
         return jsonify({"message": "Failed to create chat request", "error": str(e)}), 500
 
-# GET /chat-requests - expert fetches all requests (no auth check)
+# GET /chat-requests - expert view of the queue, one page at a time
+#   ?status=pending (default, oldest first) | accepted | rejected | expired | all
+#   ?mine=1 to only show requests claimed by the caller, ?after=<next_cursor>, ?limit=
 @chat_requests_bp.route('/chat-requests', methods=['GET'])
-def list_chat_requests():
+@JWTConfig.token_required
+def list_chat_requests(current_user):
+    if not is_expert(current_user['user_id']):
+        return jsonify({"message": "Unauthorized"}), 403
+
+    status = request.args.get('status', 'pending')
+    if status not in STATUSES + ('all',):
+        return jsonify({"message": "Invalid status"}), 400
+    claimed_by = current_user['user_id'] if request.args.get('mine') == '1' else None
+
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
-            cursor.execute(
-                """
-                SELECT r.id, r.user_id, u.name as user_name, r.session_duration, r.requested_at, r.status, r.paid, r.updated_at
-                FROM chat_session_requests r
-                LEFT JOIN users u ON u.id = r.user_id
-                ORDER BY r.requested_at DESC
-                """
-            )
-            rows = cursor.fetchall()
-            results = [row_to_dict(row) for row in rows]
-            return jsonify(results), 200
+        ChatQueue.expire_throttled()
+        rows, next_cursor = ChatQueue.page(status, request.args.get('after'),
+                                           request.args.get('limit', type=int), claimed_by)
+        return jsonify({"requests": [row_to_dict(row) for row in rows], "next_cursor": next_cursor}), 200
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
     except Exception as e:
         print(f"GET /chat-requests error: {e}")
         return jsonify({"message": "Failed to fetch chat requests", "error": str(e)}), 500
 
-# PATCH /chat-requests/<id> - expert accepts/rejects and optionally marks as paid (no auth check)
+# POST /chat-requests/claim - expert takes the oldest pending request
+@chat_requests_bp.route('/chat-requests/claim', methods=['POST'])
+@JWTConfig.token_required
+def claim_next_chat_request(current_user):
+    if not is_expert(current_user['user_id']):
+        return jsonify({"message": "Unauthorized"}), 403
+
+    try:
+        ChatQueue.expire_throttled()
+        row = ChatQueue.claim(current_user['user_id'])
+        return jsonify({"message": "Request claimed", "data": row_to_dict(row)}), 200
+    except ClaimConflict as e:
+        return jsonify({"message": str(e)}), 404
+    except Exception as e:
+        print(f"POST /chat-requests/claim error: {e}")
+        return jsonify({"message": "Failed to claim chat request", "error": str(e)}), 500
+
+# PATCH /chat-requests/<id> - expert accepts (claims) or rejects a request, and marks it paid
 @chat_requests_bp.route('/chat-requests/<int:request_id>', methods=['PATCH'])
-def update_chat_request(request_id):
+@JWTConfig.token_required
+def update_chat_request(current_user, request_id):
+    if not is_expert(current_user['user_id']):
+        return jsonify({"message": "Unauthorized"}), 403
+
     data = request.get_json()
     if not data:
         return jsonify({"message": "Missing JSON body"}), 400
@@ -77,34 +107,44 @@ def update_chat_request(request_id):
     if status not in ('accepted', 'rejected'):
         return jsonify({"message": "Invalid status"}), 400
 
+    expert_id = current_user['user_id']
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
-            # Update status and paid if provided
+        if status == 'rejected':
+            row = ChatQueue.reject(expert_id, request_id)
+        else:
+            try:
+                row = ChatQueue.claim(expert_id, request_id)
+            except ClaimConflict:
+                # Already ours: accepting again is a no-op apart from the paid flag
+                if paid is None:
+                    raise
             if paid is not None:
-                cursor.execute(
-                    """
-                    UPDATE chat_session_requests
-                    SET status = %s, paid = %s, updated_at = NOW()
-                    WHERE id = %s
-                    RETURNING id, user_id, session_duration, requested_at, status, paid, updated_at
-                    """,
-                    (status, paid, request_id)
-                )
-            else:
-                cursor.execute(
-                    """
-                    UPDATE chat_session_requests
-                    SET status = %s, updated_at = NOW()
-                    WHERE id = %s
-                    RETURNING id, user_id, session_duration, requested_at, status, paid, updated_at
-                    """,
-                    (status, request_id)
-                )
-            row = cursor.fetchone()
-            if not row:
-                return jsonify({"message": "Request not found"}), 404
-
-            return jsonify({"message": "Request updated", "data": row_to_dict(row)}), 200
+                row = ChatQueue.mark_paid(expert_id, request_id, bool(paid))
+                if row['status'] == 'active':
+                    session_timer.schedule(row['id'], row['seconds_left'])
+        return jsonify({"message": "Request updated", "data": row_to_dict(row)}), 200
+    except ClaimConflict as e:
+        return jsonify({"message": str(e)}), 409
     except Exception as e:
         print(f"PATCH /chat-requests/{request_id} error: {e}")
         return jsonify({"message": "Failed to update chat request", "error": str(e)}), 500
+
+# POST /chat-requests/<id>/end - either participant ends a running session early
+@chat_requests_bp.route('/chat-requests/<int:request_id>/end', methods=['POST'])
+@JWTConfig.token_required
+def end_chat_session(current_user, request_id):
+    try:
+        ended = ChatSessions.end([request_id], force=True, participant_id=current_user['user_id'])
+        if not ended:
+            return jsonify({"message": "No active session"}), 404
+        session_timer.cancel(request_id)
+        session = ended[0]
+        return jsonify({"message": "Session ended", "data": {
+            "id": session["id"],
+            "ended_at": session["ended_at"].isoformat(),
+            "seconds": session["seconds"],
+            "credits": session["credits"],
+        }}), 200
+    except Exception as e:
+        print(f"POST /chat-requests/{request_id}/end error: {e}")
+        return jsonify({"message": "Failed to end session", "error": str(e)}), 500
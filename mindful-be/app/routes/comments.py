@@ -1,6 +1,11 @@
+from datetime import datetime
 from flask import Blueprint, request, jsonify
 from app.config.db import DBConnection
 from app.config.JWTConfig import JWTConfig  # <-- import token_required
+from app.config.idempotency import Idempotency
+from app.services.write_behind import write_behind
+from app.services.moderation import moderation, viewer_id, visibility, visible_statuses, ModerationConfig
+from app.services.notifications import notifier
 
 comments_bp = Blueprint('comments', __name__)
 
@@ -21,19 +26,37 @@ def row_to_dict(row):
 @comments_bp.route('/posts/<int:post_id>/comments', methods=['GET'])
 def get_comments(post_id):
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
+        # Buffered comments are read first so a flush in between cannot hide them
+        pending = write_behind.pending('comments', post_id, shared=write_behind.COOKIE_NAME in request.cookies)
+        # Held and rejected comments are only listed for their author and the experts
+        viewer = viewer_id(request)
+        visible, params = visibility('c', viewer)
+        if visible != "TRUE" and 'unscreened' not in visible_statuses():
+            pending = [row for row in pending if row['author_id'] == viewer]
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
             cursor.execute(
-                """
-                SELECT c.id, c.post_id, c.author_id, u.name AS author_name, c.text, c.timestamp
+                f"""
+                SELECT c.id, c.post_id, c.author_id, u.name AS author_name, c.text, c.timestamp,
+                       c.moderation_status
                 FROM comments c
                 JOIN users u ON c.author_id = u.id
-                WHERE c.post_id = %s
+                WHERE c.post_id = %s AND {visible}
                 ORDER BY c.timestamp ASC
                 """,
-                (post_id,)
+                (post_id,) + params
             )
             comments = cursor.fetchall()
             comments_list = [row_to_dict(row) for row in comments]
+            if pending:
+                stored = {(c['author_id'], c['timestamp'], c['text']) for c in comments_list}
+                pending = [row for row in pending if (row['author_id'], row['timestamp'], row['text']) not in stored]
+            if pending:
+                cursor.execute("SELECT id, name FROM users WHERE id = ANY(%s)",
+                               (list({row['author_id'] for row in pending}),))
+                names = {user['id']: user['name'] for user in cursor.fetchall()}
+                comments_list += [dict(row, id=None, author_name=names.get(row['author_id']), pending=True)
+                                  for row in pending]
+                comments_list.sort(key=lambda c: c['timestamp'] or '')
             return jsonify({"data": comments_list, "message": "Comments retrieved successfully"}), 200
     except Exception as e:
         print(f"GET /api/posts/{post_id}/comments error: {e}")
@@ -44,6 +67,7 @@ def get_comments(post_id):
 # ─────────────────────────────────────
 @comments_bp.route('/posts/<int:post_id>/comments', methods=['POST'])
 @JWTConfig.token_required
+@Idempotency.idempotent
 def add_comment(current_user, post_id):
     data = request.get_json()
     if not data:
@@ -55,13 +79,30 @@ def add_comment(current_user, post_id):
 
     author_id = current_user['user_id']  # ← from JWT
 
+    if write_behind.enabled('comments'):
+        try:
+            with DBConnection.get_cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT name FROM users WHERE id = %s", (author_id,))
+                author_name = cursor.fetchone()['name']
+            row = write_behind.enqueue('comments', {
+                'post_id': post_id, 'author_id': author_id, 'text': text, 'timestamp': datetime.utcnow(),
+            })
+            result = dict(row, id=None, author_name=author_name, pending=True)
+            if not ModerationConfig.ENABLED:
+                notifier.emit('comment', post_id, author_id)
+            response = jsonify({"message": "Comment added successfully", "data": result})
+            return write_behind.mark(response), 202
+        except Exception as e:
+            print(f"POST /api/posts/{post_id}/comments error: {e}")
+            return jsonify({"message": "Failed to add comment", "error": str(e)}), 500
+
     try:
         with DBConnection.get_cursor(dictionary=True) as cursor:
             cursor.execute(
                 """
                 INSERT INTO comments (post_id, author_id, text, timestamp)
                 VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
-                RETURNING id, post_id, author_id, text, timestamp
+                RETURNING id, post_id, author_id, text, timestamp, moderation_status
                 """,
                 (post_id, author_id, text)
             )
@@ -73,7 +114,11 @@ def add_comment(current_user, post_id):
             result = row_to_dict(new_comment)
             result['author_name'] = author_name
 
-            return jsonify({"message": "Comment added successfully", "data": result}), 201
+        # Screened on the moderation thread once committed; the post's author is notified once it is approved
+        moderation.notify()
+        if not ModerationConfig.ENABLED:
+            notifier.emit('comment', post_id, author_id)
+        return jsonify({"message": "Comment added successfully", "data": result}), 201
     except Exception as e:
         print(f"POST /api/posts/{post_id}/comments error: {e}")
         return jsonify({"message": "Failed to add comment", "error": str(e)}), 500
@@ -0,0 +1,59 @@
+from flask import Blueprint, request, jsonify, current_app, abort
+from app.config.tracing import Tracing
+from app.config.compression import Compression
+from app.config.db import replicas
+from app.config.rate_limit import RateLimit
+from app.services.images import image_pipeline
+from app.services.model_loader import prediction_model, ModelConfig
+from app.services.sessions import session_timer
+from app.services.storage import storage
+from app.services.recommender import recommender
+from app.services.plays import play_counter
+from app.services.media_cache import media_cache
+from app.services.moderation import moderation
+from app.services.notifications import notifier
+
+debug_bp = Blueprint('debug', __name__)
+
+@debug_bp.before_request
+def require_debug_enabled():
+    # Only exposed in debug mode or when explicitly enabled
+    if not (current_app.debug or Tracing.DEBUG_ENDPOINTS):
+        abort(404)
+
+# GET /debug/slowest - top N slowest recent requests from the trace ring buffer
+@debug_bp.route('/debug/slowest', methods=['GET'])
+def slowest_requests():
+    limit = request.args.get('n', default=20, type=int)
+    path_prefix = request.args.get('path')
+    limit = max(1, min(limit, Tracing.BUFFER_SIZE))
+
+    entries, sampled = Tracing.slowest(limit=limit, path_prefix=path_prefix)
+    return jsonify({
+        "data": entries,
+        "sampled_requests": sampled,
+        "buffer_size": Tracing.BUFFER_SIZE,
+    }), 200
+
+# GET /debug/compression - compression ratios and the compressed-variant cache
+@debug_bp.route('/debug/compression', methods=['GET'])
+def compression_stats():
+    return jsonify(Compression.status()), 200
+
+# GET /debug/health - state of the model and every background subsystem in this worker
+@debug_bp.route('/debug/health', methods=['GET'])
+def health_details():
+    return jsonify({
+        "serves_prediction": ModelConfig.SERVES_PREDICTION,
+        "model": prediction_model.status(),
+        "session_timer": session_timer.status(),
+        "db_replicas": replicas.status(),
+        "rate_limit": RateLimit.status(),
+        "images": image_pipeline.status(),
+        "storage": storage.status(),
+        "recommender": recommender.status(),
+        "plays": play_counter.status(),
+        "media_cache": media_cache.status(),
+        "moderation": moderation.status(),
+        "notifications": notifier.status(),
+    }), 200
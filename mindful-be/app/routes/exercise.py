@@ -1,16 +1,30 @@
 # myapp/exercise.py
-from flask import Blueprint, request, jsonify, send_from_directory, abort, current_app
-from werkzeug.utils import secure_filename
+from flask import Blueprint, request, jsonify, abort
+from werkzeug.exceptions import HTTPException
 from app.config.db import DBConnection
-import uuid
+from app.config.tracing import Tracing
+from app.config.rate_limit import RateLimit
+from app.services.images import image_pipeline
+from app.services.storage import storage, StorageFull
+from app.services.recommender import recommender
+from app.services.plays import play_counter, counts_as_play, PlayConfig
+from app.services.media_cache import media_cache
 import os
 from datetime import datetime
 import json
 
-UPLOAD_FOLDER = os.path.normpath('uploads/exercises')
-
 exercise_bp = Blueprint('exercise', __name__)
 
+@exercise_bp.after_request
+def refresh_recommendations(response):
+    # Other workers notice the change through catalog_version within RECOMMENDER_POLL_SECONDS,
+    # and re-check their cached files within MEDIA_CACHE_META_TTL
+    if request.method not in ('GET', 'HEAD') and response.status_code < 400:
+        recommender.invalidate()
+        if request.view_args and 'exercise_id' in request.view_args:
+            media_cache.invalidate('exercise', request.view_args['exercise_id'])
+    return response
+
 def row_to_dict(row):
     if not row:
         return None
@@ -19,14 +33,24 @@ def row_to_dict(row):
         data['steps'] = []
     if 'id' in data:
         data['video_url'] = f'http://localhost:5000/api/exercises/serve/{data["id"]}'
+    if 'poster_hash' in data:
+        data['poster_urls'] = image_pipeline.urls(data['poster_hash'])
     return data
 
+
+def store_poster():
+    """Hash of the optional "poster" upload, or None; ValueError if it is not a valid image"""
+    poster = request.files.get('poster')
+    if not poster or not poster.filename:
+        return None
+    return image_pipeline.store(poster)
+
 @exercise_bp.route('/exercises', methods=['GET'])
 def get_exercises():
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
             cursor.execute("""
-                SELECT id, title, category, duration, description, steps, video_path, created_at, updated_at
+                SELECT id, title, category, duration, description, steps, video_path, poster_hash, created_at, updated_at
                 FROM exercise ORDER BY created_at DESC
             """)
             results = cursor.fetchall()
@@ -34,7 +58,28 @@ def get_exercises():
     except Exception as e:
         return jsonify({"message": "Failed to fetch exercises", "error": str(e)}), 500
 
+# GET /exercises/popular - most played exercises from the hourly play counts
+#   ?hours=<n> (default PLAYS_POPULAR_HOURS), ?limit=<n> (default PLAYS_POPULAR_LIMIT, max 100)
+@exercise_bp.route('/exercises/popular', methods=['GET'])
+def popular_exercises():
+    hours = request.args.get('hours', default=PlayConfig.POPULAR_HOURS, type=int)
+    limit = request.args.get('limit', default=PlayConfig.POPULAR_LIMIT, type=int)
+    if not 0 < hours <= PlayConfig.RETENTION_DAYS * 24 or not 0 < limit <= 100:
+        return jsonify({"message": f"hours must be 1-{PlayConfig.RETENTION_DAYS * 24} and limit 1-100"}), 400
+    try:
+        ranked = play_counter.popular('exercise', hours, limit)
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
+            cursor.execute("SELECT id, title, category, duration, description, steps, video_path, poster_hash, created_at, updated_at FROM exercise WHERE id = ANY(%s)",
+                           ([item_id for item_id, _ in ranked],))
+            rows = {row['id']: row for row in cursor.fetchall()}
+        data = [dict(row_to_dict(rows[item_id]), plays=plays) for item_id, plays in ranked if item_id in rows]
+        return jsonify({"data": data, "hours": hours}), 200
+    except Exception as e:
+        print(f"GET /api/exercises/popular error: {e}")
+        return jsonify({"message": "Failed to fetch popular exercises", "error": str(e)}), 500
+
 @exercise_bp.route('/exercises', methods=['POST'])
+@RateLimit.limit('upload')
 def upload_exercise():
     if 'video' not in request.files:
         return jsonify({"message": "No video uploaded"}), 400
@@ -50,27 +95,28 @@ def upload_exercise():
 
     if not all([title, category, duration, description]):
         return jsonify({"message": "Missing required fields"}), 400
+    try:
+        poster_hash = store_poster()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-    safe_name = secure_filename(video.filename)
-    unique_name = f"{uuid.uuid4().hex}_{safe_name}"
-    video_path = os.path.normpath(os.path.join(UPLOAD_FOLDER, unique_name))
-
+    video_path = None
     try:
-        if not os.path.exists(UPLOAD_FOLDER):
-            os.makedirs(UPLOAD_FOLDER)
-        video.save(video_path)
+        with Tracing.phase('file_io', operation='save'):
+            video_path = storage.save_upload('exercises', video)
 
         with DBConnection.get_cursor(dictionary=True) as cursor:
             cursor.execute("""
-                INSERT INTO exercise (title, category, duration, description, steps, video_path)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id, title, category, duration, description, steps, video_path, created_at, updated_at
-            """, (title, category, duration, description, steps, video_path))
+                INSERT INTO exercise (title, category, duration, description, steps, video_path, poster_hash)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                RETURNING id, title, category, duration, description, steps, video_path, poster_hash, created_at, updated_at
+            """, (title, category, duration, description, steps, video_path, poster_hash))
             new_row = cursor.fetchone()
             return jsonify({"message": "Exercise uploaded", "data": row_to_dict(new_row)}), 201
+    except StorageFull as e:
+        return jsonify({"message": str(e)}), 507
     except Exception as e:
-        if os.path.exists(video_path):
-            os.remove(video_path)
+        storage.delete(video_path)
         return jsonify({"message": "Upload failed", "error": str(e)}), 500
 
 @exercise_bp.route('/exercises/<int:exercise_id>', methods=['DELETE'])
@@ -86,28 +132,35 @@ def delete_exercise(exercise_id):
             cursor.execute("DELETE FROM exercise WHERE id = %s RETURNING id", (exercise_id,))
             deleted = cursor.fetchone()
 
-            if video_path and os.path.exists(video_path):
-                os.remove(video_path)
-
-            return jsonify({"message": "Deleted", "data": {"id": deleted['id']}}), 200
+        storage.delete(video_path)
+        return jsonify({"message": "Deleted", "data": {"id": deleted['id']}}), 200
     except Exception as e:
         return jsonify({"message": "Delete failed", "error": str(e)}), 500
 
 @exercise_bp.route('/exercises/serve/<int:exercise_id>', methods=['GET'])
 def serve_video(exercise_id):
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT video_path FROM exercise WHERE id = %s", (exercise_id,))
-            result = cursor.fetchone()
-            if not result:
-                abort(404, description="Exercise not found")
-            full_path = result['video_path']
-            filename = os.path.basename(full_path)
-
-        abs_dir = os.path.dirname(os.path.join(current_app.root_path, '..', full_path))
-        return send_from_directory(abs_dir, filename)
+        # A cache hit skips the row lookup and the file system entirely
+        entry = media_cache.get('exercise', exercise_id)
+        if entry is None:
+            with DBConnection.get_cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT video_path FROM exercise WHERE id = %s", (exercise_id,))
+                result = cursor.fetchone()
+                if not result:
+                    abort(404, description="Exercise not found")
+                video_path = result['video_path']
+            entry = media_cache.load('exercise', exercise_id, video_path)
+
+        with Tracing.phase('file_io', operation='send'):
+            response = media_cache.send(entry) if entry else storage.send(video_path)
+        if counts_as_play(request, response.status_code):
+            play_counter.record('exercise', exercise_id)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         abort(500, description=str(e))
+
 @exercise_bp.route('/exercises/<int:exercise_id>', methods=['PUT'])
 def update_exercise(exercise_id):
     video = request.files.get('video')
@@ -120,7 +173,12 @@ def update_exercise(exercise_id):
 
     if not all([title, category, duration, description]):
         return jsonify({"message": "Missing required fields"}), 400
+    try:
+        poster_hash = store_poster()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
+    new_video_path = None
     try:
         with DBConnection.get_cursor(dictionary=True) as cursor:
             # Fetch current video_path to delete old video if replaced
@@ -129,33 +187,30 @@ def update_exercise(exercise_id):
             if not existing:
                 return jsonify({"message": "Exercise not found"}), 404
 
-            video_path = existing['video_path']
+            video_path = old_video_path = existing['video_path']
 
-            # If new video uploaded, save and delete old
+            # If new video uploaded, save it; the old one goes once the update has committed
             if video and video.filename != '':
-                safe_name = secure_filename(video.filename)
-                unique_name = f"{uuid.uuid4().hex}_{safe_name}"
-                new_video_path = os.path.normpath(os.path.join(UPLOAD_FOLDER, unique_name))
-
-                if not os.path.exists(UPLOAD_FOLDER):
-                    os.makedirs(UPLOAD_FOLDER)
-                video.save(new_video_path)
-
-                # Delete old video file
-                if video_path and os.path.exists(video_path):
-                    os.remove(video_path)
-
+                with Tracing.phase('file_io', operation='save'):
+                    new_video_path = storage.save_upload('exercises', video)
                 video_path = new_video_path
 
             # Update exercise record
             cursor.execute("""
-                UPDATE exercise SET title=%s, category=%s, duration=%s, description=%s, steps=%s, video_path=%s, updated_at=NOW()
+                UPDATE exercise SET title=%s, category=%s, duration=%s, description=%s, steps=%s, video_path=%s,
+                    poster_hash=COALESCE(%s, poster_hash), updated_at=NOW()
                 WHERE id=%s
-                RETURNING id, title, category, duration, description, steps, video_path, created_at, updated_at
-            """, (title, category, duration, description, steps, video_path, exercise_id))
+                RETURNING id, title, category, duration, description, steps, video_path, poster_hash, created_at, updated_at
+            """, (title, category, duration, description, steps, video_path, poster_hash, exercise_id))
 
             updated_row = cursor.fetchone()
-            return jsonify({"message": "Exercise updated", "data": row_to_dict(updated_row)}), 200
 
+        if new_video_path:
+            storage.delete(old_video_path)
+        return jsonify({"message": "Exercise updated", "data": row_to_dict(updated_row)}), 200
+
+    except StorageFull as e:
+        return jsonify({"message": str(e)}), 507
     except Exception as e:
+        storage.delete(new_video_path)
         return jsonify({"message": "Update failed", "error": str(e)}), 500
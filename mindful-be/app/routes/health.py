@@ -0,0 +1,21 @@
+from flask import Blueprint, jsonify
+from app.services.model_loader import prediction_model, ModelConfig
+
+health_bp = Blueprint('health', __name__)
+
+# GET /health/live - the process is up and serving requests
+@health_bp.route('/health/live', methods=['GET'])
+def liveness():
+    return jsonify({"status": "ok"}), 200
+
+# GET /health/ready - flips to 200 once the prediction model has loaded, or at once in
+# workers that do not serve predictions (SERVES_PREDICTION=0)
+# Subsystem details are on GET /debug/health
+@health_bp.route('/health/ready', methods=['GET'])
+def readiness():
+    model_ready = prediction_model.is_ready()
+    ready = model_ready or not ModelConfig.SERVES_PREDICTION
+    return jsonify({
+        "status": "ready" if ready else "not_ready",
+        "model_ready": model_ready,
+    }), 200 if ready else 503
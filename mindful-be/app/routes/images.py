@@ -0,0 +1,46 @@
+from flask import Blueprint, jsonify, send_file
+from app.config.tracing import Tracing
+from app.config.rate_limit import RateLimit
+from app.services.images import image_pipeline, ImageConfig, FORMATS
+
+images_bp = Blueprint('images', __name__)
+
+def send_image(path, fmt, rendered):
+    response = send_file(path, mimetype=FORMATS[fmt][1], max_age=ImageConfig.MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers['X-Image-Rendered'] = '1' if rendered else '0'
+    return response
+
+# GET /images/<sha256>/<width>.<webp|jpg> - cover art / poster thumbnails and on-demand sizes
+# The URL is content-addressed, so the response never changes and is cached for a year
+@images_bp.route('/images/<digest>/<int:width>.<fmt>', methods=['GET'])
+def serve_image(digest, width, fmt):
+    try:
+        image_pipeline.check_width(width)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    try:
+        path = image_pipeline.rendered(digest, width, fmt)
+    except LookupError:
+        return jsonify({"message": "Image not found"}), 404
+    if path:
+        return send_image(path, fmt, False)
+    # Only a miss renders, so only a miss spends from the client's bucket
+    return render_image(digest, width, fmt)
+
+@RateLimit.limit('image-render')
+def render_image(digest, width, fmt):
+    try:
+        with Tracing.phase('file_io', operation='image'):
+            path, rendered = image_pipeline.resolve(digest, width, fmt)
+    except LookupError:
+        return jsonify({"message": "Image not found"}), 404
+    except TimeoutError:
+        response = jsonify({"message": "Image is still being rendered"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except Exception as e:
+        print(f"GET /api/images/{digest}/{width}.{fmt} error: {e}")
+        return jsonify({"message": "Failed to render image", "error": str(e)}), 500
+    return send_image(path, fmt, rendered)
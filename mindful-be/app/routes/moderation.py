@@ -0,0 +1,68 @@
+from flask import Blueprint, request, jsonify
+from app.config.JWTConfig import JWTConfig
+from app.routes.chat import is_expert
+from app.services.moderation import moderation, REVIEW_STATUSES
+
+moderation_bp = Blueprint('moderation', __name__)
+
+MAX_LIMIT = 200
+
+def row_to_dict(row):
+    return {
+        "id": row["id"],
+        "item_type": "comment" if row["comment_id"] else "post",
+        "post_id": row["post_id"],
+        "comment_id": row["comment_id"],
+        "author_id": row["author_id"],
+        "author_name": row.get("author_name"),
+        "text": row["text"],
+        "label": row["label"],
+        "terms": row["terms"],
+        "categories": row["categories"],
+        "severity": row["severity"],
+        "status": row["status"],
+        "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+        "reviewed_by": row["reviewed_by"],
+        "reviewed_at": row["reviewed_at"].isoformat() if row["reviewed_at"] else None,
+    }
+
+# GET /moderation/flags - expert review queue
+#   ?status=open (default, crisis first) | approved | rejected | all, ?limit= (default 50)
+@moderation_bp.route('/moderation/flags', methods=['GET'])
+@JWTConfig.token_required
+def list_flags(current_user):
+    if not is_expert(current_user['user_id']):
+        return jsonify({"message": "Unauthorized"}), 403
+
+    status = request.args.get('status', 'open')
+    if status not in ('open', 'all') + REVIEW_STATUSES:
+        return jsonify({"message": "Invalid status"}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_LIMIT)
+
+    try:
+        rows = moderation.flags(status, limit)
+        return jsonify({"flags": [row_to_dict(row) for row in rows]}), 200
+    except Exception as e:
+        print(f"GET /moderation/flags error: {e}")
+        return jsonify({"message": "Failed to fetch moderation flags", "error": str(e)}), 500
+
+# PATCH /moderation/flags/<id> - {"status": "approved" | "rejected"}: publish or keep hiding the item
+@moderation_bp.route('/moderation/flags/<int:flag_id>', methods=['PATCH'])
+@JWTConfig.token_required
+def review_flag(current_user, flag_id):
+    if not is_expert(current_user['user_id']):
+        return jsonify({"message": "Unauthorized"}), 403
+
+    data = request.get_json(silent=True) or {}
+    status = data.get("status")
+    if status not in REVIEW_STATUSES:
+        return jsonify({"message": "Invalid status"}), 400
+
+    try:
+        row = moderation.review(flag_id, current_user['user_id'], status)
+        if not row:
+            return jsonify({"message": "Flag not found"}), 404
+        return jsonify({"message": "Flag reviewed", "data": row_to_dict(row)}), 200
+    except Exception as e:
+        print(f"PATCH /moderation/flags/{flag_id} error: {e}")
+        return jsonify({"message": "Failed to review flag", "error": str(e)}), 500
@@ -1,6 +1,10 @@
+from datetime import datetime
 from flask import Blueprint, request, jsonify
 from app.config.db import DBConnection
 from app.config.JWTConfig import JWTConfig
+from app.config.idempotency import Idempotency
+from app.services.partitions import PartitionConfig, history_since
+from app.services.write_behind import write_behind
 
 moods_bp = Blueprint('moods', __name__)
 
@@ -12,8 +16,13 @@ def row_to_dict(row):
         "created_at": row["created_at"].isoformat() if row["created_at"] else None,
     }
 
+def pending_to_dict(row):
+    """A buffered mood that has not been flushed yet (no id until it is)"""
+    return {"id": None, "mood": row["mood"], "notes": row["notes"], "created_at": row["created_at"], "pending": True}
+
 @moods_bp.route('/moods', methods=['POST'])
 @JWTConfig.token_required
+@Idempotency.idempotent
 def log_mood(current_user):
     data = request.get_json()
     if not data:
@@ -25,6 +34,18 @@ def log_mood(current_user):
     if not mood:
         return jsonify({"message": "Mood is required"}), 400
 
+    if write_behind.enabled('moods'):
+        try:
+            row = write_behind.enqueue('moods', {
+                'user_id': current_user['user_id'], 'mood': mood, 'notes': notes,
+                'created_at': datetime.utcnow(),
+            })
+            response = jsonify({"message": "Mood logged", "data": pending_to_dict(row)})
+            return write_behind.mark(response), 202
+        except Exception as e:
+            print(f"POST /api/moods error: {e}")
+            return jsonify({"message": "Failed to log mood", "error": str(e)}), 500
+
     try:
         with DBConnection.get_cursor(dictionary=True) as cursor:
             cursor.execute(
@@ -45,19 +66,33 @@ def log_mood(current_user):
 @JWTConfig.token_required
 def get_moods(current_user):
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
+        since = history_since(request.args.get('days'), PartitionConfig.MOODS_HISTORY_DAYS)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        # Read buffered moods before the table so a flush in between cannot hide them
+        pending = write_behind.pending('moods', current_user['user_id'],
+                                       shared=write_behind.COOKIE_NAME in request.cookies)
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
             cursor.execute(
                 """
                 SELECT id, mood, notes, created_at
                 FROM moods
-                WHERE user_id = %s
+                WHERE user_id = %s AND created_at >= %s
                 ORDER BY created_at DESC
                 """,
-                (current_user['user_id'],)
+                (current_user['user_id'], since)
             )
             rows = cursor.fetchall()
             moods = [row_to_dict(row) for row in rows]
-            return jsonify(moods), 200
+        if pending:
+            stored = {(m["created_at"], m["mood"]) for m in moods}
+            moods = [pending_to_dict(row) for row in pending
+                     if (row["created_at"], row["mood"]) not in stored
+                     and row["created_at"] >= since.isoformat()] + moods
+            moods.sort(key=lambda m: m["created_at"] or '', reverse=True)
+        return jsonify(moods), 200
     except Exception as e:
         print(f"GET /api/moods error: {e}")
         return jsonify({"message": "Failed to fetch mood history", "error": str(e)}), 500
@@ -1,15 +1,29 @@
 # myapp/music.py
-from flask import Blueprint, request, jsonify, send_from_directory, abort, current_app
+from flask import Blueprint, request, jsonify, abort
 from datetime import datetime
-import uuid
 import os
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
 from app.config.db import DBConnection
-
-UPLOAD_FOLDER = os.path.normpath('uploads/music')
+from app.config.tracing import Tracing
+from app.config.rate_limit import RateLimit
+from app.services.images import image_pipeline
+from app.services.storage import storage, StorageFull
+from app.services.recommender import recommender
+from app.services.plays import play_counter, counts_as_play, PlayConfig
+from app.services.media_cache import media_cache
 
 music_bp = Blueprint('music', __name__)
 
+@music_bp.after_request
+def refresh_recommendations(response):
+    # Other workers notice the change through catalog_version within RECOMMENDER_POLL_SECONDS,
+    # and re-check their cached files within MEDIA_CACHE_META_TTL
+    if request.method not in ('GET', 'HEAD') and response.status_code < 400:
+        recommender.invalidate()
+        if request.view_args and 'music_id' in request.view_args:
+            media_cache.invalidate('music', request.view_args['music_id'])
+    return response
+
 def row_to_dict(row):
     if not row:
         return None
@@ -20,13 +34,15 @@ def row_to_dict(row):
         data['file_url'] = f'http://localhost:5000/api/music/serve/{data["id"]}'
     if 'file_path' in data:
         data['filename'] = os.path.basename(data['file_path'])
+    if 'cover_hash' in data:
+        data['cover_urls'] = image_pipeline.urls(data['cover_hash'])
     return data
 
 @music_bp.route('/music', methods=['GET'])
 def get_music():
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT id, music_name, author, category, file_path, tags, created_at, updated_at FROM music ORDER BY created_at DESC")
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
+            cursor.execute("SELECT id, music_name, author, category, file_path, tags, cover_hash, created_at, updated_at FROM music ORDER BY created_at DESC")
             music_records = cursor.fetchall()
             music_list = [row_to_dict(record) for record in music_records]
             return jsonify({"data": music_list, "message": "Music list retrieved successfully"}), 200
@@ -34,7 +50,28 @@ def get_music():
         print(f"GET /api/music error: {e}")
         return jsonify({"message": "Failed to retrieve music list", "error": str(e)}), 500
 
+# GET /music/popular - most played music from the hourly play counts
+#   ?hours=<n> (default PLAYS_POPULAR_HOURS), ?limit=<n> (default PLAYS_POPULAR_LIMIT, max 100)
+@music_bp.route('/music/popular', methods=['GET'])
+def popular_music():
+    hours = request.args.get('hours', default=PlayConfig.POPULAR_HOURS, type=int)
+    limit = request.args.get('limit', default=PlayConfig.POPULAR_LIMIT, type=int)
+    if not 0 < hours <= PlayConfig.RETENTION_DAYS * 24 or not 0 < limit <= 100:
+        return jsonify({"message": f"hours must be 1-{PlayConfig.RETENTION_DAYS * 24} and limit 1-100"}), 400
+    try:
+        ranked = play_counter.popular('music', hours, limit)
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
+            cursor.execute("SELECT id, music_name, author, category, file_path, tags, cover_hash, created_at, updated_at FROM music WHERE id = ANY(%s)",
+                           ([item_id for item_id, _ in ranked],))
+            rows = {row['id']: row for row in cursor.fetchall()}
+        data = [dict(row_to_dict(rows[item_id]), plays=plays) for item_id, plays in ranked if item_id in rows]
+        return jsonify({"data": data, "hours": hours}), 200
+    except Exception as e:
+        print(f"GET /api/music/popular error: {e}")
+        return jsonify({"message": "Failed to fetch popular music", "error": str(e)}), 500
+
 @music_bp.route('/music', methods=['POST'])
+@RateLimit.limit('upload')
 def upload_music():
     if 'file' not in request.files:
         return jsonify({"message": "No file part in the request"}), 400
@@ -51,29 +88,34 @@ def upload_music():
     if not all([music_name, author, category, file]):
         return jsonify({"message": "Missing required fields"}), 400
 
-    secured_filename = secure_filename(file.filename)
-    unique_filename = f"{uuid.uuid4().hex}_{secured_filename}"
-    file_path = os.path.normpath(os.path.join(UPLOAD_FOLDER, unique_filename))
+    # Optional cover art, checked before the audio is written
+    cover_hash = None
+    if request.files.get('cover') and request.files['cover'].filename:
+        try:
+            cover_hash = image_pipeline.store(request.files['cover'])
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
 
+    file_path = None
     try:
-        if not os.path.exists(UPLOAD_FOLDER):
-            os.makedirs(UPLOAD_FOLDER)
-        file.save(file_path)
+        with Tracing.phase('file_io', operation='save'):
+            file_path = storage.save_upload('music', file)
 
         with DBConnection.get_cursor(dictionary=True) as cursor:
             cursor.execute(
                 """
-                INSERT INTO music (music_name, author, category, file_path, tags)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id, music_name, author, category, file_path, tags, created_at, updated_at
+                INSERT INTO music (music_name, author, category, file_path, tags, cover_hash)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING id, music_name, author, category, file_path, tags, cover_hash, created_at, updated_at
                 """,
-                (music_name, author, category, file_path, tags)
+                (music_name, author, category, file_path, tags, cover_hash)
             )
             new_music_record = cursor.fetchone()
             return jsonify({"message": "Music uploaded successfully", "data": row_to_dict(new_music_record)}), 201
+    except StorageFull as e:
+        return jsonify({"message": str(e)}), 507
     except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        storage.delete(file_path)
         print(f"POST /api/music error: {e}")
         return jsonify({"message": "Failed to upload music", "error": str(e)}), 500
 
@@ -104,7 +146,7 @@ def update_music(music_id):
 
     try:
         with DBConnection.get_cursor(dictionary=True) as cursor:
-            query = f"UPDATE music SET {', '.join(set_clauses)} WHERE id = %s RETURNING id, music_name, author, category, file_path, tags, created_at, updated_at"
+            query = f"UPDATE music SET {', '.join(set_clauses)} WHERE id = %s RETURNING id, music_name, author, category, file_path, tags, cover_hash, created_at, updated_at"
             cursor.execute(query, tuple(values))
             updated_music_record = cursor.fetchone()
             if updated_music_record:
@@ -114,6 +156,30 @@ def update_music(music_id):
         print(f"PUT /api/music/{music_id} error: {e}")
         return jsonify({"message": "Failed to update music", "error": str(e)}), 500
 
+# PUT /music/<id>/cover - multipart "cover" image; replaces the track's cover art
+@music_bp.route('/music/<int:music_id>/cover', methods=['PUT'])
+@RateLimit.limit('upload')
+def update_music_cover(music_id):
+    if not request.files.get('cover') or not request.files['cover'].filename:
+        return jsonify({"message": "No cover image uploaded"}), 400
+    try:
+        cover_hash = image_pipeline.store(request.files['cover'])
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    try:
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                UPDATE music SET cover_hash = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s
+                RETURNING id, music_name, author, category, file_path, tags, cover_hash, created_at, updated_at
+            """, (cover_hash, music_id))
+            updated = cursor.fetchone()
+        if not updated:
+            return jsonify({"message": "Music not found"}), 404
+        return jsonify({"message": "Cover updated", "data": row_to_dict(updated)}), 200
+    except Exception as e:
+        print(f"PUT /api/music/{music_id}/cover error: {e}")
+        return jsonify({"message": "Failed to update cover", "error": str(e)}), 500
+
 @music_bp.route('/music/<int:music_id>', methods=['DELETE'])
 def delete_music(music_id):
     try:
@@ -127,11 +193,11 @@ def delete_music(music_id):
         with DBConnection.get_cursor(dictionary=True) as cursor:
             cursor.execute("DELETE FROM music WHERE id = %s RETURNING id", (music_id,))
             deleted = cursor.fetchone()
-            if deleted:
-                if file_path and os.path.exists(file_path):
-                    os.remove(file_path)
-                return jsonify({"message": "Music deleted successfully", "data": {"id": deleted['id']}}), 200
-            return jsonify({"message": "Music not found"}), 404
+        if deleted:
+            # Only once the delete has committed; a file left by a failure here is collected by `storage gc`
+            storage.delete(file_path)
+            return jsonify({"message": "Music deleted successfully", "data": {"id": deleted['id']}}), 200
+        return jsonify({"message": "Music not found"}), 404
     except Exception as e:
         print(f"DELETE /api/music/{music_id} error: {e}")
         return jsonify({"message": "Failed to delete music", "error": str(e)}), 500
@@ -139,22 +205,24 @@ def delete_music(music_id):
 @music_bp.route('/music/serve/<int:music_id>')
 def serve_music_file(music_id):
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT file_path FROM music WHERE id = %s", (music_id,))
-            result = cursor.fetchone()
-            if not result:
-                abort(404, description="Music not found")
-            file_path = result['file_path']
-
-        filename = os.path.basename(file_path)
-        project_root = os.path.normpath(os.path.join(current_app.root_path, '..'))
-        absolute_dir = os.path.normpath(os.path.join(project_root, UPLOAD_FOLDER))
-        full_path = os.path.join(absolute_dir, filename)
-
-        if not os.path.exists(full_path):
-            abort(404, description="File not found")
-
-        return send_from_directory(absolute_dir, filename)
+        # A cache hit skips the row lookup and the file system entirely
+        entry = media_cache.get('music', music_id)
+        if entry is None:
+            with DBConnection.get_cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT file_path FROM music WHERE id = %s", (music_id,))
+                result = cursor.fetchone()
+                if not result:
+                    abort(404, description="Music not found")
+                file_path = result['file_path']
+            entry = media_cache.load('music', music_id, file_path)
+
+        with Tracing.phase('file_io', operation='send'):
+            response = media_cache.send(entry) if entry else storage.send(file_path)
+        if counts_as_play(request, response.status_code):
+            play_counter.record('music', music_id)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"GET /api/music/serve/{music_id} error: {e}")
         abort(500, description=str(e))
@@ -0,0 +1,51 @@
+from flask import Blueprint, request, jsonify
+from app.config.JWTConfig import JWTConfig
+from app.services.notifications import notifier
+
+notifications_bp = Blueprint('notifications', __name__)
+
+# GET /notifications - the caller's notifications, most recently updated first
+#   ?unread=1 for unread ones only, ?after=<next_cursor>, ?limit=
+# New and updated notifications also arrive as 'notification' events on GET /messages/stream
+@notifications_bp.route('/notifications', methods=['GET'])
+@JWTConfig.token_required
+def list_notifications(current_user):
+    try:
+        notifications, next_cursor = notifier.page(current_user['user_id'], request.args.get('unread') == '1',
+                                                   request.args.get('after'), request.args.get('limit', type=int))
+        return jsonify({"notifications": notifications, "next_cursor": next_cursor,
+                        "unread": notifier.unread(current_user['user_id'])}), 200
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    except Exception as e:
+        print(f"GET /notifications error: {e}")
+        return jsonify({"message": "Failed to fetch notifications", "error": str(e)}), 500
+
+# GET /notifications/unread-count - badge count
+@notifications_bp.route('/notifications/unread-count', methods=['GET'])
+@JWTConfig.token_required
+def unread_count(current_user):
+    try:
+        return jsonify({"unread": notifier.unread(current_user['user_id'])}), 200
+    except Exception as e:
+        print(f"GET /notifications/unread-count error: {e}")
+        return jsonify({"message": "Failed to fetch unread count", "error": str(e)}), 500
+
+# POST /notifications/read - {"ids": [...]} marks those read, no ids marks everything read
+@notifications_bp.route('/notifications/read', methods=['POST'])
+@JWTConfig.token_required
+def mark_read(current_user):
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if ids is not None:
+        try:
+            ids = [int(i) for i in ids]
+        except (TypeError, ValueError):
+            return jsonify({"message": "ids must be a list of notification ids"}), 400
+
+    try:
+        unread = notifier.mark_read(current_user['user_id'], ids)
+        return jsonify({"message": "Notifications marked read", "unread": unread}), 200
+    except Exception as e:
+        print(f"POST /notifications/read error: {e}")
+        return jsonify({"message": "Failed to mark notifications read", "error": str(e)}), 500
@@ -2,6 +2,10 @@ from flask import Blueprint, request, jsonify, abort
 from datetime import datetime
 from app.config.db import DBConnection
 from app.config.JWTConfig import JWTConfig  # for @token_required decorator
+from app.config.idempotency import Idempotency
+from app.services.write_behind import write_behind
+from app.services.moderation import moderation, viewer_id, visibility
+from app.services.notifications import notifier
 
 posts_bp = Blueprint('posts', __name__)
 
@@ -13,17 +17,28 @@ def row_to_dict(row):
 @posts_bp.route('/posts', methods=['GET'])
 def get_posts():
     try:
-        with DBConnection.get_cursor(dictionary=True) as cursor:
-            cursor.execute("""
+        # Upvotes still in the write-behind buffer, counted in before they reach post_upvotes
+        pending = write_behind.pending('post_upvotes', None, shared=write_behind.COOKIE_NAME in request.cookies)
+        # Held and rejected posts are only listed for their author and the experts
+        visible, params = visibility('p', viewer_id(request))
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
+            cursor.execute(f"""
                 SELECT 
                     p.*, 
                     u.name AS author_name,
                     (SELECT COUNT(*) FROM post_upvotes u2 WHERE u2.post_id = p.id) AS upvotes_count
                 FROM posts p
                 JOIN users u ON p.author_id = u.id
+                WHERE {visible}
                 ORDER BY p.timestamp DESC
-            """)
+            """, params)
             posts = cursor.fetchall()
+            if pending:
+                extra = {}
+                for row in pending:
+                    extra[row['post_id']] = extra.get(row['post_id'], 0) + 1
+                for post in posts:
+                    post['upvotes_count'] += extra.get(post['id'], 0)
             return jsonify({"data": posts, "message": "Posts retrieved successfully"}), 200
     except Exception as e:
         print(f"GET /api/posts error: {e}")
@@ -32,6 +47,7 @@ def get_posts():
 
 @posts_bp.route('/posts', methods=['POST'])
 @JWTConfig.token_required
+@Idempotency.idempotent
 def create_post(current_user):
     data = request.get_json()
     title = data.get('title')
@@ -52,7 +68,9 @@ def create_post(current_user):
                 RETURNING *
             """, (title, content, category, author_id, timestamp))
             new_post = cursor.fetchone()
-            return jsonify({"message": "Post created successfully", "data": new_post}), 201
+        # Screened on the moderation thread once committed
+        moderation.notify()
+        return jsonify({"message": "Post created successfully", "data": new_post}), 201
     except Exception as e:
         print(f"POST /api/posts error: {e}")
         return jsonify({"message": "Failed to create post", "error": str(e)}), 500
@@ -73,6 +91,8 @@ def update_post(post_id):
         return jsonify({"message": "No fields provided for update"}), 400
 
     set_clauses.append("timestamp = CURRENT_TIMESTAMP")
+    # Edited text is screened again; a rejected post stays rejected
+    set_clauses.append("moderation_status = CASE WHEN moderation_status = 'rejected' THEN 'rejected' ELSE 'unscreened' END")
     values.append(post_id)
 
     try:
@@ -80,9 +100,10 @@ def update_post(post_id):
             query = f"UPDATE posts SET {', '.join(set_clauses)} WHERE id = %s RETURNING *"
             cursor.execute(query, tuple(values))
             updated_post = cursor.fetchone()
-            if updated_post:
-                return jsonify({"message": "Post updated successfully", "data": updated_post}), 200
-            return jsonify({"message": "Post not found"}), 404
+        if updated_post:
+            moderation.notify()
+            return jsonify({"message": "Post updated successfully", "data": updated_post}), 200
+        return jsonify({"message": "Post not found"}), 404
     except Exception as e:
         print(f"PUT /api/posts/{post_id} error: {e}")
         return jsonify({"message": "Failed to update post", "error": str(e)}), 500
@@ -106,6 +127,13 @@ def delete_post(current_user,post_id):
 def upvote_post(current_user, post_id):
     user_id = current_user['user_id']
 
+    if write_behind.enabled('upvotes'):
+        pending = [row for row in write_behind.pending('post_upvotes', user_id) if row['post_id'] == post_id]
+        if pending:
+            # Toggling off an upvote this worker has not written yet: write it now, then remove it below.
+            # An upvote buffered by another worker is not seen here and lands after the removal.
+            write_behind.flush()
+
     try:
         with DBConnection.get_cursor() as cursor:
             # Check if user already upvoted
@@ -117,6 +145,12 @@ def upvote_post(current_user, post_id):
                 cursor.execute("DELETE FROM post_upvotes WHERE post_id = %s AND user_id = %s", (post_id, user_id))
                 cursor.execute("UPDATE posts SET upvotes_count = upvotes_count - 1 WHERE id = %s", (post_id,))
                 return jsonify({"message": "Upvote removed"}), 200
+            elif write_behind.enabled('upvotes'):
+                # Buffered; posts.upvotes_count is bumped when the batch is written
+                write_behind.enqueue('post_upvotes', {'post_id': post_id, 'user_id': user_id,
+                                                      'timestamp': datetime.utcnow()})
+                notifier.emit('upvote', post_id, user_id)
+                return write_behind.mark(jsonify({"message": "Post upvoted successfully"})), 200
             else:
                 # Add the upvote
                 cursor.execute(
@@ -124,7 +158,9 @@ def upvote_post(current_user, post_id):
                     (post_id, user_id)
                 )
                 cursor.execute("UPDATE posts SET upvotes_count = upvotes_count + 1 WHERE id = %s", (post_id,))
-                return jsonify({"message": "Post upvoted successfully"}), 200
+        # Committed; the post's author is notified from the fan-out thread
+        notifier.emit('upvote', post_id, user_id)
+        return jsonify({"message": "Post upvoted successfully"}), 200
 
     except Exception as e:
         print(f"POST /api/posts/{post_id}/upvote error: {e}")
@@ -1,19 +1,18 @@
 from flask import Blueprint, request, jsonify
 from app.config.JWTConfig import JWTConfig
-import joblib
+from app.config.tracing import Tracing
+from app.config.rate_limit import RateLimit
+from app.routes.chat import is_expert
+from app.services.model_loader import prediction_model, ModelConfig, LABELS
+from app.services.model_registry import model_registry, shadow_model, RegistryConfig
+from app.services.partitions import history_since
+from app.services.recommender import recommender, RecommenderConfig
 import datetime
 
 prediction_bp = Blueprint('prediction', __name__)
 
-# Load the pre-trained pipeline (vectorizer + SVC)
-try:
-    model = joblib.load('app/ml_model/svc_model.joblib')  # Your pipeline
-    class_labels = ['Anxiety', 'Bipolar', 'Depression',
-                    'Normal', 'Personality disorder',
-                    'Stress', 'Suicidal']
-except Exception as e:
-    print(f"Error loading model: {str(e)}")
-    model = None
+# The pre-trained pipeline (vectorizer + SVC) is loaded off the import path,
+# see app/services/model_loader.py; app/services/model_registry.py swaps versions
 
 # Define base messages
 prediction_messages = {
@@ -80,24 +79,60 @@ standard_buttons = [
 ]
 
 category_buttons_mapping = {
-    label: standard_buttons for label in class_labels
+    label: standard_buttons for label in LABELS
 }
 
+# POST /predict - {"text": ..., "mode": "auto" (default) | "whole" | "sentences" | "windows"}
 @prediction_bp.route('/predict', methods=['POST'])
 @JWTConfig.token_required
+@RateLimit.limit('predict')
 def predict_mental_health(current_user):
+    # numpy/pandas-backed; imported on first use to keep them off the startup path
+    from app.services.prediction_history import PredictionStore
+    from app.services.segmentation import SegmentConfig, predict_segments, resolve_mode
+
+    # Refuse oversized bodies before reading them (chunked bodies are cut off at the same size)
+    if request.content_length is not None and request.content_length > SegmentConfig.MAX_BYTES:
+        return jsonify({'error': f'Text is too long (max {SegmentConfig.MAX_BYTES} bytes)'}), 413
+    request.max_content_length = SegmentConfig.MAX_BYTES
+
+    model = prediction_model.get(timeout=ModelConfig.PREDICT_WAIT_SECONDS)
     if not model:
-        return jsonify({'error': 'Model not loaded'}), 503
+        response = jsonify({'error': 'Model not loaded', 'model_state': prediction_model.state})
+        if prediction_model.state == 'loading':
+            response.headers['Retry-After'] = '5'
+        return response, 503
 
     data = request.get_json()
     input_text = data.get('text')
 
-    if not input_text or not isinstance(input_text, str):
+    if not input_text or not isinstance(input_text, str) or not input_text.strip():
         return jsonify({'error': 'Valid text input is required'}), 400
+    try:
+        mode = resolve_mode(data.get('mode'), input_text)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if mode == 'whole' and len(input_text) > SegmentConfig.WHOLE_MAX_CHARS:
+        return jsonify({'error': f'Text is too long for whole mode (max {SegmentConfig.WHOLE_MAX_CHARS} '
+                                 f'characters); use mode "sentences" or "windows"'}), 413
 
     try:
-        response_label = model.predict([input_text])
-        predicted_label = response_label[0] if response_label else 'Unknown'
+        segmented = None
+        with Tracing.phase('inference'):
+            if mode == 'whole':
+                predicted_label, scores, inference_ms = PredictionStore.predict(model, prediction_model.version,
+                                                                                input_text)
+                cached = inference_ms is None
+                shadow_model.offer(input_text, predicted_label, inference_ms)
+            else:
+                segmented = predict_segments(model, input_text, mode)
+                predicted_label, scores, cached = segmented.pop('verdict'), segmented.pop('scores'), False
+        try:
+            PredictionStore.record(current_user['user_id'], input_text, predicted_label, scores,
+                                   prediction_model.version)
+        except Exception as e:
+            # History is best effort; the user still gets their prediction
+            print(f"POST /predict history error: {e}")
 
         # Base message
         base_message = prediction_messages.get(predicted_label, 'We processed your text, but could not provide a specific mental health assessment. Please consult a professional.')
@@ -120,11 +155,112 @@ def predict_mental_health(current_user):
 
         buttons_to_send = category_buttons_mapping.get(predicted_label, [])
 
+        recommendations = None
+        if RecommenderConfig.ENABLED:
+            try:
+                recommendations = recommender.recommend(predicted_label, current_user['user_id'])
+            except Exception as e:
+                # Like history, recommendations are best effort
+                print(f"POST /predict recommendations error: {e}")
+
         return jsonify({
             'prediction': predicted_label,
             'message': final_message,
-            'recommendation_buttons': buttons_to_send
+            'recommendation_buttons': buttons_to_send,
+            'recommendations': recommendations,
+            'cached': cached,
+            'mode': mode,
+            'model_version': prediction_model.version,
+            **(segmented or {})
         }), 200
 
     except Exception as e:
         return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+
+# GET /predict/history - the caller's label distribution over time
+#   ?bucket=day | week (default) | month, ?days=<n> | all (default PREDICTION_HISTORY_DAYS)
+@prediction_bp.route('/predict/history', methods=['GET'])
+@JWTConfig.token_required
+def prediction_history(current_user):
+    from app.services.prediction_history import PredictionConfig, PredictionHistory, BUCKETS
+
+    bucket = request.args.get('bucket', 'week')
+    if bucket not in BUCKETS:
+        return jsonify({'message': 'bucket must be one of day, week, month'}), 400
+    try:
+        since = history_since(request.args.get('days'), PredictionConfig.HISTORY_DAYS)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        history = PredictionHistory.load(current_user['user_id'])
+        summary = PredictionHistory.rollup(history, since, bucket)
+        return jsonify(dict(summary, bucket=bucket)), 200
+    except Exception as e:
+        print(f"GET /predict/history error: {e}")
+        return jsonify({'message': 'Failed to fetch prediction history', 'error': str(e)}), 500
+
+# GET /predict/cohort - expert dashboard summary for many users in one call
+#   ?user_ids=1,2,3 (default: everyone with predictions in the window), ?days=<n> | all, ?limit=
+@prediction_bp.route('/predict/cohort', methods=['GET'])
+@JWTConfig.token_required
+def prediction_cohort(current_user):
+    if not is_expert(current_user['user_id']):
+        return jsonify({'message': 'Unauthorized'}), 403
+    from app.services.prediction_history import PredictionConfig, PredictionHistory
+
+    try:
+        since = history_since(request.args.get('days'), PredictionConfig.COHORT_DAYS)
+        user_ids = [int(u) for u in request.args.get('user_ids', '').split(',') if u.strip()]
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        labels, users = PredictionHistory.cohort(since, user_ids or None, request.args.get('limit', type=int))
+        return jsonify({'users': users, 'labels': labels, 'since': since.isoformat()}), 200
+    except Exception as e:
+        print(f"GET /predict/cohort error: {e}")
+        return jsonify({'message': 'Failed to build cohort summary', 'error': str(e)}), 500
+
+
+def is_model_admin(user_id):
+    if RegistryConfig.ADMIN_USER_IDS:
+        return int(user_id) in RegistryConfig.ADMIN_USER_IDS
+    return is_expert(user_id)
+
+# GET /models - active model, available versions and shadow agreement/latency stats
+@prediction_bp.route('/models', methods=['GET'])
+@JWTConfig.token_required
+def model_status(current_user):
+    if not is_model_admin(current_user['user_id']):
+        return jsonify({'message': 'Unauthorized'}), 403
+    return jsonify(model_registry.status()), 200
+
+# POST /models/promote - {"version": ...}: load it here, then every worker swaps to it
+@prediction_bp.route('/models/promote', methods=['POST'])
+@JWTConfig.token_required
+def promote_model(current_user):
+    if not is_model_admin(current_user['user_id']):
+        return jsonify({'message': 'Unauthorized'}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        version = model_registry.promote(data.get('version'))
+        return jsonify({'message': 'Model promoted', 'version': version}), 200
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        print(f"POST /models/promote error: {e}")
+        return jsonify({'message': 'Failed to load model', 'error': str(e)}), 500
+
+# PUT /models/shadow - {"version": ..., "sample": 0.1} to shadow a candidate, {"version": null} to stop
+@prediction_bp.route('/models/shadow', methods=['PUT'])
+@JWTConfig.token_required
+def shadow_model_config(current_user):
+    if not is_model_admin(current_user['user_id']):
+        return jsonify({'message': 'Unauthorized'}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        model_registry.set_shadow(data.get('version'), float(data.get('sample', 0.1)))
+        return jsonify({'message': 'Shadow updated', 'shadow': shadow_model.status()}), 200
+    except (TypeError, ValueError) as e:
+        return jsonify({'message': str(e)}), 400
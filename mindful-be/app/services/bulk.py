@@ -0,0 +1,293 @@
+# app/services/bulk.py
+"""
+Bulk import/export for catalogs and community data.
+
+Media files are validated, hashed and copied into media storage by a
+process pool; rows are then loaded with COPY in batches, one transaction per
+batch, so a failed batch only rolls back (and cleans up) its own files.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date
+from app.config.db import DBConnection
+from app.services.storage import storage, new_key
+
+MUSIC_FOLDER = 'music'
+EXERCISE_FOLDER = 'exercises'
+
+# Columns written for each export; sensitive columns (password hashes) are left out
+EXPORT_COLUMNS = {
+    'music': ['id', 'music_name', 'author', 'category', 'file_path', 'tags', 'created_at', 'updated_at'],
+    'exercise': ['id', 'title', 'category', 'duration', 'description', 'steps', 'video_path', 'created_at', 'updated_at'],
+    'posts': ['id', 'title', 'content', 'category', 'author_id', 'timestamp', 'upvotes_count'],
+    'comments': ['id', 'post_id', 'author_id', 'text', 'timestamp'],
+    'post_upvotes': ['id', 'post_id', 'user_id', 'timestamp'],
+    'moods': ['id', 'user_id', 'mood', 'notes', 'created_at'],
+    'messages': ['id', 'sender_id', 'receiver_id', 'timestamp'],
+    'users': ['id', 'name', 'date_of_birth', 'chat_count', 'created_at'],
+}
+
+
+# ─────────────────────────────────────
+# Manifests
+# ─────────────────────────────────────
+def read_manifest(path):
+    """Yield dict rows from a .csv or .jsonl manifest"""
+    if path.endswith('.jsonl') or path.endswith('.ndjson'):
+        with open(path, encoding='utf-8') as fh:
+            for line_no, line in enumerate(fh, 1):
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        raise ValueError(f"{path}:{line_no}: invalid JSON ({e})")
+    else:
+        with open(path, newline='', encoding='utf-8') as fh:
+            yield from csv.DictReader(fh)
+
+
+def as_list(value, separator=','):
+    """Accept a JSON list, a JSON-encoded list or a separated string"""
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return [str(v) for v in value]
+    value = str(value).strip()
+    if value.startswith('['):
+        return [str(v) for v in json.loads(value)]
+    return [part.strip() for part in value.split(separator) if part.strip()]
+
+
+def pg_array(values):
+    """Render a list as a PostgreSQL text[] literal for COPY"""
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"') for v in values)
+    return '{' + ','.join(f'"{v}"' for v in escaped) + '}'
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Load rows with COPY ... FROM STDIN (CSV), returns the row count"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow(['\\N' if v is None else v for v in row])
+        count += 1
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer
+    )
+    return count
+
+
+# ─────────────────────────────────────
+# Media import
+# ─────────────────────────────────────
+def stage_media_file(task):
+    """
+    Process-pool worker: validate, hash and copy one media file into storage.
+    Returns the task with 'file_path' (its storage key) and 'sha256' set, or 'error'.
+    """
+    source, folder = task['source'], task['folder']
+    if not os.path.isfile(source):
+        return {**task, 'error': f"file not found: {source}"}
+    digest = hashlib.sha256()
+    with open(source, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(chunk)
+    key = new_key(folder, os.path.basename(source))
+    try:
+        storage.put_file(key, source)
+    except Exception as e:
+        return {**task, 'error': f"could not store {source}: {e}"}
+    return {**task, 'file_path': key, 'sha256': digest.hexdigest()}
+
+
+def _music_row(entry, staged):
+    for field in ('music_name', 'author', 'category'):
+        if not entry.get(field):
+            raise ValueError(f"missing {field}")
+    return (entry['music_name'], entry['author'], entry['category'],
+            staged['file_path'], pg_array(as_list(entry.get('tags'))))
+
+
+def _exercise_row(entry, staged):
+    for field in ('title', 'category', 'duration', 'description'):
+        if not entry.get(field):
+            raise ValueError(f"missing {field}")
+    return (entry['title'], entry['category'], str(entry['duration']), entry['description'],
+            pg_array(as_list(entry.get('steps'), separator='|')), staged['file_path'])
+
+
+MEDIA_KINDS = {
+    'music': {
+        'table': 'music',
+        'folder': MUSIC_FOLDER,
+        'columns': ['music_name', 'author', 'category', 'file_path', 'tags'],
+        'row': _music_row,
+    },
+    'exercise': {
+        'table': 'exercise',
+        'folder': EXERCISE_FOLDER,
+        'columns': ['title', 'category', 'duration', 'description', 'steps', 'video_path'],
+        'row': _exercise_row,
+    },
+}
+
+
+def import_media(kind, directory, manifest, workers=None, batch_size=1000, skip_duplicates=True, log=print):
+    """
+    Import media rows from a manifest whose 'file' column is relative to `directory`.
+    Returns a summary dict with inserted, skipped and failed counts.
+    """
+    spec = MEDIA_KINDS[kind]
+    summary = {'inserted': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+    seen_hashes = set()
+
+    def tasks():
+        for index, entry in enumerate(read_manifest(manifest)):
+            yield {'index': index, 'entry': entry, 'folder': spec['folder'],
+                   'source': os.path.join(directory, entry.get('file', ''))}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in batched(tasks(), batch_size):
+            rows, staged_paths = [], []
+            for staged in pool.map(stage_media_file, batch, chunksize=32):
+                if 'error' in staged:
+                    summary['failed'] += 1
+                    summary['errors'].append(f"row {staged['index']}: {staged['error']}")
+                    continue
+                staged_paths.append(staged['file_path'])
+                if skip_duplicates and staged['sha256'] in seen_hashes:
+                    summary['skipped'] += 1
+                    storage.delete(staged_paths.pop())
+                    continue
+                try:
+                    rows.append(spec['row'](staged['entry'], staged))
+                    seen_hashes.add(staged['sha256'])
+                except ValueError as e:
+                    summary['failed'] += 1
+                    summary['errors'].append(f"row {staged['index']}: {e}")
+                    storage.delete(staged_paths.pop())
+
+            try:
+                with DBConnection.get_cursor() as cursor:
+                    copy_rows(cursor, spec['table'], spec['columns'], rows)
+                summary['inserted'] += len(rows)
+            except Exception:
+                # Nothing from this batch reached the table, so drop its files too
+                for key in staged_paths:
+                    storage.delete(key)
+                raise
+            log(f"{kind}: {summary['inserted']} inserted, {summary['skipped']} skipped, {summary['failed']} failed")
+
+    return summary
+
+
+# ─────────────────────────────────────
+# Community data import
+# ─────────────────────────────────────
+def import_posts(manifest, batch_size=10000, log=print):
+    """COPY posts from a manifest with title, content, category, author_id and optional timestamp"""
+    columns = ['title', 'content', 'category', 'author_id', 'timestamp']
+    summary = {'inserted': 0, 'failed': 0, 'errors': []}
+    now = datetime.utcnow().isoformat()
+
+    def rows():
+        for index, entry in enumerate(read_manifest(manifest)):
+            if not all(entry.get(f) for f in ('title', 'content', 'category', 'author_id')):
+                summary['failed'] += 1
+                summary['errors'].append(f"row {index}: missing required fields")
+                continue
+            try:
+                author_id = int(entry['author_id'])
+            except (TypeError, ValueError):
+                summary['failed'] += 1
+                summary['errors'].append(f"row {index}: author_id must be an integer")
+                continue
+            yield index, (entry['title'], entry['content'], entry['category'],
+                          author_id, entry.get('timestamp') or now)
+
+    for batch in batched(rows(), batch_size):
+        with DBConnection.get_cursor() as cursor:
+            # An unknown author would fail the foreign key and abort the whole COPY
+            cursor.execute("SELECT id FROM users WHERE id = ANY(%s)",
+                           (list({row[3] for _, row in batch}),))
+            authors = {r[0] for r in cursor.fetchall()}
+            valid = []
+            for index, row in batch:
+                if row[3] in authors:
+                    valid.append(row)
+                else:
+                    summary['failed'] += 1
+                    summary['errors'].append(f"row {index}: unknown author_id {row[3]}")
+            copy_rows(cursor, 'posts', columns, valid)
+        summary['inserted'] += len(valid)
+        log(f"posts: {summary['inserted']} inserted, {summary['failed']} failed")
+    return summary
+
+
+# ─────────────────────────────────────
+# Export
+# ─────────────────────────────────────
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def export_table(table, out_path, fmt='jsonl', batch_size=10000, log=print):
+    """Stream a table to JSONL or Parquet through a server-side cursor"""
+    columns = EXPORT_COLUMNS[table]
+    writer = None
+    exported = 0
+
+    if fmt == 'parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    with DBConnection.get_connection() as conn:
+        with conn.cursor(name=f"export_{table}") as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id")
+            try:
+                if fmt == 'jsonl':
+                    with open(out_path, 'w', encoding='utf-8') as fh:
+                        while rows := cursor.fetchmany(batch_size):
+                            for row in rows:
+                                fh.write(json.dumps({c: _json_value(v) for c, v in zip(columns, row)}) + '\n')
+                            exported += len(rows)
+                            log(f"{table}: {exported} rows")
+                else:
+                    while rows := cursor.fetchmany(batch_size):
+                        batch = pa.Table.from_pylist([dict(zip(columns, row)) for row in rows])
+                        if writer is None:
+                            writer = pq.ParquetWriter(out_path, batch.schema, compression='zstd')
+                        writer.write_table(batch.cast(writer.schema))
+                        exported += len(rows)
+                        log(f"{table}: {exported} rows")
+            finally:
+                if writer is not None:
+                    writer.close()
+        conn.commit()
+
+    return {'table': table, 'rows': exported, 'path': out_path, 'format': fmt}
@@ -0,0 +1,241 @@
+# app/services/chat_queue.py
+"""
+Chat session request queue.
+
+Users enqueue requests; experts claim them. A claim locks the row with
+FOR UPDATE SKIP LOCKED, so experts racing for the same request never
+block each other and exactly one of them wins. A claimed request that is
+not paid within CLAIM_TTL_SECONDS expires. Queue changes are pushed to
+connected experts on the 'experts' channel and to the requesting user on
+their own channel.
+"""
+import os
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from app.config.db import DBConnection
+from app.config.push import Push
+
+load_dotenv()
+
+COLUMNS = """
+    r.id, r.user_id, u.name AS user_name, r.session_duration, r.requested_at, r.status, r.paid,
+    r.updated_at, r.claimed_by, r.claimed_at, r.expires_at, r.started_at, r.ends_at, r.ended_at
+"""
+
+STATUSES = ('pending', 'accepted', 'rejected', 'expired', 'active', 'completed')
+
+
+class QueueConfig:
+    """Chat request queue configuration"""
+
+    CLAIM_TTL_SECONDS = int(os.getenv('CHAT_REQUEST_CLAIM_TTL_SECONDS', 900))
+    PAGE_SIZE = int(os.getenv('CHAT_REQUEST_PAGE_SIZE', 50))
+    MAX_PAGE_SIZE = 200
+    # How often the request paths sweep expired claims, per process
+    EXPIRE_SECONDS = int(os.getenv('CHAT_REQUEST_EXPIRE_SECONDS', 15))
+
+
+class ClaimConflict(Exception):
+    """The request is gone, already claimed, or being claimed by someone else"""
+
+
+def encode_cursor(row):
+    return f"{row['requested_at'].isoformat()}|{row['id']}"
+
+
+def decode_cursor(cursor):
+    """Parse a 'requested_at|id' keyset cursor; raises ValueError"""
+    requested_at, _, request_id = cursor.partition('|')
+    return datetime.fromisoformat(requested_at), int(request_id)
+
+
+def _events(row, event):
+    data = {key: row[key] for key in ('id', 'user_id', 'user_name', 'session_duration', 'requested_at',
+                                      'status', 'claimed_by', 'expires_at', 'ends_at') if key in row}
+    events = [(Push.EXPERTS_CHANNEL, event, data)]
+    if event != 'chat_request':
+        events.append((Push.user_channel(row['user_id']), event, data))
+    return events
+
+
+def _publish(cursor, row, event):
+    Push.publish_many(cursor, _events(row, event))
+
+
+class ChatQueue:
+    """Work queue over chat_session_requests"""
+
+    _expired_at = 0.0
+
+    @staticmethod
+    def create(user_id, session_duration):
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                WITH r AS (
+                    INSERT INTO chat_session_requests (user_id, session_duration, status, paid, requested_at)
+                    VALUES (%s, %s, 'pending', FALSE, NOW())
+                    RETURNING *
+                )
+                SELECT {COLUMNS} FROM r LEFT JOIN users u ON u.id = r.user_id
+            """, (user_id, session_duration))
+            row = cursor.fetchone()
+            _publish(cursor, row, 'chat_request')
+            return row
+
+    @staticmethod
+    def page(status='pending', after=None, limit=None, claimed_by=None):
+        """
+        One page of requests plus the cursor for the next page (None at the end).
+        Pending requests are returned oldest first, everything else newest first.
+        """
+        limit = max(1, min(limit or QueueConfig.PAGE_SIZE, QueueConfig.MAX_PAGE_SIZE))
+        where, params = [], []
+        if status != 'all':
+            where.append("r.status = %s")
+            params.append(status)
+        if claimed_by is not None:
+            where.append("r.claimed_by = %s")
+            params.append(claimed_by)
+        ascending = status == 'pending'
+        if after:
+            where.append(f"(r.requested_at, r.id) {'>' if ascending else '<'} (%s, %s)")
+            params.extend(decode_cursor(after))
+        order = 'ASC' if ascending else 'DESC'
+
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                SELECT {COLUMNS}
+                FROM chat_session_requests r
+                LEFT JOIN users u ON u.id = r.user_id
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+                ORDER BY r.requested_at {order}, r.id {order}
+                LIMIT %s
+            """, (*params, limit + 1))
+            rows = cursor.fetchall()
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    @staticmethod
+    def claim(expert_id, request_id=None):
+        """
+        Claim a specific pending request, or the oldest one when request_id is None.
+        Raises ClaimConflict if nothing could be claimed.
+        """
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                WITH next AS (
+                    SELECT id FROM chat_session_requests
+                    WHERE status = 'pending' {'AND id = %(id)s' if request_id is not None else ''}
+                    ORDER BY requested_at, id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                ), r AS (
+                    UPDATE chat_session_requests q
+                    SET status = 'accepted', claimed_by = %(expert)s, claimed_at = NOW(),
+                        expires_at = NOW() + make_interval(secs => %(ttl)s), updated_at = NOW()
+                    FROM next
+                    WHERE q.id = next.id
+                    RETURNING q.*
+                )
+                SELECT {COLUMNS} FROM r LEFT JOIN users u ON u.id = r.user_id
+            """, {'id': request_id, 'expert': expert_id, 'ttl': QueueConfig.CLAIM_TTL_SECONDS})
+            row = cursor.fetchone()
+            if row is not None:
+                _publish(cursor, row, 'chat_request_accepted')
+        if row is None:
+            raise ClaimConflict("Request is no longer pending" if request_id is not None else "No pending requests")
+        return row
+
+    @staticmethod
+    def reject(expert_id, request_id):
+        """Reject a pending request, or one this expert has claimed"""
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                WITH target AS (
+                    SELECT id FROM chat_session_requests
+                    WHERE id = %(id)s
+                      AND (status = 'pending' OR (status = 'accepted' AND claimed_by = %(expert)s))
+                    FOR UPDATE SKIP LOCKED
+                ), r AS (
+                    UPDATE chat_session_requests q
+                    SET status = 'rejected', expires_at = NULL, updated_at = NOW()
+                    FROM target
+                    WHERE q.id = target.id
+                    RETURNING q.*
+                )
+                SELECT {COLUMNS} FROM r LEFT JOIN users u ON u.id = r.user_id
+            """, {'id': request_id, 'expert': expert_id})
+            row = cursor.fetchone()
+            if row is not None:
+                _publish(cursor, row, 'chat_request_rejected')
+        if row is None:
+            raise ClaimConflict("Request cannot be rejected")
+        return row
+
+    @staticmethod
+    def mark_paid(expert_id, request_id, paid):
+        """
+        Set the paid flag on a request this expert has claimed. Marking it paid
+        starts the session: status 'active', ends_at = now + session_duration
+        minutes, and a 'session_start' ledger entry. The returned row carries
+        'seconds_left' for the session timer.
+        """
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                WITH r AS (
+                    UPDATE chat_session_requests
+                    SET paid = %(paid)s, updated_at = NOW(),
+                        status = CASE WHEN %(paid)s THEN 'active' ELSE status END,
+                        started_at = CASE WHEN %(paid)s THEN NOW() ELSE started_at END,
+                        ends_at = CASE WHEN %(paid)s THEN NOW() + make_interval(mins => session_duration)
+                                       ELSE ends_at END,
+                        expires_at = CASE WHEN %(paid)s THEN NULL ELSE expires_at END
+                    WHERE id = %(id)s AND status = 'accepted' AND claimed_by = %(expert)s
+                      AND (expires_at IS NULL OR expires_at > NOW())
+                    RETURNING *
+                ), ledger AS (
+                    INSERT INTO credit_ledger (user_id, session_request_id, event)
+                    SELECT user_id, id, 'session_start' FROM r WHERE r.status = 'active'
+                )
+                SELECT {COLUMNS}, EXTRACT(EPOCH FROM r.ends_at - NOW()::timestamp)::float AS seconds_left
+                FROM r LEFT JOIN users u ON u.id = r.user_id
+            """, {'paid': paid, 'id': request_id, 'expert': expert_id})
+            row = cursor.fetchone()
+            if row is not None and row['status'] == 'active':
+                _publish(cursor, row, 'chat_session_started')
+        if row is None:
+            raise ClaimConflict("Request is not claimed by you or the claim has expired")
+        return row
+
+    @staticmethod
+    def expire_throttled():
+        """expire_due() at most once per EXPIRE_SECONDS in this process, for the request paths"""
+        if time.monotonic() - ChatQueue._expired_at < QueueConfig.EXPIRE_SECONDS:
+            return []
+        ChatQueue._expired_at = time.monotonic()
+        return ChatQueue.expire_due()
+
+    @staticmethod
+    def expire_due(batch_size=100):
+        """Expire unpaid claims past their deadline; safe to run from any number of processes"""
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                WITH due AS (
+                    SELECT id FROM chat_session_requests
+                    WHERE status = 'accepted' AND NOT paid AND expires_at <= NOW()
+                    ORDER BY expires_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ), r AS (
+                    UPDATE chat_session_requests q
+                    SET status = 'expired', updated_at = NOW()
+                    FROM due
+                    WHERE q.id = due.id
+                    RETURNING q.*
+                )
+                SELECT {COLUMNS} FROM r LEFT JOIN users u ON u.id = r.user_id
+            """, (batch_size,))
+            rows = cursor.fetchall()
+            Push.publish_many(cursor, [e for row in rows for e in _events(row, 'chat_request_expired')])
+            return rows
@@ -0,0 +1,308 @@
+# app/services/compact_model.py
+"""
+Compact, memory-mappable export of the TF-IDF + SVC prediction pipeline.
+
+A bundle is a directory (<version>.bundle) of plain .npy arrays and a
+meta.json:
+
+    meta.json        vectorizer settings, classifier kind, classes
+    terms.bin        vocabulary, NUL-separated in feature-index order
+    idf.npy          idf weights (TF-IDF only)
+    linear:          coef_t.npy (features x classes), intercept.npy
+    svc:             sv_data/sv_indices/sv_indptr.npy (support vectors, CSC),
+                     sv_sq_norms.npy, dual_coef.npy, intercept.npy, n_support.npy
+
+CompactModel reproduces the pipeline with numpy alone, so loading needs
+neither scikit-learn nor unpickling, and with mmap=True the weight arrays
+are shared page cache across workers. export() checks the bundle against
+the original pipeline on held-out texts before it is kept.
+
+Supported: CountVectorizer/TfidfVectorizer with the word analyzer and no
+custom callables, followed by LinearSVC, a linear model with coef_, or SVC
+(linear/rbf/poly/sigmoid kernels).
+"""
+import json
+import os
+import re
+import shutil
+import unicodedata
+import numpy as np
+
+FORMAT_VERSION = 1
+META = 'meta.json'
+TERMS = 'terms.bin'
+
+
+def _strip_accents_unicode(text):
+    normalized = unicodedata.normalize('NFKD', text)
+    if normalized == text:
+        return text
+    return ''.join(c for c in normalized if not unicodedata.combining(c))
+
+
+def _strip_accents_ascii(text):
+    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII')
+
+
+STRIP_ACCENTS = {None: None, 'unicode': _strip_accents_unicode, 'ascii': _strip_accents_ascii}
+
+
+class CompactModel:
+    """numpy-only stand-in for the exported pipeline (predict / decision_function / classes_)"""
+
+    def __init__(self, path, mmap=True):
+        with open(os.path.join(path, META), encoding='utf-8') as fh:
+            self.meta = json.load(fh)
+        if self.meta.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported bundle format: {self.meta.get('format')}")
+        mode = 'r' if mmap else None
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+
+        vec = self.meta['vectorizer']
+        with open(os.path.join(path, TERMS), 'rb') as fh:
+            terms = fh.read().decode('utf-8').split('\0')
+        self.vocabulary = dict(zip(terms, range(len(terms))))
+        self.token_pattern = re.compile(vec['token_pattern'])
+        self.lowercase = vec['lowercase']
+        self.strip_accents = STRIP_ACCENTS[vec['strip_accents']]
+        self.stop_words = frozenset(vec['stop_words'] or ())
+        self.ngram_range = tuple(vec['ngram_range'])
+        self.binary = vec['binary']
+        self.sublinear_tf = vec['sublinear_tf']
+        self.norm = vec['norm']
+        self.idf = load('idf') if vec['use_idf'] else None
+
+        clf = self.meta['classifier']
+        self.kind = clf['kind']
+        self.classes_ = np.array(clf['classes'], dtype=object)
+        self.intercept = load('intercept')
+        if self.kind == 'linear':
+            self.coef_t = load('coef_t')
+        else:
+            self.kernel, self.gamma = clf['kernel'], clf['gamma']
+            self.coef0, self.degree = clf['coef0'], clf['degree']
+            self.sv_data, self.sv_indices, self.sv_indptr = load('sv_data'), load('sv_indices'), load('sv_indptr')
+            self.sv_sq_norms = load('sv_sq_norms')
+            self.dual_coef = load('dual_coef')
+            self.n_support = np.asarray(load('n_support'))
+            self.sv_starts = np.r_[0, np.cumsum(self.n_support)]
+
+    # ─────────────────────────────────────
+    # Vectorizer
+    # ─────────────────────────────────────
+    def _terms(self, text):
+        if self.lowercase:
+            text = text.lower()
+        if self.strip_accents:
+            text = self.strip_accents(text)
+        tokens = self.token_pattern.findall(text)
+        if self.stop_words:
+            tokens = [t for t in tokens if t not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        grams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            grams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def features(self, text):
+        """(feature indices, values) of one document, as TfidfVectorizer would produce"""
+        vocabulary = self.vocabulary
+        indices = [vocabulary[t] for t in self._terms(text) if t in vocabulary]
+        if not indices:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        indices, counts = np.unique(np.array(indices, dtype=np.int64), return_counts=True)
+        values = np.ones(len(indices)) if self.binary else counts.astype(np.float64)
+        if self.sublinear_tf:
+            values = np.log(values) + 1
+        if self.idf is not None:
+            values = values * self.idf[indices]
+        if self.norm == 'l2':
+            values = values / np.sqrt(np.dot(values, values))
+        elif self.norm == 'l1':
+            values = values / np.abs(values).sum()
+        return indices, values
+
+    # ─────────────────────────────────────
+    # Classifier
+    # ─────────────────────────────────────
+    def _kernel_row(self, indices, values):
+        """Kernel values between one document and every support vector"""
+        dots = np.zeros(len(self.sv_sq_norms))
+        for feature, value in zip(indices, values):
+            start, end = self.sv_indptr[feature], self.sv_indptr[feature + 1]
+            if start != end:
+                dots[self.sv_indices[start:end]] += value * self.sv_data[start:end]
+        if self.kernel == 'linear':
+            return dots
+        if self.kernel == 'rbf':
+            distances = np.dot(values, values) + self.sv_sq_norms - 2 * dots
+            return np.exp(-self.gamma * distances)
+        if self.kernel == 'poly':
+            return (self.gamma * dots + self.coef0) ** self.degree
+        return np.tanh(self.gamma * dots + self.coef0)
+
+    def _ovo(self, kernel_row):
+        """Pairwise decision values in libsvm order (0v1, 0v2, ..., 1v2, ...)"""
+        starts, n = self.sv_starts, len(self.classes_)
+        decisions = []
+        for i in range(n):
+            for j in range(i + 1, n):
+                si, sj = slice(starts[i], starts[i + 1]), slice(starts[j], starts[j + 1])
+                decisions.append(np.dot(self.dual_coef[j - 1, si], kernel_row[si])
+                                 + np.dot(self.dual_coef[i, sj], kernel_row[sj]))
+        return np.array(decisions) + self.intercept
+
+    def predict_scores(self, texts):
+        """(labels, decision scores) for a batch, computing features once"""
+        n_classes = len(self.classes_)
+        codes, scores = [], []
+        for text in texts:
+            indices, values = self.features(text)
+            if self.kind == 'linear':
+                raw = values @ self.coef_t[indices] + self.intercept
+                if len(self.intercept) == 1:
+                    codes.append(int(raw[0] > 0))
+                    scores.append(raw[0])
+                else:
+                    codes.append(int(np.argmax(raw)))
+                    scores.append(raw)
+                continue
+            dec = self._ovo(self._kernel_row(indices, values))
+            if n_classes == 2:
+                codes.append(int(dec[0] > 0))
+                scores.append(dec[0])
+                continue
+            votes, confidence = np.zeros(n_classes), np.zeros(n_classes)
+            k = 0
+            for i in range(n_classes):
+                for j in range(i + 1, n_classes):
+                    votes[i if dec[k] > 0 else j] += 1
+                    confidence[i] += dec[k]
+                    confidence[j] -= dec[k]
+                    k += 1
+            codes.append(int(np.argmax(votes)))
+            # SVC's default decision_function_shape='ovr'
+            scores.append(votes + confidence / (3 * (np.abs(confidence) + 1)))
+        return self.classes_[codes], np.array(scores)
+
+    def predict(self, texts):
+        return self.predict_scores(texts)[0]
+
+    def decision_function(self, texts):
+        return self.predict_scores(texts)[1]
+
+
+def _export_vectorizer(vectorizer, path):
+    from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+    if not isinstance(vectorizer, CountVectorizer):
+        raise ValueError(f"Unsupported vectorizer: {type(vectorizer).__name__}")
+    if vectorizer.analyzer != 'word' or vectorizer.tokenizer or vectorizer.preprocessor or callable(vectorizer.strip_accents):
+        raise ValueError('Only the word analyzer without custom callables can be exported')
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    if any('\0' in term for term in terms):
+        raise ValueError('Vocabulary terms may not contain NUL')
+    with open(os.path.join(path, TERMS), 'wb') as fh:
+        fh.write('\0'.join(terms).encode('utf-8'))
+    tfidf = isinstance(vectorizer, TfidfVectorizer)
+    if tfidf and vectorizer.use_idf:
+        np.save(os.path.join(path, 'idf.npy'), vectorizer.idf_.astype(np.float64))
+    stop_words = vectorizer.get_stop_words()
+    return {
+        'token_pattern': vectorizer.token_pattern,
+        'lowercase': vectorizer.lowercase,
+        'strip_accents': vectorizer.strip_accents,
+        'stop_words': sorted(stop_words) if stop_words else None,
+        'ngram_range': list(vectorizer.ngram_range),
+        'binary': vectorizer.binary,
+        'sublinear_tf': tfidf and vectorizer.sublinear_tf,
+        'use_idf': tfidf and vectorizer.use_idf,
+        'norm': vectorizer.norm if tfidf else None,
+    }
+
+
+def _export_classifier(classifier, path, dtype):
+    import scipy.sparse as sp
+    from sklearn.svm import SVC
+    save = lambda name, array: np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+    classes = [str(c) for c in classifier.classes_]
+    if isinstance(classifier, SVC):
+        if classifier.break_ties:
+            raise ValueError('SVC(break_ties=True) is not supported')
+        sv = sp.csc_matrix(classifier.support_vectors_, dtype=np.float64)
+        save('sv_data', sv.data.astype(dtype))
+        save('sv_indices', sv.indices.astype(np.int32))
+        save('sv_indptr', sv.indptr.astype(np.int64))
+        save('sv_sq_norms', np.asarray(sv.multiply(sv).sum(axis=1)).ravel())
+        save('dual_coef', np.asarray(classifier.dual_coef_.todense() if sp.issparse(classifier.dual_coef_)
+                                     else classifier.dual_coef_, dtype=np.float64))
+        save('intercept', np.asarray(classifier.intercept_, dtype=np.float64))
+        save('n_support', np.asarray(classifier.n_support_, dtype=np.int64))
+        return {'kind': 'svc', 'classes': classes, 'kernel': classifier.kernel,
+                'gamma': float(classifier._gamma), 'coef0': float(classifier.coef0),
+                'degree': int(classifier.degree)}
+    if hasattr(classifier, 'coef_') and hasattr(classifier, 'intercept_'):
+        coef = classifier.coef_.toarray() if sp.issparse(classifier.coef_) else np.asarray(classifier.coef_)
+        save('coef_t', coef.T.astype(dtype))
+        save('intercept', np.atleast_1d(classifier.intercept_).astype(np.float64))
+        return {'kind': 'linear', 'classes': classes}
+    raise ValueError(f"Unsupported classifier: {type(classifier).__name__}")
+
+
+def verify(original, compact, texts, atol=1e-4):
+    """
+    Compare a bundle with the pipeline it came from; returns a report with 'ok'.
+    A differing label only counts as a mismatch if the original's scores for
+    the two labels are more than `atol` apart (otherwise it is a tie).
+    """
+    texts = list(texts)
+    expected_labels = np.asarray(original.predict(texts)).astype(str)
+    expected_scores = np.asarray(original.decision_function(texts), dtype=np.float64)
+    labels, scores = compact.predict_scores(texts)
+    labels = labels.astype(str)
+    differing = np.flatnonzero(labels != expected_labels)
+    if expected_scores.ndim == 1:
+        margins = np.abs(expected_scores[differing])
+    else:
+        column = {str(c): i for i, c in enumerate(compact.classes_)}
+        margins = np.array([expected_scores[i, column[expected_labels[i]]] - expected_scores[i, column[labels[i]]]
+                            for i in differing])
+    mismatched = differing[margins > atol] if len(differing) else differing
+    max_diff = float(np.abs(scores - expected_scores).max()) if len(texts) else 0.0
+    return {
+        'texts': len(texts),
+        'label_mismatches': int(len(mismatched)),
+        'ties': int(len(differing) - len(mismatched)),
+        'mismatch_examples': [texts[i][:80] for i in mismatched[:5]],
+        'max_score_diff': max_diff,
+        'ok': len(mismatched) == 0 and max_diff <= atol,
+    }
+
+
+def export(pipeline, path, holdout_texts, dtype=np.float32, atol=1e-4):
+    """
+    Write `pipeline` as a bundle at `path` and verify it on `holdout_texts`.
+    The bundle is written beside the target and only moved into place if it
+    verifies; returns the verification report.
+    """
+    if not hasattr(pipeline, 'steps') or len(pipeline.steps) != 2:
+        raise ValueError('Expected a two-step pipeline (vectorizer, classifier)')
+    staging = f"{path.rstrip(os.sep)}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        meta = {
+            'format': FORMAT_VERSION,
+            'vectorizer': _export_vectorizer(pipeline[0], staging),
+            'classifier': _export_classifier(pipeline[-1], staging, dtype),
+        }
+        with open(os.path.join(staging, META), 'w', encoding='utf-8') as fh:
+            json.dump(meta, fh, indent=2)
+        report = verify(pipeline, CompactModel(staging, mmap=False), holdout_texts, atol)
+        if report['ok']:
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(staging, path)
+        return report
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
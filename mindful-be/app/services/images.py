@@ -0,0 +1,298 @@
+# app/services/images.py
+"""
+Cover art for music and posters for exercises.
+
+An upload is validated with Pillow and stored once, by content hash, as
+uploads/images/originals/<sha256>. A small pool renders the fixed
+thumbnails (IMAGE_THUMB_SIZES widths, WebP and JPEG) off the request path.
+Pillow releases the GIL while it decodes, resizes and encodes, so threads
+are enough. A URL /api/images/<sha256>/<width>.<webp|jpg> always names the
+same bytes, so it is served with a one-year immutable Cache-Control.
+
+Any other width that is a multiple of IMAGE_WIDTH_STEP, up to
+IMAGE_MAX_WIDTH, is rendered on demand into uploads/images/cache/. That
+directory is trimmed to IMAGE_CACHE_BYTES, least recently served first:
+hits bump the file's mtime. A fixed thumbnail that is requested before
+the pool has rendered it is rendered on the spot the same way.
+"""
+import hashlib
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BE_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DIGEST = re.compile(r'^[0-9a-f]{64}$')
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpg': ('JPEG', 'image/jpeg')}
+# EXIF orientations that swap width and height
+TRANSPOSED = (5, 6, 7, 8)
+
+
+class ImageConfig:
+    """Image pipeline configuration"""
+
+    DIR = os.getenv('IMAGE_DIR', os.path.join(BE_ROOT, 'uploads', 'images'))
+    MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 10_000_000))
+    MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40_000_000))
+    ALLOWED_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+    THUMB_SIZES = [int(s) for s in os.getenv('IMAGE_THUMB_SIZES', '160,320,640').split(',') if s.strip()]
+    WIDTH_STEP = int(os.getenv('IMAGE_WIDTH_STEP', 16))
+    MAX_WIDTH = int(os.getenv('IMAGE_MAX_WIDTH', 2048))
+    QUALITY = int(os.getenv('IMAGE_QUALITY', 80))
+    WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+    RENDER_TIMEOUT = float(os.getenv('IMAGE_RENDER_TIMEOUT', 10))
+    CACHE_BYTES = int(os.getenv('IMAGE_CACHE_BYTES', 500_000_000))
+    MAX_AGE = 365 * 24 * 3600
+    BASE_URL = os.getenv('IMAGE_BASE_URL', 'http://localhost:5000/api/images')
+
+
+def render(source, dest, width, fmt):
+    """Write `source` scaled to `width` (never upscaled) as `fmt` to `dest`; returns its size"""
+    from PIL import Image, ImageOps
+    with Image.open(source) as img:
+        swapped = img.getexif().get(0x0112, 1) in TRANSPOSED
+        src_w, src_h = (img.height, img.width) if swapped else img.size
+        target_w = min(width, src_w)
+        target_h = max(1, round(src_h * target_w / src_w))
+        # JPEG decodes straight at a reduced scale when far larger than the target
+        img.draft('RGB', (target_h, target_w) if swapped else (target_w, target_h))
+        img = ImageOps.exif_transpose(img)
+        if img.size != (target_w, target_h):
+            img = img.resize((target_w, target_h), Image.LANCZOS, reducing_gap=3.0)
+
+    pil_format = FORMATS[fmt][0]
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.mode or 'transparency' in img.info else 'RGB')
+    if pil_format == 'JPEG' and img.mode == 'RGBA':
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+
+    tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    options = {'quality': ImageConfig.QUALITY}
+    if pil_format == 'WEBP':
+        options['method'] = 4
+    else:
+        options.update(optimize=True, progressive=True)
+    img.save(tmp, pil_format, **options)
+    os.replace(tmp, dest)
+    return os.path.getsize(dest)
+
+
+class DiskLRU:
+    """A directory trimmed to a byte budget, least recently used files first"""
+
+    def __init__(self, directory, max_bytes, low_water=0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.evicted = 0
+        # Bytes this process believes are cached; re-measured on every trim,
+        # which also picks up files written by other workers
+        self._bytes = None
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, name):
+        """Path of a cached file (marking it recently used), or None"""
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def added(self, size):
+        with self._lock:
+            if self._bytes is not None and self._bytes + size <= self.max_bytes:
+                self._bytes += size
+                return
+            self._bytes = self._trim()
+
+    def _trim(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return total
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * self.low_water:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evicted += 1
+            except FileNotFoundError:
+                pass
+        return total
+
+    def status(self):
+        return {'bytes': self._bytes, 'max_bytes': self.max_bytes, 'evicted': self.evicted}
+
+
+class ImagePipeline:
+    """Storage of originals, the thumbnail pool and the on-demand cache"""
+
+    def __init__(self):
+        self.originals = os.path.join(ImageConfig.DIR, 'originals')
+        self.thumbs = os.path.join(ImageConfig.DIR, 'thumbs')
+        self.cache = DiskLRU(os.path.join(ImageConfig.DIR, 'cache'), ImageConfig.CACHE_BYTES)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        """The render pool of this process (recreated after a fork)"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=ImageConfig.WORKERS, thread_name_prefix='image-render')
+                    self._pid = os.getpid()
+        return self._pool
+
+    @staticmethod
+    def validate(data):
+        """ValueError unless `data` is an allowed image format within the pixel limit"""
+        from PIL import Image
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                image_format, pixels = img.format, img.width * img.height
+                img.verify()
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            raise ValueError('Not a valid image')
+        if image_format not in ImageConfig.ALLOWED_FORMATS:
+            raise ValueError(f"Unsupported image format {image_format} (use {', '.join(ImageConfig.ALLOWED_FORMATS)})")
+        if pixels > ImageConfig.MAX_PIXELS:
+            raise ValueError('Image has too many pixels')
+
+    def store(self, upload):
+        """Validate and store an uploaded image (a FileStorage); returns its SHA-256"""
+        data = upload.read(ImageConfig.MAX_BYTES + 1)
+        if len(data) > ImageConfig.MAX_BYTES:
+            raise ValueError(f"Image is too large (max {ImageConfig.MAX_BYTES} bytes)")
+        self.validate(data)
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.originals, digest)
+        if not os.path.exists(path):
+            os.makedirs(self.originals, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        self.schedule_thumbnails(digest)
+        return digest
+
+    def schedule_thumbnails(self, digest):
+        """Queue the fixed sizes that are not rendered yet; returns immediately"""
+        for width in ImageConfig.THUMB_SIZES:
+            for fmt in FORMATS:
+                if not os.path.exists(self._thumb_path(digest, width, fmt)):
+                    self.pool.submit(self._render_thumb, digest, width, fmt).add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(future):
+        if future.exception() is not None:
+            print(f"Thumbnail render error: {future.exception()}")
+
+    def _thumb_path(self, digest, width, fmt):
+        return os.path.join(self.thumbs, f"{digest}-{width}.{fmt}")
+
+    def _render_thumb(self, digest, width, fmt):
+        dest = self._thumb_path(digest, width, fmt)
+        if not os.path.exists(dest):
+            os.makedirs(self.thumbs, exist_ok=True)
+            render(os.path.join(self.originals, digest), dest, width, fmt)
+        return dest
+
+    def _render_cached(self, digest, width, fmt):
+        name = f"{digest}-{width}.{fmt}"
+        path = self.cache.get(name)
+        if path is None:
+            os.makedirs(self.cache.directory, exist_ok=True)
+            path = self.cache.path(name)
+            self.cache.added(render(os.path.join(self.originals, digest), path, width, fmt))
+        return path
+
+    @staticmethod
+    def check_width(width):
+        """ValueError unless `width` may be requested"""
+        if width in ImageConfig.THUMB_SIZES:
+            return
+        if not 0 < width <= ImageConfig.MAX_WIDTH or width % ImageConfig.WIDTH_STEP:
+            raise ValueError(f"width must be one of {ImageConfig.THUMB_SIZES} or a multiple of "
+                             f"{ImageConfig.WIDTH_STEP} up to {ImageConfig.MAX_WIDTH}")
+
+    def rendered(self, digest, width, fmt):
+        """Path of an already rendered variant, or None; never renders"""
+        if not DIGEST.match(digest) or fmt not in FORMATS:
+            raise LookupError('Unknown image')
+        self.check_width(width)
+        if width in ImageConfig.THUMB_SIZES:
+            path = self._thumb_path(digest, width, fmt)
+            return path if os.path.exists(path) else None
+        return self.cache.get(f"{digest}-{width}.{fmt}")
+
+    def resolve(self, digest, width, fmt):
+        """
+        (path, rendered) for an image variant, rendering it in the pool if needed.
+        LookupError if there is no such original; TimeoutError if rendering is too slow.
+        """
+        if path := self.rendered(digest, width, fmt):
+            return path, False
+        if not os.path.exists(os.path.join(self.originals, digest)):
+            raise LookupError('Unknown image')
+        job = self._render_thumb if width in ImageConfig.THUMB_SIZES else self._render_cached
+        return self.pool.submit(job, digest, width, fmt).result(ImageConfig.RENDER_TIMEOUT), True
+
+    @staticmethod
+    def urls(digest):
+        """Thumbnail URLs of an image by width and format, or None without one"""
+        if not digest:
+            return None
+        return {str(width): {fmt: f"{ImageConfig.BASE_URL}/{digest}/{width}.{fmt}" for fmt in FORMATS}
+                for width in ImageConfig.THUMB_SIZES}
+
+    def collect_garbage(self, referenced, cutoff, dry_run=False):
+        """Remove originals (and their renders) whose hash is not in `referenced` and older than `cutoff`"""
+        summary = {'scanned': 0, 'orphans': 0, 'orphan_bytes': 0}
+        if not os.path.isdir(self.originals):
+            return summary
+        with os.scandir(self.originals) as it:
+            entries = [entry for entry in it if entry.is_file()]
+        for entry in entries:
+            summary['scanned'] += 1
+            stat = entry.stat()
+            digest = entry.name.split('.', 1)[0]
+            if (DIGEST.match(entry.name) and digest in referenced) or stat.st_mtime > cutoff:
+                continue
+            renders = [os.path.join(self.thumbs, f"{digest}-{width}.{fmt}")
+                       for width in ImageConfig.THUMB_SIZES for fmt in FORMATS]
+            if os.path.isdir(self.cache.directory):
+                renders += [os.path.join(self.cache.directory, name) for name in os.listdir(self.cache.directory)
+                            if name.startswith(f"{digest}-")]
+            summary['orphans'] += 1
+            summary['orphan_bytes'] += stat.st_size
+            if not dry_run:
+                for path in [entry.path] + renders:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+        return summary
+
+    def status(self):
+        return {'workers': ImageConfig.WORKERS, 'thumb_sizes': ImageConfig.THUMB_SIZES, 'cache': self.cache.status()}
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,214 @@
+# app/services/media_cache.py
+"""
+In-memory cache of small, popular media files for the serve routes.
+
+A hit answers /music/serve/<id> or /exercises/serve/<id> without the row
+lookup, the existence check or the open: the entry holds the file's bytes
+plus its metadata (storage key, size, mtime, type, ETag), and Range and
+If-None-Match are answered from it. An entry's metadata is trusted for
+MEDIA_CACHE_META_TTL seconds, then re-checked against the row; catalog
+writes through this worker drop the entry at once. Keys are unique per
+upload, so the bytes themselves never go stale.
+
+Files up to MEDIA_CACHE_SMALL_MAX_BYTES are read into memory, within
+MEDIA_CACHE_MAX_BYTES per worker, least recently served evicted first.
+With MEDIA_CACHE_MMAP=1, files up to MEDIA_CACHE_MMAP_MAX_BYTES are mapped
+instead, within MEDIA_CACHE_MMAP_BUDGET_BYTES; mapped pages live in the
+page cache and are shared by every worker on the host.
+
+prefetch() loads the MEDIA_CACHE_PREFETCH_TOP_N most played items of each
+kind (from play_counts_hourly); workers run it in the background when
+they start. Only local storage is cached, and nothing is cached when
+STORAGE_DIRECT_DOWNLOADS sends clients elsewhere.
+"""
+import mimetypes
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, request
+from dotenv import load_dotenv
+from app.services.storage import storage, key_of, LocalStorage, StorageConfig, StorageError
+
+load_dotenv()
+
+CHUNK_BYTES = 256 * 1024
+
+
+class MediaCacheConfig:
+    """Media cache configuration"""
+
+    ENABLED = os.getenv('MEDIA_CACHE_ENABLED', '1') == '1'
+    MAX_BYTES = int(os.getenv('MEDIA_CACHE_MAX_BYTES', 64_000_000))
+    SMALL_MAX_BYTES = int(os.getenv('MEDIA_CACHE_SMALL_MAX_BYTES', 2_000_000))
+    MMAP = os.getenv('MEDIA_CACHE_MMAP', '0') == '1'
+    MMAP_MAX_BYTES = int(os.getenv('MEDIA_CACHE_MMAP_MAX_BYTES', 64_000_000))
+    MMAP_BUDGET_BYTES = int(os.getenv('MEDIA_CACHE_MMAP_BUDGET_BYTES', 1_000_000_000))
+    META_TTL = float(os.getenv('MEDIA_CACHE_META_TTL', 60))
+    PREFETCH_TOP_N = int(os.getenv('MEDIA_CACHE_PREFETCH_TOP_N', 50))
+
+
+class Entry:
+    """A cached file: its bytes (or mapping) and what is needed to answer for it"""
+
+    __slots__ = ('stored', 'size', 'mtime', 'mimetype', 'etag', 'data', 'mapped', 'checked_at')
+
+    def __init__(self, stored, size, mtime, mimetype, data, mapped):
+        self.stored = stored
+        self.size = size
+        self.mtime = mtime
+        self.mimetype = mimetype
+        self.etag = f"{int(mtime):x}-{size:x}"
+        self.data = data
+        self.mapped = mapped
+        self.checked_at = time.monotonic()
+
+
+def _chunks(data, start, end):
+    view = memoryview(data)
+    for offset in range(start, end, CHUNK_BYTES):
+        yield bytes(view[offset:min(offset + CHUNK_BYTES, end)])
+
+
+class MediaCache:
+    """LRU of (kind, item id) -> Entry, within separate heap and mmap budgets"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._bytes = {False: 0, True: 0}  # mapped -> bytes held
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'bytes_served': 0, 'evicted': 0,
+                       'prefetched': 0}
+
+    @staticmethod
+    def active():
+        return (MediaCacheConfig.ENABLED and isinstance(storage.backend, LocalStorage)
+                and not StorageConfig.DIRECT_DOWNLOADS)
+
+    def get(self, kind, item_id):
+        """The entry for an item if its metadata is fresh, else None (counted as a miss)"""
+        if not self.active():
+            return None
+        with self._lock:
+            entry = self._entries.get((kind, item_id))
+            if entry is not None and time.monotonic() - entry.checked_at < MediaCacheConfig.META_TTL:
+                self._entries.move_to_end((kind, item_id))
+                self._stats['hits'] += 1
+                return entry
+            self._stats['misses'] += 1
+        return None
+
+    def load(self, kind, item_id, stored):
+        """
+        Cache the item's file if it is eligible; returns its entry or None.
+        An entry whose row still points at the same file is just marked fresh.
+        """
+        if not self.active():
+            return None
+        with self._lock:
+            entry = self._entries.get((kind, item_id))
+            if entry is not None and entry.stored == stored:
+                entry.checked_at = time.monotonic()
+                self._stats['revalidated'] += 1
+                return entry
+        try:
+            path = storage.backend.path(key_of(stored))
+            stat = os.stat(path)
+        except (FileNotFoundError, StorageError):
+            return None
+        mapped = stat.st_size > MediaCacheConfig.SMALL_MAX_BYTES
+        if mapped and not (MediaCacheConfig.MMAP and stat.st_size <= MediaCacheConfig.MMAP_MAX_BYTES):
+            return None
+        if stat.st_size == 0:
+            return None
+        with open(path, 'rb') as fh:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if mapped else fh.read()
+        entry = Entry(stored, len(data), stat.st_mtime, mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                      data, mapped)
+        self._insert((kind, item_id), entry)
+        return entry
+
+    def _insert(self, key, entry):
+        budget = MediaCacheConfig.MMAP_BUDGET_BYTES if entry.mapped else MediaCacheConfig.MAX_BYTES
+        if entry.size > budget:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes[old.mapped] -= old.size
+            self._entries[key] = entry
+            self._bytes[entry.mapped] += entry.size
+            # Evict the least recently served entries of the same pool
+            for other_key in list(self._entries):
+                if self._bytes[entry.mapped] <= budget:
+                    break
+                other = self._entries[other_key]
+                if other.mapped == entry.mapped and other_key != key:
+                    del self._entries[other_key]
+                    self._bytes[other.mapped] -= other.size
+                    self._stats['evicted'] += 1
+        # Evicted mappings are unmapped when the last response streaming from them is done
+
+    def invalidate(self, kind, item_id):
+        with self._lock:
+            entry = self._entries.pop((kind, item_id), None)
+            if entry is not None:
+                self._bytes[entry.mapped] -= entry.size
+
+    def send(self, entry):
+        """A response for a cached file, honouring Range and conditional requests"""
+        response = Response(status=200, mimetype=entry.mimetype, direct_passthrough=True)
+        response.set_etag(entry.etag)
+        response.last_modified = entry.mtime
+        response.cache_control.no_cache = True  # as send_file: revalidate with the ETag
+        response.content_length = entry.size
+        response.make_conditional(request, accept_ranges=True, complete_length=entry.size)
+        if response.status_code == 304:
+            return response
+        start, end = 0, entry.size
+        if response.status_code == 206:
+            content_range = response.content_range
+            start, end = content_range.start, content_range.stop
+        response.response = _chunks(entry.data, start, end)
+        response.content_length = end - start
+        self.served(end - start)
+        return response
+
+    def served(self, nbytes):
+        """Count bytes sent from the cache (also by the native ASGI routes, app/asgi/media.py)"""
+        with self._lock:
+            self._stats['bytes_served'] += nbytes
+
+    def prefetch(self, log=print):
+        """Load the most played items of each kind; returns how many were cached"""
+        if not self.active() or not MediaCacheConfig.PREFETCH_TOP_N:
+            return 0
+        from app.services.plays import play_counter, KINDS
+        loaded = 0
+        for kind in KINDS:
+            for item_id, stored in play_counter.hot_items(kind, MediaCacheConfig.PREFETCH_TOP_N):
+                if self.load(kind, item_id, stored) is not None:
+                    loaded += 1
+        with self._lock:
+            self._stats['prefetched'] += loaded
+        log(f"Media cache: prefetched {loaded} file(s)")
+        return loaded
+
+    def start_prefetch(self):
+        """Prefetch on a background thread so the worker starts serving at once"""
+        def run():
+            try:
+                self.prefetch()
+            except Exception as e:
+                print(f"Media cache prefetch error: {e}")
+        threading.Thread(target=run, name='media-prefetch', daemon=True).start()
+
+    def status(self):
+        with self._lock:
+            return dict(self._stats, enabled=self.active(), entries=len(self._entries),
+                        bytes=self._bytes[False], mapped_bytes=self._bytes[True],
+                        max_bytes=MediaCacheConfig.MAX_BYTES, mmap=MediaCacheConfig.MMAP)
+
+
+media_cache = MediaCache()
@@ -0,0 +1,205 @@
+# app/services/model_loader.py
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+APP_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_MODEL_PATH = os.path.join(APP_ROOT, 'ml_model', 'svc_model.joblib')
+
+# Artifact formats: a pickled pipeline, or a numpy bundle directory (app/services/compact_model.py)
+ARTIFACT_SUFFIXES = ('.joblib', '.bundle')
+
+# Classes the shipped model is trained on; loaded models report their own (ModelLoader.labels)
+LABELS = ['Anxiety', 'Bipolar', 'Depression',
+          'Normal', 'Personality disorder',
+          'Stress', 'Suicidal']
+
+
+class ModelConfig:
+    """Model loading configuration"""
+
+    MODEL_PATH = os.getenv('MODEL_PATH', DEFAULT_MODEL_PATH)
+    # Versioned artifacts <version>.joblib | <version>.bundle; the CURRENT file names the active one (app/services/model_registry.py)
+    REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', os.path.join(APP_ROOT, 'ml_model', 'registry'))
+    MODEL_MMAP = os.getenv('MODEL_MMAP', '0') == '1'
+    # background: start loading when the app is created, without blocking startup
+    # lazy: load on the first prediction request
+    # eager: block app creation until the model is loaded
+    MODEL_LOAD = os.getenv('MODEL_LOAD', 'background')
+    PREDICT_WAIT_SECONDS = float(os.getenv('PREDICT_WAIT_SECONDS', 10))
+    # 0 for workers behind a pool that never gets /predict: the model is not loaded at startup
+    # and /health/ready does not wait for it
+    SERVES_PREDICTION = os.getenv('SERVES_PREDICTION', '1') == '1'
+
+
+def artifact_version(path):
+    """Version of an artifact: its registry name, or file name and mtime outside the registry"""
+    if os.path.dirname(os.path.abspath(path)) == os.path.abspath(ModelConfig.REGISTRY_DIR):
+        return os.path.splitext(os.path.basename(path))[0]
+    return f"{os.path.basename(path)}@{int(os.path.getmtime(path))}"
+
+
+def registry_artifact(version):
+    """Path of a registry version in any artifact format, or None"""
+    for suffix in ARTIFACT_SUFFIXES:
+        path = os.path.join(ModelConfig.REGISTRY_DIR, f"{version}{suffix}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def active_artifact():
+    """The registry's CURRENT artifact if there is one, else MODEL_PATH"""
+    try:
+        with open(os.path.join(ModelConfig.REGISTRY_DIR, 'CURRENT'), encoding='utf-8') as fh:
+            version = fh.read().strip()
+    except FileNotFoundError:
+        return ModelConfig.MODEL_PATH
+    return (registry_artifact(version) if version else None) or ModelConfig.MODEL_PATH
+
+
+def model_classes(model):
+    """Class labels a fitted model (or pipeline) predicts, or None if it does not say"""
+    final = model[-1] if hasattr(model, 'steps') else model
+    classes = getattr(final, 'classes_', None)
+    return None if classes is None else [str(c) for c in classes]
+
+
+class ModelLoader:
+    """
+    Loads a joblib-pickled model or a numpy bundle off the request path.
+
+    States: 'idle' -> 'loading' -> 'ready' | 'failed'.
+    With mmap=True numpy arrays inside the artifact are memory-mapped
+    read-only, so every worker process shares the same page-cache pages
+    instead of holding a private copy (only for uncompressed dumps; bundles
+    always map cleanly).
+    """
+
+    def __init__(self, path, mmap=False):
+        self.path = path
+        self.mmap = mmap
+        self.state = 'idle'
+        self.error = None
+        self.load_seconds = None
+        self.version = None  # file name and mtime of the loaded artifact; scopes cached results
+        self._model = None
+        # Bumped by set()/reload(); a background load started before either does not overwrite them
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def init_app(self, app):
+        """Kick off loading according to MODEL_LOAD"""
+        if not ModelConfig.SERVES_PREDICTION:
+            return  # loads on first use, should a prediction arrive anyway
+        if ModelConfig.MODEL_LOAD == 'eager':
+            self.get()
+        elif ModelConfig.MODEL_LOAD == 'background':
+            self.start()
+
+    def start(self):
+        """Begin loading in a background thread; returns immediately"""
+        with self._lock:
+            if self.state != 'idle':
+                return
+            self.state = 'loading'
+            generation = self._generation
+        threading.Thread(target=self._load, args=(generation,), name='model-loader', daemon=True).start()
+
+    def _read(self, path):
+        if path.endswith('.bundle'):
+            from app.services.compact_model import CompactModel  # numpy only, no scikit-learn
+            return CompactModel(path, mmap=self.mmap), artifact_version(path)
+        import joblib  # heavy (pulls in scikit-learn), keep it off the import path
+        return joblib.load(path, mmap_mode='r' if self.mmap else None), artifact_version(path)
+
+    def _load(self, generation):
+        started = time.perf_counter()
+        try:
+            model, version = self._read(self.path)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self._model = model
+                self.version = version
+                self.state = 'ready'
+            print(f"Model loaded from {self.path} in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self.error = str(e)
+                self.state = 'failed'
+            print(f"Error loading model: {str(e)}")
+        finally:
+            if generation == self._generation:
+                self.load_seconds = round(time.perf_counter() - started, 3)
+            self._ready.set()
+
+    def get(self, timeout=None):
+        """
+        Return the model, starting the load on first use.
+        Waits up to `timeout` seconds; returns None if it is not ready by then.
+        """
+        if self.state == 'ready':
+            return self._model
+        self.start()
+        self._ready.wait(timeout)
+        return self._model if self.state == 'ready' else None
+
+    def reload(self, path=None):
+        """
+        Load an artifact in the calling thread, then swap it in atomically.
+        Requests already holding the old model finish with it; on failure the
+        old model keeps serving and the error is raised.
+        """
+        path = path or self.path
+        started = time.perf_counter()
+        model, version = self._read(path)
+        with self._lock:
+            self._generation += 1
+            self._model = model
+            self.path = path
+            self.version = version
+            self.state = 'ready'
+            self.error = None
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        self._ready.set()
+        print(f"Model {version} swapped in from {path} in {self.load_seconds:.2f}s")
+        return version
+
+    @property
+    def labels(self):
+        """Labels of the loaded model, from its classes_ when it has them"""
+        return (model_classes(self._model) if self._model is not None else None) or list(LABELS)
+
+    def set(self, model, version='custom'):
+        """Install an already constructed model (used by benchmarks and tooling)"""
+        with self._lock:
+            self._generation += 1
+            self._model = model
+            self.version = version
+            self.state = 'ready'
+            self.error = None
+        self._ready.set()
+
+    def is_ready(self):
+        return self.state == 'ready'
+
+    def status(self):
+        return {
+            'state': self.state,
+            'path': self.path,
+            'mmap': self.mmap,
+            'version': self.version,
+            'labels': self.labels if self.state == 'ready' else None,
+            'load_seconds': self.load_seconds,
+            'error': self.error,
+        }
+
+
+prediction_model = ModelLoader(active_artifact(), mmap=ModelConfig.MODEL_MMAP)
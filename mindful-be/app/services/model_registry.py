@@ -0,0 +1,286 @@
+# app/services/model_registry.py
+"""
+Versioned prediction models with hot-swap and shadow evaluation.
+
+Artifacts live in MODEL_REGISTRY_DIR as <version>.joblib, or as a numpy
+bundle directory <version>.bundle (`flask models export`). Two pointer
+files, replaced atomically, describe what every worker should run:
+CURRENT (the active version) and SHADOW ("<version> <sample rate>", empty
+when off). Each worker runs a watcher thread that re-reads them every
+MODEL_REGISTRY_POLL_SECONDS, or immediately on SIGUSR2
+(`pkill -USR2 -f 'gunicorn: worker'`; the master uses USR2 itself).
+A new active model is loaded beside the old one and swapped in with a
+reference assignment, so in-flight requests finish on the model they started with.
+
+A shadow model scores a sampled fraction of /predict traffic on its own
+thread, fed through a bounded queue (full = sample dropped), and keeps
+agreement and latency statistics against the active model.
+"""
+import os
+import queue
+import random
+import re
+import signal
+import threading
+import time
+from collections import Counter, deque
+from dotenv import load_dotenv
+from app.services.model_loader import ARTIFACT_SUFFIXES, ModelConfig, ModelLoader, prediction_model, registry_artifact
+
+load_dotenv()
+
+VERSION_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+class RegistryConfig:
+    """Model registry configuration"""
+
+    DIR = ModelConfig.REGISTRY_DIR
+    POLL_SECONDS = float(os.getenv('MODEL_REGISTRY_POLL_SECONDS', 5))
+    SHADOW_QUEUE = int(os.getenv('MODEL_SHADOW_QUEUE', 256))
+    # Latency samples kept per model for the percentiles
+    STATS_WINDOW = int(os.getenv('MODEL_SHADOW_STATS_WINDOW', 2000))
+    # Users allowed to promote models and configure shadowing; empty = the experts
+    ADMIN_USER_IDS = {int(i) for i in os.getenv('MODEL_ADMIN_USER_IDS', '').split(',') if i.strip()}
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+    return {'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99), 'samples': len(ordered)}
+
+
+class ShadowEvaluator:
+    """Scores sampled requests with a candidate model, off the request path"""
+
+    def __init__(self):
+        self.loader = None
+        self.sample = 0.0
+        self._queue = queue.Queue(maxsize=RegistryConfig.SHADOW_QUEUE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.compared = 0
+        self.agreed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.disagreements = Counter()
+        self.active_ms = deque(maxlen=RegistryConfig.STATS_WINDOW)
+        self.shadow_ms = deque(maxlen=RegistryConfig.STATS_WINDOW)
+
+    def configure(self, path, sample):
+        """Shadow the artifact at `path` on `sample` of traffic; path=None turns shadowing off"""
+        with self._lock:
+            self.loader = ModelLoader(path, mmap=ModelConfig.MODEL_MMAP) if path else None
+            self.sample = sample if path else 0.0
+            self._reset_stats()
+        if self.loader:
+            self.loader.start()
+
+    def offer(self, text, active_label, active_ms=None):
+        """Queue a request for the shadow model; never blocks the caller"""
+        loader = self.loader
+        if loader is None or not loader.is_ready() or random.random() >= self.sample:
+            return
+        try:
+            self._queue.put_nowait((loader, text, active_label, active_ms))
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='model-shadow', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        # Same call the active model's timing covers, so the latencies compare like for like
+        from app.services.prediction_history import infer
+        while True:
+            loader, text, active_label, active_ms = self._queue.get()
+            if loader is not self.loader:
+                continue  # reconfigured since this was queued
+            try:
+                model = loader.get()
+                started = time.perf_counter()
+                label = infer(model, [text])[0][0]
+                elapsed = (time.perf_counter() - started) * 1000
+            except Exception as e:
+                self.errors += 1
+                print(f"Shadow model error: {e}")
+                continue
+            with self._lock:
+                self.compared += 1
+                self.shadow_ms.append(elapsed)
+                if active_ms is not None:
+                    self.active_ms.append(active_ms)
+                if label == active_label:
+                    self.agreed += 1
+                else:
+                    self.disagreements[(active_label, label)] += 1
+
+    def status(self):
+        with self._lock:
+            return {
+                'version': self.loader.version if self.loader else None,
+                'state': self.loader.state if self.loader else 'off',
+                'sample': self.sample,
+                'compared': self.compared,
+                'agreement': round(self.agreed / self.compared, 4) if self.compared else None,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'top_disagreements': [{'active': a, 'shadow': b, 'count': n}
+                                      for (a, b), n in self.disagreements.most_common(10)],
+                'latency': {'active': percentiles(self.active_ms), 'shadow': percentiles(self.shadow_ms)},
+            }
+
+
+class ModelRegistry:
+    """Artifact listing, promotion and the per-worker watcher"""
+
+    def __init__(self, active, shadow):
+        self.active = active
+        self.shadow = shadow
+        self.last_error = None
+        self._shadow_pointer = ''
+        # CURRENT version whose artifact failed to load; not retried until the pointer changes
+        self._failed_current = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @staticmethod
+    def path_of(version):
+        """Artifact path for a version; ValueError if there is no such artifact"""
+        if not version or not VERSION_NAME.match(version):
+            raise ValueError('Invalid model version')
+        path = registry_artifact(version)
+        if path is None:
+            raise ValueError(f"Unknown model version: {version}")
+        return path
+
+    @staticmethod
+    def versions():
+        if not os.path.isdir(RegistryConfig.DIR):
+            return []
+        versions = []
+        for name in sorted(os.listdir(RegistryConfig.DIR)):
+            version, suffix = os.path.splitext(name)
+            if suffix not in ARTIFACT_SUFFIXES:
+                continue
+            path = os.path.join(RegistryConfig.DIR, name)
+            if os.path.isdir(path):
+                files = [os.path.join(path, f) for f in os.listdir(path)]
+                size = sum(os.path.getsize(f) for f in files)
+            else:
+                size = os.path.getsize(path)
+            versions.append({'version': version, 'format': suffix[1:], 'size_bytes': size,
+                             'modified_at': int(os.path.getmtime(path))})
+        return versions
+
+    @staticmethod
+    def read_pointer(name):
+        try:
+            with open(os.path.join(RegistryConfig.DIR, name), encoding='utf-8') as fh:
+                return fh.read().strip()
+        except FileNotFoundError:
+            return ''
+
+    @staticmethod
+    def write_pointer(name, value):
+        """Replace a pointer file atomically so watchers never read a partial write"""
+        os.makedirs(RegistryConfig.DIR, exist_ok=True)
+        path = os.path.join(RegistryConfig.DIR, name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            fh.write(value + '\n')
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+
+    def promote(self, version):
+        """Load `version` here first (so a broken artifact is never published), then point every worker at it"""
+        self.active.reload(self.path_of(version))
+        self._failed_current = None
+        self.write_pointer('CURRENT', version)
+        return self.active.version
+
+    def set_shadow(self, version, sample):
+        """Shadow `version` on `sample` (0-1] of traffic in every worker; version=None turns it off"""
+        if version:
+            self.path_of(version)
+            if not 0 < sample <= 1:
+                raise ValueError('sample must be in (0, 1]')
+        pointer = f"{version} {sample}" if version else ''
+        self.write_pointer('SHADOW', pointer)
+        self._apply_shadow(pointer)
+
+    def _apply_shadow(self, pointer):
+        if pointer == self._shadow_pointer:
+            return
+        self._shadow_pointer = pointer
+        if not pointer:
+            self.shadow.configure(None, 0)
+            return
+        version, _, sample = pointer.partition(' ')
+        self.shadow.configure(self.path_of(version), float(sample or 0.1))
+
+    def sync(self):
+        """Bring this worker in line with the pointer files"""
+        current = self.read_pointer('CURRENT')
+        if current != self._failed_current:
+            self._failed_current = None
+        if current and current != self.active.version and current != self._failed_current:
+            try:
+                if self.active.state == 'idle':
+                    self.active.path = self.path_of(current)  # not loaded yet (MODEL_LOAD=lazy): load that one
+                elif self.active.state != 'loading':
+                    self.active.reload(self.path_of(current))
+            except Exception:
+                self._failed_current = current
+                raise
+        self._apply_shadow(self.read_pointer('SHADOW'))
+
+    def start(self):
+        """Start this process's watcher thread (idempotent, fork-aware)"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._shadow_pointer = ''  # a forked child has no shadow model loaded yet
+        self._thread = threading.Thread(target=self._run, name='model-registry', daemon=True)
+        self._thread.start()
+
+    def install_signal(self, signum=signal.SIGUSR2):
+        """Re-read the pointers immediately on `signum`; call from the main thread"""
+        signal.signal(signum, lambda *_: self._wake.set())
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+                if self._failed_current is None:
+                    self.last_error = None
+            except Exception as e:
+                if str(e) != self.last_error:
+                    print(f"Model registry sync error: {e}")
+                self.last_error = str(e)
+            self._wake.wait(RegistryConfig.POLL_SECONDS)
+            self._wake.clear()
+
+    def status(self):
+        return {
+            'active': self.active.status(),
+            'current_pointer': self.read_pointer('CURRENT') or None,
+            'versions': self.versions(),
+            'shadow': self.shadow.status(),
+            'watcher': self._thread is not None and self._thread.is_alive(),
+            'last_error': self.last_error,
+        }
+
+
+shadow_model = ShadowEvaluator()
+model_registry = ModelRegistry(prediction_model, shadow_model)
@@ -0,0 +1,405 @@
+# app/services/moderation.py
+"""
+Moderation of new posts and comments, off the write path.
+
+Posts and comments are written 'unscreened' and the routes only wake this
+worker's moderation thread (comments buffered by write-behind are found
+by the poll once they land). The thread claims up to MODERATION_BATCH
+unscreened rows of each table with FOR UPDATE SKIP LOCKED, so workers
+never screen the same row twice, and screens the batch:
+
+- the active prediction model labels every text in one call;
+- a keyword matcher (an Aho-Corasick automaton over the crisis, abuse and
+  spam terms, plus MODERATION_TERMS_FILE) finds listed phrases in one pass
+  over each text, however many terms there are.
+
+Clean rows become 'approved'. A row with a matched term, or predicted as
+one of MODERATION_ALERT_LABELS, becomes 'held' with a moderation_flags row
+for the experts; crisis hits (an alert label or a crisis term) are also
+pushed to every connected expert on the 'experts' channel, in the same
+transaction, so they surface as soon as the batch commits. Experts then
+approve or reject held items (app/routes/moderation.py).
+
+Held and rejected items are only shown to their author and the experts;
+with MODERATION_HIDE_UNSCREENED=1 so are items not screened yet. For the
+same reason a post's author is notified of a comment once it is approved,
+by the screening batch or an expert, not when it is written.
+"""
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from app.config.db import DBConnection
+from app.config.JWTConfig import JWTConfig
+from app.config.push import Push
+from app.services.model_loader import prediction_model
+from app.services.notifications import notifier
+
+load_dotenv()
+
+CATEGORIES = ('crisis', 'abuse', 'spam')
+REVIEW_STATUSES = ('approved', 'rejected')
+
+# Built-in terms per category, extended by MODERATION_TERMS_FILE
+DEFAULT_TERMS = {
+    'crisis': ('kill myself', 'killing myself', 'end my life', 'ending my life', 'take my own life',
+               'want to die', 'wanna die', 'better off dead', 'no reason to live', 'suicide', 'suicidal',
+               'self harm', 'self-harm', 'cut myself', 'cutting myself', 'overdose'),
+    'abuse': ('kill yourself', 'kys', 'go die', 'nobody likes you', 'hate you', 'idiot', 'moron', 'loser',
+              'shut up'),
+    'spam': ('buy now', 'click here', 'free money', 'limited offer', 'work from home', 'giveaway',
+             'dm me for', 'http://', 'https://', 'www.'),
+}
+
+
+class ModerationConfig:
+    """Moderation configuration"""
+
+    ENABLED = os.getenv('MODERATION_ENABLED', '1') == '1'
+    BATCH = int(os.getenv('MODERATION_BATCH', 64))
+    POLL_SECONDS = float(os.getenv('MODERATION_POLL_SECONDS', 2))
+    # Predicted labels that hold an item and alert the experts
+    ALERT_LABELS = {l.strip() for l in os.getenv('MODERATION_ALERT_LABELS', 'Suicidal').split(',') if l.strip()}
+    # Extra terms, one per line as "category: term" (category defaults to abuse), '#' for comments
+    TERMS_FILE = os.getenv('MODERATION_TERMS_FILE', '')
+    # Only this much of a text goes through the model; the matcher reads all of it
+    MODEL_MAX_CHARS = int(os.getenv('MODERATION_MODEL_MAX_CHARS', 5000))
+    HIDE_UNSCREENED = os.getenv('MODERATION_HIDE_UNSCREENED', '0') == '1'
+
+
+def load_terms(path=None):
+    """{term: category} from DEFAULT_TERMS and the terms file"""
+    terms = {term: category for category, listed in DEFAULT_TERMS.items() for term in listed}
+    path = ModerationConfig.TERMS_FILE if path is None else path
+    if path:
+        with open(path, encoding='utf-8') as fh:
+            for line in fh:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                category, sep, term = line.partition(':')
+                if not sep or category.strip().lower() not in CATEGORIES:
+                    category, term = 'abuse', line
+                term = normalize(term)
+                if term:
+                    terms[term] = category.strip().lower()
+    return terms
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton: every occurrence of every term in one pass over the text"""
+
+    def __init__(self, terms):
+        self.terms = dict(terms)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for term, category in self.terms.items():
+            node = 0
+            for ch in term:
+                child = self._goto[node].get(ch)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][ch] = child
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = child
+            self._out[node].append((term, category))
+        # Failure links, breadth first: the longest proper suffix that is also a prefix of some term
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def match(self, text):
+        """{term: category} of the terms found in `text` as whole words"""
+        text = normalize(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        found = {}
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for term, category in out[node]:
+                start = end - len(term)
+                # Word edges are only enforced where the term itself starts or ends with a word character
+                if term[0].isalnum() and start > 0 and text[start - 1].isalnum():
+                    continue
+                if term[-1].isalnum() and end < len(text) and text[end].isalnum():
+                    continue
+                found[term] = category
+        return found
+
+
+def viewer_id(request):
+    """The caller's user id when the request carries a valid token, else None"""
+    token = request.cookies.get(JWTConfig.COOKIE_NAME)
+    payload = JWTConfig.verify_token(token) if token else None
+    return payload['user_id'] if payload else None
+
+
+def visible_statuses():
+    return ['approved'] if ModerationConfig.HIDE_UNSCREENED else ['approved', 'unscreened']
+
+
+def visibility(alias, viewer):
+    """SQL condition and params for the rows of `alias` a viewer may see"""
+    from app.routes.chat import is_expert
+    if viewer is not None and is_expert(viewer):
+        return "TRUE", ()
+    return f"({alias}.moderation_status = ANY(%s) OR {alias}.author_id = %s)", (visible_statuses(), viewer)
+
+
+FLAG_COLUMNS = """
+    f.id, f.post_id, f.comment_id, f.author_id, u.name AS author_name, f.label, f.terms, f.categories,
+    f.severity, f.status, f.created_at, f.reviewed_by, f.reviewed_at,
+    COALESCE(c.text, p.title || E'\\n' || p.content) AS text
+"""
+
+FLAG_JOINS = """
+    JOIN posts p ON p.id = f.post_id
+    LEFT JOIN comments c ON c.id = f.comment_id
+    LEFT JOIN users u ON u.id = f.author_id
+"""
+
+UPSERT_FLAGS_SQL = """
+    INSERT INTO moderation_flags (post_id, comment_id, author_id, label, terms, categories, severity)
+    VALUES %s
+    ON CONFLICT (post_id, COALESCE(comment_id, 0)) DO UPDATE SET
+        author_id = EXCLUDED.author_id, label = EXCLUDED.label, terms = EXCLUDED.terms,
+        categories = EXCLUDED.categories, severity = EXCLUDED.severity, status = 'open',
+        created_at = CURRENT_TIMESTAMP, reviewed_by = NULL, reviewed_at = NULL
+    RETURNING id, post_id, comment_id, created_at
+"""
+
+
+def alert_data(flag, item):
+    return {
+        'id': flag['id'], 'post_id': item['post_id'], 'comment_id': item['comment_id'],
+        'author_id': item['author_id'], 'label': item['label'], 'terms': item['terms'],
+        'severity': item['severity'], 'excerpt': item['text'][:280], 'created_at': flag['created_at'],
+    }
+
+
+class Moderator:
+    """Screens unscreened posts and comments in batches on a per-worker thread"""
+
+    def __init__(self):
+        self._pid = None
+        self.matcher = KeywordMatcher(load_terms())
+        self.last_error = None
+        self.last_batch_ms = None
+        self._stats = {'screened': 0, 'flagged': 0, 'alerts': 0}
+
+    def _reset(self):
+        """(Re)initialise per-process state; also runs after a fork"""
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def notify(self):
+        """A post or comment was written: screen it now rather than at the next poll"""
+        if not ModerationConfig.ENABLED:
+            return
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        """Start this process's moderation thread (idempotent, fork-aware)"""
+        if not ModerationConfig.ENABLED:
+            return
+        self._ensure_process()
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='moderation', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                # Drain the backlog before going back to sleep
+                while self.screen() >= ModerationConfig.BATCH:
+                    pass
+                self.last_error = None
+            except Exception as e:
+                if str(e) != self.last_error:
+                    print(f"Moderation error: {e}")
+                self.last_error = str(e)
+            self._wake.wait(ModerationConfig.POLL_SECONDS)
+            self._wake.clear()
+
+    # ─────────────────────────────────────
+    # Screening
+    # ─────────────────────────────────────
+    def _model(self):
+        """The active model; None while it loads, False when it failed and only keywords are used"""
+        model = prediction_model.get(timeout=0)
+        if model is None and prediction_model.state == 'failed':
+            return False
+        return model
+
+    def classify(self, model, texts):
+        if not model or not texts:
+            return [None] * len(texts)
+        return [str(label) for label in model.predict([t[:ModerationConfig.MODEL_MAX_CHARS] for t in texts])]
+
+    def verdict(self, text, label):
+        """(status, flag fields or None) for one text and its predicted label"""
+        found = self.matcher.match(text)
+        categories = sorted(set(found.values()))
+        alert = label in ModerationConfig.ALERT_LABELS
+        if not found and not alert:
+            return 'approved', None
+        severity = 'crisis' if alert or 'crisis' in categories else 'review'
+        return 'held', {'label': label, 'terms': sorted(found), 'categories': categories, 'severity': severity}
+
+    def screen(self):
+        """Screen one batch of unscreened posts and comments; returns the larger batch size"""
+        if not ModerationConfig.ENABLED:
+            return 0
+        self._ensure_process()
+        model = self._model()
+        if model is None:
+            return 0  # try again once the model is loaded
+        started = time.perf_counter()
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                SELECT id AS post_id, NULL::INTEGER AS comment_id, author_id, title || E'\\n' || content AS text
+                FROM posts WHERE moderation_status = 'unscreened'
+                ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED
+            """, (ModerationConfig.BATCH,))
+            posts = cursor.fetchall()
+            cursor.execute("""
+                SELECT post_id, id AS comment_id, author_id, text
+                FROM comments WHERE moderation_status = 'unscreened'
+                ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED
+            """, (ModerationConfig.BATCH,))
+            comments = cursor.fetchall()
+            items = posts + comments
+            if not items:
+                return 0
+
+            labels = self.classify(model, [item['text'] for item in items])
+            statuses = {'posts': [], 'comments': []}
+            flagged = []
+            approved_comments = []
+            for item, label in zip(items, labels):
+                status, flag = self.verdict(item['text'], label)
+                if item['comment_id'] is None:
+                    statuses['posts'].append((item['post_id'], status))
+                else:
+                    statuses['comments'].append((item['comment_id'], status))
+                    if status == 'approved':
+                        approved_comments.append(item)
+                if flag:
+                    item.update(flag)
+                    flagged.append(item)
+
+            for table, rows in statuses.items():
+                if rows:
+                    execute_values(cursor, f"""
+                        UPDATE {table} t SET moderation_status = v.status
+                        FROM (VALUES %s) AS v(id, status) WHERE t.id = v.id
+                    """, rows)
+            alerts = []
+            if flagged:
+                returned = execute_values(cursor, UPSERT_FLAGS_SQL, [
+                    (item['post_id'], item['comment_id'], item['author_id'], item['label'], item['terms'],
+                     item['categories'], item['severity']) for item in flagged
+                ], fetch=True)
+                by_item = {(row['post_id'], row['comment_id']): row for row in returned}
+                alerts = [(Push.EXPERTS_CHANNEL, 'moderation_alert',
+                           alert_data(by_item[(item['post_id'], item['comment_id'])], item))
+                          for item in flagged if item['severity'] == 'crisis']
+                # Delivered when the batch commits
+                Push.publish_many(cursor, alerts)
+
+        # Committed: the comments are visible now, so their posts' authors hear about them
+        for item in approved_comments:
+            notifier.emit('comment', item['post_id'], item['author_id'])
+        with self._lock:
+            self._stats['screened'] += len(items)
+            self._stats['flagged'] += len(flagged)
+            self._stats['alerts'] += len(alerts)
+        self.last_batch_ms = round((time.perf_counter() - started) * 1000, 1)
+        return max(len(posts), len(comments))
+
+    # ─────────────────────────────────────
+    # Review
+    # ─────────────────────────────────────
+    @staticmethod
+    def flags(status='open', limit=50):
+        """Flags with their item's text; open flags list crisis hits first, then oldest first"""
+        where, params = ("", ()) if status == 'all' else ("WHERE f.status = %s", (status,))
+        order = "f.severity = 'crisis' DESC, f.created_at, f.id" if status == 'open' else "f.created_at DESC, f.id DESC"
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
+            cursor.execute(f"SELECT {FLAG_COLUMNS} FROM moderation_flags f {FLAG_JOINS} {where} "
+                           f"ORDER BY {order} LIMIT %s", params + (limit,))
+            return cursor.fetchall()
+
+    @staticmethod
+    def review(flag_id, expert_id, status):
+        """Approve or reject a flagged item; returns the flag, or None if there is no such flag"""
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                UPDATE moderation_flags SET status = %s, reviewed_by = %s, reviewed_at = %s
+                WHERE id = %s RETURNING post_id, comment_id
+            """, (status, expert_id, datetime.utcnow(), flag_id))
+            item = cursor.fetchone()
+            if not item:
+                return None
+            released = None
+            if item['comment_id'] is None:
+                cursor.execute("UPDATE posts SET moderation_status = %s WHERE id = %s", (status, item['post_id']))
+            else:
+                cursor.execute("""
+                    UPDATE comments c SET moderation_status = %s
+                    FROM (SELECT id, moderation_status FROM comments WHERE id = %s FOR UPDATE) old
+                    WHERE c.id = old.id
+                    RETURNING c.post_id, c.author_id, old.moderation_status AS previous
+                """, (status, item['comment_id']))
+                comment = cursor.fetchone()
+                if comment and status == 'approved' and comment['previous'] != 'approved':
+                    released = comment
+            cursor.execute(f"SELECT {FLAG_COLUMNS} FROM moderation_flags f {FLAG_JOINS} WHERE f.id = %s",
+                           (flag_id,))
+            flag = cursor.fetchone()
+            # Other experts' review queues drop it
+            Push.publish(cursor, Push.EXPERTS_CHANNEL, 'moderation_reviewed',
+                         {'id': flag_id, 'status': status, 'reviewed_by': expert_id})
+        # A held comment an expert lets through reaches the post's author only now
+        if released:
+            notifier.emit('comment', released['post_id'], released['author_id'])
+        return flag
+
+    def status(self):
+        self._ensure_process()
+        with self._lock:
+            stats = dict(self._stats)
+        return dict(stats, enabled=ModerationConfig.ENABLED, terms=len(self.matcher.terms),
+                    worker=self._thread is not None and self._thread.is_alive(),
+                    last_batch_ms=self.last_batch_ms, last_error=self.last_error)
+
+
+moderation = Moderator()
@@ -0,0 +1,358 @@
+# app/services/notifications.py
+"""
+Notifications for comments on and upvotes of a user's posts, and for chat
+messages sent to them.
+
+The write paths call emit(), which only appends the event to an in-memory
+list, so their latency does not change. Comments are emitted by the
+moderation worker once they are approved (app/services/moderation.py), so
+nobody is told about a comment they cannot see. A fan-out thread per worker takes
+the events every NOTIFICATIONS_FLUSH_MS (sooner once
+NOTIFICATIONS_MAX_PENDING are waiting), looks up the post authors in one
+query, drops events on the actor's own posts and coalesces the rest: all
+events of one kind on one subject for one recipient become one row, and
+that row merges with the recipient's unread row for the subject, so ten
+upvotes read "10 people upvoted your post". notification_unread counts
+each user's unread rows and is updated in the same transaction. Every
+changed notification is pushed, with the new unread count, on the
+recipient's channel: the same event stream as chat (GET /messages/stream).
+
+unread() serves the badge count from a per-worker cache, refreshed after
+NOTIFICATIONS_UNREAD_TTL seconds and updated by this worker's own writes;
+clients connected to the stream get the exact count with every event.
+Read notifications are deleted after NOTIFICATIONS_RETENTION_DAYS.
+"""
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from psycopg2.extras import execute_values, Json
+from dotenv import load_dotenv
+from app.config.db import DBConnection
+from app.config.push import Push
+
+load_dotenv()
+
+KINDS = ('comment', 'upvote', 'message')
+# Kinds whose subject is a post; its author is the recipient
+POST_KINDS = ('comment', 'upvote')
+# Actor names included in a rendered notification
+SHOWN_ACTORS = 2
+
+
+class NotificationConfig:
+    """Notification configuration"""
+
+    ENABLED = os.getenv('NOTIFICATIONS_ENABLED', '1') == '1'
+    FLUSH_MS = int(os.getenv('NOTIFICATIONS_FLUSH_MS', 500))
+    MAX_PENDING = int(os.getenv('NOTIFICATIONS_MAX_PENDING', 1000))
+    UNREAD_TTL = float(os.getenv('NOTIFICATIONS_UNREAD_TTL', 30))
+    UNREAD_CACHE_USERS = int(os.getenv('NOTIFICATIONS_UNREAD_CACHE_USERS', 10_000))
+    PAGE_SIZE = int(os.getenv('NOTIFICATIONS_PAGE_SIZE', 30))
+    MAX_PAGE_SIZE = 100
+    RETENTION_DAYS = int(os.getenv('NOTIFICATIONS_RETENTION_DAYS', 60))
+
+
+UPSERT_SQL = """
+    INSERT INTO notifications AS n (user_id, kind, subject_id, actor_ids, event_count, data, created_at, updated_at)
+    VALUES %s
+    ON CONFLICT (user_id, kind, subject_id) WHERE read_at IS NULL DO UPDATE SET
+        actor_ids = ARRAY(SELECT a FROM unnest(n.actor_ids) a WHERE a <> ALL(EXCLUDED.actor_ids)) || EXCLUDED.actor_ids,
+        event_count = n.event_count + EXCLUDED.event_count,
+        data = n.data || EXCLUDED.data,
+        updated_at = EXCLUDED.updated_at
+    RETURNING id, user_id, kind, subject_id, actor_ids, event_count, data, created_at, updated_at, read_at,
+              (xmax = 0) AS inserted
+"""
+
+UPSERT_TEMPLATE = "(%s, %s, %s, %s::INTEGER[], %s, %s::JSONB, %s, %s)"
+
+COUNT_SQL = """
+    INSERT INTO notification_unread AS u (user_id, unread) VALUES %s
+    ON CONFLICT (user_id) DO UPDATE SET unread = u.unread + EXCLUDED.unread
+    RETURNING user_id, unread
+"""
+
+
+def encode_cursor(row):
+    return f"{row['updated_at'].isoformat()}|{row['id']}"
+
+
+def decode_cursor(cursor):
+    """Parse an 'updated_at|id' keyset cursor; raises ValueError"""
+    updated_at, _, notification_id = cursor.partition('|')
+    return datetime.fromisoformat(updated_at), int(notification_id)
+
+
+def describe(row, names):
+    """Text of a notification, e.g. "5 people upvoted your post" """
+    actors = row['actor_ids']
+    count = row['event_count']
+    shown = [names.get(a) or 'Someone' for a in reversed(actors[-SHOWN_ACTORS:])]
+    if len(actors) == 1:
+        who = shown[0]
+    elif len(actors) == 2:
+        who = f"{shown[0]} and {shown[1]}"
+    else:
+        who = f"{len(actors)} people"
+    title = row['data'].get('post_title')
+    post = f'your post "{title}"' if title else 'your post'
+    if row['kind'] == 'upvote':
+        return f"{who} upvoted {post}"
+    if row['kind'] == 'comment':
+        if len(actors) == 1 and count > 1:
+            return f"{who} left {count} comments on {post}"
+        return f"{who} commented on {post}"
+    return f"{who} sent you {count} messages" if count > 1 else f"{who} sent you a message"
+
+
+def to_dict(row, names):
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "subject_id": row["subject_id"],
+        "text": describe(row, names),
+        "actors": [{"id": a, "name": names.get(a)} for a in reversed(row["actor_ids"][-SHOWN_ACTORS:])],
+        "actor_count": len(row["actor_ids"]),
+        "event_count": row["event_count"],
+        "data": row["data"],
+        "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+        "updated_at": row["updated_at"].isoformat() if row["updated_at"] else None,
+        "read_at": row["read_at"].isoformat() if row.get("read_at") else None,
+    }
+
+
+def actor_names(cursor, rows):
+    """{user id: name} for the actors shown in `rows`"""
+    ids = {a for row in rows for a in row['actor_ids'][-SHOWN_ACTORS:]}
+    if not ids:
+        return {}
+    cursor.execute("SELECT id, name FROM users WHERE id = ANY(%s)", (list(ids),))
+    return {row['id']: row['name'] for row in cursor.fetchall()}
+
+
+class Notifier:
+    """Buffered notification events, their fan-out thread and the unread counters"""
+
+    PRUNE_SECONDS = 3600
+
+    def __init__(self):
+        self._pid = None
+        self.delivered = 0
+        self.last_error = None
+        self._unread = {}
+
+    def _reset(self):
+        """(Re)initialise per-process state; also runs after a fork"""
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = []
+        self._thread = None
+        self._pruned_at = time.monotonic()
+
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def emit(self, kind, subject_id, actor_id, recipient_id=None):
+        """
+        Queue one event: `actor_id` commented on or upvoted post `subject_id`,
+        or sent a message (subject_id = the sender) to `recipient_id`
+        """
+        if not NotificationConfig.ENABLED:
+            return
+        self._ensure_process()
+        with self._lock:
+            self._pending.append((kind, int(subject_id), int(actor_id),
+                                  int(recipient_id) if recipient_id is not None else None, datetime.utcnow()))
+            full = len(self._pending) >= NotificationConfig.MAX_PENDING
+        self.start()
+        if full:
+            self._wake.set()
+
+    # ─────────────────────────────────────
+    # Fan-out
+    # ─────────────────────────────────────
+    def start(self):
+        """Start this process's fan-out thread (idempotent, fork-aware)"""
+        self._ensure_process()
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='notifications', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(NotificationConfig.FLUSH_MS / 1000)
+            self._wake.clear()
+            self.flush()
+
+    def _coalesce(self, cursor, events):
+        """[(user_id, kind, subject_id, actor_ids, event_count, data, first_at, last_at), ...], one per subject"""
+        post_ids = list({subject for kind, subject, _, _, _ in events if kind in POST_KINDS})
+        posts = {}
+        if post_ids:
+            cursor.execute("SELECT id, author_id, title FROM posts WHERE id = ANY(%s)", (post_ids,))
+            posts = {row['id']: row for row in cursor.fetchall()}
+        grouped = {}
+        for kind, subject, actor, recipient, at in events:
+            data = {}
+            if kind in POST_KINDS:
+                post = posts.get(subject)
+                if post is None:
+                    continue  # deleted since
+                recipient = post['author_id']
+                data = {'post_title': post['title']}
+            if recipient is None or recipient == actor:
+                continue
+            entry = grouped.get((recipient, kind, subject))
+            if entry is None:
+                grouped[(recipient, kind, subject)] = entry = {'actors': [], 'count': 0, 'data': data,
+                                                               'first': at, 'last': at}
+            if actor in entry['actors']:
+                entry['actors'].remove(actor)
+            entry['actors'].append(actor)
+            entry['count'] += 1
+            entry['last'] = max(entry['last'], at)
+        return [(recipient, kind, subject, e['actors'], e['count'], Json(e['data']), e['first'], e['last'])
+                for (recipient, kind, subject), e in grouped.items()]
+
+    def flush(self):
+        """Write and push the buffered events; returns the notifications changed"""
+        self._ensure_process()
+        with self._flush_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+            if not events:
+                return 0
+            try:
+                with DBConnection.get_cursor(dictionary=True) as cursor:
+                    rows = self._coalesce(cursor, events)
+                    if not rows:
+                        return 0
+                    # Lock order by key, so concurrent flushes from other workers cannot deadlock
+                    rows.sort(key=lambda r: (r[0], r[1], r[2]))
+                    changed = execute_values(cursor, UPSERT_SQL, rows, template=UPSERT_TEMPLATE, fetch=True)
+                    added = {}
+                    for row in changed:
+                        added[row['user_id']] = added.get(row['user_id'], 0) + (1 if row['inserted'] else 0)
+                    unread = dict(
+                        (r['user_id'], r['unread'])
+                        for r in execute_values(cursor, COUNT_SQL, sorted(added.items()), fetch=True)
+                    )
+                    names = actor_names(cursor, changed)
+                    # Delivered when the batch commits
+                    Push.publish_many(cursor, [
+                        (Push.user_channel(row['user_id']), 'notification',
+                         dict(to_dict(row, names), unread=unread[row['user_id']]))
+                        for row in changed
+                    ])
+                    if time.monotonic() - self._pruned_at > self.PRUNE_SECONDS:
+                        self._pruned_at = time.monotonic()
+                        cursor.execute("DELETE FROM notifications WHERE read_at < %s",
+                                       (datetime.utcnow() - timedelta(days=NotificationConfig.RETENTION_DAYS),))
+            except Exception as e:
+                # Put the events back and retry on the next flush
+                with self._lock:
+                    self._pending[:0] = events
+                self.last_error = str(e)
+                print(f"Notification flush error: {e}")
+                return 0
+            for user_id, count in unread.items():
+                self._cache_unread(user_id, count)
+            self.delivered += len(changed)
+            self.last_error = None
+            return len(changed)
+
+    # ─────────────────────────────────────
+    # Reading
+    # ─────────────────────────────────────
+    def _cache_unread(self, user_id, count):
+        if len(self._unread) >= NotificationConfig.UNREAD_CACHE_USERS:
+            self._unread.clear()
+        self._unread[user_id] = (time.monotonic(), count)
+
+    def unread(self, user_id):
+        """The user's unread count, cached for NOTIFICATIONS_UNREAD_TTL"""
+        cached = self._unread.get(user_id)
+        if cached and time.monotonic() - cached[0] < NotificationConfig.UNREAD_TTL:
+            return cached[1]
+        with DBConnection.get_cursor(readonly=True) as cursor:
+            cursor.execute("SELECT unread FROM notification_unread WHERE user_id = %s", (user_id,))
+            row = cursor.fetchone()
+        count = row[0] if row else 0
+        self._cache_unread(user_id, count)
+        return count
+
+    @staticmethod
+    def page(user_id, unread_only=False, after=None, limit=None):
+        """(notifications, next_cursor): the user's feed, most recently updated first"""
+        limit = min(limit or NotificationConfig.PAGE_SIZE, NotificationConfig.MAX_PAGE_SIZE)
+        conditions, params = ["user_id = %s"], [user_id]
+        if unread_only:
+            conditions.append("read_at IS NULL")
+        if after:
+            conditions.append("(updated_at, id) < (%s, %s)")
+            params += list(decode_cursor(after))
+        with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
+            cursor.execute(f"""
+                SELECT id, user_id, kind, subject_id, actor_ids, event_count, data, created_at, updated_at, read_at
+                FROM notifications
+                WHERE {' AND '.join(conditions)}
+                ORDER BY updated_at DESC, id DESC
+                LIMIT %s
+            """, params + [limit + 1])
+            rows = cursor.fetchall()
+            next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+            rows = rows[:limit]
+            names = actor_names(cursor, rows)
+        return [to_dict(row, names) for row in rows], next_cursor
+
+    def mark_read(self, user_id, ids=None):
+        """Mark the given notifications (all when ids is None) read; returns the new unread count"""
+        with DBConnection.get_cursor() as cursor:
+            if ids is None:
+                cursor.execute("UPDATE notifications SET read_at = %s WHERE user_id = %s AND read_at IS NULL",
+                               (datetime.utcnow(), user_id))
+                cursor.execute("UPDATE notification_unread SET unread = 0 WHERE user_id = %s RETURNING unread",
+                               (user_id,))
+            else:
+                cursor.execute("""
+                    UPDATE notifications SET read_at = %s
+                    WHERE user_id = %s AND read_at IS NULL AND id = ANY(%s)
+                """, (datetime.utcnow(), user_id, ids))
+                cursor.execute("""
+                    UPDATE notification_unread SET unread = GREATEST(unread - %s, 0)
+                    WHERE user_id = %s RETURNING unread
+                """, (cursor.rowcount, user_id))
+            row = cursor.fetchone()
+            count = row[0] if row else 0
+            # Other open tabs and devices clear their badges too
+            Push.publish(cursor, Push.user_channel(user_id), 'notifications_read', {'ids': ids, 'unread': count})
+        self._cache_unread(user_id, count)
+        return count
+
+    def status(self):
+        self._ensure_process()
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'enabled': NotificationConfig.ENABLED,
+            'pending_events': pending,
+            'delivered': self.delivered,
+            'cached_users': len(self._unread),
+            'last_error': self.last_error,
+        }
+
+
+notifier = Notifier()
+
+
+@atexit.register
+def _flush_on_exit():
+    if notifier._pid == os.getpid():
+        notifier.flush()
@@ -0,0 +1,190 @@
+# app/services/partitions.py
+"""
+Maintenance for the monthly partitions of messages and moods (migration 0003).
+
+Upcoming months are created ahead of time so inserts never miss a
+partition. Months older than the retention window are rolled up into the
+*_monthly_summary tables, detached with DETACH PARTITION CONCURRENTLY and
+renamed to archive_<partition> (or dropped with PARTITION_DROP_DETACHED=1).
+"""
+import os
+import re
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from app.config.db import DBConnection
+
+load_dotenv()
+
+PARTITION_NAME = re.compile(r'_(\d{4})_(\d{2})$')
+# pg_try_advisory_lock key so overlapping cron runs / workers do not race
+MAINTENANCE_LOCK = 7_403_201
+
+
+class PartitionConfig:
+    """Partition maintenance and history window configuration"""
+
+    MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 3))
+    # 0 keeps every month attached
+    MESSAGES_RETENTION_MONTHS = int(os.getenv('MESSAGES_RETENTION_MONTHS', 24))
+    MOODS_RETENTION_MONTHS = int(os.getenv('MOODS_RETENTION_MONTHS', 24))
+    DROP_DETACHED = os.getenv('PARTITION_DROP_DETACHED', '0') == '1'
+    # Default look-back of the history endpoints, so they only touch recent partitions
+    MESSAGES_HISTORY_DAYS = int(os.getenv('MESSAGES_HISTORY_DAYS', 90))
+    MOODS_HISTORY_DAYS = int(os.getenv('MOODS_HISTORY_DAYS', 365))
+
+
+# Rollups are recomputed from scratch for the month, so re-running is safe
+ROLLUPS = {
+    'messages': """
+        INSERT INTO message_monthly_summary (month, sender_id, receiver_id, message_count, first_at, last_at)
+        SELECT %(month)s, sender_id, receiver_id, COUNT(*), MIN(timestamp), MAX(timestamp)
+        FROM {partition}
+        GROUP BY sender_id, receiver_id
+        ON CONFLICT (month, sender_id, receiver_id) DO UPDATE
+        SET message_count = EXCLUDED.message_count,
+            first_at = EXCLUDED.first_at,
+            last_at = EXCLUDED.last_at
+    """,
+    'moods': """
+        INSERT INTO mood_monthly_summary (month, user_id, mood, entries)
+        SELECT %(month)s, user_id, mood, COUNT(*)
+        FROM {partition}
+        GROUP BY user_id, mood
+        ON CONFLICT (month, user_id, mood) DO UPDATE
+        SET entries = EXCLUDED.entries
+    """,
+}
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def history_since(days_arg, default_days):
+    """
+    Translate a ?days= query argument into a lower timestamp bound.
+    'all' returns datetime.min, i.e. every attached partition; raises
+    ValueError for anything else that is not a positive integer.
+    """
+    if days_arg is None or days_arg == '':
+        days = default_days
+    elif days_arg == 'all':
+        return datetime.min
+    else:
+        days = int(days_arg) if days_arg.isdigit() else 0
+        if days <= 0:
+            raise ValueError("days must be a positive integer or 'all'")
+    return datetime.utcnow() - timedelta(days=days)
+
+
+class PartitionManager:
+    """Create, roll up and detach monthly partitions"""
+
+    TABLES = ('messages', 'moods')
+
+    @staticmethod
+    def retention_months(table):
+        return {
+            'messages': PartitionConfig.MESSAGES_RETENTION_MONTHS,
+            'moods': PartitionConfig.MOODS_RETENTION_MONTHS,
+        }[table]
+
+    @staticmethod
+    def partitions(table):
+        """Return [(month, partition_name)] for the attached partitions, oldest first"""
+        with DBConnection.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+            """, (table,))
+            names = [row[0] for row in cursor.fetchall()]
+        found = []
+        for name in names:
+            match = PARTITION_NAME.search(name)
+            if match:
+                found.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+        return sorted(found)
+
+    @staticmethod
+    def ensure(table, start, end=None):
+        """Create any missing partitions for the months from `start` through `end` (default: now + MONTHS_AHEAD)"""
+        first = month_start(start)
+        last = month_start(end) if end else add_months(month_start(datetime.utcnow()), PartitionConfig.MONTHS_AHEAD)
+        existing = {name for _, name in PartitionManager.partitions(table)}
+        months = []
+        month = first
+        while month <= last:
+            months.append(month)
+            month = add_months(month, 1)
+        with DBConnection.get_cursor() as cursor:
+            cursor.execute("SELECT ensure_monthly_partition(%s, m) FROM unnest(%s::date[]) AS m", (table, months))
+            names = [row[0] for row in cursor.fetchall()]
+        return [name for name in names if name not in existing]
+
+    @staticmethod
+    def rollup(table, month, partition):
+        with DBConnection.get_cursor() as cursor:
+            cursor.execute(ROLLUPS[table].format(partition=partition), {'month': month})
+            return cursor.rowcount
+
+    @staticmethod
+    def detach(table, partition):
+        """DETACH CONCURRENTLY (cannot run in a transaction block), then archive or drop"""
+        with DBConnection.get_connection() as conn:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {partition} CONCURRENTLY')
+                if PartitionConfig.DROP_DETACHED:
+                    cursor.execute(f'DROP TABLE {partition}')
+                    return None
+                archived = f'archive_{partition}'
+                cursor.execute(f'ALTER TABLE {partition} RENAME TO {archived}')
+                return archived
+
+    @staticmethod
+    def expire(table, today=None, log=print):
+        """Roll up and detach partitions that fall entirely outside the retention window"""
+        retention = PartitionManager.retention_months(table)
+        if retention <= 0:
+            return []
+        cutoff = add_months(month_start(today or datetime.utcnow()), -retention)
+        expired = []
+        for month, partition in PartitionManager.partitions(table):
+            if month >= cutoff:
+                break
+            rows = PartitionManager.rollup(table, month, partition)
+            archived = PartitionManager.detach(table, partition)
+            log(f"{partition}: rolled up into {rows} summary rows, "
+                + (f"detached as {archived}" if archived else "detached and dropped"))
+            expired.append(partition)
+        return expired
+
+    @staticmethod
+    def maintain(expire=True, log=print):
+        """Create upcoming partitions and expire old ones; skipped if another run holds the lock"""
+        with DBConnection.get_connection() as conn:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (MAINTENANCE_LOCK,))
+                if not cursor.fetchone()[0]:
+                    log("Partition maintenance already running elsewhere, skipping")
+                    return None
+                try:
+                    report = {}
+                    now = datetime.utcnow()
+                    for table in PartitionManager.TABLES:
+                        created = PartitionManager.ensure(table, now)
+                        for name in created:
+                            log(f"Created partition {name}")
+                        report[table] = {'created': created,
+                                         'expired': PartitionManager.expire(table, now, log) if expire else []}
+                    return report
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (MAINTENANCE_LOCK,))
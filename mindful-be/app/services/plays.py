@@ -0,0 +1,244 @@
+# app/services/plays.py
+"""
+Play counts for music and exercise videos.
+
+The serve routes call record() for every play: a GET answered with the
+file (not a 304) without a Range header, or whose range starts at byte 0,
+so the follow-up range requests of one playback count once. Plays are added to an in-memory Counter keyed
+by (kind, item, hour); a flusher thread adds the counts to
+play_counts_hourly with one upsert per batch every PLAYS_FLUSH_SECONDS,
+or sooner once PLAYS_MAX_PENDING keys are waiting. A failed flush keeps
+the counts for the next one. Raw events are never stored; at worst a
+crashed worker loses its last few seconds of plays.
+
+popular() ranks items by their plays over the last PLAYS_POPULAR_HOURS
+from the rollup (cached for PLAYS_POPULAR_TTL seconds). The same ranking
+keeps the top PLAYS_WARM_TOP_N files of each kind in the OS page cache:
+every PLAYS_WARM_SECONDS the flusher asks the kernel to read them ahead
+(local storage only).
+"""
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from app.config.db import DBConnection
+
+load_dotenv()
+
+# kind -> (table, file column)
+KINDS = {'music': ('music', 'file_path'), 'exercise': ('exercise', 'video_path')}
+
+
+class PlayConfig:
+    """Play counting configuration"""
+
+    ENABLED = os.getenv('PLAYS_ENABLED', '1') == '1'
+    FLUSH_SECONDS = float(os.getenv('PLAYS_FLUSH_SECONDS', 5))
+    MAX_PENDING = int(os.getenv('PLAYS_MAX_PENDING', 5000))
+    POPULAR_HOURS = int(os.getenv('PLAYS_POPULAR_HOURS', 7 * 24))
+    POPULAR_LIMIT = int(os.getenv('PLAYS_POPULAR_LIMIT', 20))
+    POPULAR_TTL = float(os.getenv('PLAYS_POPULAR_TTL', 60))
+    WARM_TOP_N = int(os.getenv('PLAYS_WARM_TOP_N', 20))  # 0 = no warming
+    WARM_SECONDS = float(os.getenv('PLAYS_WARM_SECONDS', 300))
+    RETENTION_DAYS = int(os.getenv('PLAYS_RETENTION_DAYS', 90))
+
+
+UPSERT_SQL = """
+    INSERT INTO play_counts_hourly AS p (kind, item_id, hour, plays) VALUES %s
+    ON CONFLICT (kind, hour, item_id) DO UPDATE SET plays = p.plays + EXCLUDED.plays
+"""
+
+
+# Responses that hand over the file: all of it, a range of it, or a redirect to the storage
+# backend. A 304 means the client already has it and is not a new play.
+PLAYED_STATUSES = {200, 206, 302}
+
+
+def counts_as_play(request, status):
+    """A fresh playback rather than a seek, the next chunk of one, or a revalidation"""
+    if request.method != 'GET' or status not in PLAYED_STATUSES:
+        return False
+    byte_range = request.headers.get('Range')
+    return not byte_range or byte_range.replace(' ', '').startswith('bytes=0-')
+
+
+class PlayCounter:
+    """Buffered per-hour play counts, their rollup queries and the page-cache warmer"""
+
+    PRUNE_SECONDS = 3600
+    # popular() results held per (kind, hours, limit); the query string picks the key
+    POPULAR_CACHE_KEYS = 256
+
+    def __init__(self):
+        self._pid = None
+        self.flushed_plays = 0
+        self.last_error = None
+        self.warmed = {'files': 0, 'bytes': 0, 'at': None}
+        self._popular = {}
+
+    def _reset(self):
+        """(Re)initialise per-process state; also runs after a fork"""
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = Counter()
+        self._thread = None
+        self._warmed_at = 0.0
+        self._pruned_at = time.monotonic()
+
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def record(self, kind, item_id):
+        """Count one play of `item_id` in this hour"""
+        if not PlayConfig.ENABLED:
+            return
+        self._ensure_process()
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        with self._lock:
+            self._pending[(kind, item_id, hour)] += 1
+            full = len(self._pending) >= PlayConfig.MAX_PENDING
+        self.start()
+        if full:
+            self._wake.set()
+
+    # ─────────────────────────────────────
+    # Flushing
+    # ─────────────────────────────────────
+    def start(self):
+        """Start this process's flusher thread (idempotent, fork-aware)"""
+        self._ensure_process()
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='plays', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(PlayConfig.FLUSH_SECONDS)
+            self._wake.clear()
+            self.flush()
+            if PlayConfig.WARM_TOP_N and time.monotonic() - self._warmed_at > PlayConfig.WARM_SECONDS:
+                self._warmed_at = time.monotonic()
+                try:
+                    self.warm()
+                except Exception as e:
+                    print(f"Play count warm error: {e}")
+
+    def flush(self):
+        """Add the buffered counts to play_counts_hourly; returns the plays written"""
+        self._ensure_process()
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, Counter()
+            if not pending:
+                return 0
+            try:
+                with DBConnection.get_cursor() as cursor:
+                    execute_values(cursor, UPSERT_SQL,
+                                   [(kind, item_id, hour, plays) for (kind, item_id, hour), plays in pending.items()])
+                    if time.monotonic() - self._pruned_at > self.PRUNE_SECONDS:
+                        self._pruned_at = time.monotonic()
+                        cursor.execute("DELETE FROM play_counts_hourly WHERE hour < %s",
+                                       (datetime.utcnow() - timedelta(days=PlayConfig.RETENTION_DAYS),))
+            except Exception as e:
+                # Put the counts back and retry on the next flush
+                with self._lock:
+                    self._pending.update(pending)
+                self.last_error = str(e)
+                print(f"Play count flush error: {e}")
+                return 0
+            written = sum(pending.values())
+            self.flushed_plays += written
+            self.last_error = None
+            return written
+
+    # ─────────────────────────────────────
+    # Rollup queries
+    # ─────────────────────────────────────
+    def popular(self, kind, hours=None, limit=None):
+        """[(item_id, plays), ...] most played first over the last `hours`, from the rollup"""
+        hours = hours or PlayConfig.POPULAR_HOURS
+        limit = limit or PlayConfig.POPULAR_LIMIT
+        key = (kind, hours, limit)
+        cached = self._popular.get(key)
+        if cached and time.monotonic() - cached[0] < PlayConfig.POPULAR_TTL:
+            return cached[1]
+        table = KINDS[kind][0]
+        with DBConnection.get_cursor(readonly=True) as cursor:
+            # Items deleted since they were played drop out through the join
+            cursor.execute(f"""
+                SELECT p.item_id, SUM(p.plays)::BIGINT AS plays
+                FROM play_counts_hourly p JOIN {table} t ON t.id = p.item_id
+                WHERE p.kind = %s AND p.hour >= %s
+                GROUP BY p.item_id
+                ORDER BY plays DESC, p.item_id
+                LIMIT %s
+            """, (kind, datetime.utcnow() - timedelta(hours=hours), limit))
+            ranked = [(item_id, plays) for item_id, plays in cursor.fetchall()]
+        now = time.monotonic()
+        if len(self._popular) >= self.POPULAR_CACHE_KEYS:
+            self._popular = {k: v for k, v in self._popular.items() if now - v[0] < PlayConfig.POPULAR_TTL}
+            if len(self._popular) >= self.POPULAR_CACHE_KEYS:
+                self._popular.clear()
+        self._popular[key] = (now, ranked)
+        return ranked
+
+    def hot_items(self, kind, limit):
+        """[(item_id, stored path), ...] of the `limit` most played items of `kind`"""
+        ranked = self.popular(kind, limit=limit)
+        if not ranked:
+            return []
+        table, column = KINDS[kind]
+        with DBConnection.get_cursor(readonly=True) as cursor:
+            cursor.execute(f"SELECT id, {column} FROM {table} WHERE id = ANY(%s)", ([i for i, _ in ranked],))
+            paths = dict(cursor.fetchall())
+        return [(item_id, paths[item_id]) for item_id, _ in ranked if paths.get(item_id)]
+
+    def warm(self):
+        """Ask the kernel to read the most played files into the page cache"""
+        from app.services.storage import storage, key_of, LocalStorage, StorageError
+        if not isinstance(storage.backend, LocalStorage) or not hasattr(os, 'posix_fadvise'):
+            return
+        files = size = 0
+        for kind in KINDS:
+            for _, stored in self.hot_items(kind, PlayConfig.WARM_TOP_N):
+                try:
+                    fd = os.open(storage.backend.path(key_of(stored)), os.O_RDONLY)
+                except (FileNotFoundError, StorageError):
+                    continue
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                    size += os.fstat(fd).st_size
+                    files += 1
+                finally:
+                    os.close(fd)
+        self.warmed = {'files': files, 'bytes': size, 'at': datetime.utcnow().isoformat()}
+
+    def status(self):
+        self._ensure_process()
+        with self._lock:
+            pending = sum(self._pending.values())
+        return {
+            'enabled': PlayConfig.ENABLED,
+            'pending_plays': pending,
+            'flushed_plays': self.flushed_plays,
+            'warmed': self.warmed,
+            'last_error': self.last_error,
+        }
+
+
+play_counter = PlayCounter()
+
+
+@atexit.register
+def _flush_on_exit():
+    if play_counter._pid == os.getpid():
+        play_counter.flush()
@@ -0,0 +1,324 @@
+# app/services/prediction_history.py
+"""
+Persisted /predict results (migration 0007).
+
+Every prediction is stored with its label, the model's decision scores
+(in LABELS order) and a SHA-256 of the normalised text. The hash is also
+the inference cache key: a text this model version has already scored is
+answered from a per-process LRU, then from the table, before the model
+runs again.
+
+History is served from a per-user columnar cache (numpy arrays of
+timestamps, label codes and scores) that is topped up incrementally, and
+rolled up per day/week/month with vectorized numpy/pandas operations.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from app.config.db import DBConnection
+from app.services.model_loader import LABELS, model_classes, prediction_model
+
+load_dotenv()
+
+# Score columns, fixed to LABELS order as stored
+LABEL_CODES = {label: code for code, label in enumerate(LABELS)}
+
+# History codes: LABELS first, then any other label a model has stored; append-only
+# so codes already held in the per-user arrays stay valid
+_history_labels = list(LABELS)
+_history_codes = dict(LABEL_CODES)
+_history_lock = threading.Lock()
+
+
+def history_code(label):
+    """Code of a stored label in the history arrays, assigning one to a label first seen"""
+    code = _history_codes.get(label)
+    if code is not None:
+        return code
+    with _history_lock:
+        if label not in _history_codes:
+            _history_codes[label] = len(_history_labels)
+            _history_labels.append(label)
+        return _history_codes[label]
+
+
+def report_labels(codes):
+    """
+    Labels a summary reports: the active model's classes, then any other
+    label present in the stored rows (predictions by an earlier model).
+    """
+    labels = prediction_model.labels
+    known = set(labels)
+    present = [_history_labels[c] for c in np.unique(codes) if _history_labels[c] not in known]
+    return labels + present
+
+# pandas period aliases for the rollup buckets
+BUCKETS = {'day': 'D', 'week': 'W', 'month': 'M'}
+
+
+class PredictionConfig:
+    """Prediction history configuration"""
+
+    HISTORY_DAYS = int(os.getenv('PREDICTION_HISTORY_DAYS', 180))
+    COHORT_DAYS = int(os.getenv('PREDICTION_COHORT_DAYS', 30))
+    COHORT_LIMIT = int(os.getenv('PREDICTION_COHORT_LIMIT', 500))
+    # Entries in the per-process text-hash -> result cache
+    CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 4096))
+    # Users whose history arrays are kept in memory per process
+    HISTORY_CACHE_USERS = int(os.getenv('PREDICTION_HISTORY_CACHE_USERS', 256))
+
+
+def text_hash(text):
+    """Hash of the text with whitespace normalised, so trivially different inputs share a cache entry"""
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def infer(model, texts):
+    """
+    Labels and decision scores (rows in LABELS order, NaN where the model has
+    no such class; None without decision_function). A pipeline's feature
+    steps run once for both.
+    """
+    if hasattr(model, 'predict_scores'):
+        final = model  # compact bundle: both in one pass
+        labels, raw = model.predict_scores(texts)
+    else:
+        if hasattr(model, 'steps'):
+            features, final = model[:-1].transform(texts), model[-1]
+        else:
+            features, final = texts, model
+        labels = final.predict(features)
+        if not hasattr(final, 'decision_function'):
+            return list(labels), None
+        raw = final.decision_function(features)
+    raw = np.atleast_2d(raw)
+    classes = model_classes(final) or LABELS
+    if raw.shape[1] != len(classes):
+        return list(labels), None  # binary models return a single margin
+    scores = np.full((len(texts), len(LABELS)), np.nan, dtype=np.float32)
+    for column, label in enumerate(classes):
+        if label in LABEL_CODES:
+            scores[:, LABEL_CODES[label]] = raw[:, column]
+    return list(labels), scores
+
+
+class PredictionStore:
+    """Inference cache and persistence"""
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def cached(digest, model_version):
+        """(label, scores) for a text this model version has scored before, or None"""
+        key = (digest, model_version)
+        with PredictionStore._lock:
+            if key in PredictionStore._cache:
+                PredictionStore._cache.move_to_end(key)
+                return PredictionStore._cache[key]
+        try:
+            with DBConnection.get_cursor(readonly=True) as cursor:
+                cursor.execute("""
+                    SELECT label, scores FROM predictions
+                    WHERE text_hash = %s AND model_version = %s
+                    ORDER BY id DESC LIMIT 1
+                """, key)
+                row = cursor.fetchone()
+        except Exception as e:
+            # Without the database a lookup is just a miss; the model still answers
+            print(f"Prediction cache lookup error: {e}")
+            return None
+        if row is None:
+            return None
+        result = (row[0], None if row[1] is None else np.array(row[1], dtype=np.float32))
+        PredictionStore._remember(key, result)
+        return result
+
+    @staticmethod
+    def _remember(key, result):
+        with PredictionStore._lock:
+            PredictionStore._cache[key] = result
+            PredictionStore._cache.move_to_end(key)
+            while len(PredictionStore._cache) > PredictionConfig.CACHE_SIZE:
+                PredictionStore._cache.popitem(last=False)
+
+    @staticmethod
+    def predict(model, model_version, text):
+        """
+        (label, scores, inference_ms) for one text, running the model only on a
+        cache miss; inference_ms times the model alone and is None for a hit.
+        """
+        digest = text_hash(text)
+        hit = PredictionStore.cached(digest, model_version)
+        if hit is not None:
+            return hit[0], hit[1], None
+        started = time.perf_counter()
+        labels, scores = infer(model, [text])
+        inference_ms = (time.perf_counter() - started) * 1000
+        result = (labels[0] if labels else 'Unknown', None if scores is None else scores[0])
+        PredictionStore._remember((digest, model_version), result)
+        return result[0], result[1], inference_ms
+
+    @staticmethod
+    def record(user_id, text, label, scores, model_version):
+        """Store one prediction; returns (id, created_at)"""
+        with DBConnection.get_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO predictions (user_id, label, scores, text_hash, model_version)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id, created_at
+            """, (user_id, label, None if scores is None else [None if np.isnan(s) else float(s) for s in scores],
+                  text_hash(text), model_version))
+            return cursor.fetchone()
+
+
+class UserHistory:
+    """One user's predictions as parallel numpy columns"""
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.created_at = np.empty(0, dtype='datetime64[us]')
+        self.codes = np.empty(0, dtype=np.int16)
+        self.scores = np.empty((0, len(LABELS)), dtype=np.float32)
+        self.refreshed_at = None
+
+    def extend(self, rows):
+        """Append (id, created_at, label, scores) rows not already held"""
+        if not rows:
+            return
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        fresh = ~np.isin(ids, self.ids)
+        if not fresh.any():
+            return
+        rows = [row for row, keep in zip(rows, fresh) if keep]
+        self.ids = np.concatenate([self.ids, ids[fresh]])
+        self.created_at = np.concatenate([self.created_at, np.array([row[1] for row in rows], dtype='datetime64[us]')])
+        self.codes = np.concatenate([self.codes, np.fromiter(
+            (history_code(row[2]) for row in rows), dtype=np.int16, count=len(rows))])
+        scores = np.full((len(rows), len(LABELS)), np.nan, dtype=np.float32)
+        for i, row in enumerate(rows):
+            if row[3] is not None:
+                scores[i] = [np.nan if s is None else s for s in row[3]]
+        self.scores = np.concatenate([self.scores, scores])
+
+
+class PredictionHistory:
+    """Per-user columnar cache and rollups"""
+
+    _users = OrderedDict()
+    _lock = threading.Lock()
+    # Rows committed slightly out of id order are caught by re-reading this recent window
+    OVERLAP = timedelta(seconds=60)
+
+    @staticmethod
+    def load(user_id):
+        """The user's history, topped up with rows added since the last call"""
+        with PredictionHistory._lock:
+            history = PredictionHistory._users.pop(user_id, None) or UserHistory()
+            PredictionHistory._users[user_id] = history
+            while len(PredictionHistory._users) > PredictionConfig.HISTORY_CACHE_USERS:
+                PredictionHistory._users.popitem(last=False)
+
+        last_id = int(history.ids.max()) if len(history.ids) else 0
+        since = (history.refreshed_at or datetime.min + PredictionHistory.OVERLAP) - PredictionHistory.OVERLAP
+        with DBConnection.get_cursor(readonly=True) as cursor:
+            cursor.execute("SELECT NOW()::timestamp")
+            now = cursor.fetchone()[0]
+            cursor.execute("""
+                SELECT id, created_at, label, scores FROM predictions
+                WHERE user_id = %s AND (id > %s OR created_at >= %s)
+                ORDER BY id
+            """, (user_id, last_id, since))
+            rows = cursor.fetchall()
+        with PredictionHistory._lock:
+            history.extend(rows)
+            history.refreshed_at = now
+        return history
+
+    @staticmethod
+    def rollup(history, since, bucket):
+        """Label counts and mean decision scores per bucket, oldest first"""
+        mask = history.created_at >= np.datetime64(since)
+        created_at, codes, scores = history.created_at[mask], history.codes[mask], history.scores[mask]
+        labels = report_labels(codes)
+        columns = [history_code(label) for label in labels]
+        n_codes = len(_history_labels)
+        summary = {
+            'total': int(len(codes)),
+            'labels': labels,
+            'distribution': dict(zip(labels, np.bincount(codes, minlength=n_codes)[columns].tolist())),
+            'series': [],
+            'latest': None,
+        }
+        if not len(codes):
+            return summary
+
+        latest = int(np.argmax(created_at))
+        summary['latest'] = {'label': _history_labels[codes[latest]],
+                             'created_at': pd.Timestamp(created_at[latest]).isoformat()}
+
+        starts = pd.DatetimeIndex(created_at).to_period(BUCKETS[bucket]).start_time
+        bucket_starts, inverse = np.unique(starts.values, return_inverse=True)
+        counts = np.bincount(inverse * n_codes + codes, minlength=len(bucket_starts) * n_codes)
+        counts = counts.reshape(len(bucket_starts), n_codes)[:, columns]
+        mean_scores = pd.DataFrame(scores, columns=LABELS).groupby(inverse).mean()
+        for i, start in enumerate(bucket_starts):
+            means = mean_scores.loc[i]
+            summary['series'].append({
+                'start': pd.Timestamp(start).isoformat(),
+                'total': int(counts[i].sum()),
+                'counts': dict(zip(labels, counts[i].tolist())),
+                # Scores are only stored for LABELS columns
+                'mean_scores': {label: None if label not in means or np.isnan(means[label])
+                                else round(float(means[label]), 4) for label in labels},
+            })
+        return summary
+
+    @staticmethod
+    def cohort(since, user_ids=None, limit=None):
+        """
+        Per-user label counts, dominant and latest label for many users from
+        one query, most recently active first. Returns (labels, users).
+        """
+        limit = limit or PredictionConfig.COHORT_LIMIT
+        with DBConnection.get_cursor(readonly=True) as cursor:
+            cursor.execute(f"""
+                SELECT user_id, created_at, label FROM predictions
+                WHERE created_at >= %s {'AND user_id = ANY(%s)' if user_ids else ''}
+                ORDER BY user_id, created_at
+            """, (since, list(user_ids)) if user_ids else (since,))
+            rows = cursor.fetchall()
+            if not rows:
+                return prediction_model.labels, []
+            users = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            created_at = np.array([row[1] for row in rows], dtype='datetime64[us]')
+            codes = np.fromiter((history_code(row[2]) for row in rows), dtype=np.int16, count=len(rows))
+            labels = report_labels(codes)
+            columns = [history_code(label) for label in labels]
+
+            user_list, inverse = np.unique(users, return_inverse=True)
+            n_codes = len(_history_labels)
+            counts = np.bincount(inverse * n_codes + codes, minlength=len(user_list) * n_codes)
+            counts = counts.reshape(len(user_list), n_codes)[:, columns]
+            # Rows are sorted by user then time, so each user's last row is their latest
+            last = np.r_[np.flatnonzero(np.diff(inverse)), len(inverse) - 1]
+            order = np.argsort(created_at[last])[::-1][:limit]
+
+            cursor.execute("SELECT id, name FROM users WHERE id = ANY(%s)", (user_list[order].tolist(),))
+            names = dict(cursor.fetchall())
+
+        return labels, [{
+            'user_id': int(user_list[i]),
+            'name': names.get(int(user_list[i])),
+            'total': int(counts[i].sum()),
+            'distribution': dict(zip(labels, counts[i].tolist())),
+            'dominant': labels[int(np.argmax(counts[i]))],
+            'latest': {'label': _history_labels[codes[last[i]]],
+                       'created_at': pd.Timestamp(created_at[last[i]]).isoformat()},
+        } for i in order]
@@ -0,0 +1,239 @@
+# app/services/recommender.py
+"""
+Concrete music and exercises for a predicted label.
+
+Every catalog row is scored once per label: its category, tags and title
+words are matched against the label's term weights (LABEL_TERMS), with
+the category counting most. The best RECOMMENDER_CANDIDATES rows per
+label and kind are kept in memory, already serialized. A /predict
+response re-ranks those few with the caller's recent moods (MOOD_TERMS,
+over RECOMMENDER_MOOD_DAYS and cached per user for RECOMMENDER_MOOD_TTL
+seconds) and returns the top RECOMMENDER_TOP_K of each kind, so a lookup
+is a dict access and a short sort.
+
+Triggers on music and exercise bump catalog_version on every write. Each
+worker's watcher thread compares it every RECOMMENDER_POLL_SECONDS and
+rebuilds the candidate lists beside the old ones, swapping them in with
+one assignment; catalog writes through this worker wake it at once.
+"""
+import heapq
+import os
+import re
+import threading
+import time
+from dotenv import load_dotenv
+from app.config.db import DBConnection
+
+load_dotenv()
+
+WORD = re.compile(r"[a-z]+")
+
+# Term weights per predicted label, matched against category, tags and title words
+LABEL_TERMS = {
+    'Anxiety': {'calm': 3, 'relaxation': 3, 'relax': 3, 'breathing': 3, 'grounding': 3, 'meditation': 2,
+                'mindfulness': 2, 'nature': 2, 'quiet': 2, 'ambient': 2, 'yoga': 2, 'sleep': 1, 'slow': 1},
+    'Depression': {'uplifting': 3, 'hopeful': 3, 'energy': 2, 'morning': 2, 'light': 2, 'walk': 2,
+                   'movement': 2, 'gratitude': 2, 'smile': 2, 'nature': 2, 'friend': 1, 'focus': 1},
+    'Stress': {'relaxation': 3, 'relax': 3, 'breathing': 3, 'calm': 2, 'stretch': 2, 'yoga': 2, 'sleep': 2,
+               'meditation': 2, 'nature': 2, 'quiet': 1},
+    'Normal': {'focus': 2, 'energy': 2, 'workout': 2, 'morning': 1, 'mindfulness': 1, 'meditation': 1,
+               'hopeful': 1, 'nature': 1},
+    'Bipolar': {'sleep': 3, 'routine': 3, 'calm': 2, 'grounding': 2, 'breathing': 2, 'relaxation': 2,
+                'meditation': 1},
+    'Personality disorder': {'grounding': 3, 'mindfulness': 3, 'breathing': 2, 'journal': 2, 'calm': 2,
+                             'meditation': 2},
+    'Suicidal': {'calm': 3, 'grounding': 3, 'breathing': 3, 'support': 3, 'hopeful': 2, 'friend': 2,
+                 'gentle': 2},
+}
+
+# Terms a logged mood pulls recommendations towards, keyed by the moods
+# MoodTrackerScreen logs (Happy, Neutral, Sad, Anxious, Angry, Excited), lower-cased
+MOOD_TERMS = {
+    'happy': {'energy': 1, 'focus': 1, 'workout': 1},
+    'neutral': {'mindfulness': 1, 'meditation': 1, 'focus': 1},
+    'sad': {'uplifting': 2, 'hopeful': 2, 'smile': 1, 'light': 1},
+    'anxious': {'calm': 2, 'breathing': 2, 'grounding': 2},
+    'angry': {'relaxation': 2, 'breathing': 2, 'workout': 1, 'walk': 1},
+    'excited': {'energy': 2, 'workout': 1, 'grounding': 1},
+}
+
+CATEGORY_WEIGHT = 2.0
+TITLE_WEIGHT = 0.5
+
+KINDS = {
+    'music': ("SELECT id, music_name, author, category, file_path, tags, cover_hash, created_at, updated_at "
+              "FROM music", 'music_name'),
+    'exercises': ("SELECT id, title, category, duration, description, steps, video_path, poster_hash, "
+                  "created_at, updated_at FROM exercise", 'title'),
+}
+
+
+class RecommenderConfig:
+    """Recommendation configuration"""
+
+    ENABLED = os.getenv('RECOMMENDER_ENABLED', '1') == '1'
+    TOP_K = int(os.getenv('RECOMMENDER_TOP_K', 3))
+    CANDIDATES = int(os.getenv('RECOMMENDER_CANDIDATES', 50))
+    POLL_SECONDS = float(os.getenv('RECOMMENDER_POLL_SECONDS', 10))
+    MOOD_DAYS = int(os.getenv('RECOMMENDER_MOOD_DAYS', 14))
+    MOOD_TTL = float(os.getenv('RECOMMENDER_MOOD_TTL', 300))
+    # How much a fully matching mood history adds, relative to the label score
+    MOOD_WEIGHT = float(os.getenv('RECOMMENDER_MOOD_WEIGHT', 0.5))
+    MOOD_CACHE_USERS = int(os.getenv('RECOMMENDER_MOOD_CACHE_USERS', 10_000))
+
+
+def words(value):
+    return WORD.findall(value.lower()) if value else []
+
+
+def item_terms(row, title_column):
+    """{term: weight} describing a catalog row"""
+    terms = {}
+    for word in words(row[title_column]):
+        terms[word] = max(terms.get(word, 0), TITLE_WEIGHT)
+    for tag in row.get('tags') or []:
+        for word in words(tag):
+            terms[word] = max(terms.get(word, 0), 1.0)
+    for word in words(row['category']):
+        terms[word] = CATEGORY_WEIGHT
+    return terms
+
+
+def score(terms, weights):
+    return sum(weight * weights[term] for term, weight in terms.items() if term in weights)
+
+
+class Recommender:
+    """Per-label candidate lists, kept in step with the catalog by a watcher thread"""
+
+    def __init__(self):
+        # {label: {kind: [(score, terms, item), ...]}}, best first
+        self._candidates = None
+        self.version = None
+        self.built_at = None
+        self.build_ms = None
+        self.last_error = None
+        self._moods = {}
+        self._build_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    # Candidate lists
+    @staticmethod
+    def catalog_version():
+        with DBConnection.get_cursor(readonly=True) as cursor:
+            cursor.execute("SELECT version FROM catalog_version")
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def build(self):
+        """Rescore the catalog and swap in new candidate lists"""
+        from app.routes.music import row_to_dict as music_dict
+        from app.routes.exercise import row_to_dict as exercise_dict
+        serializers = {'music': music_dict, 'exercises': exercise_dict}
+        with self._build_lock:
+            started = time.perf_counter()
+            version = self.catalog_version()
+            candidates = {label: {} for label in LABEL_TERMS}
+            with DBConnection.get_cursor(dictionary=True, readonly=True) as cursor:
+                for kind, (query, title_column) in KINDS.items():
+                    cursor.execute(query)
+                    rows = [(row, item_terms(row, title_column)) for row in cursor.fetchall()]
+                    for label, weights in LABEL_TERMS.items():
+                        # Ties go to the newest rows
+                        best = heapq.nlargest(RecommenderConfig.CANDIDATES, rows,
+                                              key=lambda r: (score(r[1], weights), r[0]['id']))
+                        candidates[label][kind] = [(score(terms, weights), terms, serializers[kind](row))
+                                                   for row, terms in best]
+            self._candidates = candidates
+            self.version = version
+            self.built_at = time.time()
+            self.build_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    def sync(self):
+        """Rebuild if the catalog changed since the last build"""
+        if self._candidates is None or self.catalog_version() != self.version:
+            self.build()
+
+    def invalidate(self):
+        """A catalog write went through this worker: re-check on the watcher thread now"""
+        self._wake.set()
+
+    def start(self):
+        """Start this process's watcher thread (idempotent, fork-aware)"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='recommender', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+                self.last_error = None
+            except Exception as e:
+                if str(e) != self.last_error:
+                    print(f"Recommender refresh error: {e}")
+                self.last_error = str(e)
+            self._wake.wait(RecommenderConfig.POLL_SECONDS)
+            self._wake.clear()
+
+    # Mood history
+    def mood_weights(self, user_id):
+        """{term: weight} from the user's recent moods, cached for RECOMMENDER_MOOD_TTL"""
+        cached = self._moods.get(user_id)
+        if cached and time.monotonic() - cached[0] < RecommenderConfig.MOOD_TTL:
+            return cached[1]
+        with DBConnection.get_cursor(readonly=True) as cursor:
+            cursor.execute("""
+                SELECT lower(mood), COUNT(*) FROM moods
+                WHERE user_id = %s AND created_at >= NOW() - %s * INTERVAL '1 day'
+                GROUP BY lower(mood)
+            """, (user_id, RecommenderConfig.MOOD_DAYS))
+            counts = cursor.fetchall()
+        total = sum(count for _, count in counts) or 1
+        weights = {}
+        for mood, count in counts:
+            for term, weight in MOOD_TERMS.get(mood, {}).items():
+                weights[term] = weights.get(term, 0) + weight * count / total
+        if len(self._moods) >= RecommenderConfig.MOOD_CACHE_USERS:
+            self._moods.clear()
+        self._moods[user_id] = (time.monotonic(), weights)
+        return weights
+
+    # Lookup
+    def recommend(self, label, user_id=None, k=None):
+        """{'music': [...], 'exercises': [...]}: the top `k` items of each kind for `label`"""
+        if self._candidates is None:
+            self.build()
+        k = RecommenderConfig.TOP_K if k is None else k
+        moods = {}
+        if user_id is not None and RecommenderConfig.MOOD_WEIGHT:
+            try:
+                moods = self.mood_weights(user_id)
+            except Exception as e:
+                print(f"Recommender mood history error: {e}")
+        by_kind = self._candidates.get(label, {})
+        result = {}
+        for kind in KINDS:
+            candidates = by_kind.get(kind, [])
+            if moods:
+                candidates = sorted(candidates, key=lambda c: c[0] + RecommenderConfig.MOOD_WEIGHT * score(c[1], moods),
+                                    reverse=True)
+            result[kind] = [item for _, _, item in candidates[:k]]
+        return result
+
+    def status(self):
+        return {
+            'enabled': RecommenderConfig.ENABLED,
+            'catalog_version': self.version,
+            'built_at': self.built_at,
+            'build_ms': self.build_ms,
+            'watcher': self._thread is not None and self._thread.is_alive(),
+            'last_error': self.last_error,
+        }
+
+
+recommender = Recommender()
@@ -0,0 +1,122 @@
+# app/services/segmentation.py
+"""
+Segmented /predict: long inputs are split into sentences or fixed word
+windows and every segment is classified in one batched model call.
+
+The tokenizer walks the text lazily (re.finditer over words), so it stops
+as soon as SEGMENT_MAX_SEGMENTS segments are built; the rest of a huge
+paste is never tokenized or vectorized. Segment verdicts are combined by
+length-weighted mean decision score (or vote, for models without scores),
+and any segment labelled one of SEGMENT_ESCALATE_LABELS decides the verdict.
+"""
+import os
+import re
+from itertools import islice
+import numpy as np
+from dotenv import load_dotenv
+from app.services.model_loader import LABELS
+from app.services.prediction_history import LABEL_CODES, infer
+
+load_dotenv()
+
+WORD = re.compile(r'\S+')
+SENTENCE_END = ('.', '!', '?', '…')
+MODES = ('whole', 'sentences', 'windows', 'auto')
+
+
+class SegmentConfig:
+    """Segmented prediction configuration"""
+
+    # Request bodies above this are refused before they are parsed
+    MAX_BYTES = int(os.getenv('PREDICT_MAX_BYTES', 100_000))
+    # whole: one document; sentences / windows: segmented; auto: segment texts longer than AUTO_CHARS
+    DEFAULT_MODE = os.getenv('PREDICT_MODE', 'auto')
+    AUTO_CHARS = int(os.getenv('PREDICT_AUTO_SEGMENT_CHARS', 1500))
+    # Longest text classified as a single document
+    WHOLE_MAX_CHARS = int(os.getenv('PREDICT_WHOLE_MAX_CHARS', 5000))
+    MAX_SEGMENTS = int(os.getenv('SEGMENT_MAX_SEGMENTS', 64))
+    WINDOW_WORDS = int(os.getenv('SEGMENT_WINDOW_WORDS', 60))
+    # Sentences shorter than this are joined with the next one
+    MIN_WORDS = int(os.getenv('SEGMENT_MIN_WORDS', 4))
+    ESCALATE_LABELS = [l.strip() for l in os.getenv('SEGMENT_ESCALATE_LABELS', 'Suicidal').split(',') if l.strip()]
+
+
+def resolve_mode(mode, text):
+    """The concrete mode for a request; 'auto' picks by length"""
+    mode = mode or SegmentConfig.DEFAULT_MODE
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    if mode == 'auto':
+        return 'sentences' if len(text) > SegmentConfig.AUTO_CHARS else 'whole'
+    return mode
+
+
+def iter_segments(text, mode='sentences'):
+    """
+    Yield segments lazily. Sentences end at terminal punctuation or a line
+    break (short ones are merged forward); no segment exceeds WINDOW_WORDS words.
+    """
+    words = []
+    for match in WORD.finditer(text):
+        word = match.group()
+        words.append(word)
+        boundary = len(words) >= SegmentConfig.WINDOW_WORDS
+        if mode == 'sentences' and not boundary and len(words) >= SegmentConfig.MIN_WORDS:
+            boundary = word.endswith(SENTENCE_END) or text.startswith('\n', match.end())
+        if boundary:
+            yield ' '.join(words)
+            words = []
+    if words:
+        yield ' '.join(words)
+
+
+def segment(text, mode='sentences'):
+    """(segments, truncated) with at most MAX_SEGMENTS segments"""
+    segments = list(islice(iter_segments(text, mode), SegmentConfig.MAX_SEGMENTS + 1))
+    truncated = len(segments) > SegmentConfig.MAX_SEGMENTS
+    return segments[:SegmentConfig.MAX_SEGMENTS], truncated
+
+
+def aggregate(labels, scores, weights):
+    """(verdict, aggregated scores or None, share of weight per label)"""
+    weights = np.asarray(weights, dtype=np.float64)
+    codes = np.array([LABEL_CODES.get(label, -1) for label in labels])
+    known = codes >= 0
+    shares = np.bincount(codes[known], weights=weights[known], minlength=len(LABELS))
+    shares = shares / shares.sum() if shares.sum() else shares
+    distribution = {label: round(float(share), 4) for label, share in zip(LABELS, shares)}
+
+    combined = None
+    if scores is not None:
+        masked = np.ma.masked_invalid(scores)
+        combined = np.ma.average(masked, axis=0, weights=weights).filled(np.nan).astype(np.float32)
+
+    for label in SegmentConfig.ESCALATE_LABELS:
+        if label in labels:
+            return label, combined, distribution
+    if combined is not None and not np.isnan(combined).all():
+        return LABELS[int(np.nanargmax(combined))], combined, distribution
+    return LABELS[int(np.argmax(shares))], combined, distribution
+
+
+def predict_segments(model, text, mode='sentences'):
+    """Classify every segment in one batch and combine them into a verdict"""
+    segments, truncated = segment(text, mode)
+    if not segments:
+        raise ValueError('Valid text input is required')
+    labels, scores = infer(model, segments)
+    weights = [len(s.split()) for s in segments]
+    verdict, combined, distribution = aggregate(labels, scores, weights)
+    return {
+        'verdict': verdict,
+        'scores': combined,
+        'distribution': distribution,
+        'truncated': truncated,
+        'segments': [{
+            'text': s if len(s) <= 120 else s[:117] + '...',
+            'label': labels[i],
+            'scores': None if scores is None else {
+                label: None if np.isnan(v) else round(float(v), 4) for label, v in zip(LABELS, scores[i])
+            },
+        } for i, s in enumerate(segments)],
+    }
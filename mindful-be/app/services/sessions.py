@@ -0,0 +1,239 @@
+# app/services/sessions.py
+"""
+Timers for paid chat sessions.
+
+A paid claim becomes an 'active' session whose deadline (ends_at) is
+stored on the request row, so nothing is lost on restart. Each worker
+keeps its sessions in an in-memory hashed timer wheel: ticks with nothing
+due never touch the database, and everything due in the same tick is
+ended with one UPDATE that also writes the credit_ledger rows. A periodic
+resync reloads active sessions, which picks up sessions started by other
+workers and anything left over from a restart. Ending is guarded by
+status = 'active', so several workers holding the same session is safe.
+"""
+import math
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from app.config.db import DBConnection
+from app.config.push import Push
+
+load_dotenv()
+
+
+class SessionConfig:
+    """Session timer configuration"""
+
+    TICK_SECONDS = float(os.getenv('SESSION_TICK_SECONDS', 1))
+    WHEEL_SLOTS = int(os.getenv('SESSION_WHEEL_SLOTS', 512))
+    RESYNC_SECONDS = int(os.getenv('SESSION_RESYNC_SECONDS', 60))
+    # Credits taken from users.chat_count per started minute when a session ends. Messages sent
+    # during the session are not charged per message, so this is what the session costs;
+    # 0 makes sessions free once marked paid
+    CREDITS_PER_MINUTE = int(os.getenv('SESSION_CREDITS_PER_MINUTE', 1))
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel: O(1) add/remove, and each tick only looks at one slot.
+    Deadlines further away than one revolution wait in their slot until the
+    tick counter reaches them.
+    """
+
+    def __init__(self, tick_seconds, slots, clock=time.monotonic):
+        self.tick_seconds = tick_seconds
+        self.slots = [dict() for _ in range(slots)]  # key -> due tick
+        self.clock = clock
+        self.origin = clock()
+        self.current = 0  # next tick to process
+        self._slot_of = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def add(self, key, delay_seconds):
+        """(Re)schedule `key` to fire `delay_seconds` from now"""
+        with self._lock:
+            self._discard(key)
+            if delay_seconds <= 0:
+                tick = self.current  # already due: fire on the next advance
+            else:
+                elapsed = self.clock() - self.origin + delay_seconds
+                tick = max(math.ceil(elapsed / self.tick_seconds), self.current)
+            slot = tick % len(self.slots)
+            self.slots[slot][key] = tick
+            self._slot_of[key] = slot
+
+    def remove(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self.slots[slot].pop(key, None)
+
+    def advance(self):
+        """Process every tick up to now and return the keys that came due"""
+        due = []
+        with self._lock:
+            target = int((self.clock() - self.origin) / self.tick_seconds)
+            while self.current <= target:
+                bucket = self.slots[self.current % len(self.slots)]
+                ready = [key for key, tick in bucket.items() if tick <= self.current]
+                for key in ready:
+                    del bucket[key]
+                    del self._slot_of[key]
+                due.extend(ready)
+                self.current += 1
+        return due
+
+
+SESSION_COLUMNS = "id, user_id, claimed_by, session_duration, started_at, ends_at, ended_at, status"
+
+
+class ChatSessions:
+    """Database side of session start/end and metering"""
+
+    @staticmethod
+    def active(limit=None):
+        """[(request_id, seconds_left)] for every active session"""
+        with DBConnection.get_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT id, EXTRACT(EPOCH FROM ends_at - NOW()::timestamp)
+                FROM chat_session_requests
+                WHERE status = 'active'
+                ORDER BY ends_at
+                {'LIMIT %s' if limit else ''}
+            """, (limit,) if limit else None)
+            return [(request_id, float(seconds_left)) for request_id, seconds_left in cursor.fetchall()]
+
+    @staticmethod
+    def end(request_ids, force=False, participant_id=None):
+        """
+        End active sessions in one statement: mark them completed, meter the
+        time used into credit_ledger (debiting chat_count if configured) and
+        notify both sides. Without `force` only sessions past ends_at end;
+        `participant_id` limits it to sessions that user or expert is part of.
+        Returns the ended rows.
+        """
+        if not request_ids:
+            return []
+        with DBConnection.get_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                WITH ended AS (
+                    UPDATE chat_session_requests
+                    SET status = 'completed', ended_at = LEAST(NOW()::timestamp, ends_at), updated_at = NOW()
+                    WHERE id = ANY(%(ids)s) AND status = 'active'
+                      {'' if force else 'AND ends_at <= NOW()'}
+                      {'' if participant_id is None else 'AND %(participant)s IN (user_id, claimed_by)'}
+                    RETURNING {SESSION_COLUMNS}
+                ), metered AS (
+                    SELECT ended.*,
+                           GREATEST(EXTRACT(EPOCH FROM ended_at - started_at), 0)::int AS seconds,
+                           -CEIL(GREATEST(EXTRACT(EPOCH FROM ended_at - started_at), 0) / 60)::int
+                               * %(per_minute)s AS credits
+                    FROM ended
+                ), ledger AS (
+                    INSERT INTO credit_ledger (user_id, session_request_id, event, seconds, credits)
+                    SELECT user_id, id, 'session_end', seconds, credits FROM metered
+                ), debited AS (
+                    UPDATE users u SET chat_count = GREATEST(u.chat_count + m.credits, 0)
+                    FROM metered m
+                    WHERE u.id = m.user_id AND m.credits <> 0
+                )
+                SELECT * FROM metered
+            """, {'ids': list(request_ids), 'per_minute': SessionConfig.CREDITS_PER_MINUTE,
+                  'participant': participant_id})
+            rows = cursor.fetchall()
+            events = []
+            for row in rows:
+                data = {'id': row['id'], 'ended_at': row['ended_at'], 'seconds': row['seconds'],
+                        'credits': row['credits']}
+                for participant in (row['user_id'], row['claimed_by']):
+                    if participant is not None:
+                        events.append((Push.user_channel(participant), 'chat_session_ended', data))
+            Push.publish_many(cursor, events)
+        return rows
+
+    @staticmethod
+    def remaining(request_ids):
+        """{request_id: seconds_left} for the given sessions that are still active"""
+        with DBConnection.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT id, EXTRACT(EPOCH FROM ends_at - NOW()::timestamp)
+                FROM chat_session_requests
+                WHERE id = ANY(%s) AND status = 'active'
+            """, (list(request_ids),))
+            return {request_id: float(seconds_left) for request_id, seconds_left in cursor.fetchall()}
+
+
+class SessionTimer:
+    """Per-process scheduler thread driving a TimerWheel"""
+
+    def __init__(self):
+        self.wheel = TimerWheel(SessionConfig.TICK_SECONDS, SessionConfig.WHEEL_SLOTS)
+        self.ended = 0
+        self.last_resync = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def schedule(self, request_id, seconds_left):
+        self.wheel.add(request_id, seconds_left)
+
+    def cancel(self, request_id):
+        self.wheel.remove(request_id)
+
+    def start(self):
+        """Start the scheduler thread (idempotent); the first resync runs in the thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='session-timer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def resync(self):
+        for request_id, seconds_left in ChatSessions.active():
+            self.wheel.add(request_id, seconds_left)
+        self.last_resync = time.time()
+
+    def tick(self):
+        due = self.wheel.advance()
+        if not due:
+            return []
+        ended = ChatSessions.end(due)
+        self.ended += len(ended)
+        leftover = set(due) - {row['id'] for row in ended}
+        if leftover:
+            # Not past ends_at by the database clock yet (or already ended elsewhere)
+            for request_id, seconds_left in ChatSessions.remaining(leftover).items():
+                self.wheel.add(request_id, max(seconds_left, SessionConfig.TICK_SECONDS))
+        return ended
+
+    def _run(self):
+        next_resync = 0
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() >= next_resync:
+                    next_resync = time.monotonic() + SessionConfig.RESYNC_SECONDS
+                    self.resync()
+                self.tick()
+            except Exception as e:
+                print(f"Session timer error: {e}")
+            self._stop.wait(SessionConfig.TICK_SECONDS)
+
+    def status(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'scheduled': len(self.wheel),
+            'ended': self.ended,
+            'last_resync': self.last_resync,
+        }
+
+
+session_timer = SessionTimer()
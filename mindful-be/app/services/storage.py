@@ -0,0 +1,476 @@
+# app/services/storage.py
+"""
+Media files (music, exercise videos) behind one interface, on local disk or
+in an S3-compatible object store.
+
+Rows keep a storage key such as "music/<uuid>_<name>". Older rows hold
+"uploads/music/..." paths, which name the same keys. STORAGE_BACKEND picks
+where the keys live:
+
+- local: files under STORAGE_LOCAL_ROOT (default mindful-be/uploads,
+  whatever the working directory). With STORAGE_LOCAL_PUBLIC_URL and
+  STORAGE_LOCAL_SECURE_LINK_SECRET set, download URLs are signed for
+  nginx's secure_link module, so nginx serves the file itself:
+
+      location /media/ {
+          alias /srv/mindful-be/uploads/;
+          secure_link $arg_md5,$arg_expires;
+          secure_link_md5 "$secure_link_expires$uri <secret>";
+          if ($secure_link = "") { return 403; }
+          if ($secure_link = "0") { return 410; }
+      }
+
+- s3: objects in STORAGE_S3_BUCKET at STORAGE_S3_ENDPOINT (AWS, MinIO,
+  ...; path-style addressing), signed with AWS Signature V4 over plain
+  `requests`. Download URLs are pre-signed GETs.
+
+With STORAGE_DIRECT_DOWNLOADS=1 the serve routes answer with a redirect to
+such a URL, so large media never streams through a Flask worker.
+
+Writes are refused with StorageFull once the accounted usage plus the
+upload would pass STORAGE_BUDGET_BYTES, or (local) the disk would drop
+below STORAGE_MIN_FREE_BYTES. Usage is measured by listing the store,
+kept for STORAGE_USAGE_TTL seconds and adjusted on every write and delete.
+`flask storage gc` removes files that no row refers to.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import shutil
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+from flask import abort, redirect, request, send_file, Response
+from werkzeug.utils import secure_filename
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BE_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+# Key prefixes of the media this module manages, and the rows that own them
+PREFIXES = {'music/': ('music', 'file_path'), 'exercises/': ('exercise', 'video_path')}
+LEGACY_PREFIX = 'uploads/'
+EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+S3_NS = {'s3': 'http://s3.amazonaws.com/doc/2006-03-01/'}
+
+
+class StorageConfig:
+    """Media storage configuration"""
+
+    BACKEND = os.getenv('STORAGE_BACKEND', 'local')  # local | s3
+    LOCAL_ROOT = os.getenv('STORAGE_LOCAL_ROOT', os.path.join(BE_ROOT, 'uploads'))
+    LOCAL_PUBLIC_URL = os.getenv('STORAGE_LOCAL_PUBLIC_URL', '')  # e.g. https://media.example.com/media
+    LOCAL_SECURE_LINK_SECRET = os.getenv('STORAGE_LOCAL_SECURE_LINK_SECRET', '')
+    S3_ENDPOINT = os.getenv('STORAGE_S3_ENDPOINT', 'https://s3.amazonaws.com')
+    S3_BUCKET = os.getenv('STORAGE_S3_BUCKET', 'mindful-media')
+    S3_REGION = os.getenv('STORAGE_S3_REGION', 'us-east-1')
+    S3_ACCESS_KEY = os.getenv('STORAGE_S3_ACCESS_KEY', '')
+    S3_SECRET_KEY = os.getenv('STORAGE_S3_SECRET_KEY', '')
+    S3_TIMEOUT = float(os.getenv('STORAGE_S3_TIMEOUT', 30))
+    PRESIGN_SECONDS = int(os.getenv('STORAGE_PRESIGN_SECONDS', 3600))
+    DIRECT_DOWNLOADS = os.getenv('STORAGE_DIRECT_DOWNLOADS', '0') == '1'
+    BUDGET_BYTES = int(os.getenv('STORAGE_BUDGET_BYTES', 0))  # 0 = no budget
+    MIN_FREE_BYTES = int(os.getenv('STORAGE_MIN_FREE_BYTES', 1_000_000_000))
+    USAGE_TTL = float(os.getenv('STORAGE_USAGE_TTL', 60))
+    # Files younger than this are never collected: their row may not be committed yet
+    GC_GRACE_SECONDS = int(os.getenv('STORAGE_GC_GRACE_SECONDS', 3600))
+
+
+class StorageError(Exception):
+    pass
+
+
+class StorageFull(StorageError):
+    pass
+
+
+def new_key(folder, filename):
+    """A fresh key for an upload named `filename` under `folder` (music | exercises)"""
+    return f"{folder}/{uuid.uuid4().hex}_{secure_filename(filename)}"
+
+
+def key_of(stored):
+    """The storage key of a file_path/video_path value (either format)"""
+    key = stored.replace(os.sep, '/')
+    if os.path.isabs(stored):
+        key = os.path.relpath(stored, StorageConfig.LOCAL_ROOT).replace(os.sep, '/')
+    while key.startswith('./'):
+        key = key[2:]
+    if key.startswith(LEGACY_PREFIX):
+        key = key[len(LEGACY_PREFIX):]
+    return key
+
+
+# ─────────────────────────────────────
+# Local disk
+# ─────────────────────────────────────
+class LocalStorage:
+    """Files in a directory tree"""
+
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise StorageError(f"Invalid storage key: {key}")
+        return path
+
+    def save(self, key, stream):
+        """Write a file-like object to `key` atomically; returns its size"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as fh:
+                shutil.copyfileobj(stream, fh, 1024 * 1024)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return os.path.getsize(path)
+
+    def delete(self, key):
+        """Remove `key`; returns the bytes freed (0 if it did not exist)"""
+        path = self.path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return size
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def list(self, prefix):
+        """Yield (key, size, mtime) for every file under `prefix`"""
+        top = self.path(prefix)
+        for directory, _, files in os.walk(top):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield os.path.relpath(path, self.root).replace(os.sep, '/'), stat.st_size, stat.st_mtime
+
+    def free_bytes(self):
+        os.makedirs(self.root, exist_ok=True)
+        return shutil.disk_usage(self.root).free
+
+    def url(self, key, expires):
+        """An nginx secure_link URL for `key`, or None when not configured"""
+        if not (StorageConfig.LOCAL_PUBLIC_URL and StorageConfig.LOCAL_SECURE_LINK_SECRET):
+            return None
+        self.path(key)
+        expires_at = int(time.time()) + expires
+        base = StorageConfig.LOCAL_PUBLIC_URL.rstrip('/')
+        # nginx hashes the decoded $uri
+        uri = f"{urlsplit(base).path}/{key}"
+        token = hashlib.md5(f"{expires_at}{uri} {StorageConfig.LOCAL_SECURE_LINK_SECRET}".encode()).digest()
+        md5 = base64.urlsafe_b64encode(token).rstrip(b'=').decode()
+        return f"{base}/{quote(key)}?md5={md5}&expires={expires_at}"
+
+    def response(self, key):
+        path = self.path(key)
+        if not os.path.isfile(path):
+            abort(404, description="File not found")
+        return send_file(path, conditional=True)
+
+
+# ─────────────────────────────────────
+# S3-compatible object store
+# ─────────────────────────────────────
+def canonical_query(params):
+    pairs = sorted((quote(str(k), safe='-_.~'), quote(str(v), safe='-_.~')) for k, v in params.items())
+    return '&'.join(f"{k}={v}" for k, v in pairs)
+
+
+def sign_v4(secret_key, region, amz_date, method, uri, query, headers, payload_hash, service='s3'):
+    """AWS Signature V4: (signed header names, signature) for a canonical request"""
+    values = {k.lower(): ' '.join(str(v).split()) for k, v in headers.items()}
+    names = sorted(values)
+    canonical = '\n'.join([
+        method, uri, query,
+        ''.join(f"{name}:{values[name]}\n" for name in names),
+        ';'.join(names), payload_hash,
+    ])
+    scope = f"{amz_date[:8]}/{region}/{service}/aws4_request"
+    string_to_sign = '\n'.join(['AWS4-HMAC-SHA256', amz_date, scope,
+                                hashlib.sha256(canonical.encode()).hexdigest()])
+    key = f"AWS4{secret_key}".encode()
+    for part in (amz_date[:8], region, service, 'aws4_request'):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return ';'.join(names), hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+
+class S3Storage:
+    """Objects in one bucket of an S3-compatible store (path-style addressing)"""
+
+    name = 's3'
+    # Headers passed through when a download is proxied instead of redirected
+    PROXY_HEADERS = ('Content-Type', 'Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified')
+
+    def __init__(self, endpoint, bucket, region, access_key, secret_key, timeout=30):
+        self.endpoint = endpoint.rstrip('/')
+        self.host = urlsplit(self.endpoint).netloc
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.timeout = timeout
+
+    def _uri(self, key):
+        return f"/{self.bucket}/{quote(key, safe='/-_.~')}" if key else f"/{self.bucket}"
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    def _request(self, method, key='', params=None, data=None, headers=None, stream=False):
+        import requests
+        uri, query, amz_date = self._uri(key), canonical_query(params or {}), self._now()
+        signed = {'host': self.host, 'x-amz-date': amz_date,
+                  'x-amz-content-sha256': 'UNSIGNED-PAYLOAD' if data is not None else EMPTY_SHA256}
+        names, signature = sign_v4(self.secret_key, self.region, amz_date, method, uri, query,
+                                   signed, signed['x-amz-content-sha256'])
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        headers = dict(headers or {}, **signed)
+        headers['Authorization'] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={names}, Signature={signature}")
+        url = f"{self.endpoint}{uri}" + (f"?{query}" if query else '')
+        response = requests.request(method, url, data=data, headers=headers, stream=stream, timeout=self.timeout)
+        if response.status_code >= 300 and response.status_code not in (304, 404):
+            raise StorageError(f"S3 {method} {key or self.bucket}: {response.status_code} {response.text[:200]}")
+        return response
+
+    def save(self, key, stream):
+        # A known Content-Length keeps requests from falling back to chunked encoding, which S3 rejects
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        self._request('PUT', key, data=stream, headers={'Content-Length': str(size)})
+        return size
+
+    def delete(self, key):
+        head = self._request('HEAD', key)
+        if head.status_code == 404:
+            return 0
+        self._request('DELETE', key)
+        return int(head.headers.get('Content-Length', 0))
+
+    def exists(self, key):
+        return self._request('HEAD', key).status_code == 200
+
+    def list(self, prefix):
+        params = {'list-type': '2', 'prefix': prefix}
+        while True:
+            root = ET.fromstring(self._request('GET', params=params).content)
+            for item in root.findall('s3:Contents', S3_NS):
+                modified = item.findtext('s3:LastModified', namespaces=S3_NS).replace('Z', '+00:00')
+                yield (item.findtext('s3:Key', namespaces=S3_NS), int(item.findtext('s3:Size', namespaces=S3_NS)),
+                       datetime.fromisoformat(modified).timestamp())
+            if root.findtext('s3:IsTruncated', namespaces=S3_NS) != 'true':
+                return
+            params['continuation-token'] = root.findtext('s3:NextContinuationToken', namespaces=S3_NS)
+
+    def url(self, key, expires):
+        """A pre-signed GET URL for `key`, valid for `expires` seconds"""
+        uri, amz_date = self._uri(key), self._now()
+        query = canonical_query({
+            'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+            'X-Amz-Credential': f"{self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request",
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(expires),
+            'X-Amz-SignedHeaders': 'host',
+        })
+        _, signature = sign_v4(self.secret_key, self.region, amz_date, 'GET', uri, query,
+                               {'host': self.host}, 'UNSIGNED-PAYLOAD')
+        return f"{self.endpoint}{uri}?{query}&X-Amz-Signature={signature}"
+
+    def response(self, key):
+        """Stream the object through this worker, forwarding Range requests"""
+        headers = {'Range': request.headers['Range']} if 'Range' in request.headers else None
+        upstream = self._request('GET', key, headers=headers, stream=True)
+        if upstream.status_code == 404:
+            upstream.close()
+            abort(404, description="File not found")
+        passed = {h: upstream.headers[h] for h in self.PROXY_HEADERS if h in upstream.headers}
+        body = upstream.iter_content(256 * 1024)
+        response = Response(body, status=upstream.status_code, headers=passed, direct_passthrough=True)
+        response.call_on_close(upstream.close)
+        return response
+
+
+# ─────────────────────────────────────
+# Manager
+# ─────────────────────────────────────
+class MediaStorage:
+    """The configured backend plus the disk budget, usage accounting and garbage collection"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._usage = None
+        self._measured_at = 0.0
+        self._lock = threading.Lock()
+
+    # Accounting
+    def usage(self, refresh=False):
+        """{prefix: {'files', 'bytes'}} plus 'total_bytes', re-listed after STORAGE_USAGE_TTL"""
+        with self._lock:
+            if not refresh and self._usage is not None and time.monotonic() - self._measured_at < StorageConfig.USAGE_TTL:
+                return dict(self._usage)
+        usage = {'total_bytes': 0}
+        for prefix in PREFIXES:
+            files = size = 0
+            for _, file_size, _ in self.backend.list(prefix):
+                files += 1
+                size += file_size
+            usage[prefix.rstrip('/')] = {'files': files, 'bytes': size}
+            usage['total_bytes'] += size
+        with self._lock:
+            self._usage, self._measured_at = usage, time.monotonic()
+        return dict(usage)
+
+    def _account(self, key, delta):
+        with self._lock:
+            if self._usage is None:
+                return
+            prefix = key.split('/', 1)[0]
+            if prefix in self._usage:
+                self._usage[prefix]['files'] += 1 if delta > 0 else -1
+                self._usage[prefix]['bytes'] += delta
+            self._usage['total_bytes'] += delta
+
+    def reserve(self, size):
+        """StorageFull unless `size` more bytes fit the budget and the disk"""
+        size = size or 0
+        if StorageConfig.BUDGET_BYTES:
+            used = self.usage()['total_bytes']
+            if used + size > StorageConfig.BUDGET_BYTES:
+                raise StorageFull(f"Media storage budget exhausted ({used} of {StorageConfig.BUDGET_BYTES} bytes used)")
+        if isinstance(self.backend, LocalStorage) and self.backend.free_bytes() - size < StorageConfig.MIN_FREE_BYTES:
+            raise StorageFull("Not enough free disk space for media")
+
+    # Files
+    def save(self, key, stream, size_hint=None):
+        """Store a file-like object under `key` within the budget; returns its size"""
+        self.reserve(size_hint)
+        size = self.backend.save(key, stream)
+        self._account(key, size)
+        return size
+
+    def save_upload(self, folder, upload):
+        """Store a FileStorage upload under a fresh key in `folder`; returns the key"""
+        key = new_key(folder, upload.filename)
+        self.save(key, upload.stream, request.content_length)
+        return key
+
+    def put_file(self, key, source):
+        with open(source, 'rb') as fh:
+            return self.save(key, fh, os.path.getsize(source))
+
+    def delete(self, stored):
+        """Remove a stored file (a key or legacy path); never raises, returns the bytes freed"""
+        if not stored:
+            return 0
+        key = key_of(stored)
+        try:
+            freed = self.backend.delete(key)
+        except Exception as e:
+            print(f"Storage delete error ({key}): {e}")
+            return 0
+        if freed:
+            self._account(key, -freed)
+        return freed
+
+    def url(self, stored, expires=None):
+        """A direct download URL (pre-signed / secure_link), or None if the backend has none"""
+        return self.backend.url(key_of(stored), expires or StorageConfig.PRESIGN_SECONDS)
+
+    def send(self, stored):
+        """Response for a media download: a redirect to a direct URL, or the bytes"""
+        key = key_of(stored)
+        if StorageConfig.DIRECT_DOWNLOADS:
+            url = self.backend.url(key, StorageConfig.PRESIGN_SECONDS)
+            if url:
+                response = redirect(url, 302)
+                # Cache the redirect for less time than the signature lives
+                response.headers['Cache-Control'] = f"private, max-age={max(0, StorageConfig.PRESIGN_SECONDS - 60)}"
+                return response
+        return self.backend.response(key)
+
+    # Garbage collection
+    def collect_garbage(self, dry_run=False, grace_seconds=None, log=print):
+        """
+        Delete files no row refers to, older than the grace period. Also reports
+        rows whose file is missing. Returns a summary dict.
+        """
+        from app.config.db import DBConnection
+        from app.services.images import image_pipeline
+        grace = StorageConfig.GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        cutoff = time.time() - grace
+        with DBConnection.get_cursor() as cursor:
+            referenced = {}
+            for prefix, (table, column) in PREFIXES.items():
+                cursor.execute(f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL")
+                referenced[prefix] = {key_of(row[0]) for row in cursor.fetchall()}
+            cursor.execute("""
+                SELECT cover_hash FROM music WHERE cover_hash IS NOT NULL
+                UNION SELECT poster_hash FROM exercise WHERE poster_hash IS NOT NULL
+            """)
+            images = {row[0].strip() for row in cursor.fetchall()}
+
+        summary = {'backend': self.backend.name, 'dry_run': dry_run, 'scanned': 0, 'orphans': 0,
+                   'orphan_bytes': 0, 'deleted': 0, 'missing': 0, 'errors': []}
+        for prefix, keys in referenced.items():
+            seen = set()
+            for key, size, mtime in self.backend.list(prefix):
+                summary['scanned'] += 1
+                seen.add(key)
+                if key in keys or mtime > cutoff:
+                    continue
+                summary['orphans'] += 1
+                summary['orphan_bytes'] += size
+                if dry_run:
+                    log(f"orphan {key} ({size} bytes)")
+                    continue
+                try:
+                    self.backend.delete(key)
+                    summary['deleted'] += 1
+                except Exception as e:
+                    summary['errors'].append(f"{key}: {e}")
+            for key in sorted(keys - seen):
+                summary['missing'] += 1
+                summary['errors'].append(f"missing file for row: {key}")
+            log(f"{prefix.rstrip('/')}: {len(seen)} file(s), {len(keys)} row(s)")
+
+        summary['images'] = image_pipeline.collect_garbage(images, cutoff, dry_run)
+        with self._lock:
+            self._usage = None
+        return summary
+
+    def status(self):
+        """Configuration and the last measured usage (never lists the store)"""
+        with self._lock:
+            usage = dict(self._usage) if self._usage is not None else None
+        return {'backend': self.backend.name, 'budget_bytes': StorageConfig.BUDGET_BYTES,
+                'direct_downloads': StorageConfig.DIRECT_DOWNLOADS, 'usage': usage}
+
+
+def create_backend():
+    if StorageConfig.BACKEND == 's3':
+        return S3Storage(StorageConfig.S3_ENDPOINT, StorageConfig.S3_BUCKET, StorageConfig.S3_REGION,
+                         StorageConfig.S3_ACCESS_KEY, StorageConfig.S3_SECRET_KEY, StorageConfig.S3_TIMEOUT)
+    return LocalStorage(StorageConfig.LOCAL_ROOT)
+
+
+storage = MediaStorage(create_backend())
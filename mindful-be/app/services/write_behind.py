@@ -0,0 +1,345 @@
+# app/services/write_behind.py
+"""
+Write-behind buffering for high-frequency inserts.
+
+Endpoints listed in WRITE_BEHIND_ENDPOINTS (moods, comments, upvotes)
+hand their row to the buffer instead of committing it. Each row is first
+appended to a spill segment (an append-only JSONL file under
+WRITE_BEHIND_DIR, flock-held by the writing process), then kept in
+memory. A flusher thread writes everything buffered with one multi-row
+INSERT per table every WRITE_BEHIND_FLUSH_MS, or sooner once
+WRITE_BEHIND_MAX_ROWS rows are waiting, and records the segment name in
+write_behind_segments in the same transaction. Segments left behind by a
+crashed process are replayed by recover(); the segment table makes the
+replay exactly-once.
+
+Reads see pending rows through pending(): always from this process's
+buffer, and from every worker's segments when the caller sets shared=True
+(the routes do so while the WRITE_BEHIND cookie from a recent buffered
+write is present). Segments are local files, so the cross-worker overlay
+only covers workers on the same host.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, date
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from app.config.db import DBConnection
+
+load_dotenv()
+
+BE_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+class WriteBehindConfig:
+    """Write-behind configuration"""
+
+    # Comma-separated endpoints that buffer their inserts: moods, comments, upvotes
+    ENDPOINTS = {e.strip() for e in os.getenv('WRITE_BEHIND_ENDPOINTS', '').split(',') if e.strip()}
+    DIR = os.getenv('WRITE_BEHIND_DIR', os.path.join(BE_ROOT, 'spill', 'write_behind'))
+    MAX_ROWS = int(os.getenv('WRITE_BEHIND_MAX_ROWS', 500))
+    FLUSH_MS = int(os.getenv('WRITE_BEHIND_FLUSH_MS', 500))
+    # always: fsync every row, batch: fsync once before each flush, off: leave it to the OS
+    FSYNC = os.getenv('WRITE_BEHIND_FSYNC', 'batch')
+    OVERLAY_SECONDS = int(os.getenv('WRITE_BEHIND_OVERLAY_SECONDS', 30))
+    # write_behind_segments rows are only needed until leftover files have been replayed
+    SEGMENT_RETENTION_DAYS = int(os.getenv('WRITE_BEHIND_SEGMENT_RETENTION_DAYS', 7))
+
+
+class Sink:
+    """Target table for buffered rows"""
+
+    def __init__(self, table, columns, owner, conflict='', returning=None, on_flush=None):
+        self.table = table
+        self.columns = columns
+        self.owner = owner          # column the read overlay filters on
+        self.conflict = conflict
+        self.returning = returning
+        self.on_flush = on_flush    # called with (cursor, returned rows) inside the flush transaction
+
+
+def _count_upvotes(cursor, returned):
+    """Keep posts.upvotes_count in step with the upvotes a flush actually inserted"""
+    counts = Counter(post_id for (post_id,) in returned)
+    if counts:
+        execute_values(cursor, """
+            UPDATE posts p SET upvotes_count = p.upvotes_count + c.n
+            FROM (VALUES %s) AS c(id, n)
+            WHERE p.id = c.id
+        """, list(counts.items()))
+
+
+SINKS = {
+    'moods': Sink('moods', ['user_id', 'mood', 'notes', 'created_at'], owner='user_id'),
+    'comments': Sink('comments', ['post_id', 'author_id', 'text', 'timestamp'], owner='post_id'),
+    'post_upvotes': Sink('post_upvotes', ['post_id', 'user_id', 'timestamp'], owner='user_id',
+                         conflict='ON CONFLICT (post_id, user_id) DO NOTHING', returning='post_id',
+                         on_flush=_count_upvotes),
+}
+
+
+def _json_safe(row):
+    return {k: v.isoformat() if isinstance(v, (datetime, date)) else v for k, v in row.items()}
+
+
+def _read_records(path):
+    """Records from a segment file; a torn last line from a crash is ignored"""
+    records = []
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            if not line.endswith('\n'):
+                break
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+class Segment:
+    """One append-only spill file, exclusively flock-ed by the process writing it"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.records = []
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, record):
+        os.write(self._fd, (json.dumps(record) + '\n').encode('utf-8'))
+        if WriteBehindConfig.FSYNC == 'always':
+            os.fsync(self._fd)
+        self.records.append(record)
+
+    def sync(self):
+        if WriteBehindConfig.FSYNC != 'off':
+            os.fsync(self._fd)
+
+    def delete(self):
+        os.remove(self.path)
+        os.close(self._fd)
+
+
+class WriteBehindBuffer:
+    COOKIE_NAME = 'wb_pending'
+
+    def __init__(self):
+        self._pid = None
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.last_error = None
+
+    def _reset(self):
+        """(Re)initialise per-process state; also runs after a fork"""
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._active = None
+        self._sealed = deque()
+        self._seq = 0
+        self._thread = None
+
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    @staticmethod
+    def enabled(endpoint):
+        return endpoint in WriteBehindConfig.ENDPOINTS
+
+    def _new_segment(self):
+        os.makedirs(WriteBehindConfig.DIR, exist_ok=True)
+        self._seq += 1
+        name = f"{socket.gethostname()}-{os.getpid()}-{int(time.time() * 1000)}-{self._seq}.jsonl"
+        return Segment(os.path.join(WriteBehindConfig.DIR, name))
+
+    def enqueue(self, sink_name, row):
+        """Durably append a row for `sink_name`; returns the JSON-safe row as buffered"""
+        self._ensure_process()
+        record = {'sink': sink_name, 'row': _json_safe(row)}
+        with self._lock:
+            if self._active is None:
+                self._active = self._new_segment()
+            self._active.append(record)
+            full = len(self._active.records) >= WriteBehindConfig.MAX_ROWS
+        self._start()
+        if full:
+            self._wake.set()
+        return record['row']
+
+    def pending(self, sink_name, owner_value, shared=False):
+        """Rows for `sink_name` whose owner column equals `owner_value` (None: all) that are not yet flushed"""
+        self._ensure_process()
+        owner = SINKS[sink_name].owner
+        with self._lock:
+            segments = list(self._sealed) + ([self._active] if self._active else [])
+            local = {segment.name for segment in segments}
+            records = [record for segment in segments for record in segment.records]
+        if shared:
+            for path in glob.glob(os.path.join(WriteBehindConfig.DIR, '*.jsonl')):
+                if os.path.basename(path) in local:
+                    continue
+                try:
+                    records.extend(_read_records(path))
+                except FileNotFoundError:
+                    continue  # flushed and removed while we were listing
+        return [record['row'] for record in records
+                if record['sink'] == sink_name
+                and (owner_value is None or str(record['row'].get(owner)) == str(owner_value))]
+
+    def mark(self, response):
+        """Tell the client's next requests to look at other workers' pending rows too"""
+        response.set_cookie(self.COOKIE_NAME, '1', max_age=WriteBehindConfig.OVERLAY_SECONDS,
+                            httponly=True, samesite='Lax', path='/')
+        # Once flushed, the rows must be read from the primary until replicas catch up
+        DBConnection.mark_write()
+        return response
+
+    # ─────────────────────────────────────
+    # Flushing
+    # ─────────────────────────────────────
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(WriteBehindConfig.FLUSH_MS / 1000)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Seal the active segment and write every sealed segment, oldest first"""
+        self._ensure_process()
+        with self._flush_lock:
+            with self._lock:
+                if self._active is not None:
+                    self._active.sync()
+                    self._sealed.append(self._active)
+                    self._active = None
+            written = 0
+            while self._sealed:
+                segment = self._sealed[0]
+                try:
+                    written += self.write_segment(segment.name, segment.records)
+                except Exception as e:
+                    # Keep the segment (in memory and on disk) and retry on the next flush
+                    self.last_error = str(e)
+                    print(f"Write-behind flush error: {e}")
+                    break
+                with self._lock:
+                    self._sealed.popleft()
+                segment.delete()
+            return written
+
+    def write_segment(self, name, records):
+        """Insert one segment's rows in a single transaction; returns rows written (0 if already flushed)"""
+        by_sink = {}
+        for record in records:
+            by_sink.setdefault(record['sink'], []).append(record['row'])
+        with DBConnection.get_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO write_behind_segments (segment, rows) VALUES (%s, %s)
+                ON CONFLICT (segment) DO NOTHING
+                RETURNING segment
+            """, (name, len(records)))
+            if cursor.fetchone() is None:
+                return 0
+            written = 0
+            for sink_name, rows in by_sink.items():
+                written += self._insert(cursor, SINKS[sink_name], rows)
+        self.flushed_rows += written
+        return written
+
+    def _insert(self, cursor, sink, rows):
+        """Multi-row INSERT; if the batch is rejected, retry row by row and drop only the bad rows"""
+        returning = f"RETURNING {sink.returning}" if sink.returning else ''
+        sql = f"INSERT INTO {sink.table} ({', '.join(sink.columns)}) VALUES %s {sink.conflict} {returning}"
+        values = [tuple(row.get(column) for column in sink.columns) for row in rows]
+        cursor.execute("SAVEPOINT write_behind_batch")
+        try:
+            returned = execute_values(cursor, sql, values, page_size=1000, fetch=bool(sink.returning)) or []
+            cursor.execute("RELEASE SAVEPOINT write_behind_batch")
+            inserted = len(values)
+        except (psycopg2.IntegrityError, psycopg2.DataError):
+            cursor.execute("ROLLBACK TO SAVEPOINT write_behind_batch")
+            returned, inserted = [], 0
+            for value in values:
+                cursor.execute("SAVEPOINT write_behind_row")
+                try:
+                    returned.extend(execute_values(cursor, sql, [value], fetch=bool(sink.returning)) or [])
+                    cursor.execute("RELEASE SAVEPOINT write_behind_row")
+                    inserted += 1
+                except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT write_behind_row")
+                    self.failed_rows += 1
+                    print(f"Write-behind dropped a {sink.table} row: {e}")
+        if sink.on_flush:
+            sink.on_flush(cursor, returned)
+        return inserted
+
+    def recover(self, log=print):
+        """Replay segments whose writer is gone (their flock is free); safe to call from every worker"""
+        self._ensure_process()
+        with self._lock:
+            ours = {segment.name for segment in self._sealed} | ({self._active.name} if self._active else set())
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(WriteBehindConfig.DIR, '*.jsonl'))):
+            name = os.path.basename(path)
+            if name in ours:
+                continue
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue  # a live process still owns it
+            try:
+                records = _read_records(path)
+                written = self.write_segment(name, records)
+                os.remove(path)
+                replayed += written
+                log(f"Write-behind: replayed {written} of {len(records)} rows from {name}")
+            finally:
+                os.close(fd)
+        with DBConnection.get_cursor() as cursor:
+            cursor.execute("DELETE FROM write_behind_segments WHERE flushed_at < NOW() - make_interval(days => %s)",
+                           (WriteBehindConfig.SEGMENT_RETENTION_DAYS,))
+        return replayed
+
+    def status(self):
+        self._ensure_process()
+        with self._lock:
+            buffered = sum(len(s.records) for s in self._sealed) + (len(self._active.records) if self._active else 0)
+        return {
+            'endpoints': sorted(WriteBehindConfig.ENDPOINTS),
+            'buffered_rows': buffered,
+            'flushed_rows': self.flushed_rows,
+            'failed_rows': self.failed_rows,
+            'last_error': self.last_error,
+        }
+
+
+write_behind = WriteBehindBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    if write_behind._pid == os.getpid():
+        write_behind.flush()
@@ -0,0 +1,5 @@
+# benchmarks/__init__.py
+# Reproducible load-test harness for the API hot paths.
+#
+#   python -m benchmarks.seed --reset --users 200
+#   python -m benchmarks.loadtest --concurrency 16 --duration 30 --out results.json
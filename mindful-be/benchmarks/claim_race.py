@@ -0,0 +1,89 @@
+# benchmarks/claim_race.py
+"""
+Many experts draining the chat request queue at once.
+
+    python -m benchmarks.claim_race --requests 2000 --experts 16
+
+Enqueues pending requests, then has every expert thread call
+ChatQueue.claim() until the queue is empty. Reports claims per second and
+checks that every request was claimed exactly once.
+"""
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from app.config.db import DBConnection
+from app.services.bulk import copy_rows
+from app.services.chat_queue import ChatQueue, ClaimConflict
+from benchmarks.seed import EXPERT_ID
+
+
+def enqueue(count):
+    with DBConnection.get_cursor() as cursor:
+        cursor.execute("SELECT id FROM users WHERE id <> %s ORDER BY id LIMIT 100", (EXPERT_ID,))
+        users = [row[0] for row in cursor.fetchall()] or [1]
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM chat_session_requests")
+        first_id = cursor.fetchone()[0] + 1
+        copy_rows(cursor, 'chat_session_requests', ['user_id', 'session_duration', 'status', 'paid'], (
+            (users[i % len(users)], 30, 'pending', False) for i in range(count)
+        ))
+    return first_id
+
+
+def run(args):
+    first_id = enqueue(args.requests)
+    claimed, errors = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(args.experts)
+
+    def expert(expert_id):
+        mine = []
+        start.wait()
+        while True:
+            try:
+                mine.append(ChatQueue.claim(expert_id)['id'])
+            except ClaimConflict:
+                break
+            except Exception as e:
+                errors.append(str(e))
+                break
+        with lock:
+            claimed.extend(mine)
+
+    threads = [threading.Thread(target=expert, args=(10_000 + i,)) for i in range(args.experts)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    counts = Counter(claimed)
+    ours = [request_id for request_id in counts if request_id >= first_id]
+    return {
+        'requests': args.requests,
+        'experts': args.experts,
+        'claimed': len(ours),
+        'duplicates': sum(1 for request_id in ours if counts[request_id] > 1),
+        'errors': errors[:10],
+        'seconds': round(elapsed, 3),
+        'claims_per_second': round(len(claimed) / elapsed, 1) if elapsed else None,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Concurrent claim benchmark for the chat request queue')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--experts', type=int, default=16)
+    parser.add_argument('--out', help='write the JSON report to this file')
+    return parser
+
+
+if __name__ == '__main__':
+    cli_args = build_parser().parse_args()
+    output = json.dumps(run(cli_args), indent=2)
+    if cli_args.out:
+        with open(cli_args.out, 'w', encoding='utf-8') as fh:
+            fh.write(output + '\n')
+    print(output)
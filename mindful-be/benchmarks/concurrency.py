@@ -0,0 +1,121 @@
+# benchmarks/concurrency.py
+"""
+Compare the sync (gthread) and async (uvicorn) serving modes under rising
+client concurrency on the I/O-bound routes.
+
+    python -m benchmarks.concurrency --workers 1 --levels 8,32,128 --out concurrency.json
+
+Both modes are started through gunicorn.conf.py with the same worker
+count. The payment gateway is replaced by a local stand-in with a fixed
+delay, so buy-messages measures waiting rather than network variance.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from argparse import Namespace
+from benchmarks.loadtest import run as run_load
+from benchmarks.stubs import start_fake_gateway
+
+BE_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+IO_SCENARIOS = 'messages,music_serve,buy_messages'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def start_server(mode, workers, gateway_url):
+    port = free_port()
+    env = dict(os.environ,
+               SERVER_MODE=mode,
+               BIND=f'127.0.0.1:{port}',
+               WEB_CONCURRENCY=str(workers),
+               KHALTI_INITIATE_URL=gateway_url,
+               GUNICORN_ACCESS_LOG='')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                               cwd=BE_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return process, f'http://127.0.0.1:{port}'
+
+
+def run(args):
+    gateway, gateway_url = start_fake_gateway(args.gateway_delay)
+    levels = [int(level) for level in args.levels.split(',')]
+    report = {
+        'config': {
+            'workers': args.workers,
+            'levels': levels,
+            'duration_s': args.duration,
+            'scenarios': args.scenarios.split(','),
+            'gateway_delay_s': args.gateway_delay,
+        },
+        'modes': {},
+    }
+
+    for mode in args.modes.split(','):
+        process, base_url = start_server(mode, args.workers, gateway_url)
+        try:
+            results = {}
+            for level in levels:
+                load = run_load(Namespace(base_url=base_url, concurrency=level, duration=args.duration,
+                                          requests=0, scenarios=args.scenarios, timeout=args.timeout,
+                                          seed=1, model_work_factor=0))
+                results[str(level)] = {'overall': load['overall'], 'endpoints': load['endpoints']}
+            report['modes'][mode] = results
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    gateway.shutdown()
+
+    if 'sync' in report['modes'] and 'async' in report['modes']:
+        report['async_vs_sync'] = {}
+        for level in map(str, levels):
+            sync, async_ = report['modes']['sync'][level]['overall'], report['modes']['async'][level]['overall']
+            report['async_vs_sync'][level] = {
+                'throughput_ratio': round(async_['throughput_rps'] / sync['throughput_rps'], 2)
+                if sync['throughput_rps'] else None,
+                'p99_ratio': round(async_['p99_ms'] / sync['p99_ms'], 2)
+                if sync['p99_ms'] and async_['p99_ms'] else None,
+            }
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Benchmark sync vs async serving modes')
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes per mode')
+    parser.add_argument('--levels', default='8,32,128', help='client concurrency levels')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds per level')
+    parser.add_argument('--scenarios', default=IO_SCENARIOS)
+    parser.add_argument('--gateway-delay', type=float, default=0.2, help='payment gateway latency in seconds')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--out', help='write the JSON report to this file')
+    return parser
+
+
+if __name__ == '__main__':
+    cli_args = build_parser().parse_args()
+    output = json.dumps(run(cli_args), indent=2)
+    if cli_args.out:
+        with open(cli_args.out, 'w', encoding='utf-8') as fh:
+            fh.write(output + '\n')
+    print(output)
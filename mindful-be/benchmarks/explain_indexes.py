@@ -0,0 +1,128 @@
+# benchmarks/explain_indexes.py
+"""
+Show how the query-pattern indexes change plans on seeded data.
+
+    python -m benchmarks.seed --reset --users 2000
+    python -m benchmarks.explain_indexes --out plans.json
+
+Each route query is EXPLAIN ANALYZEd with the schema at the baseline
+migration and again at the latest migration. The script downgrades and
+re-upgrades the schema, so run it on the benchmark database only.
+"""
+import argparse
+import json
+from app.config.db import DBConnection
+from app.config.migrations import Migrations
+from app.routes.chat import CONVERSATION_SQL, EXPERT_ID
+from app.services.partitions import PartitionConfig, history_since
+
+BASELINE_VERSION = 1
+REPEATS = 5
+
+
+def pick_params():
+    """Choose realistic parameter values from the seeded data"""
+    with DBConnection.get_cursor() as cursor:
+        cursor.execute("SELECT post_id FROM comments GROUP BY post_id ORDER BY COUNT(*) DESC LIMIT 1")
+        post_id = cursor.fetchone()[0]
+        cursor.execute("SELECT user_id FROM moods GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1")
+        mood_user = cursor.fetchone()[0]
+        cursor.execute("SELECT sender_id FROM messages WHERE sender_id <> %s LIMIT 1", (EXPERT_ID,))
+        chat_user = cursor.fetchone()[0]
+        cursor.execute("SELECT pidx FROM purchases WHERE pidx IS NOT NULL LIMIT 1")
+        row = cursor.fetchone()
+        pidx = row[0] if row else 'missing'
+    return {'post_id': post_id, 'mood_user': mood_user, 'chat_user': chat_user, 'pidx': pidx,
+            'mood_since': history_since(None, PartitionConfig.MOODS_HISTORY_DAYS).isoformat(),
+            'chat_since': history_since(None, PartitionConfig.MESSAGES_HISTORY_DAYS).isoformat()}
+
+
+def queries(p):
+    return {
+        'get_comments': ("""
+            SELECT c.id, c.post_id, c.author_id, u.name AS author_name, c.text, c.timestamp
+            FROM comments c JOIN users u ON c.author_id = u.id
+            WHERE c.post_id = %s ORDER BY c.timestamp ASC
+        """, (p['post_id'],)),
+        'get_moods': ("""
+            SELECT id, mood, notes, created_at FROM moods
+            WHERE user_id = %s AND created_at >= %s ORDER BY created_at DESC
+        """, (p['mood_user'], p['mood_since'])),
+        'chat_history': (CONVERSATION_SQL, (p['chat_user'], EXPERT_ID, p['chat_user'], EXPERT_ID, p['chat_since'])),
+        'purchase_by_pidx': ("SELECT id, status FROM purchases WHERE pidx = %s", (p['pidx'],)),
+        'pending_chat_requests': ("""
+            SELECT id FROM chat_session_requests
+            WHERE status = 'pending' ORDER BY requested_at, id LIMIT 50
+        """, ()),
+        'music_catalog': ("SELECT id FROM music ORDER BY created_at DESC LIMIT 100", ()),
+        'exercise_catalog': ("SELECT id FROM exercise ORDER BY created_at DESC LIMIT 100", ()),
+        'posts_feed': ("SELECT id FROM posts ORDER BY timestamp DESC LIMIT 50", ()),
+    }
+
+
+def plan_nodes(plan):
+    nodes = [plan['Node Type'] + (f" on {plan['Index Name']}" if 'Index Name' in plan else '')]
+    for child in plan.get('Plans', []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def explain_all(params):
+    results = {}
+    with DBConnection.get_cursor() as cursor:
+        for name, (sql, args) in queries(params).items():
+            timings = []
+            for _ in range(REPEATS):
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, args)
+                explained = cursor.fetchone()[0][0]
+                timings.append(explained['Execution Time'])
+            timings.sort()
+            results[name] = {
+                'nodes': plan_nodes(explained['Plan']),
+                'median_ms': round(timings[len(timings) // 2], 3),
+                'shared_hit_blocks': explained['Plan'].get('Shared Hit Blocks'),
+                'shared_read_blocks': explained['Plan'].get('Shared Read Blocks'),
+            }
+    return results
+
+
+def run(args):
+    params = pick_params()
+    Migrations.downgrade(BASELINE_VERSION, log=lambda message: None)
+    with DBConnection.get_cursor() as cursor:
+        cursor.execute("ANALYZE")
+    before = explain_all(params)
+
+    Migrations.upgrade(log=lambda message: None)
+    with DBConnection.get_cursor() as cursor:
+        cursor.execute("ANALYZE")
+    after = explain_all(params)
+
+    return {
+        'params': params,
+        'queries': {
+            name: {
+                'baseline': before[name],
+                'indexed': after[name],
+                'plan_changed': before[name]['nodes'] != after[name]['nodes'],
+                'speedup': round(before[name]['median_ms'] / after[name]['median_ms'], 2)
+                if after[name]['median_ms'] else None,
+            }
+            for name in before
+        },
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Compare query plans before and after the index migrations')
+    parser.add_argument('--out', help='write the JSON report to this file')
+    return parser
+
+
+if __name__ == '__main__':
+    cli_args = build_parser().parse_args()
+    output = json.dumps(run(cli_args), indent=2)
+    if cli_args.out:
+        with open(cli_args.out, 'w', encoding='utf-8') as fh:
+            fh.write(output + '\n')
+    print(output)
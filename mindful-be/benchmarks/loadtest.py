@@ -0,0 +1,206 @@
+# benchmarks/loadtest.py
+"""
+Drive the API hot paths with concurrent clients and report latency as JSON.
+
+    python -m benchmarks.loadtest --concurrency 16 --duration 30 --out results.json
+
+By default the app is started in-process on a free port with the stub
+model installed, so the run is fully offline. Pass --base-url to target
+an already running server instead (it must share JWT_SECRET_KEY).
+"""
+import argparse
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from app.config.db import DBConnection
+from app.config.JWTConfig import JWTConfig
+
+EXPERT_ID = 8
+
+# name -> (weight, method, path template)
+SCENARIOS = {
+    'posts':          (25, 'GET',  '/api/posts'),
+    'post_comments':  (20, 'GET',  '/api/posts/{post_id}/comments'),
+    'messages':       (20, 'GET',  '/api/messages'),
+    'predict':        (10, 'POST', '/api/predict'),
+    'music':          (15, 'GET',  '/api/music'),
+    'music_serve':    (10, 'GET',  '/api/music/serve/{music_id}'),
+    'buy_messages':   (5,  'POST', '/api/buy-messages'),
+}
+
+# buy_messages needs a gateway stand-in, see benchmarks.concurrency
+DEFAULT_SCENARIOS = ['posts', 'post_comments', 'messages', 'predict', 'music', 'music_serve']
+
+PREDICT_TEXTS = [
+    'I have been feeling on edge all week and cannot stop worrying about work.',
+    'Nothing seems to matter anymore and I sleep most of the day.',
+    'Had a good walk this morning and feel pretty balanced today.',
+    'Deadlines keep piling up and my chest feels tight all the time.',
+]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies_ms, errors, elapsed):
+    values = sorted(latencies_ms)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(values, 50), 3) if values else None,
+        'p95_ms': round(percentile(values, 95), 3) if values else None,
+        'p99_ms': round(percentile(values, 99), 3) if values else None,
+        'mean_ms': round(sum(values) / len(values), 3) if values else None,
+        'max_ms': round(values[-1], 3) if values else None,
+    }
+
+
+def load_fixtures():
+    """Pick ids of seeded rows to use in request paths"""
+    with DBConnection.get_cursor() as cursor:
+        cursor.execute("SELECT id, email FROM users WHERE id <> %s ORDER BY id LIMIT 500", (EXPERT_ID,))
+        users = cursor.fetchall()
+        cursor.execute("SELECT id FROM posts ORDER BY id DESC LIMIT 1000")
+        posts = [r[0] for r in cursor.fetchall()]
+        cursor.execute("SELECT id FROM music ORDER BY id LIMIT 200")
+        music = [r[0] for r in cursor.fetchall()]
+    if not users or not posts or not music:
+        raise SystemExit('No seeded data found, run `python -m benchmarks.seed --reset` first')
+    return {
+        'tokens': [JWTConfig.generate_token(user_id, email) for user_id, email in users],
+        'post_ids': posts,
+        'music_ids': music,
+    }
+
+
+def start_local_server(model_work_factor):
+    """Run the app in-process on a free port, with the stub model installed"""
+    from werkzeug.serving import make_server
+    from app import create_app
+    from benchmarks.stubs import install_stub_model
+
+    app = create_app()
+    install_stub_model(work_factor=model_work_factor)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def run(args):
+    fixtures = load_fixtures()
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server, base_url = start_local_server(args.model_work_factor)
+
+    enabled = args.scenarios.split(',') if args.scenarios else DEFAULT_SCENARIOS
+    names = [n for n in enabled if n in SCENARIOS]
+    weights = [SCENARIOS[n][0] for n in names]
+
+    results = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def client(worker_id):
+        rng = random.Random(args.seed + worker_id)
+        session = requests.Session()
+        token = fixtures['tokens'][worker_id % len(fixtures['tokens'])]
+        session.cookies.set(JWTConfig.COOKIE_NAME, token)
+        local = defaultdict(list)
+        local_errors = defaultdict(int)
+        sent = 0
+        while time.perf_counter() < deadline and (not args.requests or sent < args.requests):
+            name = rng.choices(names, weights)[0]
+            _, method, template = SCENARIOS[name]
+            path = template.format(post_id=rng.choice(fixtures['post_ids']),
+                                   music_id=rng.choice(fixtures['music_ids']))
+            body = None
+            if name == 'predict':
+                body = {'text': rng.choice(PREDICT_TEXTS)}
+            elif name == 'buy_messages':
+                body = {'chat_credits': 1, 'amount': 2500}
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=body, timeout=args.timeout)
+                _ = response.content  # include body transfer in the measurement
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if ok:
+                local[name].append(elapsed_ms)
+            else:
+                local_errors[name] += 1
+            sent += 1
+        with lock:
+            for name, values in local.items():
+                results[name].extend(values)
+            for name, count in local_errors.items():
+                errors[name] += count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(client, range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    if server is not None:
+        server.shutdown()
+
+    all_latencies = [v for values in results.values() for v in values]
+    return {
+        'revision': git_revision(),
+        'timestamp': int(time.time()),
+        'config': {
+            'base_url': args.base_url or 'in-process',
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'scenarios': names,
+            'seed': args.seed,
+        },
+        'overall': summarize(all_latencies, sum(errors.values()), elapsed),
+        'endpoints': {name: summarize(results[name], errors[name], elapsed) for name in names},
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Load test the API hot paths')
+    parser.add_argument('--base-url', help='target a running server instead of an in-process one')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds to run')
+    parser.add_argument('--requests', type=int, default=0, help='max requests per client (0 = unlimited)')
+    parser.add_argument('--scenarios', help=f"comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--model-work-factor', type=int, default=200, help='CPU cost of the stub model')
+    parser.add_argument('--out', help='write the JSON report to this file')
+    return parser
+
+
+if __name__ == '__main__':
+    cli_args = build_parser().parse_args()
+    output = json.dumps(run(cli_args), indent=2)
+    if cli_args.out:
+        with open(cli_args.out, 'w', encoding='utf-8') as fh:
+            fh.write(output + '\n')
+    print(output)
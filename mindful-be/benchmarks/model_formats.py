@@ -0,0 +1,122 @@
+# benchmarks/model_formats.py
+"""
+Pickled pipeline vs compact numpy bundle: load time, memory and latency.
+
+    python -m benchmarks.model_formats app/ml_model/svc_model.joblib --requests 2000
+
+Exports the pipeline to a temporary bundle (verified on the same texts),
+then for each format loads it in a fresh interpreter and reports the load
+time, the RSS it added (and how much of that is shared, file-backed pages),
+the time of the first prediction and single-text latency percentiles.
+Texts come from --texts (one per line) or are generated from the vocabulary.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import joblib
+from app.services.compact_model import export
+
+FORMATS = ('joblib', 'bundle-mmap', 'bundle')
+
+# Runs in a child interpreter so every format starts from a cold, empty process
+PROBE = r'''
+import json, sys, time
+from app.services.model_loader import ModelLoader
+
+def rss():
+    fields = {}
+    with open('/proc/self/status') as fh:
+        for line in fh:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'RssFile', 'RssShmem'):
+                fields[key] = int(value.split()[0]) / 1024
+    return fields
+
+fmt, path, texts_file = sys.argv[1:4]
+with open(texts_file, encoding='utf-8') as fh:
+    texts = fh.read().split('\0')
+before = rss()
+started = time.perf_counter()
+model = ModelLoader(path, mmap=fmt != 'bundle').get()
+load_ms = (time.perf_counter() - started) * 1000
+started = time.perf_counter()
+model.predict(texts[:1])
+first_ms = (time.perf_counter() - started) * 1000
+latencies = []
+for text in texts:
+    started = time.perf_counter()
+    model.predict([text])
+    latencies.append((time.perf_counter() - started) * 1000)
+after = rss()
+latencies.sort()
+pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 3)
+print(json.dumps({
+    'load_ms': round(load_ms, 1),
+    'first_predict_ms': round(first_ms, 3),
+    'rss_added_mb': round(after['VmRSS'] - before['VmRSS'], 1),
+    'rss_file_backed_mb': round(after.get('RssFile', 0) - before.get('RssFile', 0), 1),
+    'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99),
+}))
+'''
+
+
+def sample_texts(pipeline, count, seed=7):
+    vocabulary = list(pipeline[0].vocabulary_)
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(5, 120))) for _ in range(count)]
+
+
+def probe(fmt, path, texts_file):
+    result = subprocess.run([sys.executable, '-c', PROBE, fmt, path, texts_file],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(args):
+    pipeline = joblib.load(args.model)
+    if args.texts:
+        with open(args.texts, encoding='utf-8') as fh:
+            texts = [line.strip() for line in fh if line.strip()][:args.requests]
+    else:
+        texts = sample_texts(pipeline, args.requests)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bundle = os.path.join(tmp, 'model.bundle')
+        verification = export(pipeline, bundle, texts)
+        if not verification['ok']:
+            return {'verification': verification}
+        texts_file = os.path.join(tmp, 'texts')
+        with open(texts_file, 'w', encoding='utf-8') as fh:
+            fh.write('\0'.join(texts))
+        sizes = {
+            'joblib': os.path.getsize(args.model),
+            'bundle': sum(os.path.getsize(os.path.join(bundle, f)) for f in os.listdir(bundle)),
+        }
+        formats = {}
+        for fmt in FORMATS:
+            formats[fmt] = probe(fmt, args.model if fmt == 'joblib' else bundle, texts_file)
+            formats[fmt]['artifact_kb'] = round(sizes[fmt.split('-')[0]] / 1e3, 1)
+
+    return {'model': args.model, 'requests': len(texts), 'verification': verification, 'formats': formats}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Prediction model format benchmark')
+    parser.add_argument('model', help='joblib pipeline to compare against its bundle export')
+    parser.add_argument('--requests', type=int, default=2000, help='single-text predictions per format')
+    parser.add_argument('--texts', help='texts to predict, one per line (default: generated)')
+    parser.add_argument('--out', help='write the JSON report to this file')
+    return parser
+
+
+if __name__ == '__main__':
+    cli_args = build_parser().parse_args()
+    output = json.dumps(run(cli_args), indent=2)
+    if cli_args.out:
+        with open(cli_args.out, 'w', encoding='utf-8') as fh:
+            fh.write(output + '\n')
+    print(output)
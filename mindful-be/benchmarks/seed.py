@@ -0,0 +1,171 @@
+# benchmarks/seed.py
+"""
+Seed a local PostgreSQL database with synthetic data for benchmarking.
+
+    python -m benchmarks.seed --reset --users 500 --posts-per-user 4
+
+Uses the DB_* settings from .env. --reset drops every table and rebuilds
+the schema from migrations/, so only point it at a disposable database.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from app.config.db import DBConnection
+from app.config.migrations import Migrations
+from app.services.bulk import copy_rows, pg_array
+from app.services.partitions import PartitionManager
+from benchmarks.stubs import write_media_file
+
+BE_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+
+EXPERT_ID = 8  # chat routes treat user 8 as the expert
+BENCH_PASSWORD = 'benchpass'
+
+WORDS = ('calm breath focus sleep anxious tired hopeful stressed walk music journal '
+         'friend work family morning night heavy light better worse today again '
+         'quiet noise help talk listen rest energy worry smile').split()
+MOODS = ['Happy', 'Neutral', 'Sad', 'Anxious', 'Angry', 'Excited']  # as MoodTrackerScreen logs them
+CATEGORIES = ['Relaxation', 'Sleep', 'Focus', 'Meditation', 'Nature']
+
+
+def sentence(rng, min_words=6, max_words=30):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))).capitalize() + '.'
+
+
+def reset_schema(target=None):
+    """Drop the public schema and rebuild it from migrations/ up to `target`"""
+    with DBConnection.get_cursor() as cursor:
+        cursor.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+    Migrations.upgrade(target, log=lambda message: None)
+
+
+def seed(args):
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    users = max(args.users, EXPERT_ID)
+    counts = {}
+    started = time.perf_counter()
+
+    if args.reset:
+        reset_schema()
+    # Back-dated rows need their monthly partitions to exist first
+    PartitionManager.ensure('moods', now - timedelta(hours=24 * 365))
+    PartitionManager.ensure('messages', now - timedelta(minutes=60 * 24 * 180))
+
+    with DBConnection.get_cursor() as cursor:
+        # Ids come from the sequence (gaps, concurrent writers), so names and emails follow the id drawn
+        cursor.execute(
+            """
+            INSERT INTO users (id, name, email, password_hash, date_of_birth, chat_count)
+            SELECT n.id, 'Bench User ' || n.id, 'bench' || n.id || '@example.com', %s, '1995-01-01', 1000000
+            FROM (SELECT nextval(pg_get_serial_sequence('users', 'id')) AS id FROM generate_series(1, %s)) n
+            RETURNING id
+            """,
+            (generate_password_hash(BENCH_PASSWORD), users)
+        )
+        user_ids = sorted(row[0] for row in cursor.fetchall())
+        counts['users'] = len(user_ids)
+        members = [u for u in user_ids if u != EXPERT_ID]
+
+        cursor.execute(
+            """
+            INSERT INTO posts (title, content, category, author_id, timestamp)
+            SELECT t.title, t.content, t.category, t.author_id, t.ts
+            FROM json_to_recordset(%s) AS t(title text, content text, category text, author_id int, ts timestamp)
+            RETURNING id
+            """,
+            (json.dumps([
+                {'title': sentence(rng, 3, 8), 'content': sentence(rng, 20, 120), 'category': rng.choice(CATEGORIES),
+                 'author_id': rng.choice(members),
+                 'ts': (now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))).isoformat()}
+                for _ in range(len(members) * args.posts_per_user)
+            ]),)
+        )
+        post_ids = [row[0] for row in cursor.fetchall()]
+        counts['posts'] = len(post_ids)
+
+        counts['comments'] = copy_rows(cursor, 'comments', ['post_id', 'author_id', 'text', 'timestamp'], (
+            (post_id, rng.choice(members), sentence(rng), now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)))
+            for post_id in post_ids
+            for _ in range(rng.randint(0, args.comments_per_post * 2))
+        ))
+
+        upvotes = set()
+        for post_id in post_ids:
+            for user_id in rng.sample(members, min(len(members), rng.randint(0, args.upvotes_per_post * 2))):
+                upvotes.add((post_id, user_id))
+        counts['post_upvotes'] = copy_rows(cursor, 'post_upvotes', ['post_id', 'user_id', 'timestamp'], (
+            (post_id, user_id, now) for post_id, user_id in upvotes
+        ))
+        cursor.execute("""
+            UPDATE posts p SET upvotes_count = c.n
+            FROM (SELECT post_id, COUNT(*) AS n FROM post_upvotes GROUP BY post_id) c
+            WHERE c.post_id = p.id
+        """)
+
+        counts['moods'] = copy_rows(cursor, 'moods', ['user_id', 'mood', 'notes', 'created_at'], (
+            (user_id, rng.choice(MOODS), sentence(rng, 0, 12), now - timedelta(hours=rng.randint(0, 24 * 365)))
+            for user_id in members
+            for _ in range(args.moods_per_user)
+        ))
+
+        def message_rows():
+            for user_id in members:
+                for _ in range(args.messages_per_user):
+                    sent_by_user = rng.random() < 0.6
+                    yield (
+                        user_id if sent_by_user else EXPERT_ID,
+                        EXPERT_ID if sent_by_user else user_id,
+                        sentence(rng, 3, 40),
+                        now - timedelta(minutes=rng.randint(0, 60 * 24 * 180)),
+                    )
+        counts['messages'] = copy_rows(cursor, 'messages', ['sender_id', 'receiver_id', 'content', 'timestamp'], message_rows())
+
+        music_rows = []
+        for i in range(args.music):
+            file_path = os.path.join('uploads', 'music', f'bench_{i}.mp3')
+            write_media_file(os.path.join(BE_ROOT, file_path), args.media_bytes, seed=i)
+            music_rows.append((f'Track {i}', f'Artist {i % 17}', rng.choice(CATEGORIES), file_path,
+                               pg_array(rng.sample(WORDS, 3)), now - timedelta(days=i)))
+        counts['music'] = copy_rows(cursor, 'music', ['music_name', 'author', 'category', 'file_path', 'tags', 'created_at'], music_rows)
+
+        exercise_rows = []
+        for i in range(args.exercises):
+            video_path = os.path.join('uploads', 'exercises', f'bench_{i}.mp4')
+            write_media_file(os.path.join(BE_ROOT, video_path), args.media_bytes, seed=10_000 + i)
+            exercise_rows.append((f'Exercise {i}', rng.choice(CATEGORIES), f'{rng.randint(2, 20)} min', sentence(rng),
+                                  pg_array([sentence(rng, 3, 10) for _ in range(rng.randint(3, 8))]), video_path))
+        counts['exercise'] = copy_rows(cursor, 'exercise', ['title', 'category', 'duration', 'description', 'steps', 'video_path'], exercise_rows)
+
+        cursor.execute("ANALYZE")
+
+    return {
+        'counts': counts,
+        'user_ids': [user_ids[0], user_ids[-1]],
+        'expert_id': EXPERT_ID,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Seed synthetic benchmark data')
+    parser.add_argument('--reset', action='store_true', help='drop all tables and re-run migrations first')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for reproducible data')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts-per-user', type=int, default=3)
+    parser.add_argument('--comments-per-post', type=int, default=5, help='average comments per post')
+    parser.add_argument('--upvotes-per-post', type=int, default=10, help='average upvotes per post')
+    parser.add_argument('--moods-per-user', type=int, default=60)
+    parser.add_argument('--messages-per-user', type=int, default=40)
+    parser.add_argument('--music', type=int, default=50)
+    parser.add_argument('--exercises', type=int, default=30)
+    parser.add_argument('--media-bytes', type=int, default=256 * 1024, help='size of each synthetic media file')
+    return parser
+
+
+if __name__ == '__main__':
+    print(json.dumps(seed(build_parser().parse_args()), indent=2))
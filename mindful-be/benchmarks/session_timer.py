@@ -0,0 +1,116 @@
+# benchmarks/session_timer.py
+"""
+Thousands of paid sessions expiring through the session timer.
+
+    python -m benchmarks.session_timer --sessions 5000 --spread 20
+
+Inserts active sessions whose deadlines are spread over --spread seconds,
+runs a SessionTimer until all of them have ended, and reports how late
+sessions ended and how many queries the timer issued per tick.
+"""
+import argparse
+import json
+import time
+from datetime import timedelta
+from app.config.db import DBConnection, TracedCursor, TracedRealDictCursor
+from app.services.bulk import copy_rows
+from app.services.sessions import SessionTimer
+from benchmarks.seed import EXPERT_ID
+
+
+class QueryCounter:
+    """Counts statements executed through the traced cursors while active"""
+
+    CURSORS = (TracedCursor, TracedRealDictCursor)
+
+    def __init__(self):
+        self.count = 0
+        self._originals = {}
+
+    def __enter__(self):
+        for cls in self.CURSORS:
+            original = self._originals[cls] = cls.execute
+
+            def execute(cursor, query, vars=None, _original=original):
+                self.count += 1
+                return _original(cursor, query, vars)
+
+            cls.execute = execute
+        return self
+
+    def __exit__(self, *exc):
+        for cls, original in self._originals.items():
+            cls.execute = original
+
+
+def insert_sessions(count, spread):
+    with DBConnection.get_cursor() as cursor:
+        cursor.execute("SELECT id FROM users WHERE id <> %s ORDER BY id LIMIT 500", (EXPERT_ID,))
+        users = [row[0] for row in cursor.fetchall()] or [1]
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM chat_session_requests")
+        first_id = cursor.fetchone()[0] + 1
+        cursor.execute("SELECT NOW()::timestamp")
+        now = cursor.fetchone()[0]
+        copy_rows(cursor, 'chat_session_requests',
+                  ['user_id', 'session_duration', 'status', 'paid', 'claimed_by', 'started_at', 'ends_at'], (
+                      (users[i % len(users)], 30, 'active', True, EXPERT_ID, now,
+                       now + timedelta(seconds=1 + spread * i / count))
+                      for i in range(count)
+                  ))
+    return first_id
+
+
+def run(args):
+    first_id = insert_sessions(args.sessions, args.spread)
+    timer = SessionTimer()
+    ticks = busy_ticks = 0
+    started = time.perf_counter()
+    with QueryCounter() as queries:
+        timer.resync()
+        resync_queries = queries.count
+        while timer.ended < args.sessions and time.perf_counter() - started < args.spread + 30:
+            if timer.tick():
+                busy_ticks += 1
+            ticks += 1
+            time.sleep(timer.wheel.tick_seconds)
+        tick_queries = queries.count - resync_queries
+
+    with DBConnection.get_cursor() as cursor:
+        cursor.execute("""
+            SELECT COUNT(*) FILTER (WHERE status = 'completed'),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM updated_at::timestamp - ends_at)),
+                   MAX(EXTRACT(EPOCH FROM updated_at::timestamp - ends_at)),
+                   (SELECT COUNT(*) FROM credit_ledger WHERE session_request_id >= %s AND event = 'session_end')
+            FROM chat_session_requests WHERE id >= %s
+        """, (first_id, first_id))
+        completed, p50_lag, max_lag, ledger_rows = cursor.fetchone()
+
+    return {
+        'sessions': args.sessions,
+        'completed': completed,
+        'ledger_rows': ledger_rows,
+        'ticks': ticks,
+        'ticks_with_work': busy_ticks,
+        'queries_on_resync': resync_queries,
+        'queries_on_ticks': tick_queries,
+        'queries_per_tick': round(tick_queries / ticks, 2) if ticks else None,
+        'end_lag_p50_s': round(float(p50_lag or 0), 3),
+        'end_lag_max_s': round(float(max_lag or 0), 3),
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Session timer expiry benchmark')
+    parser.add_argument('--sessions', type=int, default=5000)
+    parser.add_argument('--spread', type=float, default=20, help='deadlines spread over this many seconds')
+    parser.add_argument('--out', help='write the JSON report to this file')
+    return parser
+
+
+if __name__ == '__main__':
+    cli_args = build_parser().parse_args()
+    output = json.dumps(run(cli_args), indent=2)
+    if cli_args.out:
+        with open(cli_args.out, 'w', encoding='utf-8') as fh:
+            fh.write(output + '\n')
+    print(output)
@@ -0,0 +1,219 @@
+# benchmarks/stubs.py
+"""
+Offline stand-ins used by the benchmark harness.
+
+The real SVC pipeline and uploaded media are not part of the repository,
+so the harness swaps in a deterministic model and generates synthetic
+media files of a configurable size. The payment gateway is replaced by a
+local HTTP server with a fixed response delay, and S3/MinIO by a local
+object server that checks request signatures.
+"""
+import os
+import hashlib
+import json
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+CLASS_LABELS = ['Anxiety', 'Bipolar', 'Depression',
+                'Normal', 'Personality disorder',
+                'Stress', 'Suicidal']
+
+
+class StubModel:
+    """Deterministic stand-in for the vectorizer + SVC pipeline"""
+
+    classes_ = CLASS_LABELS
+
+    def __init__(self, work_factor=200):
+        # Rough CPU cost per document, so /predict is not free
+        self.work_factor = work_factor
+
+    def _label_index(self, text):
+        digest = text.encode('utf-8')
+        for _ in range(self.work_factor):
+            digest = hashlib.blake2b(digest, digest_size=16).digest()
+        return zlib.crc32(digest) % len(CLASS_LABELS)
+
+    def predict(self, documents):
+        return [CLASS_LABELS[self._label_index(doc)] for doc in documents]
+
+    def decision_function(self, documents):
+        rows = []
+        for doc in documents:
+            index = self._label_index(doc)
+            rows.append([1.0 if i == index else -1.0 for i in range(len(CLASS_LABELS))])
+        return rows
+
+
+def install_stub_model(work_factor=200):
+    """Replace the loaded prediction model with the stub"""
+    from app.services.model_loader import prediction_model
+    model = StubModel(work_factor=work_factor)
+    prediction_model.set(model)
+    return model
+
+
+def write_media_file(path, size_bytes, seed):
+    """Write a synthetic media file with reproducible content"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    block = hashlib.sha256(str(seed).encode()).digest() * 2048  # 64KB pattern
+    with open(path, 'wb') as fh:
+        remaining = size_bytes
+        while remaining > 0:
+            chunk = block[:remaining]
+            fh.write(chunk)
+            remaining -= len(chunk)
+
+
+def start_fake_gateway(delay_seconds=0.2):
+    """Serve a Khalti-compatible initiate endpoint on a free port, returns (server, url)"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(delay_seconds)
+            pidx = uuid.uuid4().hex
+            body = json.dumps({'pidx': pidx, 'payment_url': f'https://pay.example.com/{pidx}'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/epayment/initiate/'
+
+
+def start_fake_s3(root, access_key='bench', secret_key='bench-secret', region='us-east-1'):
+    """
+    Serve a minimal S3-compatible store (path-style PUT/GET/HEAD/DELETE, ListObjectsV2,
+    single-range GETs) from `root` on a free port; every request must carry a valid
+    Signature V4, in the Authorization header or pre-signed. Returns (server, endpoint).
+    """
+    from app.services.storage import canonical_query, sign_v4
+
+    class Handler(BaseHTTPRequestHandler):
+        def _authorized(self, parts):
+            query = dict(parse_qsl(parts.query, keep_blank_values=True))
+            if 'X-Amz-Signature' in query:
+                signature = query.pop('X-Amz-Signature')
+                amz_date, names = query['X-Amz-Date'], query['X-Amz-SignedHeaders'].split(';')
+                issued = datetime.strptime(amz_date, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+                if time.time() > issued.timestamp() + int(query['X-Amz-Expires']):
+                    return False
+                payload = 'UNSIGNED-PAYLOAD'
+            else:
+                auth = self.headers.get('Authorization', '')
+                fields = dict(item.strip().split('=', 1) for item in auth.partition(' ')[2].split(','))
+                if not fields.get('Credential', '').startswith(f"{access_key}/"):
+                    return False
+                signature, names = fields['Signature'], fields['SignedHeaders'].split(';')
+                amz_date, payload = self.headers['x-amz-date'], self.headers['x-amz-content-sha256']
+            headers = {name: self.headers.get(name, '') for name in names}
+            _, expected = sign_v4(secret_key, region, amz_date, self.command, parts.path,
+                                  canonical_query(query), headers, payload)
+            return expected == signature
+
+        def _route(self):
+            parts = urlsplit(self.path)
+            if not self._authorized(parts):
+                self._send(403, b'<Error><Code>SignatureDoesNotMatch</Code></Error>')
+                return None, None, None
+            bucket, _, key = unquote(parts.path).lstrip('/').partition('/')
+            return parts, key, os.path.join(root, bucket, key)
+
+        def _send(self, status, body=b'', headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def do_PUT(self):
+            parts, key, path = self._route()
+            if parts is None:
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            remaining = int(self.headers['Content-Length'])
+            with open(path, 'wb') as fh:
+                while remaining > 0:
+                    chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                    fh.write(chunk)
+                    remaining -= len(chunk)
+            self._send(200, headers={'ETag': '"0"'})
+
+        def do_DELETE(self):
+            parts, key, path = self._route()
+            if parts is None:
+                return
+            if os.path.isfile(path):
+                os.remove(path)
+            self._send(204)
+
+        def do_HEAD(self):
+            self.do_GET()
+
+        def do_GET(self):
+            parts, key, path = self._route()
+            if parts is None:
+                return
+            if not key:
+                self._list(dict(parse_qsl(parts.query)), path)
+                return
+            if not os.path.isfile(path):
+                self._send(404, b'<Error><Code>NoSuchKey</Code></Error>')
+                return
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            headers = {'Content-Type': 'application/octet-stream', 'Accept-Ranges': 'bytes',
+                       'Last-Modified': formatdate(os.path.getmtime(path), usegmt=True)}
+            status = 200
+            if self.headers.get('Range', '').startswith('bytes='):
+                start, _, end = self.headers['Range'][6:].partition('-')
+                start, end = int(start or 0), min(int(end) if end else len(data) - 1, len(data) - 1)
+                headers['Content-Range'] = f"bytes {start}-{end}/{len(data)}"
+                data, status = data[start:end + 1], 206
+            self._send(status, data, headers)
+
+        def _list(self, query, bucket_dir):
+            prefix = query.get('prefix', '')
+            entries = []
+            for directory, _, files in os.walk(bucket_dir):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    key = os.path.relpath(path, bucket_dir).replace(os.sep, '/')
+                    if key.startswith(prefix):
+                        entries.append((key, os.path.getsize(path), os.path.getmtime(path)))
+            # Small pages so clients have to follow continuation tokens
+            start = int(query.get('continuation-token', 0))
+            page = sorted(entries)[start:start + 100]
+            truncated = start + 100 < len(entries)
+            contents = ''.join(
+                f"<Contents><Key>{escape(key)}</Key><Size>{size}</Size><LastModified>"
+                f"{datetime.fromtimestamp(mtime, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')}</LastModified></Contents>"
+                for key, size, mtime in page)
+            token = f"<NextContinuationToken>{start + 100}</NextContinuationToken>" if truncated else ''
+            body = (f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                    f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{token}{contents}</ListBucketResult>")
+            self._send(200, body.encode(), {'Content-Type': 'application/xml'})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
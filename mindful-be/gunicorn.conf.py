@@ -0,0 +1,69 @@
+# gunicorn.conf.py
+#
+# Production entry point:
+#   gunicorn -c gunicorn.conf.py                    (SERVER_MODE=async, default)
+#   SERVER_MODE=sync gunicorn -c gunicorn.conf.py   (plain Flask under threaded workers)
+import multiprocessing
+import os
+
+mode = os.getenv('SERVER_MODE', 'async')
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+if mode == 'async':
+    # One event loop per core; blocking Flask routes run on ASGI_WSGI_THREADS per worker
+    wsgi_app = 'asgi:app'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = int(os.getenv('WEB_CONCURRENCY', cpu_count))
+else:
+    # Threads let a worker overlap DB and gateway waits; processes cover CPU-bound inference
+    wsgi_app = 'app:create_app()'
+    worker_class = 'gthread'
+    workers = int(os.getenv('WEB_CONCURRENCY', cpu_count * 2 + 1))
+    threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# SSE streams stay open, so worker timeouts only guard against hung workers
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+
+
+def on_starting(server):
+    # Fail fast, once in the master, if the schema does not match migrations/
+    from app.config.migrations import Migrations
+    from app.services.partitions import PartitionManager
+    Migrations.check()
+    # Make sure this month and the next few have partitions before serving writes
+    PartitionManager.maintain(expire=False)
+
+
+def post_worker_init(worker):
+    # Each worker drives its own session timer; ending a session is idempotent across workers
+    from app.services.sessions import session_timer
+    from app.services.write_behind import write_behind
+    from app.services.model_registry import model_registry
+    from app.services.recommender import recommender
+    from app.services.plays import play_counter
+    from app.services.media_cache import media_cache
+    from app.services.moderation import moderation
+    from app.services.notifications import notifier
+    session_timer.start()
+    # Follow the registry's CURRENT/SHADOW pointers; SIGUSR2 to a worker re-reads them at once
+    model_registry.start()
+    model_registry.install_signal()
+    # Keep the recommendation candidates in step with catalog_version
+    recommender.start()
+    # Flushes play counts and keeps the most played files in the page cache
+    play_counter.start()
+    # Load the most played small files into this worker's media cache
+    media_cache.start_prefetch()
+    # Screens new posts and comments; workers claim disjoint batches
+    moderation.start()
+    # Fans comment, upvote and message events out to notifications
+    notifier.start()
+    # Replay spill segments left by workers that died before flushing
+    write_behind.recover()
@@ -0,0 +1,2 @@
+DROP TABLE IF EXISTS chat_session_requests, purchases, messages, moods, post_upvotes,
+    comments, posts, exercise, music, users CASCADE;
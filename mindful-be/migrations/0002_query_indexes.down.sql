@@ -0,0 +1,12 @@
+-- migrate: no-transaction
+DROP INDEX CONCURRENTLY IF EXISTS idx_posts_timestamp;
+DROP INDEX CONCURRENTLY IF EXISTS idx_exercise_created;
+DROP INDEX CONCURRENTLY IF EXISTS idx_music_created;
+DROP INDEX CONCURRENTLY IF EXISTS idx_chat_requests_pending;
+DROP INDEX CONCURRENTLY IF EXISTS idx_chat_requests_requested;
+DROP INDEX CONCURRENTLY IF EXISTS idx_purchases_pidx;
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_receiver_timestamp;
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_sender_timestamp;
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_conversation;
+DROP INDEX CONCURRENTLY IF EXISTS idx_moods_user_created;
+DROP INDEX CONCURRENTLY IF EXISTS idx_comments_post_timestamp;
@@ -0,0 +1,42 @@
+-- migrate: no-transaction
+-- Indexes matched to the filters and sort orders the routes actually use.
+-- Built CONCURRENTLY so writes are not blocked; if a build is interrupted,
+-- drop the INVALID index and re-run the migration.
+
+-- get_comments: WHERE post_id = ? ORDER BY timestamp
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comments_post_timestamp
+    ON comments (post_id, timestamp);
+
+-- get_moods: WHERE user_id = ? ORDER BY created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_moods_user_created
+    ON moods (user_id, created_at DESC);
+
+-- chat history: one conversation = unordered (sender, receiver) pair, ORDER BY timestamp
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_conversation
+    ON messages (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), timestamp);
+
+-- expert user list: WHERE sender_id = ? OR receiver_id = ?, MAX(timestamp)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_sender_timestamp
+    ON messages (sender_id, timestamp);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_receiver_timestamp
+    ON messages (receiver_id, timestamp);
+
+-- purchase_complete: WHERE pidx = ?
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_purchases_pidx
+    ON purchases (pidx) WHERE pidx IS NOT NULL;
+
+-- list_chat_requests: ORDER BY requested_at DESC, pending work is a small slice
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_requests_requested
+    ON chat_session_requests (requested_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_requests_pending
+    ON chat_session_requests (requested_at) WHERE status = 'pending';
+
+-- catalogs: ORDER BY created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_music_created
+    ON music (created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exercise_created
+    ON exercise (created_at DESC);
+
+-- get_posts: ORDER BY timestamp DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_posts_timestamp
+    ON posts (timestamp DESC);
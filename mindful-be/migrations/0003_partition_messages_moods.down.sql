@@ -0,0 +1,48 @@
+-- Back to plain tables. Rows in detached (archived) partitions are not
+-- brought back; the indexes are recreated under the names 0002 expects.
+
+DROP TABLE IF EXISTS mood_monthly_summary;
+DROP TABLE IF EXISTS message_monthly_summary;
+
+ALTER TABLE messages RENAME TO messages_partitioned;
+ALTER SEQUENCE messages_id_seq OWNED BY NONE;
+
+CREATE TABLE messages (
+    id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+    sender_id INTEGER NOT NULL,
+    receiver_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO messages (id, sender_id, receiver_id, content, timestamp)
+SELECT id, sender_id, receiver_id, content, timestamp FROM messages_partitioned;
+DROP TABLE messages_partitioned;
+ALTER SEQUENCE messages_id_seq OWNED BY messages.id;
+
+ALTER TABLE messages ADD PRIMARY KEY (id);
+
+CREATE INDEX idx_messages_conversation
+    ON messages (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), timestamp);
+CREATE INDEX idx_messages_sender_timestamp ON messages (sender_id, timestamp);
+CREATE INDEX idx_messages_receiver_timestamp ON messages (receiver_id, timestamp);
+
+ALTER TABLE moods RENAME TO moods_partitioned;
+ALTER SEQUENCE moods_id_seq OWNED BY NONE;
+
+CREATE TABLE moods (
+    id INTEGER NOT NULL DEFAULT nextval('moods_id_seq'),
+    user_id INTEGER NOT NULL,
+    mood TEXT NOT NULL,
+    notes TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO moods (id, user_id, mood, notes, created_at)
+SELECT id, user_id, mood, notes, created_at FROM moods_partitioned;
+DROP TABLE moods_partitioned;
+ALTER SEQUENCE moods_id_seq OWNED BY moods.id;
+
+ALTER TABLE moods ADD PRIMARY KEY (id);
+
+CREATE INDEX idx_moods_user_created ON moods (user_id, created_at DESC);
+
+DROP FUNCTION IF EXISTS ensure_monthly_partition(TEXT, DATE);
@@ -0,0 +1,104 @@
+-- Monthly range partitioning for the two append-only history tables.
+--
+-- The existing rows are copied into the new partitioned tables inside this
+-- transaction, so on a large database run it in a maintenance window.
+-- Partitions are named <table>_YYYY_MM; app/services/partitions.py creates
+-- upcoming months ahead of time and rolls up / detaches expired ones.
+-- There is deliberately no DEFAULT partition: it would block
+-- DETACH PARTITION CONCURRENTLY and hide missing-partition bugs.
+
+CREATE OR REPLACE FUNCTION ensure_monthly_partition(parent TEXT, month DATE) RETURNS TEXT AS $$
+DECLARE
+    start_at DATE := date_trunc('month', month)::date;
+    child TEXT := parent || '_' || to_char(start_at, 'YYYY_MM');
+BEGIN
+    IF to_regclass(child) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                       child, parent, start_at, (start_at + INTERVAL '1 month')::date);
+    END IF;
+    RETURN child;
+END;
+$$ LANGUAGE plpgsql;
+
+-- messages ---------------------------------------------------------------
+
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+ALTER SEQUENCE messages_id_seq OWNED BY NONE;
+
+CREATE TABLE messages (
+    id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+    sender_id INTEGER NOT NULL,
+    receiver_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (timestamp);
+
+SELECT ensure_monthly_partition('messages', month::date)
+FROM generate_series(
+    date_trunc('month', LEAST((SELECT MIN(timestamp) FROM messages_unpartitioned), LOCALTIMESTAMP)),
+    date_trunc('month', LOCALTIMESTAMP) + INTERVAL '3 months',
+    INTERVAL '1 month'
+) AS month;
+
+INSERT INTO messages (id, sender_id, receiver_id, content, timestamp)
+SELECT id, sender_id, receiver_id, content, timestamp FROM messages_unpartitioned;
+
+DROP TABLE messages_unpartitioned;
+ALTER SEQUENCE messages_id_seq OWNED BY messages.id;
+
+-- The partition key has to be part of every unique constraint
+ALTER TABLE messages ADD PRIMARY KEY (id, timestamp);
+CREATE INDEX idx_messages_conversation
+    ON messages (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), timestamp);
+CREATE INDEX idx_messages_sender_timestamp ON messages (sender_id, timestamp);
+CREATE INDEX idx_messages_receiver_timestamp ON messages (receiver_id, timestamp);
+
+-- moods ------------------------------------------------------------------
+
+ALTER TABLE moods RENAME TO moods_unpartitioned;
+ALTER SEQUENCE moods_id_seq OWNED BY NONE;
+
+CREATE TABLE moods (
+    id INTEGER NOT NULL DEFAULT nextval('moods_id_seq'),
+    user_id INTEGER NOT NULL,
+    mood TEXT NOT NULL,
+    notes TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (created_at);
+
+SELECT ensure_monthly_partition('moods', month::date)
+FROM generate_series(
+    date_trunc('month', LEAST((SELECT MIN(created_at) FROM moods_unpartitioned), LOCALTIMESTAMP)),
+    date_trunc('month', LOCALTIMESTAMP) + INTERVAL '3 months',
+    INTERVAL '1 month'
+) AS month;
+
+INSERT INTO moods (id, user_id, mood, notes, created_at)
+SELECT id, user_id, mood, notes, COALESCE(created_at, LOCALTIMESTAMP) FROM moods_unpartitioned;
+
+DROP TABLE moods_unpartitioned;
+ALTER SEQUENCE moods_id_seq OWNED BY moods.id;
+
+ALTER TABLE moods ADD PRIMARY KEY (id, created_at);
+CREATE INDEX idx_moods_user_created ON moods (user_id, created_at DESC);
+
+-- Rollups kept after a partition is detached -----------------------------
+
+CREATE TABLE message_monthly_summary (
+    month DATE NOT NULL,
+    sender_id INTEGER NOT NULL,
+    receiver_id INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    first_at TIMESTAMP NOT NULL,
+    last_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (month, sender_id, receiver_id)
+);
+
+CREATE TABLE mood_monthly_summary (
+    month DATE NOT NULL,
+    user_id INTEGER NOT NULL,
+    mood TEXT NOT NULL,
+    entries INTEGER NOT NULL,
+    PRIMARY KEY (month, user_id, mood)
+);
+CREATE INDEX idx_mood_summary_user ON mood_monthly_summary (user_id, month);
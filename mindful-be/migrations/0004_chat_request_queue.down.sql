@@ -0,0 +1,9 @@
+-- migrate: no-transaction
+DROP INDEX CONCURRENTLY IF EXISTS idx_chat_requests_claimed_by;
+DROP INDEX CONCURRENTLY IF EXISTS idx_chat_requests_claim_expiry;
+DROP INDEX CONCURRENTLY IF EXISTS idx_chat_requests_pending;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_requests_pending
+    ON chat_session_requests (requested_at) WHERE status = 'pending';
+ALTER TABLE chat_session_requests DROP COLUMN IF EXISTS expires_at;
+ALTER TABLE chat_session_requests DROP COLUMN IF EXISTS claimed_at;
+ALTER TABLE chat_session_requests DROP COLUMN IF EXISTS claimed_by;
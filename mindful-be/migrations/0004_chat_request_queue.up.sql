@@ -0,0 +1,19 @@
+-- migrate: no-transaction
+-- Claim bookkeeping for the chat request queue (app/services/chat_queue.py).
+
+ALTER TABLE chat_session_requests ADD COLUMN IF NOT EXISTS claimed_by INTEGER;
+ALTER TABLE chat_session_requests ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+ALTER TABLE chat_session_requests ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP;
+
+-- Pending queue is read FIFO with a (requested_at, id) keyset cursor
+DROP INDEX CONCURRENTLY IF EXISTS idx_chat_requests_pending;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_requests_pending
+    ON chat_session_requests (requested_at, id) WHERE status = 'pending';
+
+-- Expiry sweep: accepted claims that were never paid
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_requests_claim_expiry
+    ON chat_session_requests (expires_at) WHERE status = 'accepted' AND NOT paid;
+
+-- An expert's own claims
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_requests_claimed_by
+    ON chat_session_requests (claimed_by, claimed_at DESC) WHERE claimed_by IS NOT NULL;
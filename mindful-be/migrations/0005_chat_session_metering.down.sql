@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+DROP INDEX CONCURRENTLY IF EXISTS idx_chat_sessions_active_user;
+DROP INDEX CONCURRENTLY IF EXISTS idx_chat_sessions_active_ends;
+DROP TABLE IF EXISTS credit_ledger;
+ALTER TABLE chat_session_requests DROP COLUMN IF EXISTS ended_at;
+ALTER TABLE chat_session_requests DROP COLUMN IF EXISTS ends_at;
+ALTER TABLE chat_session_requests DROP COLUMN IF EXISTS started_at;
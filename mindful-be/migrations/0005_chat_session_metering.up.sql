@@ -0,0 +1,29 @@
+-- migrate: no-transaction
+-- Paid chat sessions: deadlines persisted on the request row, usage in credit_ledger.
+-- session_duration is in minutes; a paid claim becomes 'active' until ends_at,
+-- then 'completed' (app/services/sessions.py).
+
+ALTER TABLE chat_session_requests ADD COLUMN IF NOT EXISTS started_at TIMESTAMP;
+ALTER TABLE chat_session_requests ADD COLUMN IF NOT EXISTS ends_at TIMESTAMP;
+ALTER TABLE chat_session_requests ADD COLUMN IF NOT EXISTS ended_at TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS credit_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    session_request_id INTEGER,
+    event VARCHAR(32) NOT NULL,
+    seconds INTEGER NOT NULL DEFAULT 0,
+    credits INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_credit_ledger_user
+    ON credit_ledger (user_id, created_at DESC);
+
+-- Timer resync: every active session ordered by deadline
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_sessions_active_ends
+    ON chat_session_requests (ends_at) WHERE status = 'active';
+
+-- send_message: does this user have a running session?
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_sessions_active_user
+    ON chat_session_requests (user_id) WHERE status = 'active';
@@ -0,0 +1 @@
+DROP TABLE IF EXISTS write_behind_segments;
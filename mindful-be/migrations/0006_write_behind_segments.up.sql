@@ -0,0 +1,9 @@
+-- Spill segments from app/services/write_behind.py that have been written to
+-- the database. Recorded in the same transaction as the rows, so replaying a
+-- segment after a crash never inserts it twice.
+
+CREATE TABLE IF NOT EXISTS write_behind_segments (
+    segment TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    flushed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
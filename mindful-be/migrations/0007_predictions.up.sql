@@ -0,0 +1,23 @@
+-- migrate: no-transaction
+-- Every /predict result, kept per user for history and trend rollups
+-- (app/services/prediction_history.py). Only a SHA-256 of the normalised
+-- text is stored; it doubles as the key of the inference cache, scoped to
+-- the model that produced the result.
+
+CREATE TABLE IF NOT EXISTS predictions (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    label VARCHAR(32) NOT NULL,
+    scores REAL[],
+    text_hash CHAR(64) NOT NULL,
+    model_version TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- /predict/history and the cohort summary: one user's (or a set of users') recent predictions
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_predictions_user_created
+    ON predictions (user_id, created_at, id);
+
+-- Inference cache lookup
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_predictions_text_hash
+    ON predictions (text_hash, model_version);
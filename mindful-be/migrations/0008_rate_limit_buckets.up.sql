@@ -0,0 +1,9 @@
+-- Shared token buckets for app/config/rate_limit.py (RATE_LIMIT_BACKEND=postgres).
+-- UNLOGGED: buckets are cheap to lose on a crash (they just refill), and
+-- skipping the WAL keeps the per-request update fast.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    key TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,2 @@
+ALTER TABLE exercise DROP COLUMN IF EXISTS poster_hash;
+ALTER TABLE music DROP COLUMN IF EXISTS cover_hash;
@@ -0,0 +1,5 @@
+-- Optional artwork for catalog rows: the SHA-256 of the original image in
+-- uploads/images/originals (see app/services/images.py). NULL = no artwork.
+
+ALTER TABLE music ADD COLUMN IF NOT EXISTS cover_hash CHAR(64);
+ALTER TABLE exercise ADD COLUMN IF NOT EXISTS poster_hash CHAR(64);
@@ -0,0 +1,4 @@
+DROP TRIGGER IF EXISTS exercise_catalog_version ON exercise;
+DROP TRIGGER IF EXISTS music_catalog_version ON music;
+DROP FUNCTION IF EXISTS bump_catalog_version();
+DROP TABLE IF EXISTS catalog_version;
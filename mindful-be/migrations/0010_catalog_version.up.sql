@@ -0,0 +1,27 @@
+-- A counter bumped by every statement that writes music or exercise rows
+-- (COPY included), so workers can tell cheaply when their precomputed
+-- recommendation candidates (app/services/recommender.py) are stale.
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO catalog_version DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE catalog_version SET version = version + 1, changed_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS music_catalog_version ON music;
+CREATE TRIGGER music_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON music
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS exercise_catalog_version ON exercise;
+CREATE TRIGGER exercise_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON exercise
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
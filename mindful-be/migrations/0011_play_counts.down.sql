@@ -0,0 +1 @@
+DROP TABLE IF EXISTS play_counts_hourly;
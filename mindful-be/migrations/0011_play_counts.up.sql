@@ -0,0 +1,11 @@
+-- Plays of music tracks and exercise videos, counted per item and hour
+-- (app/services/plays.py). Workers buffer plays in memory and add their
+-- counts here in batches; raw play events are never stored.
+
+CREATE TABLE IF NOT EXISTS play_counts_hourly (
+    kind VARCHAR(16) NOT NULL,          -- music | exercise
+    item_id INTEGER NOT NULL,
+    hour TIMESTAMP NOT NULL,
+    plays INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, hour, item_id)
+);
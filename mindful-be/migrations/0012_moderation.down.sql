@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+DROP TABLE IF EXISTS moderation_flags;
+DROP INDEX CONCURRENTLY IF EXISTS idx_comments_unscreened;
+DROP INDEX CONCURRENTLY IF EXISTS idx_posts_unscreened;
+ALTER TABLE comments DROP COLUMN IF EXISTS moderation_status;
+ALTER TABLE posts DROP COLUMN IF EXISTS moderation_status;
@@ -0,0 +1,39 @@
+-- migrate: no-transaction
+-- Moderation of posts and comments (app/services/moderation.py). Rows
+-- written from now on start 'unscreened'; the moderation worker marks them
+-- 'approved', or 'held' with a flag the experts approve or reject.
+-- Existing rows count as approved.
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS moderation_status VARCHAR(16) NOT NULL DEFAULT 'approved';
+ALTER TABLE posts ALTER COLUMN moderation_status SET DEFAULT 'unscreened';
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS moderation_status VARCHAR(16) NOT NULL DEFAULT 'approved';
+ALTER TABLE comments ALTER COLUMN moderation_status SET DEFAULT 'unscreened';
+
+-- The worker's backlog
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_posts_unscreened
+    ON posts (id) WHERE moderation_status = 'unscreened';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comments_unscreened
+    ON comments (id) WHERE moderation_status = 'unscreened';
+
+-- One flag per item; a post's own flag has no comment_id
+CREATE TABLE IF NOT EXISTS moderation_flags (
+    id SERIAL PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+    comment_id INTEGER REFERENCES comments(id) ON DELETE CASCADE,
+    author_id INTEGER NOT NULL,
+    label VARCHAR(64),                    -- predicted label, NULL when the model was unavailable
+    terms TEXT[] NOT NULL DEFAULT '{}',   -- matched keywords
+    categories TEXT[] NOT NULL DEFAULT '{}',
+    severity VARCHAR(16) NOT NULL,        -- crisis | review
+    status VARCHAR(16) NOT NULL DEFAULT 'open',  -- open | approved | rejected
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    reviewed_by INTEGER,
+    reviewed_at TIMESTAMP
+);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_moderation_flags_item
+    ON moderation_flags (post_id, COALESCE(comment_id, 0));
+
+-- Review queue: open flags, oldest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_moderation_flags_open
+    ON moderation_flags (created_at, id) WHERE status = 'open';
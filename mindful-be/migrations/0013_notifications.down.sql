@@ -0,0 +1,2 @@
+DROP TABLE IF EXISTS notification_unread;
+DROP TABLE IF EXISTS notifications;
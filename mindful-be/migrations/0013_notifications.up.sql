@@ -0,0 +1,34 @@
+-- In-app notifications (app/services/notifications.py): comments on and
+-- upvotes of a user's posts and chat messages sent to them. Events on the
+-- same subject coalesce into the recipient's one unread row for it.
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind VARCHAR(16) NOT NULL,          -- comment | upvote | message
+    subject_id INTEGER NOT NULL,        -- the post (comment, upvote) or the sender (message)
+    actor_ids INTEGER[] NOT NULL,       -- distinct actors, most recent last
+    event_count INTEGER NOT NULL DEFAULT 1,
+    data JSONB NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    read_at TIMESTAMP
+);
+
+-- Coalescing target: at most one unread notification per user, kind and subject
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_unread_subject
+    ON notifications (user_id, kind, subject_id) WHERE read_at IS NULL;
+
+-- A user's feed, most recently updated first
+CREATE INDEX IF NOT EXISTS idx_notifications_user_updated
+    ON notifications (user_id, updated_at DESC, id DESC);
+
+-- Retention sweep of read notifications
+CREATE INDEX IF NOT EXISTS idx_notifications_read_at
+    ON notifications (read_at) WHERE read_at IS NOT NULL;
+
+-- Unread rows per user, kept in step by the writers of notifications
+CREATE TABLE IF NOT EXISTS notification_unread (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    unread INTEGER NOT NULL DEFAULT 0
+);
@@ -0,0 +1,17 @@
+-- Idempotency-Key claims and the responses replayed to retries
+-- (app/config/idempotency.py). Rows expire after IDEMPOTENCY_TTL_SECONDS
+-- and are swept by the workers that claim new keys.
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id INTEGER NOT NULL,
+    key VARCHAR(255) NOT NULL,
+    request_hash BYTEA NOT NULL,        -- SHA-256 of method, path and body
+    status_code SMALLINT,               -- NULL while the first request is running
+    headers JSONB,
+    body BYTEA,                         -- zlib-compressed
+    locked_until TIMESTAMPTZ NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (user_id, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys (expires_at);
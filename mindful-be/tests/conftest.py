@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the backend as the app does: from mindful-be/ (`app`, `asgi`, `benchmarks`)
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), '..')))
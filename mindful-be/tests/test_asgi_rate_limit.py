@@ -0,0 +1,58 @@
+import os
+import pytest
+
+os.environ.setdefault('MODEL_LOAD', 'lazy')
+pytest.importorskip('starlette')
+from starlette.testclient import TestClient
+from app.asgi import create_asgi_app
+from app.config.JWTConfig import JWTConfig
+from app.config.rate_limit import RateLimit, MemoryBuckets, ConcurrencyGate
+
+
+@pytest.fixture(scope='module')
+def asgi_app():
+    return create_asgi_app()
+
+
+@pytest.fixture
+def client(asgi_app, monkeypatch):
+    monkeypatch.setattr(RateLimit, 'ENABLED', True)
+    monkeypatch.setattr(RateLimit, 'CAPACITY', 30.0)
+    monkeypatch.setattr(RateLimit, 'REFILL_PER_SECOND', 0.5)
+    monkeypatch.setattr(RateLimit, 'buckets', MemoryBuckets())
+    monkeypatch.setattr(RateLimit, 'gate', ConcurrencyGate(4, 0, 0))
+    # No lifespan: requests rejected before the handler's first query never need the pool
+    client = TestClient(asgi_app)
+    client.cookies.set(JWTConfig.COOKIE_NAME, JWTConfig.generate_token(1, 'ratelimit@example.com'))
+    return client
+
+
+def buy(client):
+    # Invalid body: answered 400 by the handler without touching the database or the gateway
+    return client.post('/api/buy-messages', json={})
+
+
+def test_buy_messages_spends_its_route_cost(client):
+    cost = RateLimit.COSTS['buy-messages']
+    allowed = int(RateLimit.CAPACITY // cost)
+    for _ in range(allowed):
+        assert buy(client).status_code == 400
+
+    response = buy(client)
+    assert response.status_code == 429
+    assert response.json()['message'] == 'Too many requests'
+    retry_after = int(response.headers['Retry-After'])
+    assert retry_after == response.json()['retry_after'] >= 1
+
+
+def test_buy_messages_is_gated_when_the_server_is_busy(client):
+    for _ in range(RateLimit.gate.max_inflight):
+        assert RateLimit.gate.acquire()
+    try:
+        response = buy(client)
+    finally:
+        for _ in range(RateLimit.gate.max_inflight):
+            RateLimit.gate.release()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(RateLimit.ADMISSION_RETRY_AFTER)
+    assert RateLimit.gate.inflight == 0
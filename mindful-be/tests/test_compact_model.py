@@ -0,0 +1,63 @@
+import random
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.svm import SVC, LinearSVC
+from app.services.compact_model import CompactModel, export, verify
+
+VOCABULARY = {
+    'Anxiety': 'worried nervous restless panic racing heart uneasy dread',
+    'Depression': 'empty hopeless tired numb worthless sad alone heavy',
+    'Normal': 'fine good walk lunch friends weekend relaxed happy',
+    'Stress': 'deadline workload pressure exams overtime busy boss bills',
+}
+FILLER = 'i feel today and the it was so very much lately my'.split()
+
+
+def corpus(seed, per_label):
+    rng = random.Random(seed)
+    texts, labels = [], []
+    for label, words in VOCABULARY.items():
+        words = words.split()
+        for _ in range(per_label):
+            picked = rng.sample(words, 3) + rng.sample(FILLER, 4)
+            # Some words from another label, so not every text is separable
+            picked += rng.sample(rng.choice(list(VOCABULARY.values())).split(), 1)
+            rng.shuffle(picked)
+            texts.append(' '.join(picked))
+            labels.append(label)
+    return texts, labels
+
+
+TRAIN = corpus(seed=1, per_label=30)
+EXPORT_CHECK, _ = corpus(seed=2, per_label=5)
+# Never seen by fit() or export(), plus words and characters outside the vocabulary
+HELD_OUT = corpus(seed=3, per_label=10)[0] + [
+    'Panic at the Café, Très nervous!!', 'DEADLINE... deadline; overtime?', 'unrelated words only', '',
+]
+
+
+@pytest.fixture(params=[
+    pytest.param(lambda: SVC(kernel='rbf', C=10, gamma='scale'), id='svc'),
+    pytest.param(lambda: LinearSVC(C=1.0), id='linear_svc'),
+])
+def pipeline(request):
+    model = Pipeline([
+        ('tfidf', TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, strip_accents='unicode')),
+        ('clf', request.param()),
+    ])
+    return model.fit(*TRAIN)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_bundle_matches_pipeline_on_held_out_texts(pipeline, tmp_path, mmap):
+    path = str(tmp_path / 'v1.bundle')
+    report = export(pipeline, path, EXPORT_CHECK)
+    assert report['ok'], report
+
+    compact = CompactModel(path, mmap=mmap)
+    assert verify(pipeline, compact, HELD_OUT)['ok']
+    assert list(compact.predict(HELD_OUT)) == list(pipeline.predict(HELD_OUT))
+    np.testing.assert_allclose(compact.decision_function(HELD_OUT), pipeline.decision_function(HELD_OUT),
+                               atol=1e-4)
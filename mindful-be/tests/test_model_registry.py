@@ -0,0 +1,39 @@
+import pytest
+from app.services.model_loader import ModelConfig
+from app.services.model_registry import ModelRegistry, RegistryConfig, shadow_model
+
+
+class BrokenLoader:
+    version = 'v1'
+    state = 'ready'
+
+    def __init__(self):
+        self.attempts = []
+
+    def reload(self, path):
+        self.attempts.append(path)
+        raise ValueError('corrupt artifact')
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(RegistryConfig, 'DIR', str(tmp_path))
+    monkeypatch.setattr(ModelConfig, 'REGISTRY_DIR', str(tmp_path))
+    for version in ('v2', 'v3'):
+        (tmp_path / f'{version}.joblib').write_bytes(b'not a model')
+    return ModelRegistry(BrokenLoader(), shadow_model)
+
+
+def test_failed_current_is_not_reloaded_every_poll(registry):
+    ModelRegistry.write_pointer('CURRENT', 'v2')
+    with pytest.raises(ValueError):
+        registry.sync()
+    registry.sync()
+    registry.sync()
+    assert len(registry.active.attempts) == 1
+
+    # A new pointer is tried again
+    ModelRegistry.write_pointer('CURRENT', 'v3')
+    with pytest.raises(ValueError):
+        registry.sync()
+    assert len(registry.active.attempts) == 2
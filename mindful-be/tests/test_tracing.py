@@ -0,0 +1,48 @@
+import time
+import pytest
+from flask import Flask, jsonify
+from app.config.tracing import Tracing
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Tracing, 'ENABLED', True)
+    monkeypatch.setattr(Tracing, '_recent', type(Tracing._recent)(maxlen=10))
+    app = Flask(__name__)
+    Tracing.init_app(app)
+
+    @app.route('/nested')
+    def nested():
+        with Tracing.phase('inference'):
+            time.sleep(0.03)
+            with Tracing.phase('db'):
+                time.sleep(0.05)
+                with Tracing.phase('db'):
+                    time.sleep(0.01)
+        return jsonify({'ok': True})
+
+    return app.test_client()
+
+
+def last_trace():
+    entries, _ = Tracing.slowest(limit=1)
+    return entries[0]
+
+
+def test_nested_phase_is_not_double_counted(client):
+    assert client.get('/nested').status_code == 200
+    trace = last_trace()
+    phases = trace['phases']
+
+    # The outer phase is paused while the nested one runs
+    assert 25 <= phases['inference'] < 50
+    # Same-phase nesting counts the inner block once
+    assert 55 <= phases['db'] < 80
+    recorded = sum(ms for name, ms in phases.items() if name != 'app')
+    assert recorded <= trace['duration_ms']
+    assert phases['app'] == pytest.approx(trace['duration_ms'] - recorded, abs=0.01)
+
+
+def test_phase_outside_a_request_is_a_noop():
+    with Tracing.phase('db'):
+        pass